@@ -21,7 +21,8 @@ This module contains some very basic stuff needed all over the whole project. It
 import string
 import random
 import hashlib
-from os.path import dirname
+import os
+from os.path import dirname, isfile
 import sys
 
 __license__ = 'Apache License V2.0'
@@ -36,6 +37,8 @@ class SingletonMeta(type):
     Make a class a singleton.
 
     Add ``metaclass=SingletonMeta`` to the class' options to make it a singleton.
+
+    The instances are forgotten in the child process after a fork, so every process creates its own ones.
     """
     __instances = dict()
 
@@ -44,6 +47,17 @@ class SingletonMeta(type):
             cls.__instances[cls] = super(SingletonMeta, cls).__call__(*args, **kwargs)
         return cls.__instances[cls]
 
+    @staticmethod
+    def reset() -> None:
+        """
+        Forget all instances, so they are created again on the next call
+        """
+        SingletonMeta.__instances.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SingletonMeta.reset)
+
 
 def create_salt(length: int=128) -> str:
     """
@@ -113,8 +127,12 @@ def find_root_path() -> str:
     """
     Find the application's root path in the file system
 
+    When the application is run out of an archive (e.g. a zipapp), the folder containing the archive is the root path.
+
     :return: The root path as string
     """
     if hasattr(sys, 'frozen'):
         return dirname(sys.executable)
+    if isfile(sys.path[0]):
+        return dirname(sys.path[0])
     return sys.path[0]
\ No newline at end of file
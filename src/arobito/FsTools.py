@@ -21,6 +21,7 @@ We need those functions to use configuration files and find out about their loca
 """
 
 import os
+import configparser
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -80,3 +81,36 @@ def get_config_file(filename: str='arobito.ini') -> str:
     if not os.path.isfile(config_file):
         raise IOError('Requested file is not a file!')
     return config_file
+
+
+def get_config_section(filename: str, section: str, defaults: dict) -> configparser.SectionProxy:
+    """
+    Load a section of a configuration file and make sure all default values are present
+
+    Missing sections and missing (or empty) options are filled up with the values from ``defaults`` and written back to
+    the file, so the file always documents all options available.
+
+    :param filename: The name of the configuration file, e.g. ``controller.ini``
+    :param section: The name of the section
+    :param defaults: A dict of option names and their default values as strings
+    :return: The section of the configuration
+    :raises: IOError when no file can be found and created
+    """
+    conf_file = get_config_file(filename)
+    config = configparser.ConfigParser()
+    config.read(conf_file)
+    config_changed = False
+    if not section in config.sections():
+        config.add_section(section)
+        config_changed = True
+    for option, value in defaults.items():
+        current = config.get(section, option, fallback=None)
+        if current is None or len(current) <= 0:
+            config.set(section, option, value)
+            config_changed = True
+    if config_changed:
+        with open(conf_file, 'w') as fh:
+            config.write(fh)
+            fh.flush()
+            fh.close()
+    return config[section]
@@ -19,8 +19,6 @@ This module provides some basic helper functions needed globally.
 """
 
 import cherrypy
-import sys
-from threading import Timer
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -28,19 +26,70 @@ __author__ = 'Jürgen Edelbluth'
 __credits__ = ['Jürgen Edelbluth']
 __maintainer__ = 'Jürgen Edelbluth'
 
+#: The channel on the CherryPy bus for status changes of the application
+status_channel = 'arobito-status'
 
-def shutdown(code: int=0, delay: int=0) -> None:
+#: The channel on the CherryPy bus for notifications to the users
+notification_channel = 'arobito-notification'
+
+#: The channel on the CherryPy bus the server modes publish their listening socket on once they serve
+serving_channel = 'arobito-serving'
+
+#: The channel on the CherryPy bus for shutdown requests, answered by the :py:mod:`Shutdown
+#: <arobito.controlinterface.Shutdown>` plugin
+shutdown_channel = 'arobito-shutdown'
+
+#: The channel on the CherryPy bus the server modes drain their requests on during a shutdown
+drain_channel = 'arobito-drain'
+
+#: The channel on the CherryPy bus for restart requests, answered by the :py:mod:`Handoff
+#: <arobito.controlinterface.Handoff>` plugin
+restart_channel = 'arobito-restart'
+
+
+def publish_status(state: str, **details) -> None:
+    """
+    Announce a status change of the application on the CherryPy bus, e.g. for the push channel
+
+    :param state: The new state, e.g. ``shutdown``
+    :param details: Additional information about the state
+    """
+    cherrypy.engine.publish(status_channel, dict(state=state, **details))
+
+
+def notify(title: str, message: str, level: str='info') -> None:
+    """
+    Send a notification to the users on the CherryPy bus, e.g. for the push channel
+
+    :param title: The title of the notification
+    :param message: The message
+    :param level: One of ``info``, ``notice``, ``warning`` and ``error``
+    """
+    cherrypy.engine.publish(notification_channel, dict(title=title, message=message, level=level))
+
+
+def shutdown(drain: bool=True) -> bool:
     """
     Shutdown the CherryPy engine and exit the program.
 
-    The shutdown can be delayed.
+    The shutdown runs in the background, see :py:mod:`Shutdown <arobito.controlinterface.Shutdown>`: The server stops
+    accepting, the requests in flight finish or are aborted, the sessions are written and the engine exits.
+
+    :param drain: True to let the requests in flight finish within the ``drain-timeout`` of the server, False to abort
+                  them at once
+    :return: True when the shutdown was started, False when there is no server or it is shutting down already
+    """
+    return True in cherrypy.engine.publish(shutdown_channel, drain)
+
+
+def restart() -> bool:
+    """
+    Restart the program without closing its listening socket
+
+    The restart runs in the background. The new process takes over once it is ready, see :py:mod:`Handoff
+    <arobito.controlinterface.Handoff>`.
 
-    :param code: Return code
-    :param delay: Delay in seconds
+    :return: True when the restart was started, False when it is not possible, e.g. in the worker process mode, or
+             already running
     """
-    if delay > 0:
-        timer = Timer(float(delay), shutdown, kwargs={'code': code, 'delay': 0})
-        timer.start()
-        return
-    cherrypy.engine.exit()
-    sys.exit(code)
+    return True in cherrypy.engine.publish(restart_channel)
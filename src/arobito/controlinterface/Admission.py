@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module limits the number of ``/app`` requests processed at the same time and sheds load early when the server is
+overloaded.
+
+At most ``admission-limit`` requests run at once. Further requests wait in a queue of ``admission-queue`` places for a
+free slot. The queue has three lanes, served in this order:
+
+#. ``priority``: Administrative calls like ``shutdown`` and ``restart``
+#. ``interactive``: Everything else
+#. ``expensive``: ``auth``, with its password hashing
+
+A request is rejected with ``503 Service Unavailable`` and a ``Retry-After`` header right away when its expected wait,
+estimated from the average processing time, exceeds ``admission-slo`` seconds, when it does not get a slot within that
+time, or when the queue is full. A full queue makes room for a request of a better lane by rejecting the newest request
+waiting in a worse lane.
+
+In the CherryPy server, the waiting requests occupy a worker thread, so ``thread-pool`` should be larger than
+``admission-limit`` plus ``admission-queue``. The state of the limiter is available as :py:meth:`metrics
+<.AdmissionController.metrics>`.
+"""
+
+import asyncio
+import math
+import threading
+import time
+import cherrypy
+from arobito.Base import SingletonMeta
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The lanes of the queue, in the order they are served
+lanes = ('priority', 'interactive', 'expensive')
+
+#: The lanes of the ``/app`` methods; methods not listed here are ``interactive``
+method_lanes = {
+    'shutdown': 'priority',
+    'restart': 'priority',
+    'get_session_count': 'priority',
+    'get_admission_stats': 'priority',
+    'profile': 'priority',
+    'memory': 'priority',
+    'auth': 'expensive'
+}
+
+
+def lane_of(method: str) -> str:
+    """
+    Get the lane of an ``/app`` method
+
+    :param method: The name of the method
+    :return: The lane
+    """
+    return method_lanes.get(method, 'interactive')
+
+
+class Overloaded(Exception):
+    """
+    A request was not admitted
+    """
+
+    def __init__(self, retry_after: int):
+        """
+        Create the exception
+
+        :param retry_after: Seconds the client should wait before trying again
+        """
+        super(Overloaded, self).__init__('Overloaded, retry after {:d} seconds'.format(retry_after))
+        self.retry_after = retry_after
+
+
+class Ticket(object):
+    """
+    The place of a request in the limiter
+    """
+
+    __slots__ = ('lane', 'state', 'started', 'wake')
+
+    def __init__(self, lane: int, wake):
+        """
+        Create the ticket
+
+        :param lane: The index of the lane
+        :param wake: Called without arguments when the waiting request is admitted or shed, or None
+        """
+        self.lane = lane
+        #: ``waiting``, ``admitted``, ``shed``, ``expired`` or ``left``
+        self.state = 'waiting'
+        self.started = 0.0
+        self.wake = wake
+
+
+class AdmissionController(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, keeps the number of requests in flight and the waiting requests
+    """
+
+    #: The weight of the latest processing time in its moving average
+    smoothing = 0.2
+
+    def __init__(self):
+        """
+        Start disabled, until :py:meth:`configure` is called
+        """
+        self.__lock = threading.Lock()
+        self.limit = 0
+        self.queue_size = 0
+        self.slo = 1.0
+        self.in_flight = 0
+        #: The moving average of the processing time of a request in seconds
+        self.service_time = 0.0
+        self.__waiting = [list() for lane in lanes]
+        self.__admitted = [0] * len(lanes)
+        self.__rejected = [0] * len(lanes)
+        self.__shed = [0] * len(lanes)
+
+    def configure(self, limit: int, queue_size: int, slo: float) -> None:
+        """
+        Set the limits
+
+        Waiting requests the new limit leaves room for are admitted at once; all of them when the limit is 0.
+
+        :param limit: The maximum number of requests in flight, 0 to admit every request
+        :param queue_size: The maximum number of waiting requests
+        :param slo: The maximum time in seconds a request may wait
+        """
+        wakes = list()
+        with self.__lock:
+            self.limit = limit
+            self.queue_size = queue_size
+            self.slo = slo
+            for waiting in self.__waiting:
+                while waiting and (self.limit <= 0 or self.in_flight < self.limit):
+                    next_ticket = waiting.pop(0)
+                    self.__admit(next_ticket)
+                    wakes.append(next_ticket.wake)
+        for wake in wakes:
+            if wake is not None:
+                wake()
+
+    def __retry_after(self, position: int) -> int:
+        """
+        Estimate when a request at a position of the queue would get a slot
+
+        :param position: The position, 1 for the first one
+        :return: The estimate in whole seconds, at least 1
+        """
+        return max(1, math.ceil(position * self.service_time / max(self.limit, 1)))
+
+    def enter(self, lane: str, wake=None) -> Ticket:
+        """
+        Admit a request or queue it, without waiting
+
+        :param lane: The lane of the request
+        :param wake: Called without arguments when the request waits and is admitted or shed later
+        :return: The ticket, to be passed to :py:meth:`leave`, or None when the limiter is disabled
+        :raise Overloaded: When the request is rejected
+        """
+        index = lanes.index(lane)
+        wakes = list()
+        with self.__lock:
+            if self.limit <= 0:
+                return None
+            ticket = Ticket(index, wake)
+            if self.in_flight < self.limit:
+                self.__admit(ticket)
+                return ticket
+            position = sum(len(waiting) for waiting in self.__waiting[:index + 1]) + 1
+            if position * self.service_time / self.limit > self.slo:
+                self.__rejected[index] += 1
+                raise Overloaded(self.__retry_after(position))
+            if sum(len(waiting) for waiting in self.__waiting) >= self.queue_size:
+                victims = [worse for worse in range(len(lanes) - 1, index, -1) if self.__waiting[worse]]
+                if not victims:
+                    self.__rejected[index] += 1
+                    raise Overloaded(self.__retry_after(position))
+                victim = self.__waiting[victims[0]].pop()
+                victim.state = 'shed'
+                self.__shed[victim.lane] += 1
+                wakes.append(victim.wake)
+            self.__waiting[index].append(ticket)
+        for wake in wakes:
+            if wake is not None:
+                wake()
+        return ticket
+
+    def __admit(self, ticket: Ticket) -> None:
+        """
+        Give a slot to a request, with the lock held
+
+        :param ticket: The ticket of the request
+        """
+        ticket.state = 'admitted'
+        ticket.started = time.monotonic()
+        self.in_flight += 1
+        self.__admitted[ticket.lane] += 1
+
+    def cancel(self, ticket: Ticket) -> bool:
+        """
+        Give up waiting
+
+        :param ticket: The ticket
+        :return: True when the request was still waiting and is rejected now, False when it got a slot meanwhile
+        """
+        with self.__lock:
+            if ticket.state != 'waiting':
+                return False
+            self.__waiting[ticket.lane].remove(ticket)
+            ticket.state = 'expired'
+            self.__rejected[ticket.lane] += 1
+            return True
+
+    def leave(self, ticket: Ticket) -> None:
+        """
+        Free the slot of a finished request and give it to the next waiting one
+
+        :param ticket: The ticket returned by :py:meth:`enter`, may be None
+        """
+        if ticket is None or ticket.state != 'admitted':
+            return
+        wakes = list()
+        with self.__lock:
+            ticket.state = 'left'
+            self.in_flight -= 1
+            elapsed = time.monotonic() - ticket.started
+            self.service_time += (elapsed - self.service_time) * self.smoothing
+            for waiting in self.__waiting:
+                while waiting and self.in_flight < self.limit:
+                    next_ticket = waiting.pop(0)
+                    self.__admit(next_ticket)
+                    wakes.append(next_ticket.wake)
+        for wake in wakes:
+            if wake is not None:
+                wake()
+
+    def admit(self, lane: str) -> Ticket:
+        """
+        Admit a request, waiting for a slot if needed
+
+        :param lane: The lane of the request
+        :return: The ticket, to be passed to :py:meth:`leave`
+        :raise Overloaded: When the request is rejected
+        """
+        event = threading.Event()
+        ticket = self.enter(lane, event.set)
+        if ticket is None or ticket.state == 'admitted':
+            return ticket
+        if not event.wait(self.slo) and self.cancel(ticket):
+            raise Overloaded(max(1, math.ceil(self.slo)))
+        if ticket.state != 'admitted':
+            raise Overloaded(self.__retry_after(self.queue_size))
+        return ticket
+
+    async def admit_async(self, lane: str) -> Ticket:
+        """
+        Admit a request, waiting for a slot if needed, for the :py:mod:`AsyncServer
+        <arobito.controlinterface.AsyncServer>`
+
+        :param lane: The lane of the request
+        :return: The ticket, to be passed to :py:meth:`leave`
+        :raise Overloaded: When the request is rejected
+        """
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+
+        def wake() -> None:
+            loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+
+        ticket = self.enter(lane, wake)
+        if ticket is None or ticket.state == 'admitted':
+            return ticket
+        try:
+            await asyncio.wait_for(woken, self.slo)
+        except asyncio.TimeoutError:
+            if self.cancel(ticket):
+                raise Overloaded(max(1, math.ceil(self.slo)))
+        if ticket.state != 'admitted':
+            raise Overloaded(self.__retry_after(self.queue_size))
+        return ticket
+
+    def metrics(self) -> dict:
+        """
+        Get the state of the limiter
+
+        :return: A dict with the limits, the requests in flight, the average processing time and the numbers of
+                 waiting, admitted, rejected and shed requests of every lane
+        """
+        with self.__lock:
+            return dict(limit=self.limit, queue_size=self.queue_size, slo=self.slo, in_flight=self.in_flight,
+                        service_time=self.service_time,
+                        lanes=dict((lane, dict(waiting=len(self.__waiting[index]), admitted=self.__admitted[index],
+                                               rejected=self.__rejected[index], shed=self.__shed[index]))
+                                   for index, lane in enumerate(lanes)))
+
+
+class ServiceUnavailable(cherrypy.HTTPError):
+    """
+    A ``503 Service Unavailable`` error with a ``Retry-After`` header, which CherryPy removes from other errors
+    """
+
+    def __init__(self, overloaded: Overloaded):
+        """
+        Create the error
+
+        :param overloaded: The rejection
+        """
+        super(ServiceUnavailable, self).__init__(503, overloaded.__str__())
+        self.retry_after = overloaded.retry_after
+
+    def set_response(self) -> None:
+        cherrypy.HTTPError.set_response(self)
+        cherrypy.serving.response.headers['Retry-After'] = str(self.retry_after)
+
+
+class AdmissionTool(cherrypy.Tool):
+    """
+    The CherryPy tool passing the ``/app`` requests through the :py:class:`AdmissionController <.AdmissionController>`
+    """
+
+    def __init__(self):
+        """
+        Run before the handler, once the body is read
+        """
+        cherrypy.Tool.__init__(self, 'before_handler', self.admit, priority=20)
+
+    def _setup(self) -> None:
+        """
+        Hook the release of the slot into the end of the request
+        """
+        cherrypy.Tool._setup(self)
+        cherrypy.request.hooks.attach('on_end_request', self.release)
+
+    @staticmethod
+    def admit() -> None:
+        """
+        Admit the request or answer with ``503 Service Unavailable``
+        """
+        method = cherrypy.request.path_info.strip('/').split('/')[0]
+        try:
+            cherrypy.request.admission_ticket = AdmissionController().admit(lane_of(method))
+        except Overloaded as e:
+            raise ServiceUnavailable(e)
+
+    @staticmethod
+    def release() -> None:
+        """
+        Free the slot of the request
+        """
+        AdmissionController().leave(getattr(cherrypy.request, 'admission_ticket', None))
+
+
+cherrypy.tools.admission = AdmissionTool()
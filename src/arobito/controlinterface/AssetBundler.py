@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module bundles the style sheets and scripts referenced by the ``index.html`` of the static folder.
+
+All style sheets are concatenated into one CSS bundle and all scripts into one JavaScript bundle. The file names of the
+bundles contain a hash of their content, so they can be cached by the browsers forever. Small images referenced by the
+style sheets are inlined as data URIs. Finally, a copy of ``index.html`` is written that references the bundles instead
+of the single files.
+
+The bundles are written to the ``bundles`` folder within the static folder, along with a ``manifest.json`` that allows
+to detect if the bundles are outdated.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import re
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The name of the folder within the static folder that receives the bundles
+bundle_folder = 'bundles'
+
+#: The URL the static folder is mounted at
+static_url = '/static/'
+
+#: Find the style sheets in the index page
+stylesheet_regex = re.compile(r'[ \t]*<link rel="stylesheet" type="text/css" href="(?P<src>/static/[^"]+\.css)" />\n?')
+
+#: Find the scripts in the index page
+script_regex = re.compile(r'[ \t]*<script type="text/javascript" src="(?P<src>/static/[^"]+\.js)"></script>\n?')
+
+#: Find URLs in style sheets
+css_url_regex = re.compile(r'url\((?P<quote>[\'"]?)(?P<url>[^\'")]+)(?P=quote)\)')
+
+#: Images that may be inlined into the style sheets
+image_types = dict(png='image/png', gif='image/gif', jpg='image/jpeg', jpeg='image/jpeg')
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Create the fingerprint used in the bundle file names
+
+    :param data: The content of the bundle
+    :return: The first 16 hex digits of the SHA-256 hash
+    """
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def url_to_file(root_dir: str, url: str) -> str:
+    """
+    Map an URL below ``/static/`` to a file in the static folder
+
+    :param root_dir: The static folder
+    :param url: The URL
+    :return: The file name
+    """
+    return os.path.join(root_dir, *url[len(static_url):].split('/'))
+
+
+def rewrite_css_urls(css: str, css_url: str, root_dir: str, inline_limit: int) -> str:
+    """
+    Rewrite the URLs in a style sheet, so it still works when served from the bundle folder
+
+    Relative URLs are made absolute. Images up to ``inline_limit`` bytes are inlined as data URIs.
+
+    :param css: The style sheet
+    :param css_url: The URL the style sheet was originally served from
+    :param root_dir: The static folder
+    :param inline_limit: The maximum size of an image to inline
+    :return: The rewritten style sheet
+    """
+    base_url = css_url[:css_url.rfind('/') + 1]
+
+    def replace(match) -> str:
+        url = match.group('url')
+        if url.startswith('data:') or url.startswith('/') or '://' in url:
+            return match.group(0)
+        absolute_url = os.path.normpath(base_url + url).replace(os.sep, '/')
+        extension = absolute_url[absolute_url.rfind('.') + 1:].lower()
+        file = url_to_file(root_dir, absolute_url)
+        if extension in image_types and os.path.isfile(file) and os.path.getsize(file) <= inline_limit:
+            with open(file, 'rb') as fh:
+                encoded = base64.b64encode(fh.read()).decode('ascii')
+            return 'url("data:{:s};base64,{:s}")'.format(image_types[extension], encoded)
+        return 'url("{:s}")'.format(absolute_url)
+
+    return css_url_regex.sub(replace, css)
+
+
+def build_bundles(root_dir: str, inline_limit: int=8192) -> dict:
+    """
+    Build the bundles and the rewritten index page
+
+    :param root_dir: The static folder
+    :param inline_limit: The maximum size of an image to inline into the style sheets
+    :return: The manifest, a dict with the names of the bundles and the modification times of all sources
+    :raise IOError: When the files cannot be read or written
+    """
+    index_file = os.path.join(root_dir, 'index.html')
+    with open(index_file, 'r', encoding='utf-8') as fh:
+        index = fh.read()
+    sources = dict(index=os.path.getmtime(index_file))
+
+    css_parts = list()
+    for match in stylesheet_regex.finditer(index):
+        file = url_to_file(root_dir, match.group('src'))
+        sources[match.group('src')] = os.path.getmtime(file)
+        with open(file, 'r', encoding='utf-8') as fh:
+            css_parts.append(rewrite_css_urls(fh.read(), match.group('src'), root_dir, inline_limit))
+    js_parts = list()
+    for match in script_regex.finditer(index):
+        file = url_to_file(root_dir, match.group('src'))
+        sources[match.group('src')] = os.path.getmtime(file)
+        with open(file, 'r', encoding='utf-8') as fh:
+            js_parts.append(fh.read())
+
+    css = '\n'.join(css_parts).encode('utf-8')
+    js = '\n;\n'.join(js_parts).encode('utf-8')
+    css_name = 'app.{:s}.css'.format(content_hash(css))
+    js_name = 'app.{:s}.js'.format(content_hash(js))
+
+    css_tag = '    <link rel="stylesheet" type="text/css" href="{:s}{:s}/{:s}" />\n'\
+        .format(static_url, bundle_folder, css_name)
+    js_tag = '    <script type="text/javascript" src="{:s}{:s}/{:s}"></script>\n'\
+        .format(static_url, bundle_folder, js_name)
+    index = stylesheet_regex.sub('', index)
+    index = script_regex.sub('', index)
+    index = index.replace('</head>', css_tag + js_tag + '</head>', 1)
+
+    output_dir = os.path.join(root_dir, bundle_folder)
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.startswith('app.'):
+            os.remove(os.path.join(output_dir, name))
+    with open(os.path.join(output_dir, css_name), 'wb') as fh:
+        fh.write(css)
+    with open(os.path.join(output_dir, js_name), 'wb') as fh:
+        fh.write(js)
+    with open(os.path.join(output_dir, 'index.html'), 'w', encoding='utf-8') as fh:
+        fh.write(index)
+    manifest = dict(css=css_name, js=js_name, index='index.html', sources=sources)
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as fh:
+        json.dump(manifest, fh, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(root_dir: str) -> dict:
+    """
+    Load the manifest of the bundles, if they are up to date
+
+    The bundles are outdated when one of the sources has been modified since the bundles have been built.
+
+    :param root_dir: The static folder
+    :return: The manifest or None when there are no bundles or they are outdated
+    """
+    manifest_file = os.path.join(root_dir, bundle_folder, 'manifest.json')
+    if not os.path.isfile(manifest_file):
+        return None
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        for source, mtime in manifest['sources'].items():
+            file = os.path.join(root_dir, 'index.html') if source == 'index' else url_to_file(root_dir, source)
+            if os.path.getmtime(file) != mtime:
+                return None
+        for name in (manifest['css'], manifest['js'], manifest['index']):
+            if not os.path.isfile(os.path.join(root_dir, bundle_folder, name)):
+                return None
+    except (IOError, ValueError, KeyError):
+        return None
+    return manifest
+
+
+def ensure_bundles(root_dir: str, inline_limit: int=8192) -> dict:
+    """
+    Make sure up to date bundles exist, and build them if not
+
+    :param root_dir: The static folder
+    :param inline_limit: The maximum size of an image to inline into the style sheets
+    :return: The manifest
+    :raise IOError: When the bundles need to be built, but the files cannot be read or written
+    """
+    manifest = load_manifest(root_dir)
+    if manifest is None:
+        manifest = build_bundles(root_dir, inline_limit)
+    return manifest
@@ -0,0 +1,936 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+An alternative HTTP server on :py:mod:`asyncio`, selected with ``server-mode = asyncio`` (see :py:mod:`ServerTuning
+<arobito.controlinterface.ServerTuning>`).
+
+The CherryPy server needs a worker thread for every connection it is busy with. This server handles all connections
+in a single thread, so many idle keep-alive connections and push WebSockets cost only a little memory each. HTTP/1.1
+is parsed with the standard library only. The server provides the same paths as the CherryPy application:
+
+* ``/`` redirects to the index page
+* ``/static/...`` delivers the files of :py:class:`ArobitoControlInterfaceStatics
+  <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>`, large ones by ``sendfile``
+* ``/app/...`` calls the methods of :py:class:`ControllerBackend.App <arobito.controlinterface.ControllerBackend.App>`
+  through the :py:mod:`Codec <arobito.controlinterface.Codec>` layer, limited by the :py:mod:`Admission
+  <arobito.controlinterface.Admission>` control
+* ``/push/`` is the WebSocket of the :py:mod:`PushChannel <arobito.controlinterface.PushChannel>`
+* ``/health/live`` and ``/health/ready`` answer the probes of :py:mod:`Health <arobito.controlinterface.Health>`
+* ``/metrics`` renders the :py:mod:`Metrics <arobito.controlinterface.Metrics>`, recorded for ``/static`` and ``/app``
+
+Every response carries the security headers of :py:class:`ArobitoControlInterface
+<arobito.controlinterface.ControlInterface.ArobitoControlInterface>`. Blocking backend methods, like ``auth`` with its
+password hashing, run in a thread pool executor. With ``server-timing`` enabled, the ``/app`` responses carry the
+phases of :py:mod:`Timing <arobito.controlinterface.Timing>`. The requests in flight are watched by the
+:py:mod:`Watchdog <arobito.controlinterface.Watchdog>`, and their access records and errors are written by the
+:py:mod:`LogWriter <arobito.controlinterface.LogWriter>`. With a ``capture-file``, the ``/app`` and ``/static``
+requests are recorded by the :py:mod:`Capture <arobito.controlinterface.Capture>`.
+"""
+
+import asyncio
+import base64
+import concurrent.futures
+import contextvars
+import hashlib
+import os
+import signal
+import struct
+import threading
+import time
+import traceback
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote
+import cherrypy
+from arobito import Helper
+from arobito.controlinterface import Admission, Codec, ControllerFrontend, Health, Metrics, Profiler, StaticContent, \
+    Timing, Watchdog, LogWriter, Capture
+from arobito.controlinterface.ControllerBackend import App as Backend
+from arobito.controlinterface.PushChannel import PushBroker
+from arobito.controlinterface.ServerTuning import ServerSettings
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The maximum size of the request line and the headers in bytes
+max_header_size = 65536
+
+#: The maximum size of a WebSocket message in bytes
+max_message_size = 65536
+
+#: The API methods: All methods the CherryPy frontend exposes, so new backend methods are served here as well
+api_methods = tuple(sorted(name for name, member in vars(ControllerFrontend.App).items()
+                           if getattr(member, 'exposed', False)))
+
+#: The API methods that block and therefore run in the executor
+executor_methods = ('auth', 'profile', 'memory')
+
+#: The GUID for the ``Sec-WebSocket-Accept`` header (RFC 6455)
+websocket_guid = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+class HttpError(Exception):
+    """
+    An error to answer with an HTTP status code
+    """
+
+    def __init__(self, status: int, message: str=None, headers: list=None):
+        """
+        Create the error
+
+        :param status: The status code
+        :param message: The text of the response body, the reason phrase by default
+        :param headers: Additional response headers as a list of tuples
+        """
+        self.status = status
+        self.message = message if message is not None else HTTPStatus(status).phrase
+        self.headers = headers if headers is not None else list()
+        super(HttpError, self).__init__(self.message)
+
+
+class HttpRequest(object):
+    """
+    A parsed HTTP request
+    """
+
+    def __init__(self, method: str, target: str, version: str, headers: dict):
+        """
+        Create the request
+
+        :param method: The method, e.g. ``GET``
+        :param target: The request target, e.g. ``/static/index.html?x=1``
+        :param version: The protocol version, ``HTTP/1.0`` or ``HTTP/1.1``
+        :param headers: The headers with lower case names; repeated headers joined by commas
+        """
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.path = unquote(target.split('?', 1)[0])
+        self.body = None
+        #: The token of the request for the :py:mod:`Watchdog <arobito.controlinterface.Watchdog>`, if enabled
+        self.watchdog_token = None
+
+    def header(self, name: str, default: str=None) -> str:
+        """
+        Get a header
+
+        :param name: The name of the header, in any case
+        :param default: The value when the header is missing
+        :return: The value
+        """
+        return self.headers.get(name.lower(), default)
+
+    def tokens(self, name: str) -> set:
+        """
+        Get the comma separated tokens of a header, e.g. of ``Connection``
+
+        :param name: The name of the header
+        :return: A set of the tokens in lower case
+        """
+        return set(token.strip().lower() for token in self.header(name, '').split(',') if token.strip())
+
+    def media_type(self) -> str:
+        """
+        Get the media type of the request body
+
+        :return: The ``Content-Type`` without parameters in lower case, or None
+        """
+        content_type = self.header('Content-Type')
+        if content_type is None:
+            return None
+        return content_type.split(';', 1)[0].strip().lower()
+
+    def keep_alive(self) -> bool:
+        """
+        Tell if the client wants to keep the connection open
+
+        :return: True for HTTP/1.1 without ``Connection: close`` and HTTP/1.0 with ``Connection: keep-alive``
+        """
+        connection = self.tokens('Connection')
+        if self.version == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+
+def unmask(data: bytes, mask: bytes) -> bytes:
+    """
+    Remove the mask of a WebSocket payload
+
+    :param data: The masked payload
+    :param mask: The 4 byte masking key
+    :return: The payload
+    """
+    if len(data) <= 0:
+        return data
+    key = (mask * (len(data) // 4 + 1))[:len(data)]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(len(data), 'big')
+
+
+class AsyncPushSocket(object):
+    """
+    A WebSocket of the push channel on the asyncio server, for text messages
+
+    :py:meth:`push` and :py:meth:`close` may be called from any thread, like the methods of :py:class:`PushSocket
+    <arobito.controlinterface.PushChannel.PushSocket>`.
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        """
+        Create the socket after the handshake
+
+        :param writer: The stream of the connection
+        :param loop: The event loop of the server
+        """
+        self.writer = writer
+        self.loop = loop
+        self.terminated = False
+
+    @staticmethod
+    def frame(opcode: int, payload: bytes) -> bytes:
+        """
+        Create an unmasked, final frame
+
+        :param opcode: The opcode, e.g. ``0x1`` for text
+        :param payload: The payload
+        :return: The frame
+        """
+        length = len(payload)
+        if length < 126:
+            return struct.pack('>BB', 0x80 | opcode, length) + payload
+        if length <= 0xffff:
+            return struct.pack('>BBH', 0x80 | opcode, 126, length) + payload
+        return struct.pack('>BBQ', 0x80 | opcode, 127, length) + payload
+
+    def __send(self, opcode: int, payload: bytes) -> None:
+        """
+        Send a frame, only in the thread of the event loop
+
+        :param opcode: The opcode
+        :param payload: The payload
+        """
+        if not self.terminated:
+            self.writer.write(AsyncPushSocket.frame(opcode, payload))
+
+    def __close(self, code: int, reason: str) -> None:
+        """
+        Send a close frame and close the connection, only in the thread of the event loop
+
+        :param code: The close code
+        :param reason: The close reason
+        """
+        if self.terminated:
+            return
+        self.__send(0x8, struct.pack('>H', code) + reason.encode('utf-8')[:123])
+        self.terminated = True
+        self.writer.close()
+
+    def push(self, payload: str) -> None:
+        """
+        Send a text message
+
+        :param payload: The message
+        """
+        try:
+            self.loop.call_soon_threadsafe(self.__send, 0x1, payload.encode('utf-8'))
+        except RuntimeError:
+            pass
+
+    def close(self, code: int=1000, reason: str='') -> None:
+        """
+        Close the socket
+
+        :param code: The close code
+        :param reason: The close reason
+        """
+        try:
+            self.loop.call_soon_threadsafe(self.__close, code, reason)
+        except RuntimeError:
+            pass
+
+    async def run(self, reader: asyncio.StreamReader) -> None:
+        """
+        Read the frames of the client and pass the messages to the :py:class:`PushBroker
+        <arobito.controlinterface.PushChannel.PushBroker>` until the socket closes
+
+        :param reader: The stream of the connection
+        """
+        broker = PushBroker()
+        fragments = None
+        while not self.terminated:
+            first, second = await reader.readexactly(2)
+            opcode = first & 0x0f
+            if not second & 0x80:
+                self.__close(1002, 'Frames must be masked')
+                return
+            length = second & 0x7f
+            if length == 126:
+                length = struct.unpack('>H', await reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('>Q', await reader.readexactly(8))[0]
+            if length > max_message_size:
+                self.__close(1009, 'Message too big')
+                return
+            mask = await reader.readexactly(4)
+            payload = unmask(await reader.readexactly(length), mask)
+            if opcode == 0x8:
+                self.__close(struct.unpack('>H', payload[:2])[0] if len(payload) >= 2 else 1000, '')
+                return
+            if opcode == 0x9:
+                self.__send(0xa, payload)
+                continue
+            if opcode == 0xa:
+                continue
+            if opcode in (0x1, 0x2):
+                fragments = [payload]
+            elif opcode == 0x0 and fragments is not None:
+                fragments.append(payload)
+            else:
+                self.__close(1002, 'Protocol error')
+                return
+            if sum(len(fragment) for fragment in fragments) > max_message_size:
+                self.__close(1009, 'Message too big')
+                return
+            if first & 0x80:
+                message = b''.join(fragments)
+                fragments = None
+                broker.handle(self, message.decode('utf-8', errors='replace'))
+
+
+class AsyncServer(object):
+    """
+    The asyncio HTTP server
+    """
+
+    #: Seconds to wait for the handlers of connections accepted just before stopping
+    drain_grace = 0.25
+
+    def __init__(self, bind_ip: str, listen_port: int, settings: ServerSettings, statics, security_headers: list,
+                 bus=None, listen_socket=None):
+        """
+        Prepare the server
+
+        :param bind_ip: The IP to bind to
+        :param listen_port: The port to listen to, 0 for any free port
+        :param settings: The server settings; the socket, body size and keep-alive settings apply
+        :param statics: The :py:class:`ArobitoControlInterfaceStatics
+                        <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>` to serve
+        :param security_headers: The headers to send with every response, as a list of tuples
+        :param bus: The CherryPy engine. If given, the server drains and stops with the engine and ``SIGTERM`` or
+                    ``SIGINT`` request a shutdown from it.
+        :param listen_socket: A listening socket to serve on instead of binding one, e.g. one handed over by the
+                              previous process
+        """
+        self.bind_ip = bind_ip
+        self.listen_port = listen_port
+        self.settings = settings
+        self.statics = statics
+        self.bus = bus
+        self.listen_socket = listen_socket
+        self.backend = Backend()
+        self.health = Health.Health(self.backend, bus, lambda: self.__executing > self.settings.thread_pool)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=settings.thread_pool,
+                                                              thread_name_prefix='AsyncExecutor')
+        self.fixed_headers = ''.join('{:s}: {:s}\r\n'.format(name, value) for name, value in security_headers)
+        self.port = None
+        self.__loop = None
+        self.__stopped = None
+        self.__stopping = False
+        self.__server = None
+        #: The numbers of drained and aborted requests, once drained
+        self.__drained = None
+        #: The open connections and whether they are between two requests
+        self.__connections = dict()
+        self.__idle = 0
+        #: The number of calls running in the executor or waiting for it
+        self.__executing = 0
+        self.__date_second = 0
+        self.__date_value = ''
+        Metrics.Registry().add_gauge('thread_pool_workers', 'Threads of the executor, by state', self.__workers)
+        Metrics.Registry().add_gauge('thread_pool_queued', 'Calls waiting for a thread of the executor',
+                                     lambda: max(0, self.__executing - self.settings.thread_pool))
+        if bus is not None:
+            bus.subscribe('stop', self.stop)
+            bus.subscribe(Helper.drain_channel, self.drain)
+
+    def run(self) -> None:
+        """
+        Run the server in the current thread until it is stopped
+        """
+        asyncio.run(self.serve())
+
+    def stop(self) -> None:
+        """
+        Stop the server, safe to be called from any thread
+        """
+        loop = self.__loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self.__stopped.set)
+        except RuntimeError:
+            pass
+
+    async def serve(self) -> None:
+        """
+        Listen and serve until :py:meth:`stop` is called
+        """
+        self.__loop = asyncio.get_running_loop()
+        self.__stopped = asyncio.Event()
+        Profiler.Profiler().register_worker()
+        if self.listen_socket is not None:
+            server = await asyncio.start_server(self.__handle_connection, sock=self.listen_socket,
+                                                backlog=self.settings.socket_queue_size, limit=max_header_size)
+        else:
+            server = await asyncio.start_server(self.__handle_connection, self.bind_ip, self.listen_port,
+                                                backlog=self.settings.socket_queue_size, limit=max_header_size,
+                                                reuse_address=True, reuse_port=self.settings.workers > 1 or None)
+        self.__server = server
+        self.port = server.sockets[0].getsockname()[1]
+        if self.bus is not None:
+            self.bus.publish(Helper.serving_channel, server.sockets[0])
+        for signal_number in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self.__loop.add_signal_handler(signal_number, self.__on_signal)
+            except (ValueError, RuntimeError, NotImplementedError):
+                pass
+        try:
+            await self.__stopped.wait()
+        finally:
+            if self.__drained is None:
+                await self.__stop_serving(time.monotonic() + self.settings.drain_timeout)
+            await self.__server.wait_closed()
+            self.executor.shutdown(wait=False)
+
+    def drain(self, deadline: float) -> tuple:
+        """
+        Stop accepting and let the requests in flight finish until the deadline, safe to be called from any thread
+
+        The server keeps running until :py:meth:`stop` is called.
+
+        :param deadline: When to close the remaining connections (``time.monotonic``)
+        :return: The numbers of drained and aborted requests
+        """
+        loop = self.__loop
+        if loop is None or self.__drained is not None:
+            return 0, 0
+        try:
+            return asyncio.run_coroutine_threadsafe(self.__stop_serving(deadline), loop).result()
+        except RuntimeError:
+            return 0, 0
+
+    async def __stop_serving(self, deadline: float) -> tuple:
+        """
+        Stop accepting and drain the connections
+
+        :param deadline: When to close the remaining connections (``time.monotonic``)
+        :return: The numbers of drained and aborted requests
+        """
+        if self.__drained is not None:
+            return 0, 0
+        self.__drained = (0, 0)
+        self.__stopping = True
+        # Stop accepting first and let the connections accepted in this loop iteration get their transport:
+        # Transports created after server.close() are never attached and their sockets leak until the exit.
+        for listening in self.__server.sockets:
+            self.__loop.remove_reader(listening.fileno())
+        await asyncio.sleep(0)
+        self.__server.close()
+        busy = set(writer for writer, idle in self.__connections.items() if not idle)
+        aborted = await self.__drain(deadline)
+        self.__drained = (len(busy) - len(busy & aborted), len(aborted))
+        return self.__drained
+
+    async def __drain(self, deadline: float) -> set:
+        """
+        Let the connections finish the requests they are busy with; idle keep-alive connections are closed at once
+
+        Connections accepted just before the listening socket was closed get their handler a moment later, so the
+        drain lasts at least :py:attr:`drain_grace` seconds, unless the deadline is earlier.
+
+        :param deadline: When to close the remaining connections (``time.monotonic``)
+        :return: The connections that were busy with a request when they were closed
+        """
+        grace_end = time.monotonic() + self.drain_grace
+        while (self.__connections or time.monotonic() < grace_end) and time.monotonic() < deadline:
+            for writer, idle in list(self.__connections.items()):
+                if idle:
+                    writer.close()
+            await asyncio.sleep(0.05)
+        aborted = set(writer for writer, idle in self.__connections.items() if not idle)
+        for writer in list(self.__connections):
+            writer.close()
+        return aborted
+
+    def __on_signal(self) -> None:
+        """
+        Request a shutdown from the engine on a termination signal, or stop directly without an engine
+
+        The engine exits directly when nothing runs the :py:mod:`Shutdown <arobito.controlinterface.Shutdown>`.
+        """
+        if self.bus is None:
+            self.stop()
+            return
+        if not self.bus.publish(Helper.shutdown_channel, True):
+            threading.Thread(target=self.bus.exit, name='EngineExit').start()
+
+    def __date(self) -> str:
+        """
+        Get the value of the ``Date`` header, formatted once per second
+
+        :return: The date
+        """
+        now = int(time.time())
+        if now != self.__date_second:
+            self.__date_second = now
+            self.__date_value = formatdate(now, usegmt=True)
+        return self.__date_value
+
+    def __head(self, status: int, headers: list, length: int, keep_alive: bool) -> bytes:
+        """
+        Create the status line and the headers of a response
+
+        :param status: The status code
+        :param headers: The headers as a list of tuples
+        :param length: The length of the body, None to send no ``Content-Length``
+        :param keep_alive: False to close the connection after the response
+        :return: The head as bytes
+        """
+        lines = ['HTTP/1.1 {:d} {:s}\r\n'.format(status, HTTPStatus(status).phrase),
+                 'Date: {:s}\r\nServer: Arobito\r\n'.format(self.__date())]
+        lines.extend('{:s}: {:s}\r\n'.format(name, value) for name, value in headers)
+        if length is not None:
+            lines.append('Content-Length: {:d}\r\n'.format(length))
+        if not keep_alive:
+            lines.append('Connection: close\r\n')
+        lines.append(self.fixed_headers)
+        lines.append('\r\n')
+        return ''.join(lines).encode('iso-8859-1')
+
+    async def __timed(self, awaitable):
+        """
+        Wait for a read with the socket timeout
+
+        :param awaitable: The read
+        :return: The result of the read
+        :raise asyncio.TimeoutError: When the timeout expires
+        """
+        return await asyncio.wait_for(awaitable, self.settings.socket_timeout)
+
+    async def __read_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> HttpRequest:
+        """
+        Read the next request including its body
+
+        :param reader: The stream to read from
+        :param writer: The stream to send ``100 Continue`` to
+        :return: The request or None when the client closed the connection
+        :raise HttpError: On a malformed or too large request
+        """
+        try:
+            head = await self.__timed(reader.readuntil(b'\r\n\r\n'))
+        except asyncio.IncompleteReadError as e:
+            if len(e.partial.strip()) <= 0:
+                return None
+            raise HttpError(400, 'Incomplete request')
+        except asyncio.LimitOverrunError:
+            raise HttpError(431)
+        lines = head[:-4].decode('iso-8859-1').lstrip('\r\n').split('\r\n')
+        request_line = lines[0].split(' ')
+        if len(request_line) != 3 or not request_line[1].startswith('/'):
+            raise HttpError(400, 'Malformed request line')
+        method, target, version = request_line
+        if version not in ('HTTP/1.0', 'HTTP/1.1'):
+            raise HttpError(505)
+        headers = dict()
+        for line in lines[1:]:
+            name, separator, value = line.partition(':')
+            if not separator or not name or name != name.strip():
+                raise HttpError(400, 'Malformed header')
+            name = name.lower()
+            value = value.strip()
+            headers[name] = headers[name] + ', ' + value if name in headers else value
+        request = HttpRequest(method, target, version, headers)
+
+        if request.tokens('Transfer-Encoding'):
+            if request.tokens('Transfer-Encoding') != {'chunked'}:
+                raise HttpError(501, 'Unsupported transfer encoding')
+            self.__continue(request, writer)
+            request.body = await self.__read_chunked(reader)
+        elif request.header('Content-Length') is not None:
+            try:
+                length = int(request.header('Content-Length'))
+            except ValueError:
+                raise HttpError(400, 'Invalid Content-Length')
+            if length < 0:
+                raise HttpError(400, 'Invalid Content-Length')
+            if 0 < self.settings.max_request_body_size < length:
+                raise HttpError(413)
+            self.__continue(request, writer)
+            request.body = await self.__timed(reader.readexactly(length))
+        return request
+
+    @staticmethod
+    def __continue(request: HttpRequest, writer: asyncio.StreamWriter) -> None:
+        """
+        Send ``100 Continue`` when the client waits for it
+
+        :param request: The request
+        :param writer: The stream of the connection
+        """
+        if request.version == 'HTTP/1.1' and request.header('Expect', '').lower() == '100-continue':
+            writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+
+    async def __read_chunked(self, reader: asyncio.StreamReader) -> bytes:
+        """
+        Read a body in chunked transfer encoding
+
+        :param reader: The stream to read from
+        :return: The body
+        :raise HttpError: On a malformed or too large body
+        """
+        chunks = list()
+        total = 0
+        while True:
+            line = await self.__timed(reader.readuntil(b'\r\n'))
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, 'Malformed chunk')
+            if size <= 0:
+                while await self.__timed(reader.readuntil(b'\r\n')) != b'\r\n':
+                    pass
+                return b''.join(chunks)
+            total += size
+            if 0 < self.settings.max_request_body_size < total:
+                raise HttpError(413)
+            chunks.append(await self.__timed(reader.readexactly(size)))
+            if await self.__timed(reader.readexactly(2)) != b'\r\n':
+                raise HttpError(400, 'Malformed chunk')
+
+    async def __handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve the requests of a connection until it closes
+
+        :param reader: The stream to read from
+        :param writer: The stream to write to
+        """
+        self.__connections[writer] = False
+        served = 0
+        try:
+            while served == 0 or not self.__stopping:
+                self.__idle += 1
+                self.__connections[writer] = served > 0
+                try:
+                    request = await self.__read_request(reader, writer)
+                except HttpError as e:
+                    writer.write(self.__head(e.status, e.headers + [('Content-Type', 'text/plain')],
+                                             len(e.message.encode('utf-8')), False) + e.message.encode('utf-8'))
+                    await writer.drain()
+                    break
+                finally:
+                    self.__idle -= 1
+                    self.__connections[writer] = False
+                if request is None:
+                    break
+                served += 1
+                if request.path in ('/push', '/push/'):
+                    self.__connections[writer] = True
+                    await self.__upgrade(request, reader, writer)
+                    break
+                keep_alive = request.keep_alive() and self.settings.keep_alive and not self.__stopping and \
+                    self.__idle < self.settings.keep_alive_limit
+                await self.__respond(request, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.__connections.pop(writer, None)
+            writer.close()
+
+    def __workers(self) -> dict:
+        """
+        Get the busy and idle threads of the executor, as gauge labels and values
+
+        :return: The gauge values
+        """
+        busy = min(self.__executing, self.settings.thread_pool)
+        return {(('state', 'busy'),): busy, (('state', 'idle'),): self.settings.thread_pool - busy}
+
+    async def __respond(self, request: HttpRequest, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        """
+        Route a request, send the response and record its metrics
+
+        :param request: The request
+        :param writer: The stream to write to
+        :param keep_alive: False to close the connection after the response
+        """
+        metrics = Metrics.Registry()
+        endpoint = None
+        if request.path.startswith('/static/') or request.path.startswith('/app/'):
+            endpoint = metrics.endpoint_of(request.path)
+            metrics.started(endpoint)
+        started = time.perf_counter()
+        status, length = 500, 0
+        timer = None
+        if self.settings.server_timing and request.path.startswith('/app/'):
+            timer = Timing.RequestTimer(request.header('X-Request-ID'))
+            token = Timing.current.set(timer)
+        peer = writer.get_extra_info('peername')
+        remote = peer[0] if peer else None
+        tracker = None
+        if self.settings.watchdog_threshold > 0:
+            tracker = Watchdog.RequestTracker()
+            request.watchdog_token = tracker.begin(request.method, request.path, remote, request.header('X-Request-ID'))
+        try:
+            if request.path == '/':
+                status, headers, body = 303, [('Location', '/static/index.html'), ('Content-Type', 'text/plain')], \
+                    b'See /static/index.html'
+            elif request.path.startswith('/static/'):
+                status, headers, body = self.__static(request, tuple(p for p in request.path[8:].split('/') if p))
+            elif request.path.startswith('/app/'):
+                status, headers, body = await self.__api(request, request.path[5:])
+            elif request.path.startswith('/health/'):
+                response = self.health.respond(request.method, request.path[8:].strip('/'))
+                if response is None:
+                    raise HttpError(404)
+                status, headers, body = response
+            elif request.path.rstrip('/') == '/metrics':
+                status, headers, body = self.__metrics(request)
+            else:
+                raise HttpError(404)
+        except HttpError as e:
+            status, headers, body = e.status, e.headers + [('Content-Type', 'text/plain')], e.message.encode('utf-8')
+        except Exception as e:
+            LogWriter.log('error', 'request_failed', 'Error on {:s}: {:s}'.format(request.path, e.__str__()),
+                          traceback=traceback.format_exc())
+            status, headers, body = 500, [('Content-Type', 'text/plain')], b'Internal Server Error'
+        if timer is not None:
+            timer.mark(None)
+            headers = headers + [('Server-Timing', timer.header()), ('X-Request-ID', timer.request_id)]
+        try:
+            length = await self.__write_response(writer, request, status, headers, body, keep_alive)
+        finally:
+            if timer is not None:
+                timer.mark('write')
+                timer.log(request.method, request.path, status)
+                Timing.current.reset(token)
+            if endpoint is not None:
+                metrics.finished(endpoint, status, time.perf_counter() - started, len(request.body or b''), length)
+            if tracker is not None:
+                tracker.end(request.watchdog_token)
+            LogWriter.LogWriter().access(request.method, request.path, status, length, time.perf_counter() - started,
+                                         remote, request.header('X-Request-ID'))
+            capture = Capture.CaptureWriter()
+            if capture.enabled and Capture.captured(request.path):
+                document = None
+                if status == 200 and request.path.startswith('/app/') and isinstance(body, bytes):
+                    document = Capture.decode(body, dict(headers).get('Content-Type'))
+                capture.record(request.method, request.path,
+                               Capture.decode(request.body, request.header('Content-Type')), status, length,
+                               time.perf_counter() - started, document)
+
+    async def __write_response(self, writer: asyncio.StreamWriter, request: HttpRequest, status: int, headers: list,
+                               body, keep_alive: bool) -> int:
+        """
+        Send a response
+
+        :param writer: The stream to write to
+        :param request: The request
+        :param status: The status code
+        :param headers: The headers as a list of tuples
+        :param body: Bytes, a list of buffers or a :py:class:`FileBody
+                     <arobito.controlinterface.StaticContent.FileBody>`
+        :param keep_alive: False to close the connection after the response
+        :return: The length of the body
+        """
+        if isinstance(body, StaticContent.FileBody):
+            length = body.content_length()
+        elif isinstance(body, list):
+            length = sum(len(part) for part in body)
+        else:
+            length = len(body)
+        writer.write(self.__head(status, headers, length, keep_alive))
+        if request.method == 'HEAD' or length <= 0:
+            pass
+        elif isinstance(body, bytes):
+            writer.write(body)
+        elif isinstance(body, list):
+            for part in body:
+                writer.write(part)
+                await writer.drain()
+        elif type(body) is StaticContent.FileBody and not body.is_multipart():
+            start, stop = body.ranges[0]
+            with open(body.file_name, 'rb') as fh:
+                await asyncio.get_running_loop().sendfile(writer.transport, fh, start, stop - start)
+        else:
+            for chunk in body:
+                writer.write(chunk)
+                await writer.drain()
+        await writer.drain()
+        return length
+
+    def __static(self, request: HttpRequest, parts: tuple) -> tuple:
+        """
+        Serve a static file, like :py:meth:`ArobitoControlInterfaceStatics.default
+        <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics.default>`
+
+        :param request: The request
+        :param parts: The parts of the path below ``/static``
+        :return: A tuple of the status code, the headers and the body
+        :raise HttpError: When the file does not exist or the range is not satisfiable
+        """
+        if request.method not in ('GET', 'HEAD'):
+            raise HttpError(405, headers=[('Allow', 'GET, HEAD')])
+        statics = self.statics
+        try:
+            args, file, entry, mime, immutable = statics.resolve(parts)
+        except cherrypy.HTTPError as e:
+            raise HttpError(e.status, e._message)
+        headers = [('Content-Type', mime)]
+        if immutable:
+            headers.append(('Cache-Control', 'public, max-age=31536000, immutable'))
+        location = statics.offload_location(args, file)
+        if location is not None:
+            headers.append((statics.offload_header, location))
+            return 200, headers, b''
+        headers.append(('Accept-Ranges', 'bytes'))
+        size = entry.size if entry is not None else os.path.getsize(file)
+        ranges = None
+        if request.method == 'GET':
+            ranges = StaticContent.parse_range(request.header('Range'), size)
+            if ranges is not None and len(ranges) <= 0:
+                raise HttpError(416, 'Requested range not satisfiable',
+                                [('Content-Range', 'bytes */{:d}'.format(size))])
+        if entry is not None:
+            if entry.deflated:
+                headers.append(('Vary', 'Accept-Encoding'))
+                if ranges is None and StaticContent.accepts_gzip(request.header('Accept-Encoding')):
+                    headers.append(('Content-Encoding', 'gzip'))
+                    return 200, headers, list(statics.archive.gzip_parts(entry))
+            body = StaticContent.BufferBody(statics.archive.read(entry), mime, ranges)
+        elif ranges is None and size <= statics.stream_threshold:
+            with open(file, 'rb') as fh:
+                return 200, headers, fh.read()
+        else:
+            body = StaticContent.FileBody(file, size, mime, ranges)
+        if ranges is None:
+            return 200, headers, body
+        headers[0] = ('Content-Type', body.content_type())
+        if not body.is_multipart():
+            headers.append(('Content-Range', body.content_range()))
+        return 206, headers, body
+
+    def __metrics(self, request: HttpRequest) -> tuple:
+        """
+        Render the metrics, like :py:meth:`MetricsApp.index
+        <arobito.controlinterface.ControllerFrontend.MetricsApp.index>`
+
+        :param request: The request
+        :return: A tuple of the status code, the headers and the body
+        :raise HttpError: Without a session key of an administrator
+        """
+        if request.method not in ('GET', 'HEAD'):
+            raise HttpError(405, headers=[('Allow', 'GET, HEAD')])
+        text = self.backend.get_metrics(dict(key=Metrics.bearer_key(request.header('Authorization'))))
+        if text is None:
+            raise HttpError(401, 'A session key of an administrator is required', [('WWW-Authenticate', 'Bearer')])
+        return 200, [('Content-Type', Metrics.content_type), ('Cache-Control', 'no-store')], text.encode('utf-8')
+
+    async def __api(self, request: HttpRequest, name: str) -> tuple:
+        """
+        Call a backend method, like the methods of :py:class:`ControllerFrontend.App
+        <arobito.controlinterface.ControllerFrontend.App>`
+
+        :param request: The request
+        :param name: The name of the method
+        :return: A tuple of the status code, the headers and the body
+        :raise HttpError: On an unknown method or an invalid request
+        """
+        if name not in api_methods:
+            raise HttpError(404)
+        media_type = request.media_type()
+        if media_type not in Codec.json_types + Codec.binary_types:
+            raise HttpError(415, 'Expected an entity of content type {:s}'
+                            .format(', '.join(Codec.json_types + Codec.binary_types)))
+        if request.body is None:
+            raise HttpError(411)
+        codec = Codec.codec_for(media_type)
+        timer = Timing.current.get()
+        if timer is not None:
+            timer.mark('tools')
+        try:
+            document = Codec.decode(request.body, codec)
+        except ValueError:
+            raise HttpError(400, 'Invalid MessagePack document' if codec is Codec.binary else 'Invalid JSON document')
+        if timer is not None:
+            timer.mark('parse')
+        method = getattr(self.backend, name)
+        profiler = Profiler.Profiler()
+        admission = Admission.AdmissionController()
+        try:
+            ticket = await admission.admit_async(Admission.lane_of(name))
+        except Admission.Overloaded as e:
+            raise HttpError(503, e.__str__(), [('Retry-After', str(e.retry_after))])
+        if timer is not None:
+            timer.mark('admission')
+        try:
+            if name in executor_methods:
+                self.__executing += 1
+                try:
+                    context = contextvars.copy_context()
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, context.run, Watchdog.RequestTracker().run, request.watchdog_token,
+                        profiler.call, method, document)
+                finally:
+                    self.__executing -= 1
+            else:
+                result = profiler.call(method, document)
+        finally:
+            admission.leave(ticket)
+        response_codec, response_type = Codec.negotiate(request.header('Accept'), media_type)
+        return 200, [('Content-Type', response_type), ('Vary', 'Accept')], Codec.encode(result, response_codec)
+
+    async def __upgrade(self, request: HttpRequest, reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter) -> None:
+        """
+        Upgrade the connection to a push channel WebSocket and serve it until it closes
+
+        :param request: The request
+        :param reader: The stream to read from
+        :param writer: The stream to write to
+        """
+        key = request.header('Sec-WebSocket-Key')
+        if request.method != 'GET' or 'websocket' not in request.tokens('Upgrade') or \
+                'upgrade' not in request.tokens('Connection') or request.header('Sec-WebSocket-Version') != '13' or \
+                not key:
+            await self.__write_response(writer, request, 400, [('Content-Type', 'text/plain')],
+                                        b'Invalid WebSocket handshake', False)
+            return
+        accept = base64.b64encode(hashlib.sha1(key.strip().encode('ascii') + websocket_guid).digest()).decode('ascii')
+        writer.write(self.__head(101, [('Upgrade', 'websocket'), ('Connection', 'Upgrade'),
+                                       ('Sec-WebSocket-Accept', accept)], None, True))
+        socket = AsyncPushSocket(writer, self.__loop)
+        broker = PushBroker()
+        broker.add(socket)
+        try:
+            await socket.run(reader)
+        finally:
+            broker.remove(socket)
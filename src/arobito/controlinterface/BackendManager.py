@@ -20,13 +20,22 @@ basic applications.
 
 Additionally, it provides an User and a Session Manager to handle login requests, user privileges and associated
 sessions.
+
+The sessions are kept in the memory of the process by default. With ``store = sqlite`` in the ``[SessionManagement]``
+section of ``controller.ini``, they are kept in ``sessions.sqlite`` in the config folder instead, so several processes
+share them. The multi-process mode sets :py:data:`store_override` to ``sqlite``.
 """
 
 
 from arobito.Base import SingletonMeta, create_salt, hash_password, create_simple_key
 from arobito import FsTools
+import collections
 import configparser
+import json
+import os
 import re
+import sqlite3
+import threading
 import time
 
 __license__ = 'Apache License V2.0'
@@ -109,7 +118,7 @@ class UserManager(object, metaclass=SingletonMeta):
         if not UserManager.username_regex.match(username):
             return None
         user_section = 'User:{:s}'.format(username)
-        if not user_section in self.__config.sections():
+        if not self.__config.has_section(user_section):
             return None
         section = self.__config[user_section]
         level = 'level' in section and section['level'] or None
@@ -126,6 +135,269 @@ class UserManager(object, metaclass=SingletonMeta):
         return dict(username=username, level=level, timestamp=time.time(), last_access=time.time())
 
 
+#: The session stores available
+session_stores = ('memory', 'sqlite')
+
+#: A session store to use regardless of the configuration, or None
+store_override = None
+
+
+class MemorySessionStore(object):
+    """
+    Keeps the sessions in a dict, only visible to the current process
+
+    The sessions are kept in the order of their last access, and their keys once more in the order of their login, so
+    expiring them only looks at the oldest ones instead of all. An access never moves ``last_access`` back behind the
+    newest one, so accesses racing for the lock keep the order. When a session is added out of order, e.g. on an import
+    from another process, both orders are sorted again on the next expiry.
+    """
+
+    #: False because other processes do not see the sessions
+    shared = False
+
+    def __init__(self):
+        """
+        Start without sessions
+        """
+        self.__lock = threading.Lock()
+        self.__sessions = collections.OrderedDict()
+        self.__logins = collections.OrderedDict()
+        self.__newest_login = 0.0
+        self.__newest_access = 0.0
+        self.__ordered = True
+
+    def add(self, key: str, user: dict) -> None:
+        """
+        Store a session
+
+        :param key: The session key
+        :param user: The user dict, with the ``timestamp`` of the login and the ``last_access``
+        """
+        with self.__lock:
+            self.__sessions.pop(key, None)
+            self.__logins.pop(key, None)
+            if user['timestamp'] < self.__newest_login or user['last_access'] < self.__newest_access:
+                self.__ordered = False
+            self.__newest_login = max(self.__newest_login, user['timestamp'])
+            self.__newest_access = max(self.__newest_access, user['last_access'])
+            self.__sessions[key] = user
+            self.__logins[key] = user['timestamp']
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a session
+
+        :param key: The session key
+        :return: True when the session existed
+        """
+        with self.__lock:
+            self.__logins.pop(key, None)
+            return self.__sessions.pop(key, None) is not None
+
+    def get(self, key: str, access_time: float=None) -> dict:
+        """
+        Get the user of a session
+
+        :param key: The session key
+        :param access_time: If given, the new ``last_access`` of the session; not earlier than the newest access
+        :return: The user dict or None
+        """
+        with self.__lock:
+            user = self.__sessions.get(key, None)
+            if user is not None and access_time is not None:
+                self.__newest_access = max(self.__newest_access, access_time)
+                user['last_access'] = self.__newest_access
+                self.__sessions.move_to_end(key)
+            return user
+
+    def count(self) -> int:
+        """
+        Count the sessions
+
+        :return: The number of sessions
+        """
+        return len(self.__sessions)
+
+    def expire(self, created_before: float, accessed_before: float) -> int:
+        """
+        Remove old sessions
+
+        :param created_before: Remove sessions created before this time
+        :param accessed_before: Remove sessions not accessed since this time
+        :return: The number of sessions removed
+        """
+        removed = 0
+        with self.__lock:
+            if not self.__ordered:
+                self.__sessions = collections.OrderedDict(sorted(self.__sessions.items(),
+                                                                 key=lambda item: item[1]['last_access']))
+                self.__logins = collections.OrderedDict(sorted(self.__logins.items(), key=lambda item: item[1]))
+                self.__ordered = True
+            while self.__sessions:
+                key, user = next(iter(self.__sessions.items()))
+                if user['last_access'] >= accessed_before:
+                    break
+                del self.__sessions[key]
+                del self.__logins[key]
+                removed += 1
+            while self.__logins:
+                key, timestamp = next(iter(self.__logins.items()))
+                if timestamp >= created_before:
+                    break
+                del self.__sessions[key]
+                del self.__logins[key]
+                removed += 1
+        return removed
+
+    def clear(self) -> None:
+        """
+        Remove all sessions
+        """
+        with self.__lock:
+            self.__sessions.clear()
+            self.__logins.clear()
+
+    def items(self) -> dict:
+        """
+        Get all sessions
+
+        :return: A dict of the session keys and the user dicts
+        """
+        with self.__lock:
+            return dict((key, dict(user)) for key, user in self.__sessions.items())
+
+    def flush(self) -> None:
+        """
+        Nothing to write, the sessions end with the process
+        """
+        pass
+
+
+class SqliteSessionStore(object):
+    """
+    Keeps the sessions in an SQLite database, shared by all processes using the same file
+
+    Every thread uses its own connection. The database runs in WAL mode, so readers do not block each other.
+    """
+
+    #: True because every process using the file sees the sessions
+    shared = True
+
+    def __init__(self, file_name: str):
+        """
+        Open the database and create the table if needed
+
+        :param file_name: The database file
+        """
+        self.file_name = file_name
+        self.__local = threading.local()
+        self.__connection().executescript(
+            'CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, user TEXT NOT NULL, timestamp REAL NOT NULL, '
+            'last_access REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS sessions_timestamp ON sessions (timestamp);'
+            'CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);')
+
+    def __connection(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current thread, opened again after a fork
+
+        :return: The connection
+        """
+        if getattr(self.__local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.file_name, timeout=10.0, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.__local.connection = connection
+            self.__local.pid = os.getpid()
+        return self.__local.connection
+
+    def add(self, key: str, user: dict) -> None:
+        """
+        Store a session
+
+        :param key: The session key
+        :param user: The user dict, with the ``timestamp`` of the login and the ``last_access``
+        """
+        self.__connection().execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)',
+                                    (key, json.dumps(user), user['timestamp'], user['last_access']))
+
+    def remove(self, key: str) -> bool:
+        """
+        Remove a session
+
+        :param key: The session key
+        :return: True when the session existed
+        """
+        return self.__connection().execute('DELETE FROM sessions WHERE key = ?', (key,)).rowcount > 0
+
+    def get(self, key: str, access_time: float=None) -> dict:
+        """
+        Get the user of a session
+
+        :param key: The session key
+        :param access_time: If given, the new ``last_access`` of the session
+        :return: The user dict or None
+        """
+        connection = self.__connection()
+        if access_time is not None:
+            connection.execute('UPDATE sessions SET last_access = ? WHERE key = ?', (access_time, key))
+        row = connection.execute('SELECT user, timestamp, last_access FROM sessions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        user = json.loads(row[0])
+        user['timestamp'] = row[1]
+        user['last_access'] = row[2]
+        return user
+
+    def count(self) -> int:
+        """
+        Count the sessions
+
+        :return: The number of sessions
+        """
+        return self.__connection().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+    def expire(self, created_before: float, accessed_before: float) -> int:
+        """
+        Remove old sessions
+
+        :param created_before: Remove sessions created before this time
+        :param accessed_before: Remove sessions not accessed since this time
+        :return: The number of sessions removed
+        """
+        return self.__connection().execute('DELETE FROM sessions WHERE timestamp < ? OR last_access < ?',
+                                           (created_before, accessed_before)).rowcount
+
+    def clear(self) -> None:
+        """
+        Remove all sessions
+        """
+        self.__connection().execute('DELETE FROM sessions')
+
+    def items(self) -> dict:
+        """
+        Get all sessions
+
+        :return: A dict of the session keys and the user dicts
+        """
+        result = dict()
+        for key, user, timestamp, last_access in self.__connection().execute('SELECT * FROM sessions'):
+            result[key] = json.loads(user)
+            result[key]['timestamp'] = timestamp
+            result[key]['last_access'] = last_access
+        return result
+
+    def flush(self) -> None:
+        """
+        Write the log into the database file and close the connection of the current thread
+        """
+        if getattr(self.__local, 'pid', None) != os.getpid():
+            return
+        self.__local.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.__local.connection.close()
+        del self.__local.pid
+
+
 class SessionManager(object, metaclass=SingletonMeta):
     """
     This class, a singleton, manages the sessions.
@@ -134,6 +406,8 @@ class SessionManager(object, metaclass=SingletonMeta):
     def __init__(self):
         """
         Loads session defaults from the 'controller.ini' configuration file.
+
+        :raise ValueError: On an unknown session store
         """
         self.__conf_file = FsTools.get_config_file('controller.ini')
         config = configparser.ConfigParser()
@@ -156,6 +430,9 @@ class SessionManager(object, metaclass=SingletonMeta):
         if not 'max_inactivity' in config['SessionManagement']:
             config.set('SessionManagement', 'max_inactivity', '3600')
             config_changed = True
+        if not 'store' in config['SessionManagement']:
+            config.set('SessionManagement', 'store', 'memory')
+            config_changed = True
         if config_changed:
             with open(self.__conf_file, 'w') as fh:
                 config.write(fh)
@@ -165,7 +442,43 @@ class SessionManager(object, metaclass=SingletonMeta):
         self.__session_max_age = float(self.__config['SessionManagement']['max_age_seconds'])
         self.__session_max_inactivity = float(self.__config['SessionManagement']['max_inactivity'])
         self.__user_manager = UserManager()
-        self.__sessions = dict()
+        store = store_override if store_override is not None else self.__config['SessionManagement']['store'].lower()
+        if store == 'sqlite':
+            self.__store = SqliteSessionStore(os.path.join(FsTools.get_config_folder(), 'sessions.sqlite'))
+        elif store == 'memory':
+            self.__store = MemorySessionStore()
+        else:
+            raise ValueError('Unknown session store "{:s}", use one of: {:s}'.format(store, ', '.join(session_stores)))
+        self.__listeners = list()
+
+    def add_listener(self, listener) -> None:
+        """
+        Register a listener for changes of the session count
+
+        The listener is called with the new number of sessions after every login and logout, including the sessions
+        thrown away by :py:meth:`cleanup() <.cleanup>`.
+
+        :param listener: A callable taking the session count
+        """
+        if not listener in self.__listeners:
+            self.__listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        """
+        Remove a listener registered with :py:meth:`add_listener() <.add_listener>`
+
+        :param listener: The listener
+        """
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def __notify_listeners(self) -> None:
+        """
+        Tell all listeners the current session count
+        """
+        count = self.__store.count()
+        for listener in self.__listeners:
+            listener(count)
 
     def login(self, username: str, password: str) -> str:
         """
@@ -182,7 +495,8 @@ class SessionManager(object, metaclass=SingletonMeta):
         if user is None:
             return None
         key = create_simple_key()
-        self.__sessions[key] = user
+        self.__store.add(key, user)
+        self.__notify_listeners()
         return key
 
     def logout(self, session: str) -> None:
@@ -192,24 +506,16 @@ class SessionManager(object, metaclass=SingletonMeta):
         :param session: The session to log out
         """
         if not session is None:
-            self.__sessions.pop(session, None)
+            if self.__store.remove(session):
+                self.__notify_listeners()
 
     def cleanup(self) -> None:
         """
         Clean left-over and old sessions from the SessionManager
         """
         current_time = time.time()
-        for d in self.__sessions:
-            user = self.__sessions.get(d, None)
-            if user is None:
-                continue
-            age = current_time - user['timestamp']
-            last_access = current_time - user['last_access']
-            if age > self.__session_max_age:
-                self.logout(d)
-                continue
-            if last_access > self.__session_max_inactivity:
-                self.logout(d)
+        if self.__store.expire(current_time - self.__session_max_age, current_time - self.__session_max_inactivity) > 0:
+            self.__notify_listeners()
 
     def get_user(self, session: str) -> dict:
         """
@@ -223,10 +529,55 @@ class SessionManager(object, metaclass=SingletonMeta):
         self.cleanup()
         if session is None:
             return None
-        if not session in self.__sessions:
+        return self.__store.get(session, time.time())
+
+    def has_session(self, session: str) -> bool:
+        """
+        Check if a session is still valid, without counting this as an access
+
+        It calls the :py:meth:`cleanup() <.cleanup>` method first to throw old sessions away.
+
+        :param session: The session ID to look up
+        :return: True when the session is valid
+        """
+        self.cleanup()
+        return session is not None and self.__store.get(session) is not None
+
+    def clear(self) -> None:
+        """
+        Remove all sessions, e.g. those left in a shared store by the last run
+        """
+        if self.__store.count() > 0:
+            self.__store.clear()
+            self.__notify_listeners()
+
+    def export_sessions(self) -> dict:
+        """
+        Get the sessions for another process, e.g. on a restart
+
+        :return: A dict of the session keys and the user dicts, or None when the store is shared anyway
+        """
+        if self.__store.shared:
             return None
-        self.__sessions[session]['last_access'] = time.time()
-        return self.__sessions[session]
+        return self.__store.items()
+
+    def import_sessions(self, sessions: dict) -> None:
+        """
+        Take over the sessions of another process
+
+        :param sessions: The result of :py:meth:`export_sessions` in the other process
+        """
+        for key, user in sessions.items():
+            self.__store.add(key, user)
+        self.cleanup()
+        self.__notify_listeners()
+
+    def flush(self) -> None:
+        """
+        Drop the old sessions and write the rest to the store, e.g. before the process exits
+        """
+        self.cleanup()
+        self.__store.flush()
 
     def get_current_sessions(self) -> int:
         """
@@ -237,4 +588,4 @@ class SessionManager(object, metaclass=SingletonMeta):
         :return: The count of active sessions.
         """
         self.cleanup()
-        return len(self.__sessions)
+        return self.__store.count()
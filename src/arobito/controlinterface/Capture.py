@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+This module records the ``/app`` and ``/static`` requests to a file, to replay them later against another instance
+(see ``benchmarks/arobito/controlinterface/Replay.py`` in the tests).
+
+The capture is off by default and enabled by ``capture-file`` in the ``[Server]`` section of ``controller.ini``; a
+relative file name is taken from the config folder. Every request becomes one line of JSON, appended in the background
+by a :py:class:`CaptureWriter`, the :py:class:`LogWriter <arobito.controlinterface.LogWriter.LogWriter>` of the
+capture:
+
+.. code-block:: javascript
+
+   {"m":"POST","p":"/app/auth","s":200,"n":126,"ms":3.884,"b":{"username":"arobito","password":"*"},
+    "r":{"auth":{"success":"bool","status":"str","key":"str"}},"k":1,"ts":"2014-06-01T12:00:00.123Z"}
+   {"m":"POST","p":"/app/get_session_count","s":200,"n":19,"ms":1.075,"b":{"key":"$key1"},
+    "r":{"session_count":"number"},"ts":"2014-06-01T12:00:00.301Z"}
+   {"m":"GET","p":"/static/index.html","s":200,"n":2310,"ms":0.83,"ts":"2014-06-01T12:00:00.302Z"}
+
+The fields are the method, the path, the status code, the size of the response body in bytes, the milliseconds the
+request took in the server, the request body (``b``), for ``/app`` responses their :py:func:`shape` and the time stamp
+of the end of the request. When the queue of the writer overflows, a ``log_dropped`` record reports the requests lost.
+
+Secrets are redacted from the request bodies: The values of :py:data:`secret_fields` become ``*``, and session keys are
+replaced by ``$key`` and the number of the session. A response handing out a new session key carries this number as
+``k``, so a replay can use the key it gets for the same requests.
+"""
+
+import collections
+import threading
+import time
+import cherrypy
+from arobito.controlinterface import Codec, LogWriter
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The fields of a request body whose values are replaced by ``*``
+secret_fields = ('password', 'secret')
+
+#: The field holding a session key, in requests and responses
+key_field = 'key'
+
+#: The number of session keys remembered; the oldest are forgotten and get a new number when seen again
+max_keys = 10000
+
+
+def shape(value):
+    """
+    Get the shape of a document: Its structure with the types of the values instead of the values
+
+    :param value: The decoded document
+    :return: A dict for a dict, a list with the shape of the first element for a list, or the name of the type:
+             ``str``, ``number``, ``bool``, ``null`` or ``bytes``
+    """
+    if isinstance(value, dict):
+        return dict((str(name), shape(item)) for name, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return [shape(value[0])] if value else []
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, (int, float)):
+        return 'number'
+    if isinstance(value, (bytes, bytearray)):
+        return 'bytes'
+    return 'str'
+
+
+def find_key(value) -> str:
+    """
+    Find a session key in a response
+
+    :param value: The decoded response
+    :return: The first string value of a :py:data:`key_field`, None if there is none
+    """
+    if isinstance(value, dict):
+        if isinstance(value.get(key_field), str):
+            return value[key_field]
+        items = value.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return None
+    for item in items:
+        key = find_key(item)
+        if key is not None:
+            return key
+    return None
+
+
+def decode(data: bytes, content_type: str):
+    """
+    Decode a request or response body for the capture
+
+    :param data: The body
+    :param content_type: The ``Content-Type`` header, may be None
+    :return: The document, None if the body is empty or not a document
+    """
+    if not data:
+        return None
+    try:
+        return Codec.decode(data, Codec.codec_for((content_type or '').split(';', 1)[0].strip().lower()))
+    except (ValueError, TypeError):
+        return None
+
+
+class CaptureWriter(LogWriter.LogWriter):
+    """
+    This class, a singleton, redacts the requests and writes them to the capture file in its own thread
+    """
+
+    thread_name = 'CaptureWriter'
+
+    dropped_counter = 'capture_records_dropped'
+
+    def __init__(self):
+        """
+        Start disabled
+        """
+        LogWriter.LogWriter.__init__(self)
+        #: True to capture the requests
+        self.enabled = False
+        self.__lock = threading.Lock()
+        self.__keys = collections.OrderedDict()
+        self.__sessions = 0
+
+    def configure(self, file_name: str=None, max_bytes: int=0, backups: int=0, queue_size: int=10000,
+                  interval: float=10.0, access: bool=False) -> None:
+        """
+        Set the options; the capture is enabled with a file name
+
+        :param file_name: The capture file, None or empty to disable the capture
+        :param max_bytes: The size after which the file is rotated, 0 to never rotate it
+        :param backups: The number of old files kept
+        :param queue_size: The number of records the queue holds
+        :param interval: The seconds between the reports of dropped records
+        :param access: Ignored, every request is captured
+        """
+        LogWriter.LogWriter.configure(self, file_name, max_bytes, backups, queue_size, interval, False)
+        self.enabled = self.file_name is not None
+
+    def number(self, key: str) -> int:
+        """
+        Get the number of a session
+
+        :param key: The session key
+        :return: The number, counted from 1 in the order the keys were first seen
+        """
+        with self.__lock:
+            number = self.__keys.get(key)
+            if number is None:
+                self.__sessions += 1
+                number = self.__keys[key] = self.__sessions
+                if len(self.__keys) > max_keys:
+                    self.__keys.popitem(last=False)
+            return number
+
+    def redact(self, value):
+        """
+        Redact the secrets of a request body
+
+        :param value: The decoded request body
+        :return: A copy without secrets
+        """
+        if isinstance(value, dict):
+            result = dict()
+            for name, item in value.items():
+                if name in secret_fields and item is not None:
+                    result[name] = '*'
+                elif name == key_field and isinstance(item, str):
+                    result[name] = '${:s}{:d}'.format(key_field, self.number(item))
+                else:
+                    result[name] = self.redact(item)
+            return result
+        if isinstance(value, (list, tuple)):
+            return [self.redact(item) for item in value]
+        return value
+
+    def record(self, method: str, path: str, request, status: int, length: int, elapsed: float,
+               response=None) -> None:
+        """
+        Queue the record of a request, when enabled
+
+        :param method: The request method
+        :param path: The request path
+        :param request: The decoded request body or None
+        :param status: The status code of the response
+        :param length: The size of the response body in bytes
+        :param elapsed: The seconds the request took
+        :param response: The decoded response body or None
+        """
+        if not self.enabled:
+            return
+        record = dict(m=method, p=path, s=status, n=length, ms=round(elapsed * 1000, 3))
+        if request is not None:
+            record['b'] = self.redact(request)
+        if response is not None:
+            record['r'] = shape(response)
+            key = find_key(response)
+            if key is not None:
+                record['k'] = self.number(key)
+        self.write(record)
+
+
+def captured(path: str) -> bool:
+    """
+    Check if the requests of a path are captured
+
+    :param path: The request path
+    :return: True for ``/app`` and ``/static``
+    """
+    return path.startswith('/app/') or path.startswith('/static/')
+
+
+class CaptureTool(cherrypy.Tool):
+    """
+    The CherryPy tool recording the requests to the capture
+    """
+
+    def __init__(self):
+        """
+        Take the start when the resource is found
+        """
+        cherrypy.Tool.__init__(self, 'on_start_resource', self.start, priority=0)
+
+    def _setup(self) -> None:
+        """
+        Hook the record into the end of the request
+        """
+        cherrypy.Tool._setup(self)
+        cherrypy.request.hooks.attach('on_end_request', self.finish, priority=100)
+
+    @staticmethod
+    def start() -> None:
+        """
+        Take the start of the request
+        """
+        cherrypy.request.capture_started = time.perf_counter()
+
+    @staticmethod
+    def finish() -> None:
+        """
+        Record the request
+        """
+        request = cherrypy.request
+        started = getattr(request, 'capture_started', None)
+        path = request.script_name + request.path_info
+        if started is None or not captured(path):
+            return
+        response = cherrypy.response
+        try:
+            status = int(str(response.status)[:3])
+        except ValueError:
+            status = 500
+        document = None
+        if status == 200 and path.startswith('/app/') and isinstance(response.body, list):
+            document = decode(b''.join(response.body), response.headers.get('Content-Type'))
+        CaptureWriter().record(request.method, path, getattr(request, 'json', None), status,
+                               int(response.headers.get('Content-Length', 0) or 0), time.perf_counter() - started,
+                               document)
+
+
+cherrypy.tools.capture = CaptureTool()
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module is the codec layer of the ``/app`` API: It decodes the requests and encodes the responses.
+
+For JSON, the fastest library installed is used: ``orjson``, ``ujson`` or, as fallback, the ``json`` module of the
+standard library with compact separators and without key sorting. The codec can be chosen with the ``json-codec``
+option in the ``[Server]`` section of ``controller.ini`` (``auto``, ``orjson``, ``ujson`` or ``stdlib``).
+
+Besides JSON, a compact binary encoding compatible with MessagePack (see :py:mod:`MessagePack
+<arobito.controlinterface.MessagePack>`) is understood. Requests are decoded by their ``Content-Type``; responses are
+encoded by the ``Accept`` header of the request or, without a preference, in the format of the request. This applies to
+every method using the options below, so new API methods get the binary encoding without further work.
+
+Responses that never change can be declared as :py:class:`ConstantResponse <.ConstantResponse>`. They are encoded only
+once per codec. Their cache hits and misses are counted in the :py:mod:`Metrics <arobito.controlinterface.Metrics>`,
+the size of the cache is reported by :py:mod:`Memory <arobito.controlinterface.Memory>`.
+
+The codec is plugged into CherryPy's ``json_in`` and ``json_out`` tools by :py:data:`json_in_options` and
+:py:data:`json_out_options`.
+"""
+
+import json
+import weakref
+import cherrypy
+from cherrypy.lib import httputil
+from arobito import FsTools
+from arobito.controlinterface import MessagePack, Metrics
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class BodyCodec(object):
+    """
+    An encoding library wrapped into a common interface
+    """
+
+    def __init__(self, name: str, encode, decode):
+        """
+        Create the codec
+
+        :param name: The name of the codec
+        :param encode: A callable converting an object to bytes (UTF-8 encoded for JSON)
+        :param decode: A callable converting bytes to an object, raising ValueError on invalid documents
+        """
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+def __create_codecs() -> dict:
+    """
+    Create the codecs for all JSON libraries installed
+
+    :return: A dict of the codecs by name
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'), sort_keys=False, ensure_ascii=False, check_circular=False)
+    decoder = json.JSONDecoder()
+    available = dict(stdlib=BodyCodec('stdlib', lambda value: encoder.encode(value).encode('utf-8'),
+                                      lambda data: decoder.decode(data.decode('utf-8'))))
+    try:
+        import ujson
+        available['ujson'] = BodyCodec('ujson', lambda value: ujson.dumps(value, ensure_ascii=False).encode('utf-8'),
+                                       ujson.loads)
+    except ImportError:
+        pass
+    try:
+        import orjson
+        available['orjson'] = BodyCodec('orjson', orjson.dumps, orjson.loads)
+    except ImportError:
+        pass
+    return available
+
+
+#: The codecs available, by name
+codecs = __create_codecs()
+
+#: The order of preference when choosing the codec automatically
+preference = ('orjson', 'ujson', 'stdlib')
+
+#: The JSON codec in use
+current = codecs[[name for name in preference if name in codecs][0]]
+
+#: The codec of the binary encoding
+binary = BodyCodec('msgpack', MessagePack.pack, MessagePack.unpack)
+
+#: The media types of JSON, the first one is used for responses
+json_types = ('application/json', 'text/javascript')
+
+#: The media types of the binary encoding, the first one is used for responses unless the client asked for another
+binary_types = ('application/msgpack', 'application/x-msgpack')
+
+
+def select(name: str='auto') -> BodyCodec:
+    """
+    Choose the JSON codec to use
+
+    :param name: The name of the codec or ``auto`` for the fastest one available
+    :return: The codec selected
+    :raise ValueError: When the codec is unknown or its library is not installed
+    """
+    global current
+    if name == 'auto':
+        name = [n for n in preference if n in codecs][0]
+    if not name in codecs:
+        raise ValueError('JSON codec "{:s}" is not available'.format(name))
+    current = codecs[name]
+    return current
+
+
+def configure() -> BodyCodec:
+    """
+    Choose the JSON codec by the ``json-codec`` option of ``controller.ini``
+
+    :return: The codec selected
+    :raise ValueError: When the codec configured is not available
+    """
+    config = FsTools.get_config_section('controller.ini', 'Server', {'json-codec': 'auto'})
+    return select(config.get('json-codec').lower())
+
+
+class ConstantResponse(dict):
+    """
+    A response that never changes and is therefore encoded only once per codec
+
+    The dict itself cannot be modified. Nested objects must not be modified either.
+    """
+
+    #: All constant responses, for the size of the cache
+    instances = weakref.WeakValueDictionary()
+
+    def __init__(self, *args, **kwargs):
+        """
+        Create the response from the same arguments as a dict
+        """
+        dict.__init__(self, *args, **kwargs)
+        self.__encoded = dict()
+        ConstantResponse.instances[id(self)] = self
+
+    def encoded(self, codec: BodyCodec) -> bytes:
+        """
+        Get the encoded response
+
+        :param codec: The codec
+        :return: The encoded bytes
+        """
+        encoded = self.__encoded.get(codec.name)
+        if encoded is None:
+            Metrics.Registry().count('response_cache_misses')
+            encoded = self.__encoded[codec.name] = codec.encode(dict(self))
+        else:
+            Metrics.Registry().count('response_cache_hits')
+        return encoded
+
+    @staticmethod
+    def cache_size() -> tuple:
+        """
+        Get the size of the cache of all constant responses
+
+        :return: A tuple of the number of encoded responses and their total size in bytes
+        """
+        entries = [encoded for response in list(ConstantResponse.instances.values())
+                   for encoded in list(response.__encoded.values())]
+        return len(entries), sum(len(encoded) for encoded in entries)
+
+    def __readonly(self, *args, **kwargs):
+        """
+        Refuse every modification with a ``TypeError``
+        """
+        raise TypeError('Constant responses cannot be modified')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __readonly
+
+
+def codec_for(media_type: str) -> BodyCodec:
+    """
+    Get the codec of a media type
+
+    :param media_type: The media type without parameters, e.g. ``application/json``
+    :return: The binary codec for its media types, the current JSON codec for all others
+    """
+    return binary if media_type in binary_types else current
+
+
+def negotiate(accept: str, request_type: str=None) -> tuple:
+    """
+    Choose the encoding of a response
+
+    The format with the highest quality in the ``Accept`` header wins. On a tie, without an ``Accept`` header or when
+    neither format is acceptable, the response uses the format of the request. JSON is the default.
+
+    :param accept: The ``Accept`` header of the request or None
+    :param request_type: The media type of the request body without parameters or None
+    :return: A tuple of the codec and the media type of the response
+    """
+    request_binary = request_type in binary_types
+    qualities = dict(json=(0.0, json_types[0]), binary=(0.0, request_type if request_binary else binary_types[0]))
+    for element in httputil.header_elements('Accept', accept or ''):
+        if element.value in json_types:
+            matches = ['json']
+        elif element.value in binary_types:
+            matches = ['binary']
+        elif element.value in ('*/*', 'application/*'):
+            matches = ['json', 'binary']
+        else:
+            continue
+        for match in matches:
+            quality, media_type = qualities[match]
+            if element.qvalue > quality:
+                exact = element.value in json_types or element.value in binary_types
+                qualities[match] = (element.qvalue, element.value if exact else media_type)
+    json_quality, binary_quality = qualities['json'][0], qualities['binary'][0]
+    if binary_quality > json_quality or (binary_quality == json_quality and request_binary):
+        return binary, qualities['binary'][1]
+    return current, json_types[0]
+
+
+def encode(value, codec: BodyCodec=None) -> bytes:
+    """
+    Encode a response
+
+    :param value: The response
+    :param codec: The codec, by default the current JSON codec
+    :return: The encoded bytes
+    """
+    if codec is None:
+        codec = current
+    if isinstance(value, ConstantResponse):
+        return value.encoded(codec)
+    return codec.encode(value)
+
+
+def decode(data: bytes, codec: BodyCodec=None):
+    """
+    Decode a request
+
+    :param data: The request body
+    :param codec: The codec, by default the current JSON codec
+    :return: The request object
+    :raise ValueError: On an invalid document
+    """
+    return (current if codec is None else codec).decode(data)
+
+
+def json_processor(entity) -> None:
+    """
+    Request body processor for the ``json_in`` tool, storing the decoded request at ``cherrypy.request.json``
+
+    The codec is chosen by the ``Content-Type`` of the request.
+
+    :param entity: The request entity
+    """
+    if not entity.headers.get('Content-Length', ''):
+        raise cherrypy.HTTPError(411)
+    body = entity.fp.read()
+    codec = codec_for(entity.content_type.value)
+    try:
+        cherrypy.serving.request.json = decode(body, codec)
+    except ValueError:
+        raise cherrypy.HTTPError(400, 'Invalid MessagePack document' if codec is binary else 'Invalid JSON document')
+
+
+def json_handler(*args, **kwargs) -> bytes:
+    """
+    Response handler for the ``json_out`` tool, encoding the result of the exposed method
+
+    The codec is negotiated by :py:func:`negotiate`.
+
+    :return: The encoded response
+    """
+    request = cherrypy.serving.request
+    response = cherrypy.serving.response
+    request_type = None
+    if request.headers.get('Content-Type'):
+        request_type = request.headers.elements('Content-Type')[0].value
+    codec, media_type = negotiate(request.headers.get('Accept'), request_type)
+    value = request._json_inner_handler(*args, **kwargs)
+    response.headers['Content-Type'] = media_type
+    response.headers['Vary'] = 'Accept'
+    return encode(value, codec)
+
+
+#: Options for ``cherrypy.tools.json_in`` to use this codec layer
+json_in_options = dict(processor=json_processor, content_type=list(json_types + binary_types))
+
+#: Options for ``cherrypy.tools.json_out`` to use this codec layer
+json_out_options = dict(handler=json_handler)
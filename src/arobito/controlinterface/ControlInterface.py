@@ -21,12 +21,15 @@ Parts of the web application
 import cherrypy
 from sys import stderr
 from os import path
+from urllib.parse import quote
 import re
-from arobito.controlinterface import ControllerFrontend
+import itertools
+from arobito.controlinterface import ControllerFrontend, StaticContent, StaticArchive, AssetBundler, ServerTuning, \
+    PushChannel, Codec, AsyncServer, Supervisor, BackendManager, Handoff, Shutdown, Admission, Health, Metrics, \
+    Timing, Watchdog, LogWriter, Capture
 import traceback
 from arobito.Base import SingletonMeta, find_root_path
-from arobito import FsTools
-import configparser
+from arobito import FsTools, Helper
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -48,85 +51,229 @@ class ArobitoControlInterfaceStatics(object):
     mime_types = dict(html='application/xhtml+xml', png='image/png', gif='image/gif', jpeg='image/jpeg',
                       jpg='image/jpeg', css='text/css', js='text/javascript', xml='application/xml',
                       xhtml='application/xhtml+xml')
+    #: headers for handing the delivery over to a reverse proxy, by the ``static-offload`` option
+    offload_headers = {'none': None, 'x-accel-redirect': 'X-Accel-Redirect', 'x-sendfile': 'X-Sendfile'}
 
     def __init__(self):
         """
         Look in the config file 'controller.ini' for the folder with the static contents to serve.
+
+        The ``static-folder`` option may also name a zip archive (see :py:mod:`StaticArchive
+        <arobito.controlinterface.StaticArchive>`). By default, the ``web-static`` folder next to the application is
+        used, or a ``web-static.zip`` archive if there is no such folder.
+
+        Files larger than the ``stream-threshold`` option (in bytes) are streamed instead of being read into memory.
+
+        When a reverse proxy like nginx sits in front of the interface, the ``static-offload`` option can be set to
+        ``x-accel-redirect`` or ``x-sendfile``. The file is then only resolved here and the proxy delivers it. For
+        ``x-accel-redirect``, the path is appended to ``static-offload-prefix``, which must be an internal location of
+        the proxy pointing to the static folder.
+
+        With ``asset-bundles`` enabled, the scripts and style sheets of the index page are served as bundles (see
+        :py:mod:`AssetBundler <arobito.controlinterface.AssetBundler>`). Outdated or missing bundles are built on
+        startup. If that fails, e.g. on a read-only static folder, the single files are served. Archives must contain
+        the bundles already.
+
+        :raise ValueError: On an unknown offload mode or when offloading is configured for an archive
+        :raise IOError: When the archive cannot be read
         """
-        self.conf_file = FsTools.get_config_file('controller.ini')
-        config = configparser.ConfigParser()
-        config.read(self.conf_file)
-        config_changed = False
-        if not 'Server' in config.sections():
-            config.add_section('Server')
-            config.set('Server', 'static-folder', path.join(find_root_path(), 'web-static'))
-            config_changed = True
-        if config_changed:
-            with open(self.conf_file, 'w') as fh:
-                config.write(fh)
-                fh.flush()
-                fh.close()
-                config_changed = False
-        if not 'static-folder' in config['Server']:
-            config.set('Server', 'static-folder', path.join(find_root_path(), 'web-static'))
-            config_changed = True
-        if config_changed:
-            with open(self.conf_file, 'w') as fh:
-                config.write(fh)
-                fh.flush()
-                fh.close()
-                config_changed = True
-        static_folder = config.get('Server', 'static-folder')
-        if static_folder is None or len(static_folder) <= 0:
-            config.set('Server', 'static-folder', path.join(find_root_path(), 'web-static'))
-            config_changed = True
-        if config_changed:
-            with open(self.conf_file, 'w') as fh:
-                config.write(fh)
-                fh.flush()
-                fh.close()
-        static_folder = config.get('Server', 'static-folder')
-        self.root_dir = static_folder
+        default_folder = path.join(find_root_path(), 'web-static')
+        if not path.isdir(default_folder) and path.isfile(default_folder + '.zip'):
+            default_folder += '.zip'
+        config = FsTools.get_config_section('controller.ini', 'Server', {
+            'static-folder': default_folder,
+            'stream-threshold': '262144',
+            'static-offload': 'none',
+            'static-offload-prefix': '/internal-static',
+            'asset-bundles': 'yes',
+            'bundle-inline-limit': '8192'
+        })
+        self.root_dir = config.get('static-folder')
+        self.stream_threshold = config.getint('stream-threshold')
+        offload = config.get('static-offload').lower()
+        if not offload in ArobitoControlInterfaceStatics.offload_headers:
+            raise ValueError('Unknown static-offload mode "{:s}"'.format(offload))
+        self.offload_header = ArobitoControlInterfaceStatics.offload_headers[offload]
+        self.offload_prefix = config.get('static-offload-prefix').rstrip('/')
+        self.archive = None
+        if StaticArchive.is_archive(self.root_dir):
+            if self.offload_header is not None:
+                raise ValueError('static-offload cannot be used with an archive')
+            self.archive = StaticArchive.StaticArchive(self.root_dir)
+        self.bundles = None
+        if config.getboolean('asset-bundles'):
+            if self.archive is not None:
+                self.bundles = self.archive.load_json(AssetBundler.bundle_folder + '/manifest.json')
+            else:
+                try:
+                    self.bundles = AssetBundler.ensure_bundles(self.root_dir, config.getint('bundle-inline-limit'))
+                except IOError as e:
+                    print('Statics Server: Cannot build asset bundles: {:s}'.format(e.__str__()), file=stderr)
 
-    @cherrypy.expose
-    def default(self, *args) -> bytes:
+    def resolve(self, args: tuple) -> tuple:
         """
-        Serve static content directly out of the package
+        Find the static file requested
+
+        :param args: The parts of the path below ``/static``
+        :return: A tuple of the path parts (pointing to the bundle for the index page), the file (a path or, for an
+                 archive, its name in the archive), the archive entry (None without an archive), the mime type and
+                 whether the file may be cached forever
+        :raise cherrypy.HTTPError: 404 when there is no such file
         """
         if len(args) <= 0:
             raise cherrypy.HTTPError(404, 'File not found')
-        file = self.root_dir
+        immutable = False
+        if self.bundles is not None:
+            if args == ('index.html',):
+                args = (AssetBundler.bundle_folder, self.bundles['index'])
+            elif len(args) == 2 and args[0] == AssetBundler.bundle_folder:
+                immutable = args[1] in (self.bundles['css'], self.bundles['js'])
         for a in args:
             if a is None:
-                print('Statics Server: Invalid part: It is "None"', file=stderr)
+                LogWriter.log('warning', 'static_invalid_part', 'Invalid part: It is "None"')
                 raise cherrypy.HTTPError(404, 'File not found')
             if not type(a) == str:
-                print('Statics Server: Invalid part: Is not a string', file=stderr)
+                LogWriter.log('warning', 'static_invalid_part', 'Invalid part: Is not a string')
                 raise cherrypy.HTTPError(404, 'File not found')
             a = str(a)
             if a.startswith('..'):
-                print('Statics Server: Invalid part: "{:s}" starts with ".."'.format(a), file=stderr)
+                LogWriter.log('warning', 'static_invalid_part', 'Invalid part: "{:s}" starts with ".."'.format(a))
+                raise cherrypy.HTTPError(404, 'File not found')
+        entry = None
+        if self.archive is not None:
+            file = '/'.join(args)
+            entry = self.archive.get_entry(file)
+            if entry is None:
+                LogWriter.log('warning', 'static_not_found', 'File does not exist in archive: "{:s}"'.format(file))
+                raise cherrypy.HTTPError(404, 'File not found')
+        else:
+            file = path.join(self.root_dir, *args)
+            if not path.exists(file):
+                LogWriter.log('warning', 'static_not_found', 'File does not exist: "{:s}"'.format(file))
+                raise cherrypy.HTTPError(404, 'File not found')
+            if not path.isfile(file):
+                LogWriter.log('warning', 'static_not_found', 'File is not a file: "{:s}"'.format(file))
                 raise cherrypy.HTTPError(404, 'File not found')
-            file = path.join(file, a)
-        if not path.exists(file):
-            print('Statics Server: File does not exist: "{:s}"'.format(file), file=stderr)
-            raise cherrypy.HTTPError(404, 'File not found')
-        if not path.isfile(file):
-            print('Statics Server: File is not a file: "{:s}"'.format(file), file=stderr)
-            raise cherrypy.HTTPError(404, 'File not found')
         match = ArobitoControlInterfaceStatics.mime_extract_regex.search(file)
         if not match:
-            print('Statics Server: File does not match mime regex: "{:s}"'.format(file), file=stderr)
+            LogWriter.log('warning', 'static_not_found', 'File does not match mime regex: "{:s}"'.format(file))
             raise cherrypy.HTTPError(404, 'File not found')
         mt = match.group('attr').lower()
         mime = ArobitoControlInterfaceStatics.mime_types.get(mt, ArobitoControlInterfaceStatics.default_mime_type)
+        return args, file, entry, mime, immutable
+
+    def offload_location(self, args: tuple, file: str) -> str:
+        """
+        Get the value of the offload header for a file
+
+        :param args: The path parts as returned by :py:meth:`resolve`
+        :param file: The file as returned by :py:meth:`resolve`
+        :return: The header value, or None when offloading is disabled
+        """
+        if self.offload_header == 'X-Accel-Redirect':
+            return self.offload_prefix + '/' + '/'.join(quote(a) for a in args)
+        if self.offload_header == 'X-Sendfile':
+            return path.abspath(file)
+        return None
+
+    @cherrypy.expose
+    def default(self, *args) -> bytes:
+        """
+        Serve static content directly out of the package
+
+        Single and multi-part ``Range`` requests are answered with ``206 Partial Content``. Range requests and files
+        above the stream threshold are streamed out of a memory map chunk by chunk. With an offload mode configured,
+        the body stays empty and the reverse proxy delivers the file named in the offload header. Bundles carry a
+        content hash in their names and are marked as immutable for the browser caches.
+        """
+        args, file, entry, mime, immutable = self.resolve(args)
         cherrypy.response.headers['Content-type'] = mime
+        if immutable:
+            cherrypy.response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        location = self.offload_location(args, file)
+        if location is not None:
+            cherrypy.response.headers[self.offload_header] = location
+            return b''
+        cherrypy.response.headers['Accept-Ranges'] = 'bytes'
+        if self.archive is not None:
+            return self.__serve_archive_entry(entry, mime)
+        try:
+            size = path.getsize(file)
+            ranges = self.__get_ranges(size)
+            if ranges is None and size <= self.stream_threshold:
+                with open(file, 'rb') as fh:
+                    file_bytes = fh.read()
+                return file_bytes
+            body = StaticContent.FileBody(file, size, mime, ranges)
+        except cherrypy.HTTPError:
+            raise
+        except Exception as e:
+            raise cherrypy.HTTPError(500, 'File read problem: ' + e.__str__())
+        return self.__stream_body(body, ranges)
+
+    @staticmethod
+    def __get_ranges(size: int) -> list:
+        """
+        Get the ranges requested by the client
+
+        :param size: The size of the content
+        :return: The ranges like :py:func:`parse_range <arobito.controlinterface.StaticContent.parse_range>` returns
+                 them, but never an empty list
+        :raise cherrypy.HTTPError: 416 when no range is satisfiable
+        """
+        if cherrypy.request.method != 'GET':
+            return None
+        ranges = StaticContent.parse_range(cherrypy.request.headers.get('Range'), size)
+        if ranges is not None and len(ranges) <= 0:
+            cherrypy.response.headers['Content-Range'] = 'bytes */{:d}'.format(size)
+            raise cherrypy.HTTPError(416, 'Requested range not satisfiable')
+        return ranges
+
+    @staticmethod
+    def __stream_body(body: StaticContent.FileBody, ranges: list) -> StaticContent.FileBody:
+        """
+        Set up the response for streaming a body
+
+        :param body: The body to stream
+        :param ranges: The ranges requested, or None
+        :return: The body
+        """
+        if ranges is not None:
+            cherrypy.response.status = 206
+            cherrypy.response.headers['Content-type'] = body.content_type()
+            if not body.is_multipart():
+                cherrypy.response.headers['Content-Range'] = body.content_range()
+        cherrypy.response.headers['Content-Length'] = str(body.content_length())
+        cherrypy.response.stream = True
+        return body
+
+    def __serve_archive_entry(self, entry: StaticArchive.ArchiveEntry, mime: str):
+        """
+        Serve a file out of the static archive
+
+        Stored entries are delivered directly out of the memory map. Deflated entries are sent as they are, wrapped
+        into a gzip member, when the client accepts gzip and requested no ranges. Otherwise they are decompressed.
+
+        :param entry: The entry of the file in the archive
+        :param mime: The mime type of the file
+        :return: The response body
+        """
+        ranges = self.__get_ranges(entry.size)
+        if entry.deflated:
+            cherrypy.response.headers['Vary'] = 'Accept-Encoding'
+            if ranges is None and StaticContent.accepts_gzip(cherrypy.request.headers.get('Accept-Encoding')):
+                header, data, trailer = self.archive.gzip_parts(entry)
+                cherrypy.response.headers['Content-Encoding'] = 'gzip'
+                cherrypy.response.headers['Content-Length'] = str(len(header) + len(data) + len(trailer))
+                cherrypy.response.stream = True
+                return itertools.chain([header], StaticContent.BufferBody(data, mime), [trailer])
         try:
-            with open(file, 'rb') as fh:
-                file_bytes = fh.read()
+            data = self.archive.read(entry)
         except Exception as e:
             raise cherrypy.HTTPError(500, 'File read problem: ' + e.__str__())
-        return file_bytes
+        if ranges is None and entry.size <= self.stream_threshold:
+            return bytes(data)
+        return self.__stream_body(StaticContent.BufferBody(data, mime, ranges), ranges)
 
 
 class ArobitoControlInterfaceRedirect(object):
@@ -147,15 +294,42 @@ class ArobitoControlInterface(object, metaclass=SingletonMeta):
     Main Class to control the Robi Web Based Interface
     """
 
-    def __init__(self, bind_ip: str='0.0.0.0', listen_port: int=9812):
+    #: The Content Security Policy of the interface
+    content_security_policy = "default-src 'none'; " \
+                              "script-src 'self' 'unsafe-inline'; " \
+                              "style-src 'self' 'unsafe-inline'; " \
+                              "img-src 'self' data:; " \
+                              "connect-src 'self'; " \
+                              "font-src 'none'; " \
+                              "object-src 'none'; " \
+                              "media-src 'none'; " \
+                              "frame-src 'none'"
+    #: The security headers sent with every response, by both server modes
+    security_headers = [
+        ('X-Frame-Options', 'DENY'),
+        ('X-XSS-Protection', '1; mode=block'),
+        ('Content-Security-Policy', content_security_policy),
+        ('X-Content-Security-Policy', content_security_policy),
+        ('X-Webkit-CSP', content_security_policy),
+        ('X-Content-Type-Options', 'nosniff')
+    ]
+
+    def __init__(self, bind_ip: str='0.0.0.0', listen_port: int=9812, server_options: dict=None,
+                 pid_file: str=None):
         """
         Configure a control server for Robi
 
         :param bind_ip: The IP to bind to
         :param listen_port: The port to listen to
+        :param server_options: Options overriding the server tuning in ``controller.ini``, see :py:mod:`ServerTuning
+                               <arobito.controlinterface.ServerTuning>`
+        :param pid_file: The file to write the process ID of the serving process to, see :py:mod:`Handoff
+                         <arobito.controlinterface.Handoff>`
         """
         self.bind_ip = bind_ip
         self.listen_port = listen_port
+        self.server_options = server_options
+        self.pid_file = pid_file
         pass
 
     def startup(self) -> int:
@@ -167,38 +341,132 @@ class ArobitoControlInterface(object, metaclass=SingletonMeta):
         cherrypy.log.access_file = None
         cherrypy.log.screen = None
 
-        csp = "default-src 'none'; " \
-              "script-src 'self' 'unsafe-inline'; " \
-              "style-src 'self' 'unsafe-inline'; " \
-              "img-src 'self' data:; " \
-              "connect-src 'self'; " \
-              "font-src 'none'; " \
-              "object-src 'none'; " \
-              "media-src 'none'; " \
-              "frame-src 'none'"
         try:
-            cherrypy.config.update({'global': {
-                'server.socket_host': self.bind_ip,
-                'server.socket_port': self.listen_port,
-                'autoreload.on': False,
-                'tools.gzip.on': False,
-                'tools.encode.on': False,
-                'tools.response_headers.on': True,
-                'tools.response_headers.headers': [
-                    ('X-Frame-Options', 'DENY'),
-                    ('X-XSS-Protection', '1; mode=block'),
-                    ('Content-Security-Policy', csp),
-                    ('X-Content-Security-Policy', csp),
-                    ('X-Webkit-CSP', csp),
-                    ('X-Content-Type-Options', 'nosniff')
-                ]
-            }})
-            cherrypy.tree.mount(ArobitoControlInterfaceRedirect(), '/', {'/': {}})
-            cherrypy.tree.mount(ArobitoControlInterfaceStatics(), '/static', {'/': {}})
-            cherrypy.tree.mount(ControllerFrontend.App(), '/app', {'/': {}})
-            cherrypy.engine.start()
-            cherrypy.engine.block()
-            return 0
+            settings = ServerTuning.ServerSettings(self.server_options)
+            Codec.configure()
+            if settings.workers > 1:
+                return self.__startup_workers(settings)
+            return self.__serve(settings)
         except Exception as e:
             print('Cannot start internal service: {:s}:\n{:s}'.format(e.__str__(), traceback.format_exc()), file=stderr)
             return -1
+
+    def __serve(self, settings: ServerTuning.ServerSettings) -> int:
+        """
+        Run the server in this process until it is stopped
+
+        In single process mode, the listening socket of a previous process is taken over and the process can be
+        restarted the same way, see :py:mod:`Handoff <arobito.controlinterface.Handoff>`.
+
+        :param settings: The server settings
+        :return: The exit status code
+        """
+        inherited = None
+        if settings.workers == 1:
+            inherited = Handoff.inherited_socket()
+            Handoff.import_sessions()
+            Handoff.Handoff(cherrypy.engine, self.pid_file).subscribe()
+        Shutdown.Shutdown(cherrypy.engine, settings.drain_timeout).subscribe()
+        LogWriter.LogWriter().configure(settings.log_file, settings.log_max_bytes, settings.log_backups,
+                                        settings.log_queue, settings.log_interval, settings.access_log)
+        LogWriter.LogPlugin(cherrypy.engine).subscribe()
+        Capture.CaptureWriter().configure(settings.capture_file, queue_size=settings.log_queue,
+                                          interval=settings.log_interval)
+        if settings.capture_file is not None:
+            LogWriter.LogPlugin(cherrypy.engine, Capture.CaptureWriter).subscribe()
+        Admission.AdmissionController().configure(settings.admission_limit, settings.admission_queue,
+                                                  settings.admission_slo)
+        Metrics.Registry().declare_endpoints('/app/' + method for method in AsyncServer.api_methods)
+        Metrics.add_service_gauges()
+        if settings.server_timing:
+            Timing.install(AsyncServer.api_methods, settings.server_timing_sample)
+        if settings.watchdog_threshold > 0:
+            Watchdog.Watchdog(cherrypy.engine, settings.watchdog_threshold, settings.watchdog_interval,
+                              settings.watchdog_dump_interval).subscribe()
+        if settings.server_mode == 'asyncio':
+            return self.__startup_asyncio(settings, inherited)
+        cherrypy.config.update({'global': settings.cherrypy_config()})
+        cherrypy.config.update({'global': {
+            'server.socket_host': self.bind_ip,
+            'server.socket_port': self.listen_port,
+            'autoreload.on': False,
+            'tools.gzip.on': False,
+            'tools.encode.on': False,
+            'tools.response_headers.on': True,
+            'tools.response_headers.headers': ArobitoControlInterface.security_headers,
+            'tools.access_log.on': settings.access_log
+        }})
+        cherrypy.tree.mount(ArobitoControlInterfaceRedirect(), '/', {'/': {}})
+        watchdog = settings.watchdog_threshold > 0
+        capture = settings.capture_file is not None
+        cherrypy.tree.mount(ArobitoControlInterfaceStatics(), '/static', {'/': {'tools.metrics.on': True,
+                                                                                'tools.watchdog.on': watchdog,
+                                                                                'tools.capture.on': capture}})
+        frontend = ControllerFrontend.App()
+        cherrypy.tree.mount(frontend, '/app', {'/': {'tools.admission.on': True, 'tools.metrics.on': True,
+                                                     'tools.timing.on': settings.server_timing,
+                                                     'tools.profiler.on': True, 'tools.watchdog.on': watchdog,
+                                                     'tools.capture.on': capture}})
+        cherrypy.tree.mount(ControllerFrontend.MetricsApp(), '/metrics', {'/': {'tools.watchdog.on': watchdog}})
+        cherrypy.tree.mount(PushChannel.PushApp(), '/push', PushChannel.PushApp.config)
+        PushChannel.PushPlugin(cherrypy.engine).subscribe()
+        ServerTuning.prepare_server(cherrypy.server, settings, cherrypy.engine)
+        pool = cherrypy.server.httpserver.requests
+        cherrypy.tree.graft(Health.Health(frontend.backend, cherrypy.engine, lambda: Health.pool_saturated(pool)),
+                            '/health')
+        Metrics.Registry().add_gauge('thread_pool_workers', 'Worker threads of the HTTP server, by state',
+                                     lambda: Metrics.pool_workers(pool))
+        Metrics.Registry().add_gauge('thread_pool_queued', 'Connections waiting for a worker thread',
+                                     lambda: pool.qsize)
+        adapter = ServerTuning.SharedPortServer(cherrypy.engine, cherrypy.server.httpserver, cherrypy.server.bind_addr)
+        cherrypy.server.unsubscribe()
+        adapter.subscribe()
+        cherrypy.engine.start()
+        if inherited is not None:
+            inherited.close()
+        cherrypy.engine.publish(Helper.serving_channel, cherrypy.server.httpserver.socket)
+        cherrypy.engine.block()
+        return 0
+
+    def __startup_workers(self, settings: ServerTuning.ServerSettings) -> int:
+        """
+        Run the server in several worker processes, see :py:mod:`Supervisor <arobito.controlinterface.Supervisor>`
+
+        The sessions are kept in SQLite, so every worker knows them. The configuration files and the session database
+        are created here, before the workers start, and the singletons of this process are dropped, so every worker
+        creates its own ones. Session count changes are only pushed by the worker where they happen.
+
+        :param settings: The server settings
+        :return: The exit status code
+        """
+        BackendManager.store_override = 'sqlite'
+        BackendManager.UserManager()
+        BackendManager.SessionManager().clear()
+        SingletonMeta.reset()
+        supervisor = Supervisor.Supervisor(settings.workers, self.bind_ip, self.listen_port,
+                                           lambda: self.__serve(settings))
+        supervisor.stop_timeout += settings.drain_timeout
+        return supervisor.run()
+
+    def __startup_asyncio(self, settings: ServerTuning.ServerSettings, inherited=None) -> int:
+        """
+        Start the :py:class:`AsyncServer <arobito.controlinterface.AsyncServer.AsyncServer>` instead of the CherryPy
+        HTTP server
+
+        The CherryPy engine still runs, without its HTTP server, for the push delivery and the shutdown.
+
+        :param settings: The server settings
+        :param inherited: A listening socket to use instead of binding one, or None
+        :return: The exit status code
+        """
+        server = AsyncServer.AsyncServer(self.bind_ip, self.listen_port, settings, ArobitoControlInterfaceStatics(),
+                                         ArobitoControlInterface.security_headers, cherrypy.engine, inherited)
+        cherrypy.server.unsubscribe()
+        PushChannel.PushDelivery(cherrypy.engine).subscribe()
+        cherrypy.engine.start()
+        try:
+            server.run()
+        finally:
+            if cherrypy.engine.state == cherrypy.engine.states.STARTED:
+                cherrypy.engine.exit()
+        return 0
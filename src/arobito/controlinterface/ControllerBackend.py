@@ -19,8 +19,14 @@ This module implements the methods for the main controller app. By decoupling th
 they are better to test without a mock.
 """
 
+import threading
 from arobito import Helper
+from arobito.controlinterface.Admission import AdmissionController
 from arobito.controlinterface.BackendManager import SessionManager
+from arobito.controlinterface.Codec import ConstantResponse
+from arobito.controlinterface.Memory import MemoryInspector, actions as memory_actions
+from arobito.controlinterface.Metrics import Registry
+from arobito.controlinterface.Profiler import Profiler, modes as profile_modes
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -35,7 +41,34 @@ class App(object):
     """
 
     #: The default response when authorization fails.
-    auth_default_response = dict(auth=dict(success=False, status='failed', reason='User unknown or password wrong'))
+    auth_default_response = ConstantResponse(auth=dict(success=False, status='failed',
+                                                       reason='User unknown or password wrong'))
+    #: The response to a logout
+    logout_response = ConstantResponse(logout=True)
+    #: The response to a successful shutdown request
+    shutdown_response = ConstantResponse(shutdown=True)
+    #: The response to a denied shutdown request
+    shutdown_denied_response = ConstantResponse(shutdown=False)
+    #: The modes of a shutdown: Let the requests in flight finish or abort them
+    shutdown_modes = ('drain', 'immediate')
+    #: The response to a successful restart request
+    restart_response = ConstantResponse(restart=True)
+    #: The response to a denied or impossible restart request
+    restart_denied_response = ConstantResponse(restart=False)
+    #: The response when the session count is not available
+    session_count_denied_response = ConstantResponse(session_count=-1)
+    #: The response when the admission statistics are not available
+    admission_stats_denied_response = ConstantResponse(admission=None)
+    #: The response to a denied profiling request
+    profile_denied_response = ConstantResponse(profile=None)
+    #: The response to a profiling request while another run is going on
+    profile_busy_response = ConstantResponse(profile=dict(busy=True))
+    #: The response to a denied memory request
+    memory_denied_response = ConstantResponse(memory=None)
+    #: The methods that may be called within a batch
+    batch_methods = ('get_session_count', 'shutdown', 'logout')
+    #: The maximum number of calls in a batch
+    batch_max_calls = 32
 
     def __init__(self):
         """
@@ -44,12 +77,26 @@ class App(object):
         """
 
         self.locked = True
+        self.__batch = threading.local()
         try:
             self.session_manager = SessionManager()
             self.locked = False
         except IOError:
             pass
 
+    def __get_user(self, key: str) -> dict:
+        """
+        Look up the user of a session
+
+        Within a batch, the user looked up once for the batch is used.
+
+        :param key: The session key
+        :return: The user dict or None on an invalid session
+        """
+        if getattr(self.__batch, 'active', False) and key == self.__batch.key:
+            return self.__batch.user
+        return self.session_manager.get_user(key)
+
     def auth(self, json_req: dict) -> dict:
         """
         Backend method for :py:meth:`ControllerFrontend.App.auth <.ControllerFrontend.App.auth>`
@@ -94,7 +141,9 @@ class App(object):
 
         if 'key' in json_req:
             self.session_manager.logout(json_req['key'])
-        return dict(logout=True)
+            if getattr(self.__batch, 'active', False) and json_req['key'] == self.__batch.key:
+                self.__batch.user = None
+        return App.logout_response
 
     def shutdown(self, json_req: dict) -> dict:
         """
@@ -110,15 +159,39 @@ class App(object):
             raise ValueError('json_req must be a dict')
 
         if not 'key' in json_req:
-            return dict(shutdown=False)
-        user = self.session_manager.get_user(json_req['key'])
+            return App.shutdown_denied_response
+        mode = json_req.get('mode', 'drain')
+        if not mode in App.shutdown_modes:
+            raise ValueError('mode must be one of ' + ', '.join(App.shutdown_modes))
+        user = self.__get_user(json_req['key'])
         if user is None:
-            return dict(shutdown=False)
-        if user['level'] == 'Administrator':
-            Helper.shutdown(delay=10)
-            return dict(shutdown=True)
+            return App.shutdown_denied_response
+        if user['level'] == 'Administrator' and Helper.shutdown(drain=mode == 'drain'):
+            return App.shutdown_response
         else:
-            return dict(shutdown=False)
+            return App.shutdown_denied_response
+
+    def restart(self, json_req: dict) -> dict:
+        """
+        Backend method for :py:meth:`ControllerFrontend.App.restart <.ControllerFrontend.App.restart>`
+
+        :param json_req: The JSON request dict
+        :return: Response as dictionary
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        if not 'key' in json_req:
+            return App.restart_denied_response
+        user = self.__get_user(json_req['key'])
+        if user is None or user['level'] != 'Administrator':
+            return App.restart_denied_response
+        if Helper.restart():
+            return App.restart_response
+        return App.restart_denied_response
 
     def get_session_count(self, json_req: dict) -> dict:
         """
@@ -135,11 +208,190 @@ class App(object):
             raise ValueError('json_req must be a dict')
 
         if not 'key' in json_req:
-            return dict(session_count=-1)
-        user = self.session_manager.get_user(json_req['key'])
+            return App.session_count_denied_response
+        user = self.__get_user(json_req['key'])
         if user is None:
-            return dict(session_count=-1)
+            return App.session_count_denied_response
         if user['level'] == 'Administrator':
             return dict(session_count=self.session_manager.get_current_sessions())
         else:
-            return dict(session_count=-1)
+            return App.session_count_denied_response
+
+    def get_admission_stats(self, json_req: dict) -> dict:
+        """
+        Backend method for :py:meth:`ControllerFrontend.App.get_admission_stats
+        <.ControllerFrontend.App.get_admission_stats>`
+
+        :param json_req: The JSON request dict
+        :return: Response as dictionary
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        if not 'key' in json_req:
+            return App.admission_stats_denied_response
+        user = self.__get_user(json_req['key'])
+        if user is None or user['level'] != 'Administrator':
+            return App.admission_stats_denied_response
+        return dict(admission=AdmissionController().metrics())
+
+    @staticmethod
+    def __number(json_req: dict, name: str, default):
+        """
+        Get a positive number out of a request
+
+        :param json_req: The JSON request dict
+        :param name: The name of the number
+        :param default: The value when it is missing
+        :return: The number
+        :raise ValueError: When it is not a positive number
+        """
+        value = json_req.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError('{:s} must be a positive number'.format(name))
+        return value
+
+    def profile(self, json_req: dict) -> dict:
+        """
+        Backend method for :py:meth:`ControllerFrontend.App.profile <.ControllerFrontend.App.profile>`
+
+        :param json_req: The JSON request dict
+        :return: Response as dictionary
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        if not 'key' in json_req:
+            return App.profile_denied_response
+        mode = json_req.get('mode', 'sample')
+        if not mode in profile_modes:
+            raise ValueError('mode must be one of ' + ', '.join(profile_modes))
+        duration = App.__number(json_req, 'duration', 5)
+        interval = App.__number(json_req, 'interval', 0.01)
+        every = App.__number(json_req, 'every', 1)
+        user = self.__get_user(json_req['key'])
+        if user is None or user['level'] != 'Administrator':
+            return App.profile_denied_response
+        if mode == 'sample':
+            result = Profiler().sample(duration, interval, json_req.get('all_threads', False) is True,
+                                       json_req.get('idle', False) is True)
+        else:
+            result = Profiler().deterministic(duration, int(every))
+        if result is None:
+            return App.profile_busy_response
+        result['mode'] = mode
+        return dict(profile=result)
+
+    def memory(self, json_req: dict) -> dict:
+        """
+        Backend method for :py:meth:`ControllerFrontend.App.memory <.ControllerFrontend.App.memory>`
+
+        :param json_req: The JSON request dict
+        :return: Response as dictionary
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        if not 'key' in json_req:
+            return App.memory_denied_response
+        action = json_req.get('action', 'status')
+        if not action in memory_actions:
+            raise ValueError('action must be one of ' + ', '.join(memory_actions))
+        frames = App.__number(json_req, 'frames', 1)
+        limit = App.__number(json_req, 'limit', 20)
+        user = self.__get_user(json_req['key'])
+        if user is None or user['level'] != 'Administrator':
+            return App.memory_denied_response
+        inspector = MemoryInspector()
+        if action == 'start':
+            result = inspector.start(int(frames))
+        elif action == 'stop':
+            result = inspector.stop()
+        elif action == 'snapshot':
+            result = inspector.snapshot(int(limit), json_req.get('traceback', False) is True)
+        else:
+            result = inspector.status()
+        return dict(memory=result)
+
+    def get_metrics(self, json_req: dict) -> str:
+        """
+        Backend method for :py:meth:`ControllerFrontend.MetricsApp.index <.ControllerFrontend.MetricsApp.index>`
+
+        :param json_req: The JSON request dict, with the session key taken from the ``Authorization`` header
+        :return: The metrics in the Prometheus text format, or None when they are not available
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        if not 'key' in json_req:
+            return None
+        user = self.__get_user(json_req['key'])
+        if user is None or user['level'] != 'Administrator':
+            return None
+        return Registry().render()
+
+    def batch(self, json_req: dict) -> dict:
+        """
+        Backend method for :py:meth:`ControllerFrontend.App.batch <.ControllerFrontend.App.batch>`
+
+        The session is looked up once for the whole batch. The calls are dispatched in order to the methods of this
+        class listed in :py:attr:`batch_methods`, with the session key added to their parameters.
+
+        :param json_req: The JSON request dict
+        :return: Response as dictionary
+        """
+
+        if json_req is None:
+            raise ValueError('json_req cannot be None')
+        if not isinstance(json_req, dict):
+            raise ValueError('json_req must be a dict')
+
+        calls = json_req.get('calls', None)
+        if not isinstance(calls, list):
+            return dict(batch=dict(success=False, reason='Calls must be a list'))
+        if len(calls) > App.batch_max_calls:
+            return dict(batch=dict(success=False, reason='Too many calls'))
+        key = json_req.get('key', None)
+        user = self.session_manager.get_user(key) if isinstance(key, str) else None
+        if user is None:
+            return dict(batch=dict(success=False, reason='Invalid session'))
+
+        results = list()
+        self.__batch.active = True
+        self.__batch.key = key
+        self.__batch.user = user
+        try:
+            for call in calls:
+                if not isinstance(call, dict) or not call.get('method', None) in App.batch_methods:
+                    results.append(dict(error='Unknown method'))
+                    continue
+                params = call.get('params', dict())
+                if not isinstance(params, dict):
+                    results.append(dict(error='Params must be an object'))
+                    continue
+                if self.__batch.user is None:
+                    results.append(dict(error='Invalid session'))
+                    continue
+                params = dict(params)
+                params['key'] = key
+                try:
+                    results.append(dict(result=getattr(self, call['method'])(params)))
+                except ValueError as e:
+                    results.append(dict(error=e.__str__()))
+        finally:
+            self.__batch.active = False
+            self.__batch.key = None
+            self.__batch.user = None
+        return dict(batch=dict(success=True, results=results))
@@ -21,6 +21,7 @@ This module contains the mapping between the CherryPy methods and the :py:mod:`C
 
 import cherrypy
 from arobito.controlinterface.ControllerBackend import App as Backend
+from arobito.controlinterface import Codec, Metrics
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -41,8 +42,8 @@ class App(object):
         self.backend = Backend()
 
     @cherrypy.expose
-    @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
     def auth(self) -> dict:
         """
         Answer to an authorization request.
@@ -93,8 +94,8 @@ class App(object):
         return self.backend.auth(cherrypy.request.json)
 
     @cherrypy.expose
-    @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
     def logout(self) -> dict:
         """
         Perform a logout with the given session key.
@@ -125,8 +126,8 @@ class App(object):
         return self.backend.logout(cherrypy.request.json)
 
     @cherrypy.expose
-    @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
     def shutdown(self) -> dict:
         """
         Initiate the shutdown for the controlling application.
@@ -137,10 +138,13 @@ class App(object):
         .. code-block:: javascript
 
            {
-             'key': 'The Session Key'
+             'key': 'The Session Key',
+             'mode': 'drain'
            }
 
-        The shutdown will be initiated within the next 10 seconds.
+        The ``mode`` is optional. With ``drain``, the server stops accepting and the requests in flight get the
+        ``drain-timeout`` of the server to finish. With ``immediate``, they are aborted. Then the sessions are written
+        and the application exits, see :py:mod:`Shutdown <arobito.controlinterface.Shutdown>`.
 
         In case of success, the response looks like the following:
 
@@ -150,7 +154,7 @@ class App(object):
              'shutdown': true
            }
 
-        The request fails on insufficient rights. The response is in this cases:
+        The request fails on insufficient rights and while a shutdown is running. The response is in this cases:
 
         .. code-block:: javascript
 
@@ -168,8 +172,48 @@ class App(object):
         return self.backend.shutdown(cherrypy.request.json)
 
     @cherrypy.expose
-    @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
+    def restart(self) -> dict:
+        """
+        Restart the controlling application without closing its port, e.g. after an upgrade.
+
+        This is only available to users of the level ``Administrator``. The request looks like this:
+
+        .. code-block:: javascript
+
+           {
+             'key': 'The Session Key'
+           }
+
+        A new process is started and takes over the listening socket. Once it is ready, this process finishes the
+        requests it is serving and exits. The sessions are handed over as well. In case of success, the response looks
+        like the following:
+
+        .. code-block:: javascript
+
+           {
+             'restart': true
+           }
+
+        The request fails on insufficient rights, in the worker process mode and while a restart is running:
+
+        .. code-block:: javascript
+
+           {
+             'restart': false
+           }
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.restart
+        <.ControllerBackend.App.restart>`.
+
+        :return: The response as dict
+        """
+        return self.backend.restart(cherrypy.request.json)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
     def get_session_count(self) -> dict:
         """
         Get the current session count.
@@ -207,3 +251,297 @@ class App(object):
         :return: The response as dict
         """
         return self.backend.get_session_count(cherrypy.request.json)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
+    def get_admission_stats(self) -> dict:
+        """
+        Get the state of the admission control, see :py:mod:`Admission <arobito.controlinterface.Admission>`.
+
+        This is only available to users of the level ``Administrator``. The request must be a JSON post and looks like
+        this:
+
+        .. code-block:: javascript
+
+           {
+             'key': 'The Session Key'
+           }
+
+        In case of success, the limits, the requests in flight, the average processing time in seconds and the counters
+        of every lane are returned:
+
+        .. code-block:: javascript
+
+           {
+             'admission':
+             {
+               'limit': 6,
+               'queue_size': 3,
+               'slo': 1.0,
+               'in_flight': 1,
+               'service_time': 0.004,
+               'lanes':
+               {
+                 'priority': { 'waiting': 0, 'admitted': 12, 'rejected': 0, 'shed': 0 },
+                 'interactive': { 'waiting': 0, 'admitted': 140, 'rejected': 3, 'shed': 1 },
+                 'expensive': { 'waiting': 0, 'admitted': 20, 'rejected': 5, 'shed': 2 }
+               }
+             }
+           }
+
+        If there are insufficient rights, the response is:
+
+        .. code-block:: javascript
+
+           {
+             'admission': null
+           }
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.get_admission_stats
+        <.ControllerBackend.App.get_admission_stats>`.
+
+        :return: The response as dict
+        """
+        return self.backend.get_admission_stats(cherrypy.request.json)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
+    def profile(self) -> dict:
+        """
+        Profile the running interface for some seconds, see :py:mod:`Profiler <arobito.controlinterface.Profiler>`.
+
+        This is only available to users of the level ``Administrator``. The response is sent when the run is over. To
+        sample the stacks of the worker threads every 10 milliseconds for 5 seconds, the following JSON needs to be
+        posted:
+
+        .. code-block:: javascript
+
+           {
+             'key': 'The Session Key',
+             'mode': 'sample',
+             'duration': 5,
+             'interval': 0.01
+           }
+
+        ``all_threads`` and ``idle`` may be set to ``true`` to sample all threads, and to keep the samples of idle
+        threads. The response contains the collapsed stacks for a flame graph:
+
+        .. code-block:: javascript
+
+           {
+             'profile':
+             {
+               'mode': 'sample',
+               'samples': 500,
+               'threads': 2,
+               'stacks': 'threading.py:_bootstrap;...;Base.py:hash_password 48\\n...'
+             }
+           }
+
+        With ``'mode': 'cprofile'``, every n-th ``/app`` request given by ``every`` (1 by default) is profiled
+        with :py:mod:`cProfile` for the duration. The response contains the number of requests profiled and the
+        functions with the highest cumulative time:
+
+        .. code-block:: javascript
+
+           {
+             'profile':
+             {
+               'mode': 'cprofile',
+               'requests': 12,
+               'stats': '   ncalls  tottime  percall  cumtime  percall filename:lineno(function)\\n...'
+             }
+           }
+
+        While another run is going on, the response is:
+
+        .. code-block:: javascript
+
+           {
+             'profile': { 'busy': true }
+           }
+
+        If there are insufficient rights, the response is:
+
+        .. code-block:: javascript
+
+           {
+             'profile': null
+           }
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.profile
+        <.ControllerBackend.App.profile>`.
+
+        :return: The response as dict
+        """
+        return self.backend.profile(cherrypy.request.json)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
+    def memory(self) -> dict:
+        """
+        Look into the memory of the running interface, see :py:mod:`Memory <arobito.controlinterface.Memory>`.
+
+        This is only available to users of the level ``Administrator``. The ``action`` is one of ``status`` (the
+        default), ``start`` and ``stop`` to start and stop tracing the allocations, and ``snapshot``. To start tracing
+        with 5 frames per allocation, the following JSON needs to be posted:
+
+        .. code-block:: javascript
+
+           {
+             'key': 'The Session Key',
+             'action': 'start',
+             'frames': 5
+           }
+
+        Every response contains the state of the tracing, the memory of the process and the sizes of the tables that
+        grow with the use of the interface:
+
+        .. code-block:: javascript
+
+           {
+             'memory':
+             {
+               'tracing': true,
+               'frames': 5,
+               'traced': 1048576,
+               'traced_peak': 2097152,
+               'process': { 'rss': 31457280, 'rss_peak': 33554432 },
+               'tables': { 'sessions': 3, 'response_cache': 12, 'response_cache_bytes': 640, 'requests_in_flight': 1 }
+             }
+           }
+
+        A ``snapshot`` adds the ``limit`` (20 by default) allocation sites holding the most memory, and the sites that
+        changed the most since the previous snapshot. With ``'traceback': true``, the allocations are grouped by
+        their whole traceback instead of the allocating line:
+
+        .. code-block:: javascript
+
+           {
+             'memory':
+             {
+               'tracing': true,
+               ...
+               'top': [ { 'site': '.../BackendManager.py:162', 'size': 52000, 'count': 400 }, ... ],
+               'diff': [ { 'site': '.../BackendManager.py:162', 'size': 52000, 'size_diff': 13000, 'count': 400,
+                           'count_diff': 100 }, ... ]
+             }
+           }
+
+        ``top`` is ``null`` when not tracing, ``diff`` also for the first snapshot. If there are insufficient rights,
+        the response is:
+
+        .. code-block:: javascript
+
+           {
+             'memory': null
+           }
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.memory
+        <.ControllerBackend.App.memory>`.
+
+        :return: The response as dict
+        """
+        return self.backend.memory(cherrypy.request.json)
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in(**Codec.json_in_options)
+    @cherrypy.tools.json_out(**Codec.json_out_options)
+    def batch(self) -> dict:
+        """
+        Run several calls with one request.
+
+        The calls are run in the given order, all with the same session key. The session is checked only once. The
+        request must be a JSON post and looks like this:
+
+        .. code-block:: javascript
+
+           {
+             'key': 'The Session Key',
+             'calls':
+             [
+               { 'method': 'get_session_count', 'params': {} },
+               { 'method': 'unknown' }
+             ]
+           }
+
+        Allowed methods are ``get_session_count``, ``shutdown`` and ``logout``. The ``params`` are optional. The
+        response contains a result or an error for each call, in the same order:
+
+        .. code-block:: javascript
+
+           {
+             'batch':
+             {
+               'success': true,
+               'results':
+               [
+                 { 'result': { 'session_count': 1 } },
+                 { 'error': 'Unknown method' }
+               ]
+             }
+           }
+
+        On an invalid session or an invalid request, no call is run:
+
+        .. code-block:: javascript
+
+           {
+             'batch':
+             {
+               'success': false,
+               'reason': 'Invalid session'
+             }
+           }
+
+        The dict returned by this method is converted to JSON by CherryPy.
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.batch
+        <.ControllerBackend.App.batch>`.
+
+        :return: The response as dict
+        """
+        return self.backend.batch(cherrypy.request.json)
+
+
+class MetricsApp(object):
+    """
+    The metrics of the interface for Prometheus, see :py:mod:`Metrics <arobito.controlinterface.Metrics>`
+    """
+
+    def __init__(self):
+        """
+        Initialize the backend
+        """
+        self.backend = Backend()
+
+    @cherrypy.expose
+    def index(self) -> bytes:
+        """
+        Render the metrics in the Prometheus text format.
+
+        This is only available to users of the level ``Administrator``. The session key is sent as bearer token, which
+        Prometheus supports with the ``authorization`` option of a scrape config:
+
+        .. code-block:: bash
+
+           GET /metrics
+           Authorization: Bearer The Session Key
+
+        Without a valid key of an administrator, the response is ``401 Unauthorized``.
+
+        This method refers to the backend method :py:meth:`ControllerBackend.App.get_metrics
+        <.ControllerBackend.App.get_metrics>`.
+
+        :return: The metrics
+        """
+        text = self.backend.get_metrics(dict(key=Metrics.bearer_key(cherrypy.request.headers.get('Authorization'))))
+        if text is None:
+            cherrypy.response.headers['WWW-Authenticate'] = 'Bearer'
+            raise cherrypy.HTTPError(401, 'A session key of an administrator is required')
+        cherrypy.response.headers['Content-Type'] = Metrics.content_type
+        cherrypy.response.headers['Cache-Control'] = 'no-store'
+        return text.encode('utf-8')
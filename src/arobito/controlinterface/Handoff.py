@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module restarts the control interface without closing its listening socket (POSIX only).
+
+A restart is requested with ``SIGHUP`` or by an administrator on ``/app/restart``. The running process then starts a
+new process with the same command line and passes the listening socket as file descriptor 3, the way systemd socket
+activation does (``LISTEN_FDS`` and ``LISTEN_PID``). Connections arriving in the meantime wait in the backlog of the
+socket, so no client is refused. The new process reports on a pipe when it serves. Then the old process stops
+accepting, finishes the requests it is busy with and exits. If the new process fails, the old one keeps serving.
+
+The sessions of the in-memory store are passed in a file that only the owner can read. Logins in the old process after
+the new one was started are lost. Push WebSockets are closed with the old process, so clients reconnect.
+
+With ``--pidfile``, the process serving the port writes its process ID to that file, so scripts find the new process.
+"""
+
+import json
+import os
+import select
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from cherrypy.process import plugins
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from arobito import FsTools, Helper
+from arobito.controlinterface import LogWriter
+from arobito.controlinterface.BackendManager import SessionManager
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The file descriptor of the inherited listening socket
+listen_fd = 3
+
+#: The file descriptor of the pipe to report readiness on
+ready_fd = 4
+
+#: The environment variable naming the descriptor to report readiness on
+ready_variable = 'AROBITO_READY_FD'
+
+#: The environment variable naming the file with the handed over sessions
+sessions_variable = 'AROBITO_SESSIONS'
+
+
+def inherited_socket() -> socket.socket:
+    """
+    Take over a listening socket passed by the previous process or by systemd
+
+    ``LISTEN_PID`` is set to this process, which makes the CherryPy server use the socket as well.
+
+    :return: The socket or None when there is none
+    """
+    if os.environ.get('LISTEN_FDS', '') != '1':
+        return None
+    if os.environ.get('LISTEN_PID', str(os.getpid())) != str(os.getpid()):
+        return None
+    try:
+        listening = socket.socket(fileno=listen_fd)
+    except OSError:
+        return None
+    listening.set_inheritable(False)
+    os.environ['LISTEN_PID'] = str(os.getpid())
+    return listening
+
+
+def import_sessions() -> int:
+    """
+    Take over the sessions handed over by the previous process and delete their file
+
+    :return: The number of sessions imported
+    """
+    file_name = os.environ.pop(sessions_variable, None)
+    if file_name is None:
+        return 0
+    try:
+        with open(file_name, 'r') as fh:
+            sessions = json.load(fh)
+        SessionManager().import_sessions(sessions)
+        return len(sessions)
+    except (IOError, ValueError) as e:
+        LogWriter.report('error', 'handoff_import_failed',
+                         'Handoff: Cannot import the sessions: {:s}'.format(e.__str__()))
+        return 0
+    finally:
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
+
+
+class Handoff(plugins.SimplePlugin):
+    """
+    Engine plugin restarting the process with a socket handoff, and the receiving side of it
+    """
+
+    #: Seconds the new process gets to report that it serves
+    ready_timeout = 60.0
+
+    def __init__(self, bus, pid_file: str=None, arguments: list=None):
+        """
+        Prepare the plugin
+
+        :param bus: The CherryPy engine
+        :param pid_file: The file to write the process ID to once serving, or None
+        :param arguments: The command line of the new process, by default the one of this process
+        """
+        plugins.SimplePlugin.__init__(self, bus)
+        self.pid_file = pid_file
+        if arguments is None:
+            arguments = [sys.executable] + list(getattr(sys, 'orig_argv', [sys.executable] + sys.argv)[1:])
+        self.arguments = arguments
+        self.listening = None
+        self.__lock = threading.Lock()
+        self.__restarting = False
+
+    def subscribe(self) -> None:
+        """
+        Register with the engine and for ``SIGHUP``
+        """
+        plugins.SimplePlugin.subscribe(self)
+        self.bus.subscribe(Helper.serving_channel, self.serving)
+        self.bus.subscribe(Helper.restart_channel, self.restart)
+        if hasattr(signal, 'SIGHUP') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGHUP, lambda signal_number, frame: self.restart())
+
+    def unsubscribe(self) -> None:
+        """
+        Unregister from the engine
+        """
+        plugins.SimplePlugin.unsubscribe(self)
+        self.bus.unsubscribe(Helper.serving_channel, self.serving)
+        self.bus.unsubscribe(Helper.restart_channel, self.restart)
+
+    def serving(self, listening) -> None:
+        """
+        Remember the listening socket, report readiness to the previous process and write the PID file
+
+        :param listening: The listening socket
+        """
+        self.listening = listening
+        fd = os.environ.pop(ready_variable, None)
+        if fd is not None:
+            try:
+                os.write(int(fd), b'ready')
+                os.close(int(fd))
+            except (OSError, ValueError) as e:
+                LogWriter.report('error', 'handoff_ready_failed',
+                                 'Handoff: Cannot report readiness: {:s}'.format(e.__str__()))
+        if self.pid_file is not None:
+            with open(self.pid_file, 'w') as fh:
+                fh.write('{:d}\n'.format(os.getpid()))
+
+    def exit(self) -> None:
+        """
+        Remove the PID file, unless another process wrote it already
+        """
+        if self.pid_file is None:
+            return
+        try:
+            with open(self.pid_file, 'r') as fh:
+                if fh.read().strip() == str(os.getpid()):
+                    os.remove(self.pid_file)
+        except (IOError, OSError):
+            pass
+
+    def restart(self) -> bool:
+        """
+        Start a restart in the background
+
+        :return: True when the restart was started, False without a listening socket, on platforms without
+                 ``posix_spawn`` or when one is running already
+        """
+        if fcntl is None or not hasattr(os, 'posix_spawn'):
+            return False
+        with self.__lock:
+            if self.__restarting or self.listening is None or self.bus.state != self.bus.states.STARTED:
+                return False
+            self.__restarting = True
+        threading.Thread(target=self.__restart, name='Handoff').start()
+        return True
+
+    def __restart(self) -> None:
+        """
+        Start the new process, wait for it and exit this one
+        """
+        try:
+            pid, read_end, sessions_file = self.__spawn()
+            if self.__wait_ready(pid, read_end):
+                self.bus.log('Handoff: Process {:d} took over, exiting'.format(pid))
+                self.bus.exit()
+                return
+            LogWriter.report('warning', 'handoff_failed', 'Handoff: The new process did not come up, keeping this one')
+            if sessions_file is not None and os.path.isfile(sessions_file):
+                os.remove(sessions_file)
+        except Exception as e:
+            LogWriter.report('error', 'handoff_failed', 'Handoff: Restart failed: {:s}'.format(e.__str__()),
+                             stack=traceback.format_exc())
+        with self.__lock:
+            self.__restarting = False
+
+    def __spawn(self) -> tuple:
+        """
+        Start the new process with the listening socket and the write end of the readiness pipe
+
+        :return: The process ID, the read end of the readiness pipe and the sessions file or None
+        """
+        read_end, write_end = os.pipe()
+        minimum = 10
+        duplicate = getattr(fcntl, 'F_DUPFD_CLOEXEC', fcntl.F_DUPFD)
+        passed_socket = fcntl.fcntl(self.listening.fileno(), duplicate, minimum)
+        passed_pipe = fcntl.fcntl(write_end, duplicate, minimum)
+        os.close(write_end)
+        environment = dict((name, value) for name, value in os.environ.items()
+                           if name not in ('LISTEN_FDS', 'LISTEN_PID', ready_variable, sessions_variable))
+        environment['LISTEN_FDS'] = '1'
+        environment[ready_variable] = str(ready_fd)
+        sessions = SessionManager().export_sessions()
+        file_name = None
+        if sessions is not None:
+            handle, file_name = tempfile.mkstemp(prefix='sessions-', suffix='.json', dir=FsTools.get_config_folder())
+            with os.fdopen(handle, 'w') as fh:
+                json.dump(sessions, fh)
+            environment[sessions_variable] = file_name
+        try:
+            pid = os.posix_spawn(self.arguments[0], self.arguments, environment,
+                                 file_actions=[(os.POSIX_SPAWN_DUP2, passed_socket, listen_fd),
+                                               (os.POSIX_SPAWN_DUP2, passed_pipe, ready_fd)])
+            return pid, read_end, file_name
+        except OSError:
+            os.close(read_end)
+            if file_name is not None:
+                os.remove(file_name)
+            raise
+        finally:
+            os.close(passed_socket)
+            os.close(passed_pipe)
+
+    def __wait_ready(self, pid: int, read_end: int) -> bool:
+        """
+        Wait for the new process to report readiness
+
+        :param pid: The process ID of the new process
+        :param read_end: The read end of the readiness pipe, closed afterwards
+        :return: True when it is ready, False when it failed; it is terminated then
+        """
+        deadline = time.monotonic() + self.ready_timeout
+        message = b''
+        try:
+            while time.monotonic() < deadline:
+                readable = select.select([read_end], [], [], 0.5)[0]
+                if readable:
+                    data = os.read(read_end, 16)
+                    if not data:
+                        break
+                    message += data
+                    if message == b'ready':
+                        return True
+                if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                    return False
+        finally:
+            os.close(read_end)
+        try:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+        return False
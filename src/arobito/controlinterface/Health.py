@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module answers the probes of load balancers and service managers.
+
+* ``/health/live`` answers ``200`` as long as the process serves requests at all.
+* ``/health/ready`` answers ``200`` when the interface can serve ``/app`` requests, and ``503`` with the reason
+  otherwise: The backend is locked (``locked``), the engine is still starting (``starting``) or not running any more
+  (``stopping``), or all workers are busy and more requests wait for one (``saturated``).
+
+The probes are meant to be sent every second, so they are as cheap as possible: In the CherryPy server, they are a
+plain WSGI application grafted next to the CherryPy applications, so no tool, dispatcher or session lookup runs. The
+response bodies are built once. The probes are not subject to the :py:mod:`Admission
+<arobito.controlinterface.Admission>` control.
+"""
+
+import json
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The reasons for not being ready
+not_ready_reasons = ('locked', 'starting', 'stopping', 'saturated')
+
+
+def build_response(status: int, document: dict) -> tuple:
+    """
+    Build a response once
+
+    :param status: The status code
+    :param document: The JSON document of the body
+    :return: A tuple of the status code, the headers and the body
+    """
+    body = json.dumps(document, separators=(',', ':')).encode('utf-8')
+    return status, [('Content-Type', 'application/json'), ('Cache-Control', 'no-store')], body
+
+
+#: The response to a liveness probe
+live_response = build_response(200, dict(live=True))
+
+#: The response to a readiness probe when ready
+ready_response = build_response(200, dict(ready=True))
+
+#: The responses to a readiness probe when not ready, by reason
+not_ready_responses = dict((reason, build_response(503, dict(ready=False, reason=reason)))
+                           for reason in not_ready_reasons)
+
+#: The status lines of the WSGI responses
+status_lines = {200: '200 OK', 404: '404 Not Found', 405: '405 Method Not Allowed', 503: '503 Service Unavailable'}
+
+
+class Health(object):
+    """
+    The health probes, as a WSGI application and for the :py:class:`AsyncServer
+    <arobito.controlinterface.AsyncServer.AsyncServer>`
+    """
+
+    def __init__(self, backend, bus=None, saturated=None):
+        """
+        Prepare the probes
+
+        :param backend: The :py:class:`ControllerBackend.App <arobito.controlinterface.ControllerBackend.App>` serving
+                        the ``/app`` requests
+        :param bus: The CherryPy engine, or None to ignore its state
+        :param saturated: A callable telling whether all workers are busy and more requests wait, or None
+        """
+        self.backend = backend
+        self.bus = bus
+        self.saturated = saturated
+        self.__responses = dict(live=self.live, ready=self.ready)
+
+    def live(self) -> tuple:
+        """
+        Answer a liveness probe
+
+        :return: A tuple of the status code, the headers and the body
+        """
+        return live_response
+
+    def ready(self) -> tuple:
+        """
+        Answer a readiness probe
+
+        :return: A tuple of the status code, the headers and the body
+        """
+        if self.backend.locked:
+            return not_ready_responses['locked']
+        if self.bus is not None and self.bus.state != self.bus.states.STARTED:
+            return not_ready_responses['starting' if self.bus.state == self.bus.states.STARTING else 'stopping']
+        if self.saturated is not None and self.saturated():
+            return not_ready_responses['saturated']
+        return ready_response
+
+    def respond(self, method: str, probe: str) -> tuple:
+        """
+        Answer a request below ``/health``
+
+        :param method: The request method
+        :param probe: The path below ``/health``, without slashes
+        :return: A tuple of the status code, the headers and the body, or None when the probe does not exist
+        """
+        if probe not in self.__responses:
+            return None
+        if method not in ('GET', 'HEAD'):
+            return 405, [('Allow', 'GET, HEAD'), ('Content-Type', 'text/plain')], b'Method Not Allowed'
+        status, headers, body = self.__responses[probe]()
+        return status, headers, body if method == 'GET' else b''
+
+    def __call__(self, environ: dict, start_response) -> list:
+        """
+        Answer a request as a WSGI application
+
+        :param environ: The WSGI environment
+        :param start_response: The WSGI callable to start the response
+        :return: The response body
+        """
+        response = self.respond(environ['REQUEST_METHOD'], environ.get('PATH_INFO', '').strip('/'))
+        if response is None:
+            response = 404, [('Content-Type', 'text/plain')], b'Not Found'
+        status, headers, body = response
+        start_response(status_lines[status], headers + [('Content-Length', str(len(body)))])
+        return [body]
+
+
+def pool_saturated(pool) -> bool:
+    """
+    Tell whether all workers of a CherryPy thread pool are busy and connections wait for one
+
+    :param pool: The thread pool of the HTTP server
+    :return: True when saturated
+    """
+    return pool.idle <= 0 and pool.qsize > 0
@@ -0,0 +1,478 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module writes the access and error log of the control interface, without holding up the workers.
+
+A record is a dict, written as one line of JSON. The workers only append it to a bounded queue in memory; a single
+writer thread takes the records out in batches, encodes them and writes every batch at once. When the queue is full,
+records are dropped, counted in the ``log_records_dropped_total`` counter of the :py:mod:`Metrics
+<arobito.controlinterface.Metrics>` and reported by a ``log_dropped`` record as soon as there is room again.
+
+Messages (all records but the access records) are thinned out per ``log-interval``: a message identical to one written
+within the interval is not written again, and of each event at most :py:data:`event_burst` messages are written. The
+messages left out are reported by a ``suppressed`` record at the end of the interval, with their numbers per event.
+Messages that may come up before the writer starts or after it stops, e.g. of the shutdown or the worker processes,
+go through :py:func:`report`, which prints them to the error output while the writer does not run.
+
+The options are read from the ``[Server]`` section of ``controller.ini``:
+
+* ``access-log``: Write a record for every request
+* ``log-file``: The file to write to, the error output when empty. It is rotated when it grows beyond
+  ``log-max-bytes``, keeping ``log-backups`` old files. With several worker processes, all workers append to the same
+  file: The first to find it full rotates it while holding a lock on ``<log-file>.lock``, the others notice the file
+  was replaced and reopen it.
+* ``log-queue``: The number of records the queue holds
+* ``log-interval``: The seconds of the deduplication interval
+
+Records look like this:
+
+.. code-block:: javascript
+
+   {"ts":"2014-06-01T12:00:00.123Z","level":"access","method":"GET","path":"/static/index.html","status":200,
+    "bytes":1234,"ms":1.52,"remote":"192.168.1.2"}
+   {"ts":"2014-06-01T12:00:01.456Z","level":"warning","event":"static_not_found","message":"File does not exist: ..."}
+"""
+
+import collections
+import os
+import threading
+import time
+from sys import stderr
+import cherrypy
+from cherrypy.process import plugins
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from arobito.Base import SingletonMeta
+from arobito.controlinterface import Codec, Metrics
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The maximum number of messages of an event written per interval
+event_burst = 20
+
+#: The maximum number of records written at once
+batch_size = 512
+
+#: The seconds the writer waits for further records before it writes a batch
+flush_delay = 0.2
+
+#: The number of characters a message is cut to
+max_message = 4096
+
+
+def timestamp(seconds: float) -> str:
+    """
+    Format a point in time for a record
+
+    :param seconds: The seconds since the epoch
+    :return: The time in UTC as ISO 8601 with milliseconds
+    """
+    return '{:s}.{:03d}Z'.format(time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)),
+                                 int(seconds * 1000) % 1000)
+
+
+class LogWriter(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, queues the records and writes them in its own thread
+    """
+
+    #: The name of the writer thread
+    thread_name = 'LogWriter'
+
+    #: The counter of the :py:mod:`Metrics <arobito.controlinterface.Metrics>` for the records dropped
+    dropped_counter = 'log_records_dropped'
+
+    def __init__(self):
+        """
+        Start unconfigured: Writing to the error output, without access records
+        """
+        self.file_name = None
+        self.max_bytes = 10485760
+        self.backups = 3
+        self.queue_size = 10000
+        self.interval = 10.0
+        #: True to write a record for every request
+        self.access_enabled = False
+        #: The number of records dropped as the queue was full
+        self.dropped = 0
+        self.__condition = threading.Condition()
+        self.__queue = collections.deque()
+        self.__unreported = 0
+        self.__seen = set()
+        self.__events = dict()
+        self.__suppressed = dict()
+        self.__interval_start = time.monotonic()
+        self.__thread = None
+        self.__stopping = False
+        self.__file = None
+        self.__size = 0
+
+    def configure(self, file_name: str=None, max_bytes: int=10485760, backups: int=3, queue_size: int=10000,
+                  interval: float=10.0, access: bool=False) -> None:
+        """
+        Set the options
+
+        :param file_name: The file to write to, None or empty for the error output
+        :param max_bytes: The size after which the file is rotated, 0 to never rotate it
+        :param backups: The number of old files kept
+        :param queue_size: The number of records the queue holds
+        :param interval: The seconds of the deduplication interval
+        :param access: True to write a record for every request
+        """
+        self.file_name = file_name if file_name else None
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue_size = queue_size
+        self.interval = interval
+        self.access_enabled = access
+
+    def write(self, record: dict) -> bool:
+        """
+        Queue a record
+
+        :param record: The record; a ``ts`` is added
+        :return: False when it was dropped as the queue is full
+        """
+        record['ts'] = time.time()
+        with self.__condition:
+            if len(self.__queue) >= self.queue_size:
+                self.dropped += 1
+                self.__unreported += 1
+                Metrics.Registry().count(self.dropped_counter)
+                return False
+            self.__queue.append(record)
+            if len(self.__queue) == 1 or len(self.__queue) >= batch_size:
+                self.__condition.notify()
+        return True
+
+    def log(self, level: str, event: str, message: str, **fields) -> bool:
+        """
+        Queue a message, unless it is suppressed in the current interval
+
+        :param level: The level, e.g. ``warning`` or ``error``
+        :param event: A short name of the kind of the message, e.g. ``static_not_found``
+        :param message: The message
+        :param fields: Further fields of the record
+        :return: False when it was suppressed or dropped
+        """
+        with self.__condition:
+            key = (event, message)
+            if key in self.__seen or self.__events.get(event, 0) >= event_burst:
+                self.__suppressed[event] = self.__suppressed.get(event, 0) + 1
+                return False
+            self.__seen.add(key)
+            self.__events[event] = self.__events.get(event, 0) + 1
+        return self.write(dict(level=level, event=event, message=message[:max_message], **fields))
+
+    def access(self, method: str, path: str, status: int, length: int, elapsed: float, remote: str=None,
+               request_id: str=None) -> None:
+        """
+        Queue the access record of a request, when enabled
+
+        :param method: The request method
+        :param path: The request path
+        :param status: The status code of the response
+        :param length: The size of the response body in bytes
+        :param elapsed: The seconds the request took
+        :param remote: The address of the client, if known
+        :param request_id: The ID of the request, if the client sent one
+        """
+        if not self.access_enabled:
+            return
+        record = dict(level='access', method=method, path=path, status=status, bytes=length,
+                      ms=round(elapsed * 1000, 2))
+        if remote is not None:
+            record['remote'] = remote
+        if request_id is not None:
+            record['request_id'] = request_id
+        self.write(record)
+
+    @property
+    def running(self) -> bool:
+        """
+        True while the writer thread runs and is not stopping
+        """
+        with self.__condition:
+            return self.__thread is not None and not self.__stopping
+
+    def start(self) -> None:
+        """
+        Start the writer thread
+        """
+        with self.__condition:
+            if self.__thread is not None:
+                return
+            self.__stopping = False
+            self.__thread = threading.Thread(target=self.__run, name=self.thread_name, daemon=True)
+        self.__thread.start()
+
+    def stop(self, timeout: float=5.0) -> None:
+        """
+        Write the records queued and stop the writer thread
+
+        :param timeout: The seconds to wait for the writer
+        """
+        with self.__condition:
+            thread = self.__thread
+            if thread is None:
+                return
+            self.__stopping = True
+            self.__condition.notify()
+        thread.join(timeout)
+        with self.__condition:
+            self.__thread = None
+
+    def __take(self) -> list:
+        """
+        Wait for records and take a batch out of the queue, with the reports due
+
+        :return: The records, empty when stopping without records left
+        """
+        with self.__condition:
+            if not self.__queue and not self.__stopping:
+                self.__condition.wait(max(0.0, self.__interval_start + self.interval - time.monotonic()))
+            if 0 < len(self.__queue) < batch_size and not self.__stopping:
+                self.__condition.wait(flush_delay)
+            records = list()
+            while self.__queue and len(records) < batch_size:
+                records.append(self.__queue.popleft())
+            now = time.monotonic()
+            if self.__unreported > 0 and len(self.__queue) < self.queue_size:
+                records.append(dict(level='warning', event='log_dropped', dropped=self.__unreported, ts=time.time()))
+                self.__unreported = 0
+            if now >= self.__interval_start + self.interval or (self.__stopping and not self.__queue):
+                if self.__suppressed:
+                    records.append(dict(level='info', event='suppressed', suppressed=self.__suppressed,
+                                        ts=time.time()))
+                self.__suppressed = dict()
+                self.__seen = set()
+                self.__events = dict()
+                self.__interval_start = now
+        return records
+
+    def __run(self) -> None:
+        """
+        Write the records until stopped
+        """
+        while True:
+            records = self.__take()
+            if records:
+                self.__emit(records)
+            with self.__condition:
+                if self.__stopping and not self.__queue:
+                    break
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __emit(self, records: list) -> None:
+        """
+        Encode and write a batch of records
+
+        :param records: The records
+        """
+        encode = Codec.current.encode
+        lines = list()
+        for record in records:
+            record['ts'] = timestamp(record['ts'])
+            try:
+                lines.append(encode(record))
+            except (TypeError, ValueError, OverflowError):
+                lines.append(encode(dict(ts=record['ts'], level='error', event='log_unencodable',
+                                         message=repr(record)[:max_message])))
+        data = b'\n'.join(lines) + b'\n'
+        try:
+            if self.file_name is None:
+                stderr.write(data.decode('utf-8'))
+                stderr.flush()
+                return
+            if self.__file is not None and self.__replaced():
+                self.__file.close()
+                self.__file = None
+            if self.__file is None:
+                self.__open()
+            self.__file.write(data)
+            self.__file.flush()
+            self.__size = os.fstat(self.__file.fileno()).st_size
+            if 0 < self.max_bytes <= self.__size:
+                self.__rotate()
+        except (IOError, OSError) as e:
+            print('Log Writer: Cannot write "{:s}": {:s}'.format(str(self.file_name), e.__str__()), file=stderr)
+            self.__file = None
+
+    def __open(self) -> None:
+        """
+        Open the file for appending
+        """
+        self.__file = open(self.file_name, 'ab')
+        self.__size = self.__file.tell()
+
+    def __replaced(self) -> bool:
+        """
+        Check whether the open file was rotated by another process
+
+        :return: True when the file name no longer points to the open file
+        """
+        try:
+            return os.stat(self.file_name).st_ino != os.fstat(self.__file.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def __rotate(self) -> None:
+        """
+        Rotate the file: ``log`` becomes ``log.1``, ``log.1`` becomes ``log.2`` and so on; a new file is opened on
+        the next write
+
+        Other processes writing the same file are kept out by a lock; when one of them rotated the file in the meantime,
+        it is not rotated again.
+        """
+        self.__file.close()
+        self.__file = None
+        with open(self.file_name + '.lock', 'ab') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(self.file_name) or os.path.getsize(self.file_name) < self.max_bytes:
+                    return
+                if self.backups <= 0:
+                    os.remove(self.file_name)
+                    return
+                for number in range(self.backups - 1, 0, -1):
+                    name = '{:s}.{:d}'.format(self.file_name, number)
+                    if os.path.exists(name):
+                        os.replace(name, '{:s}.{:d}'.format(self.file_name, number + 1))
+                os.replace(self.file_name, self.file_name + '.1')
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def log(level: str, event: str, message: str, **fields) -> bool:
+    """
+    Queue a message, see :py:meth:`LogWriter.log <.LogWriter.log>`
+
+    :param level: The level, e.g. ``warning`` or ``error``
+    :param event: A short name of the kind of the message
+    :param message: The message
+    :param fields: Further fields of the record
+    :return: False when it was suppressed or dropped
+    """
+    return LogWriter().log(level, event, message, **fields)
+
+
+def report(level: str, event: str, message: str, **fields) -> bool:
+    """
+    Queue a message while the writer runs, or print it to the error output before it starts and after it stops
+
+    :param level: The level, e.g. ``warning`` or ``error``
+    :param event: A short name of the kind of the message
+    :param message: The message
+    :param fields: Further fields of the record; a ``stack`` is printed below the message
+    :return: False when it was suppressed or dropped
+    """
+    writer = LogWriter()
+    if writer.running:
+        return writer.log(level, event, message, **fields)
+    print(message, file=stderr)
+    if 'stack' in fields:
+        print(fields['stack'], end='', file=stderr)
+    return True
+
+
+class LogPlugin(plugins.SimplePlugin):
+    """
+    Engine plugin running the writer thread of the :py:class:`LogWriter` while the engine runs
+    """
+
+    def __init__(self, bus, writer=LogWriter):
+        """
+        Create the plugin
+
+        :param bus: The engine
+        :param writer: The class of the writer, :py:class:`LogWriter` or a subclass
+        """
+        plugins.SimplePlugin.__init__(self, bus)
+        self.writer = writer
+
+    def start(self) -> None:
+        """
+        Start the writer
+        """
+        self.writer().start()
+
+    start.priority = 10
+
+    def stop(self) -> None:
+        """
+        Write the records left and stop the writer
+        """
+        self.writer().stop()
+
+    stop.priority = 90
+
+
+class AccessLogTool(cherrypy.Tool):
+    """
+    The CherryPy tool writing the access records
+    """
+
+    def __init__(self):
+        """
+        Take the start when the resource is found
+        """
+        cherrypy.Tool.__init__(self, 'on_start_resource', self.start, priority=0)
+
+    def _setup(self) -> None:
+        """
+        Hook the record into the end of the request
+        """
+        cherrypy.Tool._setup(self)
+        cherrypy.request.hooks.attach('on_end_request', self.finish, priority=100)
+
+    @staticmethod
+    def start() -> None:
+        """
+        Take the start of the request
+        """
+        cherrypy.request.access_started = time.perf_counter()
+
+    @staticmethod
+    def finish() -> None:
+        """
+        Write the access record
+        """
+        request = cherrypy.request
+        started = getattr(request, 'access_started', None)
+        if started is None:
+            return
+        response = cherrypy.response
+        try:
+            status = int(str(response.status)[:3])
+        except ValueError:
+            status = 500
+        LogWriter().access(request.method, request.script_name + request.path_info, status,
+                           int(response.headers.get('Content-Length', 0) or 0), time.perf_counter() - started,
+                           request.remote.ip, request.headers.get('X-Request-ID'))
+
+
+cherrypy.tools.access_log = AccessLogTool()
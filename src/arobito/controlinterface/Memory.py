@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module looks into the memory of a running interface, for the :py:meth:`memory
+<arobito.controlinterface.ControllerBackend.App.memory>` method.
+
+The allocations are traced with :py:mod:`tracemalloc`, which is started and stopped on demand, as it slows every
+allocation down and needs memory itself. A snapshot lists the allocation sites holding the most memory and, from the
+second snapshot on, the sites that grew or shrank the most since the previous one.
+
+Every report also contains the resident set size of the process, read from ``/proc/self/status``, and the sizes of the
+tables that grow with the use of the interface: the sessions of the :py:class:`SessionManager
+<arobito.controlinterface.BackendManager.SessionManager>`, the cache of the :py:class:`ConstantResponse
+<arobito.controlinterface.Codec.ConstantResponse>` encodings and the requests in flight of the :py:mod:`Watchdog
+<arobito.controlinterface.Watchdog>`.
+"""
+
+import threading
+import tracemalloc
+from arobito.Base import SingletonMeta
+from arobito.controlinterface.BackendManager import SessionManager
+from arobito.controlinterface.Codec import ConstantResponse
+from arobito.controlinterface.Watchdog import RequestTracker
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The actions of the memory method
+actions = ('status', 'start', 'stop', 'snapshot')
+
+#: The maximum number of frames stored per allocation
+max_frames = 32
+
+#: The maximum number of allocation sites listed
+max_sites = 200
+
+#: The status file of the process
+status_file = '/proc/self/status'
+
+#: Allocations of these files are left out of the snapshots
+ignored_files = ('<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', '<unknown>',
+                 tracemalloc.__file__)
+
+
+def process_memory() -> dict:
+    """
+    Read the memory of the process from :py:data:`status_file`
+
+    :return: A dict with the resident set size (``rss``) and its peak (``rss_peak``) in bytes, empty when the file
+             cannot be read, e.g. on other platforms than Linux
+    """
+    fields = {'VmRSS': 'rss', 'VmHWM': 'rss_peak'}
+    result = dict()
+    try:
+        with open(status_file, 'r') as fh:
+            for line in fh:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    result[fields[name]] = int(value.split()[0]) * 1024
+    except (IOError, ValueError, IndexError):
+        pass
+    return result
+
+
+def table_sizes() -> dict:
+    """
+    Get the sizes of the tables that grow with the use of the interface
+
+    :return: A dict of the table names and their numbers of entries, and the size of the response cache in bytes
+    """
+    cache_entries, cache_bytes = ConstantResponse.cache_size()
+    return dict(sessions=SessionManager().get_current_sessions(), response_cache=cache_entries,
+                response_cache_bytes=cache_bytes, requests_in_flight=len(RequestTracker().flights()))
+
+
+def site_of(statistic) -> str:
+    """
+    Describe the allocation site of a statistic
+
+    :param statistic: A :py:class:`tracemalloc.Statistic` or :py:class:`tracemalloc.StatisticDiff`
+    :return: The frames as ``file:line``, from the outermost to the allocating one, separated by ``;``
+    """
+    return ';'.join('{:s}:{:d}'.format(frame.filename, frame.lineno) for frame in statistic.traceback)
+
+
+class MemoryInspector(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, controls the tracing and keeps the previous snapshot
+    """
+
+    def __init__(self):
+        """
+        Start without a snapshot
+        """
+        self.__lock = threading.Lock()
+        self.__previous = None
+
+    def status(self) -> dict:
+        """
+        Get the state of the tracing and the sizes
+
+        :return: A dict with ``tracing``, the number of ``frames`` stored per allocation, the ``traced`` memory and
+                 its ``traced_peak`` in bytes while tracing, the ``process`` memory and the ``tables``
+        """
+        result = dict(tracing=tracemalloc.is_tracing(), frames=tracemalloc.get_traceback_limit(),
+                      process=process_memory(), tables=table_sizes())
+        if result['tracing']:
+            result['traced'], result['traced_peak'] = tracemalloc.get_traced_memory()
+        return result
+
+    def start(self, frames: int=1) -> dict:
+        """
+        Start tracing the allocations; a tracing going on already is left as it is
+
+        :param frames: The number of frames stored per allocation, at most :py:data:`max_frames`
+        :return: The status
+        """
+        with self.__lock:
+            if not tracemalloc.is_tracing():
+                self.__previous = None
+                tracemalloc.start(min(max(1, frames), max_frames))
+        return self.status()
+
+    def stop(self) -> dict:
+        """
+        Stop tracing and drop the previous snapshot
+
+        :return: The status
+        """
+        with self.__lock:
+            self.__previous = None
+            tracemalloc.stop()
+        return self.status()
+
+    def snapshot(self, limit: int=20, traceback: bool=False) -> dict:
+        """
+        Take a snapshot and compare it to the previous one
+
+        :param limit: The number of allocation sites listed, at most :py:data:`max_sites`
+        :param traceback: True to group the allocations by their whole traceback instead of the line allocating
+        :return: The status with the ``top`` allocation sites and the ``diff`` to the previous snapshot, each a list of
+                 dicts; ``top`` is None when not tracing, ``diff`` also for the first snapshot
+        """
+        limit = min(max(1, limit), max_sites)
+        group = 'traceback' if traceback else 'lineno'
+        with self.__lock:
+            if not tracemalloc.is_tracing():
+                result = self.status()
+                result['top'] = result['diff'] = None
+                return result
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, name)
+                                                                  for name in ignored_files])
+            previous, self.__previous = self.__previous, snapshot
+        result = self.status()
+        result['top'] = [dict(site=site_of(statistic), size=statistic.size, count=statistic.count)
+                         for statistic in snapshot.statistics(group)[:limit]]
+        result['diff'] = None
+        if previous is not None:
+            result['diff'] = [dict(site=site_of(statistic), size=statistic.size, size_diff=statistic.size_diff,
+                                   count=statistic.count, count_diff=statistic.count_diff)
+                              for statistic in snapshot.compare_to(previous, group)[:limit]
+                              if statistic.size_diff != 0 or statistic.count_diff != 0]
+        return result
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A compact binary encoding compatible with `MessagePack <http://msgpack.org/>`_, written with :py:mod:`struct`.
+
+It covers the types that JSON covers (None, booleans, integers up to 64 bit, floats, strings, lists and dicts) plus
+bytes. Extension types are not supported. Integers and lengths are always written in the smallest format possible.
+"""
+
+import struct
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The maximum nesting of lists and dicts accepted when unpacking
+max_depth = 64
+
+_uint8 = struct.Struct('>B')
+_uint16 = struct.Struct('>H')
+_uint32 = struct.Struct('>I')
+_uint64 = struct.Struct('>Q')
+_int8 = struct.Struct('>b')
+_int16 = struct.Struct('>h')
+_int32 = struct.Struct('>i')
+_int64 = struct.Struct('>q')
+_float32 = struct.Struct('>f')
+_float64 = struct.Struct('>d')
+
+#: Type byte and struct of the integer formats, by type byte
+_int_formats = {0xcc: _uint8, 0xcd: _uint16, 0xce: _uint32, 0xcf: _uint64,
+                0xd0: _int8, 0xd1: _int16, 0xd2: _int32, 0xd3: _int64}
+
+
+def __pack_length(parts: list, length: int, fix_type: int, fix_limit: int, types: tuple) -> None:
+    """
+    Write the header of a string, binary, array or map
+
+    :param parts: The list of parts to append to
+    :param length: The length
+    :param fix_type: The type byte of the fix format, or None when there is none
+    :param fix_limit: The first length that does not fit into the fix format
+    :param types: The type bytes of the 8 (or None), 16 and 32 bit formats
+    """
+    if fix_type is not None and length < fix_limit:
+        parts.append(_uint8.pack(fix_type | length))
+    elif types[0] is not None and length <= 0xff:
+        parts.append(_uint8.pack(types[0]) + _uint8.pack(length))
+    elif length <= 0xffff:
+        parts.append(_uint8.pack(types[1]) + _uint16.pack(length))
+    elif length <= 0xffffffff:
+        parts.append(_uint8.pack(types[2]) + _uint32.pack(length))
+    else:
+        raise ValueError('Object too large to pack')
+
+
+def __pack_int(parts: list, value: int) -> None:
+    """
+    Write an integer in the smallest format
+
+    :param parts: The list of parts to append to
+    :param value: The integer
+    """
+    if 0 <= value <= 0x7f:
+        parts.append(_uint8.pack(value))
+    elif -32 <= value < 0:
+        parts.append(_int8.pack(value))
+    elif value > 0:
+        for type_byte, fmt in ((0xcc, _uint8), (0xcd, _uint16), (0xce, _uint32), (0xcf, _uint64)):
+            if value < 1 << (fmt.size * 8):
+                parts.append(_uint8.pack(type_byte) + fmt.pack(value))
+                return
+        raise ValueError('Integer {:d} too large to pack'.format(value))
+    else:
+        for type_byte, fmt in ((0xd0, _int8), (0xd1, _int16), (0xd2, _int32), (0xd3, _int64)):
+            if value >= -(1 << (fmt.size * 8 - 1)):
+                parts.append(_uint8.pack(type_byte) + fmt.pack(value))
+                return
+        raise ValueError('Integer {:d} too small to pack'.format(value))
+
+
+def __pack(parts: list, value) -> None:
+    """
+    Write a value
+
+    :param parts: The list of parts to append to
+    :param value: The value
+    """
+    if value is None:
+        parts.append(b'\xc0')
+    elif value is True:
+        parts.append(b'\xc3')
+    elif value is False:
+        parts.append(b'\xc2')
+    elif isinstance(value, int):
+        __pack_int(parts, value)
+    elif isinstance(value, float):
+        parts.append(b'\xcb' + _float64.pack(value))
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        __pack_length(parts, len(data), 0xa0, 32, (0xd9, 0xda, 0xdb))
+        parts.append(data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        __pack_length(parts, len(data), None, 0, (0xc4, 0xc5, 0xc6))
+        parts.append(data)
+    elif isinstance(value, (list, tuple)):
+        __pack_length(parts, len(value), 0x90, 16, (None, 0xdc, 0xdd))
+        for item in value:
+            __pack(parts, item)
+    elif isinstance(value, dict):
+        __pack_length(parts, len(value), 0x80, 16, (None, 0xde, 0xdf))
+        for key, item in value.items():
+            __pack(parts, key)
+            __pack(parts, item)
+    else:
+        raise TypeError('Object of type {:s} cannot be packed'.format(type(value).__name__))
+
+
+def pack(value) -> bytes:
+    """
+    Encode a value
+
+    :param value: The value
+    :return: The encoded bytes
+    :raise TypeError: When the value contains an unsupported type
+    :raise ValueError: When an integer or a length is out of range
+    """
+    parts = list()
+    __pack(parts, value)
+    return b''.join(parts)
+
+
+class Unpacker(object):
+    """
+    Decodes a single value out of bytes
+    """
+
+    #: Structs of the types with a fixed size payload (integers and floats), by type byte
+    numbers = dict(_int_formats)
+    numbers.update({0xca: _float32, 0xcb: _float64})
+
+    #: Structs of the length of strings, binaries, arrays and maps, by type byte
+    lengths = {0xd9: _uint8, 0xda: _uint16, 0xdb: _uint32, 0xc4: _uint8, 0xc5: _uint16, 0xc6: _uint32,
+               0xdc: _uint16, 0xdd: _uint32, 0xde: _uint16, 0xdf: _uint32}
+
+    def __init__(self, data: bytes):
+        """
+        Prepare decoding
+
+        :param data: The encoded bytes
+        """
+        self.data = bytes(data)
+        self.position = 0
+
+    def __take(self, length: int) -> bytes:
+        """
+        Read raw bytes
+
+        :param length: The number of bytes
+        :return: The bytes
+        :raise ValueError: When the data ends before
+        """
+        start = self.position
+        end = start + length
+        if end > len(self.data):
+            raise ValueError('Truncated data')
+        self.position = end
+        return self.data[start:end]
+
+    def __read_sequence(self, length: int, depth: int) -> list:
+        """
+        Read the items of an array
+
+        :param length: The number of items
+        :param depth: The nesting depth of the array
+        :return: The items
+        """
+        return [self.read(depth + 1) for i in range(0, length)]
+
+    def __read_map(self, length: int, depth: int) -> dict:
+        """
+        Read the pairs of a map
+
+        :param length: The number of pairs
+        :param depth: The nesting depth of the map
+        :return: The map
+        :raise ValueError: When a key is not hashable
+        """
+        result = dict()
+        read = self.read
+        depth += 1
+        for i in range(0, length):
+            key = read(depth)
+            if isinstance(key, (list, dict)):
+                raise ValueError('Invalid map key')
+            result[key] = read(depth)
+        return result
+
+    def read(self, depth: int=0):
+        """
+        Decode the next value
+
+        :param depth: The current nesting depth
+        :return: The value
+        :raise ValueError: On invalid or truncated data
+        """
+        if depth > max_depth:
+            raise ValueError('Nesting too deep')
+        data = self.data
+        position = self.position
+        if position >= len(data):
+            raise ValueError('Truncated data')
+        type_byte = data[position]
+        self.position = position + 1
+        if type_byte <= 0x7f:
+            return type_byte
+        if type_byte >= 0xe0:
+            return type_byte - 0x100
+        if type_byte <= 0x8f:
+            return self.__read_map(type_byte & 0x0f, depth)
+        if type_byte <= 0x9f:
+            return self.__read_sequence(type_byte & 0x0f, depth)
+        if type_byte <= 0xbf:
+            return self.__take(type_byte & 0x1f).decode('utf-8')
+        if type_byte == 0xc0:
+            return None
+        if type_byte == 0xc2:
+            return False
+        if type_byte == 0xc3:
+            return True
+        fmt = Unpacker.numbers.get(type_byte) or Unpacker.lengths.get(type_byte)
+        if fmt is None:
+            raise ValueError('Unsupported type 0x{:02x}'.format(type_byte))
+        value = fmt.unpack(self.__take(fmt.size))[0]
+        if type_byte in Unpacker.numbers:
+            return value
+        if type_byte >= 0xde:
+            return self.__read_map(value, depth)
+        if type_byte >= 0xdc:
+            return self.__read_sequence(value, depth)
+        if type_byte >= 0xd9:
+            return self.__take(value).decode('utf-8')
+        return self.__take(value)
+
+
+def unpack(data: bytes):
+    """
+    Decode a value
+
+    :param data: The encoded bytes, containing exactly one value
+    :return: The value
+    :raise ValueError: On invalid data
+    """
+    unpacker = Unpacker(data)
+    try:
+        value = unpacker.read()
+    except UnicodeDecodeError as e:
+        raise ValueError('Invalid string: {:s}'.format(e.__str__()))
+    if unpacker.position != len(unpacker.data):
+        raise ValueError('Extra data after the value')
+    return value
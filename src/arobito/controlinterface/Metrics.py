@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module records metrics of the requests and renders them in the Prometheus text format.
+
+For every endpoint, the requests are counted by status code, their latency is recorded in a histogram with fixed
+buckets, the bytes received and sent are summed up and the requests in flight are counted. Every ``/app`` method is an
+endpoint of its own, the static files are one endpoint together. Further counters, e.g. the hits of a cache, and gauges,
+e.g. the session count, can be added.
+
+Every thread records into a shard of its own, so recording needs no lock. The shards are summed up when the metrics
+are rendered. Administrators get the metrics on ``/metrics``, with their session key as bearer token:
+
+.. code-block:: bash
+
+   curl -H 'Authorization: Bearer The Session Key' http://localhost:9812/metrics
+"""
+
+import bisect
+import threading
+import time
+import cherrypy
+from arobito.Base import SingletonMeta
+from arobito.controlinterface.Admission import AdmissionController
+from arobito.controlinterface.BackendManager import SessionManager
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The upper bounds of the latency histogram buckets in seconds
+latency_buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: The prefix of all metric names
+prefix = 'arobito_'
+
+#: The content type of the Prometheus text format
+content_type = 'text/plain; version=0.0.4; charset=utf-8'
+
+#: The help texts of the counters; counters not listed here get their name as help text
+counter_help = {
+    'response_cache_hits': 'Constant responses taken from the encoding cache',
+    'response_cache_misses': 'Constant responses encoded because they were not cached yet',
+    'slow_requests': 'Requests that ran longer than the watchdog threshold',
+    'log_records_dropped': 'Log records dropped as the queue of the log writer was full',
+    'capture_records_dropped': 'Captured requests dropped as the queue of the capture writer was full'
+}
+
+
+class Shard(object):
+    """
+    The metrics recorded by one thread
+    """
+
+    __slots__ = ('requests', 'latency', 'latency_sum', 'bytes_in', 'bytes_out', 'in_flight', 'counters')
+
+    def __init__(self):
+        #: Requests by endpoint and status code
+        self.requests = dict()
+        #: Latency bucket counts by endpoint, the last one for larger latencies
+        self.latency = dict()
+        self.latency_sum = dict()
+        self.bytes_in = dict()
+        self.bytes_out = dict()
+        self.in_flight = dict()
+        self.counters = dict()
+
+
+class Registry(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, holds the shards of all threads, the gauges and the known endpoints
+    """
+
+    def __init__(self):
+        """
+        Start without any metrics
+        """
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__shards = list()
+        self.__gauges = dict()
+        self.endpoints = {'/', '/static'}
+
+    def declare_endpoints(self, endpoints) -> None:
+        """
+        Add endpoints that get metrics of their own; requests to other paths are recorded as ``/other``
+
+        :param endpoints: The paths, e.g. ``/app/auth``
+        """
+        self.endpoints = self.endpoints | set(endpoints)
+
+    def endpoint_of(self, path: str) -> str:
+        """
+        Get the endpoint of a request path
+
+        :param path: The path of the request
+        :return: The endpoint
+        """
+        if path.startswith('/static/'):
+            return '/static'
+        path = path.rstrip('/') or '/'
+        return path if path in self.endpoints else '/other'
+
+    def shard(self) -> Shard:
+        """
+        Get the shard of the current thread
+
+        :return: The shard
+        """
+        try:
+            return self.__local.shard
+        except AttributeError:
+            shard = Shard()
+            with self.__lock:
+                self.__shards.append(shard)
+            self.__local.shard = shard
+            return shard
+
+    def started(self, endpoint: str) -> None:
+        """
+        Record the start of a request
+
+        :param endpoint: The endpoint
+        """
+        in_flight = self.shard().in_flight
+        in_flight[endpoint] = in_flight.get(endpoint, 0) + 1
+
+    def finished(self, endpoint: str, status: int, elapsed: float, bytes_in: int, bytes_out: int) -> None:
+        """
+        Record the end of a request, in the thread that recorded its start
+
+        :param endpoint: The endpoint
+        :param status: The status code of the response
+        :param elapsed: The latency in seconds
+        :param bytes_in: The size of the request body
+        :param bytes_out: The size of the response body
+        """
+        shard = self.shard()
+        shard.in_flight[endpoint] = shard.in_flight.get(endpoint, 1) - 1
+        key = (endpoint, status)
+        shard.requests[key] = shard.requests.get(key, 0) + 1
+        buckets = shard.latency.get(endpoint)
+        if buckets is None:
+            buckets = shard.latency[endpoint] = [0] * (len(latency_buckets) + 1)
+        buckets[bisect.bisect_left(latency_buckets, elapsed)] += 1
+        shard.latency_sum[endpoint] = shard.latency_sum.get(endpoint, 0.0) + elapsed
+        shard.bytes_in[endpoint] = shard.bytes_in.get(endpoint, 0) + bytes_in
+        shard.bytes_out[endpoint] = shard.bytes_out.get(endpoint, 0) + bytes_out
+
+    def count(self, name: str, amount: int=1) -> None:
+        """
+        Increase a counter
+
+        :param name: The name of the counter without prefix and ``_total`` suffix, e.g. ``response_cache_hits``
+        :param amount: The amount to add
+        """
+        counters = self.shard().counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def add_gauge(self, name: str, help_text: str, function, metric_type: str='gauge') -> None:
+        """
+        Add a gauge, replacing one of the same name
+
+        :param name: The name of the gauge without prefix, e.g. ``sessions``
+        :param help_text: The help text
+        :param function: Called on rendering, returns the value, or a dict of label tuples (name and value pairs) and
+                         values
+        :param metric_type: ``counter`` for values counted elsewhere, e.g. by the admission control
+        """
+        with self.__lock:
+            self.__gauges[name] = (help_text, function, metric_type)
+
+    def __sum(self) -> dict:
+        """
+        Sum up the shards
+
+        The dicts of the shards are copied before reading them, which does not release the interpreter lock, so the
+        other threads can keep recording.
+
+        :return: A dict of the shard attributes and their sums
+        """
+        with self.__lock:
+            shards = list(self.__shards)
+        total = dict((name, dict()) for name in Shard.__slots__)
+        for shard in shards:
+            for name in Shard.__slots__:
+                values = total[name]
+                for key, value in getattr(shard, name).copy().items():
+                    if name == 'latency':
+                        value = list(value)
+                        if key in values:
+                            value = [a + b for a, b in zip(values[key], value)]
+                        values[key] = value
+                    else:
+                        values[key] = values.get(key, 0) + value
+        return total
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format
+
+        :return: The text
+        """
+        total = self.__sum()
+        lines = list()
+
+        def family(name: str, metric_type: str, help_text: str) -> None:
+            lines.append('# HELP {:s}{:s} {:s}'.format(prefix, name, help_text))
+            lines.append('# TYPE {:s}{:s} {:s}'.format(prefix, name, metric_type))
+
+        def sample(name: str, labels: tuple, value) -> None:
+            label_text = ','.join('{:s}="{:s}"'.format(label, escape(str(label_value)))
+                                  for label, label_value in labels)
+            lines.append('{:s}{:s}{:s} {:s}'.format(prefix, name, '{' + label_text + '}' if label_text else '',
+                                                   format_value(value)))
+
+        family('requests_total', 'counter', 'Requests served, by endpoint and status code')
+        for (endpoint, status), value in sorted(total['requests'].items()):
+            sample('requests_total', (('endpoint', endpoint), ('status', status)), value)
+        family('request_duration_seconds', 'histogram', 'Time from the start of a request until its response is sent')
+        for endpoint, buckets in sorted(total['latency'].items()):
+            cumulated = 0
+            for bound, value in zip(latency_buckets + ('+Inf',), buckets):
+                cumulated += value
+                sample('request_duration_seconds_bucket', (('endpoint', endpoint), ('le', bound)), cumulated)
+            sample('request_duration_seconds_sum', (('endpoint', endpoint),), total['latency_sum'][endpoint])
+            sample('request_duration_seconds_count', (('endpoint', endpoint),), cumulated)
+        family('request_bytes_total', 'counter', 'Bytes received in request bodies')
+        for endpoint, value in sorted(total['bytes_in'].items()):
+            sample('request_bytes_total', (('endpoint', endpoint),), value)
+        family('response_bytes_total', 'counter', 'Bytes sent in response bodies')
+        for endpoint, value in sorted(total['bytes_out'].items()):
+            sample('response_bytes_total', (('endpoint', endpoint),), value)
+        family('requests_in_flight', 'gauge', 'Requests being served')
+        for endpoint, value in sorted(total['in_flight'].items()):
+            sample('requests_in_flight', (('endpoint', endpoint),), value)
+        for name, value in sorted(total['counters'].items()):
+            family(name + '_total', 'counter', counter_help.get(name, name.replace('_', ' ').capitalize()))
+            sample(name + '_total', (), value)
+        with self.__lock:
+            gauges = sorted(self.__gauges.items())
+        for name, (help_text, function, metric_type) in gauges:
+            try:
+                value = function()
+            except Exception:
+                continue
+            family(name, metric_type, help_text)
+            if isinstance(value, dict):
+                for labels, labelled_value in sorted(value.items()):
+                    sample(name, labels, labelled_value)
+            else:
+                sample(name, (), value)
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value: str) -> str:
+    """
+    Escape a label value
+
+    :param value: The value
+    :return: The escaped value
+    """
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def admission_lanes(field: str) -> dict:
+    """
+    Get a value of every lane of the :py:mod:`Admission <arobito.controlinterface.Admission>` control, as gauge labels
+    and values
+
+    :param field: The name of the value, e.g. ``waiting``
+    :return: The gauge values
+    """
+    return dict(((('lane', lane),), values[field]) for lane, values in AdmissionController().metrics()['lanes'].items())
+
+
+def add_service_gauges() -> None:
+    """
+    Add the gauges of the session count and of the admission control
+    """
+    registry = Registry()
+    registry.add_gauge('sessions', 'Active sessions', lambda: SessionManager().get_current_sessions())
+    registry.add_gauge('admission_in_flight', 'Requests holding an admission slot',
+                       lambda: AdmissionController().metrics()['in_flight'])
+    registry.add_gauge('admission_waiting', 'Requests waiting for an admission slot, by lane',
+                       lambda: admission_lanes('waiting'))
+    for outcome in ('admitted', 'rejected', 'shed'):
+        registry.add_gauge('admission_{:s}_total'.format(outcome),
+                           'Requests {:s} by the admission control, by lane'.format(outcome),
+                           lambda outcome=outcome: admission_lanes(outcome), 'counter')
+
+
+def bearer_key(authorization: str) -> str:
+    """
+    Get the session key out of an ``Authorization`` header
+
+    :param authorization: The header value, may be None
+    :return: The bearer token, or None when there is none
+    """
+    if authorization is None:
+        return None
+    scheme, separator, token = authorization.strip().partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+def pool_workers(pool) -> dict:
+    """
+    Get the busy and idle workers of a CherryPy thread pool, as gauge labels and values
+
+    :param pool: The thread pool of the HTTP server
+    :return: The gauge values
+    """
+    idle = max(0, pool.idle)
+    return {(('state', 'busy'),): max(0, len(pool._threads) - idle), (('state', 'idle'),): idle}
+
+
+def format_value(value) -> str:
+    """
+    Format a sample value
+
+    :param value: An int or a float
+    :return: The text
+    """
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class MetricsTool(cherrypy.Tool):
+    """
+    The CherryPy tool recording the metrics of the requests
+    """
+
+    def __init__(self):
+        """
+        Start the measurement when the resource is found
+        """
+        cherrypy.Tool.__init__(self, 'on_start_resource', self.start, priority=0)
+
+    def _setup(self) -> None:
+        """
+        Hook the end of the measurement into the end of the request
+        """
+        cherrypy.Tool._setup(self)
+        cherrypy.request.hooks.attach('on_end_request', self.finish, priority=100)
+
+    @staticmethod
+    def start() -> None:
+        """
+        Record the start of the request
+        """
+        request = cherrypy.request
+        request.metrics_endpoint = Registry().endpoint_of(request.script_name + request.path_info)
+        request.metrics_started = time.perf_counter()
+        Registry().started(request.metrics_endpoint)
+
+    @staticmethod
+    def finish() -> None:
+        """
+        Record the end of the request
+        """
+        request = cherrypy.request
+        endpoint = getattr(request, 'metrics_endpoint', None)
+        if endpoint is None:
+            return
+        response = cherrypy.response
+        try:
+            status = int(str(response.status)[:3])
+        except ValueError:
+            status = 500
+        Registry().finished(endpoint, status, time.perf_counter() - request.metrics_started,
+                            int(request.headers.get('Content-Length', 0) or 0),
+                            int(response.headers.get('Content-Length', 0) or 0))
+
+
+cherrypy.tools.metrics = MetricsTool()
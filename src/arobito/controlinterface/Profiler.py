@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module profiles a running interface on demand, for the :py:meth:`profile
+<arobito.controlinterface.ControllerBackend.App.profile>` method.
+
+Two modes are available:
+
+* ``sample``: The stacks of the worker threads are sampled with :py:func:`sys._current_frames` at a fixed interval.
+  The result are collapsed stacks, one line per stack with its frames from the root to the leaf separated by ``;`` and
+  the number of samples, as ``flamegraph.pl`` and speedscope read them. Idle workers are left out unless asked for.
+* ``cprofile``: Every n-th ``/app`` request is profiled with :py:mod:`cProfile`. The result are the functions with the
+  highest cumulative time over all profiled requests.
+
+A run stops by itself after its duration, at most :py:data:`max_duration` seconds, and only one run is allowed at a
+time. The sampler sleeps at least as long as a sample took, so it never takes more than half of a core.
+"""
+
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+import cherrypy
+from arobito.Base import SingletonMeta
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The profiling modes
+modes = ('sample', 'cprofile')
+
+#: The longest run in seconds
+max_duration = 60.0
+
+#: The shortest sampling interval in seconds
+min_interval = 0.001
+
+#: The maximum number of different stacks kept; further stacks are counted as ``[truncated]``
+max_stacks = 10000
+
+#: The maximum number of frames of a stack, counted from the root
+max_depth = 128
+
+#: The number of functions listed in a ``cprofile`` result
+max_functions = 40
+
+#: The name prefixes of the worker threads: CherryPy workers and the executor of the asyncio server
+worker_prefixes = ('CP Server', 'AsyncExecutor')
+
+#: Frames that make a stack idle when they are the leaf or its caller, as file name and function
+idle_frames = {
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('selectors.py', 'select')
+}
+
+
+class Profiler(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, runs the profiling
+    """
+
+    def __init__(self):
+        """
+        Start idle
+        """
+        self.__lock = threading.Lock()
+        self.__profiling = threading.Lock()
+        self.busy = False
+        #: Every n-th request is profiled in ``cprofile`` mode, 0 when not profiling
+        self.every = 0
+        self.__requests = itertools.count()
+        self.__stats = None
+        self.__profiled = 0
+        #: The IDs of further worker threads, e.g. of the asyncio event loop
+        self.workers = set()
+
+    def register_worker(self) -> None:
+        """
+        Count the current thread as worker for the sampling
+        """
+        self.workers.add(threading.get_ident())
+
+    def __is_worker(self, ident: int, names: dict) -> bool:
+        """
+        Tell whether a thread is a worker
+
+        :param ident: The ID of the thread
+        :param names: The names of the threads by ID
+        :return: True for a worker
+        """
+        return ident in self.workers or names.get(ident, '').startswith(worker_prefixes)
+
+    def __start(self) -> bool:
+        """
+        Mark the profiler busy
+
+        :return: False when a run is going on already
+        """
+        with self.__lock:
+            if self.busy:
+                return False
+            self.busy = True
+            return True
+
+    def sample(self, duration: float, interval: float=0.01, all_threads: bool=False, idle: bool=False) -> dict:
+        """
+        Sample the stacks of the threads, blocking for the duration
+
+        :param duration: The seconds to sample, at most :py:data:`max_duration`
+        :param interval: The seconds between two samples, at least :py:data:`min_interval`
+        :param all_threads: True to sample all threads instead of the workers only
+        :param idle: True to keep the samples of idle threads
+        :return: A dict with the number of samples, of threads seen and the collapsed stacks, or None when a run is
+                 going on already
+        """
+        duration = min(max(0.0, duration), max_duration)
+        interval = max(min_interval, interval)
+        if not self.__start():
+            return None
+        try:
+            stacks = dict()
+            threads = set()
+            rounds = 0
+            own = threading.get_ident()
+            deadline = time.monotonic() + duration
+            while True:
+                started = time.monotonic()
+                names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+                for ident, frame in sys._current_frames().items():
+                    if ident == own or not (all_threads or self.__is_worker(ident, names)):
+                        continue
+                    entries = list()
+                    while frame is not None:
+                        entries.append((os.path.basename(frame.f_code.co_filename), frame.f_code.co_name))
+                        frame = frame.f_back
+                    if not idle and (entries[0] in idle_frames or
+                                     (len(entries) > 1 and entries[1] in idle_frames)):
+                        continue
+                    threads.add(ident)
+                    stack = ';'.join('{:s}:{:s}'.format(*entry) for entry in reversed(entries[-max_depth:]))
+                    if stack not in stacks and len(stacks) >= max_stacks:
+                        stack = '[truncated]'
+                    stacks[stack] = stacks.get(stack, 0) + 1
+                rounds += 1
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                time.sleep(min(max(interval, now - started), deadline - now))
+            collapsed = '\n'.join('{:s} {:d}'.format(stack, count)
+                                  for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
+            return dict(samples=rounds, threads=len(threads), stacks=collapsed)
+        finally:
+            self.busy = False
+
+    def deterministic(self, duration: float, every: int=1) -> dict:
+        """
+        Profile every n-th request with :py:mod:`cProfile`, blocking for the duration
+
+        :param duration: The seconds to profile, at most :py:data:`max_duration`
+        :param every: Profile every n-th request, at least 1
+        :return: A dict with the number of requests profiled and the statistics, or None when a run is going on already
+        """
+        duration = min(max(0.0, duration), max_duration)
+        if not self.__start():
+            return None
+        try:
+            with self.__lock:
+                self.__stats = None
+                self.__profiled = 0
+                self.every = max(1, every)
+            time.sleep(duration)
+        finally:
+            with self.__lock:
+                self.every = 0
+                stats, profiled = self.__stats, self.__profiled
+                self.__stats = None
+            self.busy = False
+        if stats is None:
+            return dict(requests=0, stats='')
+        output = io.StringIO()
+        stats.stream = output
+        stats.strip_dirs().sort_stats('cumulative').print_stats(max_functions)
+        return dict(requests=profiled, stats=output.getvalue())
+
+    def call(self, function, *args, **kwargs):
+        """
+        Call a function, profiled when it is the n-th request in ``cprofile`` mode
+
+        Without a run, this costs a single attribute check. Only one call is profiled at a time, as the interpreter
+        allows a single active profiler; calls overlapping it run unprofiled.
+
+        :param function: The function
+        :return: Its result
+        """
+        every = self.every
+        if every <= 0 or next(self.__requests) % every != 0:
+            return function(*args, **kwargs)
+        if not self.__profiling.acquire(False):
+            return function(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            self.__profiling.release()
+            with self.__lock:
+                if self.every > 0:
+                    if self.__stats is None:
+                        self.__stats = pstats.Stats(profile)
+                    else:
+                        self.__stats.add(profile)
+                    self.__profiled += 1
+
+
+class ProfilerTool(cherrypy.Tool):
+    """
+    The CherryPy tool passing the ``/app`` handlers through :py:meth:`Profiler.call <.Profiler.call>`
+    """
+
+    def __init__(self):
+        """
+        Run before the handler, after the admission
+        """
+        cherrypy.Tool.__init__(self, 'before_handler', self.wrap, priority=90)
+
+    @staticmethod
+    def wrap() -> None:
+        """
+        Wrap the handler while a ``cprofile`` run is going on
+        """
+        profiler = Profiler()
+        if profiler.every <= 0:
+            return
+        request = cherrypy.request
+        handler = request.handler
+        request.handler = lambda *args, **kwargs: profiler.call(handler, *args, **kwargs)
+
+
+cherrypy.tools.profiler = ProfilerTool()
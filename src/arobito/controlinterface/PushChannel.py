@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the WebSocket push channel. Instead of polling, a dashboard opens one WebSocket to ``/push/`` and
+the server pushes status changes, session count changes and notifications to it.
+
+All messages are JSON objects. The client first authenticates with its session key, then subscribes to topics:
+
+.. code-block:: javascript
+
+   { 'action': 'auth', 'key': 'The Session Key' }
+   { 'action': 'subscribe', 'topics': ['status', 'sessions', 'notifications'] }
+   { 'action': 'unsubscribe', 'topics': ['notifications'] }
+
+Every request is answered with the action, a ``success`` flag and, on failure, a ``reason``. Pushed messages look like
+this:
+
+.. code-block:: javascript
+
+   { 'topic': 'sessions', 'data': { 'count': 2 } }
+
+The ``sessions`` topic is only available to users of the level ``Administrator``. Sockets that do not authenticate in
+time or whose session ends are closed.
+
+The WebSockets are handled by ws4py: Its CherryPy plugin keeps the sockets after the upgrade and polls them in a single
+thread, so idle sockets cost no worker threads of the HTTP server. In the asyncio server mode, the :py:mod:`AsyncServer
+<arobito.controlinterface.AsyncServer>` holds the sockets instead; both pass the requests to the same broker.
+"""
+
+import json
+import queue
+import threading
+import time
+import cherrypy
+from cherrypy.process import plugins
+from ws4py.exc import HandshakeError
+from ws4py.server.cherrypyserver import WebSocketPlugin, WebSocketTool
+from ws4py.websocket import WebSocket
+from arobito.Base import SingletonMeta
+from arobito import Helper
+from arobito.controlinterface.BackendManager import SessionManager
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class PushBroker(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, keeps track of the push sockets and their subscriptions.
+
+    Messages are published into a queue and delivered by the thread of :py:class:`PushDelivery <.PushDelivery>`, so
+    publishing never blocks a request. Each message is encoded only once, no matter how many sockets receive it.
+    """
+
+    #: The topics clients may subscribe to
+    topics = ('status', 'sessions', 'notifications')
+    #: The topics only available to administrators
+    admin_topics = ('sessions',)
+    #: Seconds a socket may stay open without authenticating
+    auth_timeout = 10.0
+
+    def __init__(self):
+        """
+        Start without any sockets
+        """
+        self.__lock = threading.Lock()
+        self.__sockets = dict()
+        self.__subscribers = dict((topic, set()) for topic in PushBroker.topics)
+        self.__queue = queue.Queue()
+        self.session_manager = SessionManager()
+        self.state = dict(state='running')
+
+    def add(self, socket) -> None:
+        """
+        Register a newly opened socket
+
+        :param socket: The socket
+        """
+        with self.__lock:
+            self.__sockets[socket] = dict(opened=time.monotonic(), key=None, user=None)
+
+    def remove(self, socket) -> None:
+        """
+        Forget a socket and all its subscriptions
+
+        :param socket: The socket
+        """
+        with self.__lock:
+            self.__sockets.pop(socket, None)
+            for subscribers in self.__subscribers.values():
+                subscribers.discard(socket)
+
+    def authenticate(self, socket, key: str) -> bool:
+        """
+        Authenticate a socket by a session key
+
+        :param socket: The socket
+        :param key: The session key
+        :return: True on success
+        """
+        user = self.session_manager.get_user(key) if isinstance(key, str) else None
+        with self.__lock:
+            if user is None or socket not in self.__sockets:
+                return False
+            self.__sockets[socket]['key'] = key
+            self.__sockets[socket]['user'] = user
+            return True
+
+    def subscribe(self, socket, topic: str) -> bool:
+        """
+        Subscribe an authenticated socket to a topic
+
+        :param socket: The socket
+        :param topic: The topic
+        :return: True on success, False on an unknown topic, insufficient rights or a socket not authenticated
+        """
+        with self.__lock:
+            info = self.__sockets.get(socket, None)
+            if info is None or info['user'] is None or topic not in self.__subscribers:
+                return False
+            if topic in PushBroker.admin_topics and info['user']['level'] != 'Administrator':
+                return False
+            self.__subscribers[topic].add(socket)
+            return True
+
+    def unsubscribe(self, socket, topic: str) -> None:
+        """
+        Remove the subscription of a socket to a topic
+
+        :param socket: The socket
+        :param topic: The topic
+        """
+        with self.__lock:
+            if topic in self.__subscribers:
+                self.__subscribers[topic].discard(socket)
+
+    def count(self, topic: str=None) -> int:
+        """
+        Count the sockets
+
+        :param topic: Count only the subscribers of this topic
+        :return: The number of sockets
+        """
+        with self.__lock:
+            if topic is None:
+                return len(self.__sockets)
+            return len(self.__subscribers.get(topic, ()))
+
+    def current(self, topic: str) -> dict:
+        """
+        Get the current state of a topic, sent to new subscribers right away
+
+        :param topic: The topic
+        :return: The data of the topic or None when there is no state
+        """
+        if topic == 'status':
+            return self.state
+        if topic == 'sessions':
+            return dict(count=self.session_manager.get_current_sessions())
+        return None
+
+    def publish(self, topic: str, data: dict) -> None:
+        """
+        Publish a message to all subscribers of a topic
+
+        The message is delivered asynchronously.
+
+        :param topic: The topic
+        :param data: The data to send, must be convertible to JSON
+        """
+        if topic == 'status':
+            self.state = data
+        self.__queue.put((topic, data))
+
+    @staticmethod
+    def encode(topic: str, data: dict) -> str:
+        """
+        Encode a pushed message
+
+        :param topic: The topic
+        :param data: The data
+        :return: The JSON text
+        """
+        return json.dumps(dict(topic=topic, data=data), separators=(',', ':'))
+
+    def deliver(self, timeout: float=None) -> int:
+        """
+        Wait for published messages and deliver them
+
+        :param timeout: Seconds to wait for the first message, None to wait forever
+        :return: The number of messages delivered
+        """
+        delivered = 0
+        try:
+            topic, data = self.__queue.get(timeout=timeout)
+            while True:
+                payload = PushBroker.encode(topic, data)
+                with self.__lock:
+                    subscribers = list(self.__subscribers.get(topic, ()))
+                for socket in subscribers:
+                    socket.push(payload)
+                delivered += 1
+                topic, data = self.__queue.get_nowait()
+        except queue.Empty:
+            pass
+        return delivered
+
+    def sweep(self) -> list:
+        """
+        Find the sockets that did not authenticate in time and those whose session has ended
+
+        :return: The list of sockets to close
+        """
+        now = time.monotonic()
+        with self.__lock:
+            sockets = list(self.__sockets.items())
+        valid_keys = dict()
+        expired = list()
+        for socket, info in sockets:
+            if info['key'] is None:
+                if now - info['opened'] > PushBroker.auth_timeout:
+                    expired.append(socket)
+                continue
+            if not info['key'] in valid_keys:
+                valid_keys[info['key']] = self.session_manager.has_session(info['key'])
+            if not valid_keys[info['key']]:
+                expired.append(socket)
+        return expired
+
+    def __reply(self, socket, action: str, success: bool, **fields) -> None:
+        """
+        Answer a request of a client
+
+        :param socket: The socket of the client
+        :param action: The action requested
+        :param success: The result
+        :param fields: Further fields of the answer
+        """
+        socket.push(json.dumps(dict(action=action, success=success, **fields), separators=(',', ':')))
+
+    def handle(self, socket, message: str) -> None:
+        """
+        Handle a request of a client
+
+        The socket must provide ``push(payload)`` and ``close(code, reason)``, so every server implementation can pass
+        its own sockets.
+
+        :param socket: The socket the request came in
+        :param message: The text of the request
+        """
+        try:
+            request = json.loads(message)
+        except ValueError:
+            self.__reply(socket, 'unknown', False, reason='Invalid JSON')
+            return
+        if not isinstance(request, dict):
+            self.__reply(socket, 'unknown', False, reason='Invalid request')
+            return
+        action = request.get('action', None)
+        if action == 'auth':
+            if self.authenticate(socket, request.get('key', None)):
+                self.__reply(socket, action, True)
+            else:
+                self.__reply(socket, action, False, reason='Invalid session')
+                socket.close(code=1008, reason='Invalid session')
+            return
+        if action in ('subscribe', 'unsubscribe'):
+            topics = request.get('topics', None)
+            if not isinstance(topics, list):
+                self.__reply(socket, action, False, reason='Topics must be a list')
+                return
+            failed = list()
+            for topic in topics:
+                if action == 'unsubscribe':
+                    self.unsubscribe(socket, topic)
+                elif not self.subscribe(socket, topic):
+                    failed.append(topic)
+            self.__reply(socket, action, len(failed) <= 0, topics=topics, failed=failed)
+            if action == 'subscribe':
+                for topic in topics:
+                    data = self.current(topic) if topic not in failed else None
+                    if data is not None:
+                        socket.push(PushBroker.encode(topic, data))
+            return
+        self.__reply(socket, 'unknown', False, reason='Unknown action')
+
+
+class PushSocket(WebSocket):
+    """
+    A WebSocket of the push channel
+    """
+
+    def opened(self) -> None:
+        """
+        Register the socket with the broker
+        """
+        self.__send_lock = threading.Lock()
+        PushBroker().add(self)
+
+    def closed(self, code: int, reason: str=None) -> None:
+        """
+        Unregister the socket from the broker
+
+        :param code: The close code
+        :param reason: The close reason
+        """
+        PushBroker().remove(self)
+
+    def push(self, payload: str) -> None:
+        """
+        Send a text message, safe to be called from any thread
+
+        :param payload: The message
+        """
+        if self.terminated:
+            return
+        try:
+            with self.__send_lock:
+                self.send(payload)
+        except Exception:
+            PushBroker().remove(self)
+
+    def received_message(self, message) -> None:
+        """
+        Handle a request of the client
+
+        :param message: The message received
+        """
+        data = message.data
+        PushBroker().handle(self, data.decode('utf-8', errors='replace') if isinstance(data, bytes) else data)
+
+
+class PushTool(WebSocketTool):
+    """
+    The ws4py upgrade tool, answering invalid handshakes with ``400 Bad Request`` instead of an internal error
+    """
+
+    def upgrade(self, *args, **kwargs) -> None:
+        try:
+            WebSocketTool.upgrade(self, *args, **kwargs)
+        except HandshakeError as e:
+            raise cherrypy.HTTPError(400, e.__str__())
+
+
+class PushDelivery(plugins.SimplePlugin):
+    """
+    A CherryPy plugin running the delivery thread of the :py:class:`PushBroker <.PushBroker>`
+
+    It connects the broker to the session count of the :py:class:`SessionManager
+    <arobito.controlinterface.BackendManager.SessionManager>` and to the status and notification channels of the
+    CherryPy bus (see :py:mod:`Helper <arobito.Helper>`). It does not depend on the server holding the sockets.
+    """
+
+    #: Seconds between two checks for sockets to close
+    sweep_interval = 5.0
+
+    def __init__(self, bus):
+        """
+        Create the plugin
+
+        :param bus: The CherryPy engine
+        """
+        plugins.SimplePlugin.__init__(self, bus)
+        self.broker = PushBroker()
+        self.__thread = None
+        self.__running = False
+
+    def start(self) -> None:
+        """
+        Start the delivery thread
+        """
+        self.broker.session_manager.add_listener(self.sessions_changed)
+        self.bus.subscribe(Helper.status_channel, self.status_changed)
+        self.bus.subscribe(Helper.notification_channel, self.notification)
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, name='PushDelivery', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """
+        Announce the end to the clients and stop the delivery thread
+        """
+        self.status_changed(dict(state='stopped'))
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        self.broker.deliver(timeout=0)
+        self.broker.session_manager.remove_listener(self.sessions_changed)
+        self.bus.unsubscribe(Helper.status_channel, self.status_changed)
+        self.bus.unsubscribe(Helper.notification_channel, self.notification)
+
+    #: Stop before the servers close the sockets, so the clients still get the last status
+    stop.priority = 40
+
+    def sessions_changed(self, count: int) -> None:
+        """
+        Push the new session count
+
+        :param count: The number of sessions
+        """
+        self.broker.publish('sessions', dict(count=count))
+
+    def status_changed(self, status: dict) -> None:
+        """
+        Push a status change
+
+        :param status: The new status
+        """
+        self.broker.publish('status', status)
+
+    def notification(self, notification: dict) -> None:
+        """
+        Push a notification
+
+        :param notification: The notification
+        """
+        self.broker.publish('notifications', notification)
+
+    def __run(self) -> None:
+        """
+        Deliver the messages and close expired sockets until the plugin stops
+        """
+        last_sweep = time.monotonic()
+        while self.__running:
+            self.broker.deliver(timeout=0.5)
+            if time.monotonic() - last_sweep >= PushDelivery.sweep_interval:
+                last_sweep = time.monotonic()
+                for socket in self.broker.sweep():
+                    self.broker.remove(socket)
+                    socket.close(code=1008, reason='Not authenticated')
+
+
+class PushPlugin(WebSocketPlugin):
+    """
+    The ws4py CherryPy plugin, extended by the :py:class:`PushDelivery <.PushDelivery>`
+    """
+
+    def __init__(self, bus):
+        """
+        Create the plugin
+
+        :param bus: The CherryPy engine
+        """
+        WebSocketPlugin.__init__(self, bus)
+        self.delivery = PushDelivery(bus)
+
+    def start(self) -> None:
+        """
+        Start the WebSocket processing and the delivery thread
+        """
+        WebSocketPlugin.start(self)
+        self.delivery.start()
+
+    def stop(self) -> None:
+        """
+        Announce the end to the clients and stop the delivery thread
+        """
+        self.delivery.stop()
+        WebSocketPlugin.stop(self)
+
+    #: Stop before the ws4py cleanup closes the sockets, so the clients still get the last status
+    stop.priority = 40
+
+
+class PushApp(object):
+    """
+    The application mounted at ``/push``, only there to let the WebSocket tool upgrade the requests
+    """
+
+    #: The CherryPy configuration to mount this application with
+    config = {'/': {'tools.websocket.on': True, 'tools.websocket.handler_cls': PushSocket}}
+
+    @cherrypy.expose
+    def index(self) -> None:
+        """
+        Nothing to do, the connection has been upgraded by the tool already
+        """
+        pass
+
+
+cherrypy.tools.websocket = PushTool()
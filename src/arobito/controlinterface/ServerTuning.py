@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the tuning of the HTTP server: The size of the worker thread pool, the socket backlog, timeouts,
+the maximum request body size and keep-alive handling.
+
+All settings are read from the ``[Server]`` section of ``controller.ini`` and may be overridden on the command line.
+The ``server-mode`` option chooses between the threaded CherryPy server (``cherrypy``) and the single threaded
+:py:mod:`AsyncServer <arobito.controlinterface.AsyncServer>` (``asyncio``). The asyncio server uses ``thread-pool`` as
+the size of its executor for blocking work and ignores the other thread pool options.
+With ``workers`` larger than 1, the interface runs in that many processes sharing the port (see :py:mod:`Supervisor
+<arobito.controlinterface.Supervisor>`), each of them with the settings here.
+On a shutdown, requests in flight get ``drain-timeout`` seconds to finish (see :py:mod:`Shutdown
+<arobito.controlinterface.Shutdown>`).
+The ``admission-`` options limit the ``/app`` requests processed at once (see :py:mod:`Admission
+<arobito.controlinterface.Admission>`), ``admission-limit = 0`` disables the limit.
+``server-timing`` reports the phases of the ``/app`` requests in a ``Server-Timing`` header and logs the share
+``server-timing-sample`` of them (see :py:mod:`Timing <arobito.controlinterface.Timing>`).
+Requests running longer than ``watchdog-threshold`` seconds are counted and their stacks printed (see
+:py:mod:`Watchdog <arobito.controlinterface.Watchdog>`), ``watchdog-threshold = 0`` disables this.
+The access and error log is written in the background by the :py:mod:`LogWriter <arobito.controlinterface.LogWriter>`,
+configured by ``access-log`` and the ``log-`` options. A relative ``log-file`` is taken from the config folder.
+With ``capture-file`` set, the ``/app`` and ``/static`` requests are recorded there for a replay (see :py:mod:`Capture
+<arobito.controlinterface.Capture>`); a relative file is taken from the config folder as well.
+Optionally, the thread pool is sized automatically: The time connections wait in the queue of the pool before a worker
+picks them up is measured, and the pool grows when the average wait exceeds a target and shrinks again when workers
+are idle.
+"""
+
+import configparser
+import os
+import queue
+import socket
+import time
+import threading
+from cheroot.server import HTTPServer
+from cherrypy.process.plugins import Monitor
+from cherrypy.process.servers import ServerAdapter
+from arobito import FsTools, Helper
+from arobito.controlinterface import LogWriter, Supervisor
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The server implementations available
+server_modes = ('cherrypy', 'asyncio')
+
+#: True when the CherryPy server can share its port with other workers, which needs cheroot 10.0.0 or later
+reuse_port_supported = hasattr(HTTPServer, 'reuse_port')
+
+#: The options in the ``[Server]`` section of ``controller.ini`` with their defaults
+config_defaults = {
+    'server-mode': 'cherrypy',
+    'workers': '1',
+    'thread-pool': '10',
+    'thread-pool-max': '-1',
+    'thread-pool-autosize': 'no',
+    'autosize-target-wait': '0.05',
+    'autosize-interval': '1.0',
+    'socket-queue-size': '64',
+    'socket-timeout': '10',
+    'max-request-body-size': '104857600',
+    'keep-alive': 'yes',
+    'keep-alive-limit': '64',
+    'drain-timeout': '10',
+    'admission-limit': '6',
+    'admission-queue': '3',
+    'admission-slo': '1.0',
+    'server-timing': 'no',
+    'server-timing-sample': '0.01',
+    'watchdog-threshold': '10',
+    'watchdog-interval': '1.0',
+    'watchdog-dump-interval': '60',
+    'access-log': 'yes',
+    'log-file': '',
+    'log-max-bytes': '10485760',
+    'log-backups': '3',
+    'log-queue': '10000',
+    'log-interval': '10',
+    'capture-file': ''
+}
+
+
+def to_bool(value: str) -> bool:
+    """
+    Convert a config value to a boolean, the way :py:mod:`configparser` does
+
+    :param value: The value, e.g. ``yes``, ``off`` or ``True``
+    :return: The boolean
+    :raise ValueError: When the value is not a boolean
+    """
+    states = configparser.ConfigParser.BOOLEAN_STATES
+    if value.lower() not in states:
+        raise ValueError('Not a boolean: "{:s}"'.format(value))
+    return states[value.lower()]
+
+
+class ServerSettings(object):
+    """
+    The tuning settings of the HTTP server
+    """
+
+    def __init__(self, overrides: dict=None):
+        """
+        Read the settings from ``controller.ini``
+
+        :param overrides: A dict of option names (as in the config file) and values, e.g. from the command line. Values
+                          of None are ignored.
+        :raise ValueError: On invalid values
+        """
+        config = FsTools.get_config_section('controller.ini', 'Server', config_defaults)
+        values = dict((option, config.get(option)) for option in config_defaults)
+        if overrides is not None:
+            for option, value in overrides.items():
+                if option not in config_defaults:
+                    raise ValueError('Unknown server option "{:s}"'.format(option))
+                if value is not None:
+                    values[option] = str(value)
+
+        self.server_mode = values['server-mode'].lower()
+        if self.server_mode not in server_modes:
+            raise ValueError('server-mode must be one of: {:s}'.format(', '.join(server_modes)))
+        try:
+            self.workers = int(values['workers'])
+            self.thread_pool = int(values['thread-pool'])
+            self.thread_pool_max = int(values['thread-pool-max'])
+            self.autosize = to_bool(values['thread-pool-autosize'])
+            self.autosize_target_wait = float(values['autosize-target-wait'])
+            self.autosize_interval = float(values['autosize-interval'])
+            self.socket_queue_size = int(values['socket-queue-size'])
+            self.socket_timeout = int(values['socket-timeout'])
+            self.max_request_body_size = int(values['max-request-body-size'])
+            self.keep_alive = to_bool(values['keep-alive'])
+            self.keep_alive_limit = int(values['keep-alive-limit'])
+            self.drain_timeout = float(values['drain-timeout'])
+            self.admission_limit = int(values['admission-limit'])
+            self.admission_queue = int(values['admission-queue'])
+            self.admission_slo = float(values['admission-slo'])
+            self.server_timing = to_bool(values['server-timing'])
+            self.server_timing_sample = float(values['server-timing-sample'])
+            self.watchdog_threshold = float(values['watchdog-threshold'])
+            self.watchdog_interval = float(values['watchdog-interval'])
+            self.watchdog_dump_interval = float(values['watchdog-dump-interval'])
+            self.access_log = to_bool(values['access-log'])
+            self.log_max_bytes = int(values['log-max-bytes'])
+            self.log_backups = int(values['log-backups'])
+            self.log_queue = int(values['log-queue'])
+            self.log_interval = float(values['log-interval'])
+        except ValueError as e:
+            raise ValueError('Invalid server option: {:s}'.format(e.__str__()))
+
+        if self.workers < 1:
+            raise ValueError('workers must be 1 or larger')
+        if self.workers > 1 and not Supervisor.supported:
+            raise ValueError('workers larger than 1 need fork() and SO_REUSEPORT, which this platform does not have')
+        if self.workers > 1 and self.server_mode == 'cherrypy' and not reuse_port_supported:
+            raise ValueError('workers larger than 1 need a cheroot version with reuse_port (10.0.0 or later)')
+        if self.thread_pool < 1:
+            raise ValueError('thread-pool must be 1 or larger')
+        if self.thread_pool_max == 0 or 0 < self.thread_pool_max < self.thread_pool:
+            raise ValueError('thread-pool-max must be -1 (no limit) or not smaller than thread-pool')
+        if self.autosize and self.thread_pool_max <= self.thread_pool:
+            raise ValueError('thread-pool-autosize needs a thread-pool-max larger than thread-pool')
+        if self.autosize_target_wait <= 0 or self.autosize_interval <= 0:
+            raise ValueError('autosize-target-wait and autosize-interval must be larger than zero')
+        if self.socket_queue_size < 1 or self.socket_timeout <= 0:
+            raise ValueError('socket-queue-size and socket-timeout must be larger than zero')
+        if self.max_request_body_size < 0 or self.keep_alive_limit < 0:
+            raise ValueError('max-request-body-size and keep-alive-limit must not be negative')
+        if self.drain_timeout < 0:
+            raise ValueError('drain-timeout must not be negative')
+        if self.admission_limit < 0 or self.admission_queue < 0:
+            raise ValueError('admission-limit and admission-queue must not be negative')
+        if self.admission_slo <= 0:
+            raise ValueError('admission-slo must be larger than zero')
+        if not 0 <= self.server_timing_sample <= 1:
+            raise ValueError('server-timing-sample must be between 0 and 1')
+        if self.watchdog_threshold < 0 or self.watchdog_dump_interval < 0:
+            raise ValueError('watchdog-threshold and watchdog-dump-interval must not be negative')
+        if self.watchdog_interval <= 0:
+            raise ValueError('watchdog-interval must be larger than zero')
+        if self.log_max_bytes < 0 or self.log_backups < 0:
+            raise ValueError('log-max-bytes and log-backups must not be negative')
+        if self.log_queue < 1 or self.log_interval <= 0:
+            raise ValueError('log-queue and log-interval must be larger than zero')
+        self.log_file = None
+        if values['log-file'].strip():
+            self.log_file = os.path.join(FsTools.get_config_folder(), values['log-file'].strip())
+        self.capture_file = None
+        if values['capture-file'].strip():
+            self.capture_file = os.path.join(FsTools.get_config_folder(), values['capture-file'].strip())
+
+    def cherrypy_config(self) -> dict:
+        """
+        Get the settings CherryPy understands directly, for the ``global`` section of its configuration
+
+        :return: A dict of CherryPy config keys and values
+        """
+        return {
+            'server.thread_pool': self.thread_pool,
+            'server.thread_pool_max': self.thread_pool_max,
+            'server.socket_queue_size': self.socket_queue_size,
+            'server.socket_timeout': self.socket_timeout,
+            'server.max_request_body_size': self.max_request_body_size
+        }
+
+
+class TimedQueue(queue.Queue):
+    """
+    A queue that measures how long the items wait in it
+
+    It replaces the queue of the worker thread pool of the HTTP server, so the time a connection waits for a worker is
+    known.
+    """
+
+    def __init__(self, maxsize: int=0):
+        """
+        Create the queue
+
+        :param maxsize: The maximum size of the queue, zero or less for no limit
+        """
+        super(TimedQueue, self).__init__(maxsize)
+        self.__waits = 0
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+
+    def _put(self, item) -> None:
+        self.queue.append((time.monotonic(), item))
+
+    def _get(self):
+        queued, item = self.queue.popleft()
+        wait = time.monotonic() - queued
+        self.__waits += 1
+        self.__wait_total += wait
+        self.__wait_max = max(self.__wait_max, wait)
+        return item
+
+    def take_stats(self) -> tuple:
+        """
+        Get the wait statistics since the last call and reset them
+
+        :return: A tuple of the number of items taken, the average and the maximum wait in seconds
+        """
+        with self.mutex:
+            waits, total, longest = self.__waits, self.__wait_total, self.__wait_max
+            self.__waits = 0
+            self.__wait_total = 0.0
+            self.__wait_max = 0.0
+        return waits, total / waits if waits > 0 else 0.0, longest
+
+
+class PoolAutoSizer(Monitor):
+    """
+    A CherryPy plugin that grows and shrinks the worker thread pool of the HTTP server by the observed queue wait
+
+    The pool grows by a quarter (at least one thread) as soon as the average wait within an interval exceeds the target.
+    It shrinks by the same step when the wait stayed far below the target and more threads than the step were idle for
+    :py:attr:`shrink_after` intervals in a row. The limits are those of the pool (``thread-pool`` and
+    ``thread-pool-max``).
+    """
+
+    #: Number of calm intervals in a row before the pool shrinks
+    shrink_after = 5
+
+    def __init__(self, bus, pool, timed_queue: TimedQueue, target_wait: float, interval: float):
+        """
+        Create the plugin
+
+        :param bus: The CherryPy engine
+        :param pool: The worker thread pool of the HTTP server
+        :param timed_queue: The queue of the pool
+        :param target_wait: The average queue wait in seconds the pool should stay below
+        :param interval: The time between two adjustments in seconds
+        """
+        super(PoolAutoSizer, self).__init__(bus, self.adjust, frequency=interval, name='PoolAutoSizer')
+        self.pool = pool
+        self.timed_queue = timed_queue
+        self.target_wait = target_wait
+        self.__calm = 0
+        self.__lock = threading.Lock()
+
+    def decide(self, threads: int, idle: int, average_wait: float) -> int:
+        """
+        Decide how to resize the pool
+
+        :param threads: The current number of worker threads
+        :param idle: The number of idle worker threads
+        :param average_wait: The average queue wait of the last interval in seconds
+        :return: The number of threads to add (positive) or to remove (negative)
+        """
+        step = max(1, threads // 4)
+        if average_wait > self.target_wait:
+            self.__calm = 0
+            return step
+        if average_wait < self.target_wait / 4 and idle > step:
+            self.__calm += 1
+            if self.__calm >= PoolAutoSizer.shrink_after:
+                self.__calm = 0
+                return -step
+            return 0
+        self.__calm = 0
+        return 0
+
+    def adjust(self) -> None:
+        """
+        Take the statistics of the last interval and resize the pool
+        """
+        with self.__lock:
+            average_wait = self.timed_queue.take_stats()[1]
+            change = self.decide(len(self.pool._threads), self.pool.idle, average_wait)
+            if change > 0:
+                self.pool.grow(change)
+            elif change < 0:
+                self.pool.shrink(-change)
+
+
+class SharedPortServer(ServerAdapter):
+    """
+    A server adapter for a port shared with other processes, through ``SO_REUSEPORT`` or by handing the listening
+    socket over on a restart
+
+    The CherryPy adapter refuses to start when something already listens on the port and waits for the port to be free
+    after stopping, but the other processes keep listening on it. This one only waits for its own HTTP server. A port
+    used by another program still makes the start fail, as binding the socket fails.
+    """
+
+    #: Seconds the workers get to notice their connection was closed when their requests are aborted
+    abort_grace = 1.0
+
+    def subscribe(self) -> None:
+        """
+        Register with the engine, also for draining on a shutdown
+        """
+        ServerAdapter.subscribe(self)
+        self.bus.subscribe(Helper.drain_channel, self.drain)
+
+    def unsubscribe(self) -> None:
+        """
+        Unregister from the engine
+        """
+        ServerAdapter.unsubscribe(self)
+        self.bus.unsubscribe(Helper.drain_channel, self.drain)
+
+    def start(self) -> None:
+        """
+        Start the HTTP server in a new thread
+        """
+        if self.running:
+            return
+        self.interrupt = None
+        thread = threading.Thread(target=self._start_http_thread, name='HTTPServer')
+        thread.start()
+        while not getattr(self.httpserver, 'ready', False):
+            if self.interrupt:
+                raise self.interrupt
+            time.sleep(0.1)
+        self.running = True
+        self.bus.log('Serving on {:s} (shared port)'.format(self.description))
+
+    start.priority = 75
+
+    def stop(self) -> None:
+        """
+        Stop the HTTP server
+        """
+        if self.running:
+            self.httpserver.stop()
+            self.running = False
+            self.bus.log('HTTP Server {:s} shut down'.format(str(self.httpserver)))
+
+    stop.priority = 25
+
+    def drain(self, deadline: float) -> tuple:
+        """
+        Stop the HTTP server, letting the requests in flight finish until the deadline
+
+        Requests still running at the deadline are aborted by shutting their connection down, as threads cannot be
+        stopped. The request fails as soon as it reads from or writes to the connection.
+
+        :param deadline: When to abort the remaining requests (``time.monotonic``)
+        :return: The numbers of drained and aborted requests
+        """
+        if not self.running:
+            return 0, 0
+        pool = self.httpserver.requests
+        workers = list(getattr(pool, '_threads', list()))
+        in_flight = sum(1 for worker in workers if getattr(worker, 'conn', None) is not None)
+        if hasattr(pool, '_queue'):
+            in_flight += pool._queue.qsize()
+        self.httpserver.shutdown_timeout = max(deadline - time.monotonic(), 0) + self.abort_grace
+        stopping = threading.Thread(target=self.stop, name='HTTPServerStop', daemon=True)
+        stopping.start()
+        stopping.join(max(deadline - time.monotonic(), 0))
+        aborted = 0
+        for worker in workers:
+            conn = getattr(worker, 'conn', None)
+            if conn is None or not worker.is_alive():
+                continue
+            aborted += 1
+            try:
+                conn.socket.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, OSError):
+                pass
+        stopping.join(self.abort_grace)
+        return max(in_flight - aborted, 0), aborted
+
+
+def prepare_server(server, settings: ServerSettings, bus=None) -> PoolAutoSizer:
+    """
+    Create the HTTP server of a CherryPy server adapter and apply the settings CherryPy does not pass on by itself
+
+    This must be called after the CherryPy configuration has been updated with :py:meth:`ServerSettings.cherrypy_config
+    <.ServerSettings.cherrypy_config>` and before the engine is started.
+
+    :param server: The CherryPy server adapter, usually ``cherrypy.server``
+    :param settings: The settings
+    :param bus: The engine to subscribe the auto sizer to, if enabled
+    :return: The auto sizer or None when auto sizing is disabled or not possible
+    """
+    server.httpserver, server.bind_addr = server.httpserver_from_self()
+    server.httpserver.keep_alive_conn_limit = settings.keep_alive_limit if settings.keep_alive else 0
+    server.httpserver.reuse_port = settings.workers > 1
+    if not settings.autosize:
+        return None
+    pool = server.httpserver.requests
+    if not hasattr(pool, '_queue') or not hasattr(pool, '_threads'):
+        LogWriter.report('warning', 'autosize_unsupported',
+                         'Server Tuning: The thread pool does not support auto sizing')
+        return None
+    timed_queue = TimedQueue(pool._queue.maxsize)
+    pool._queue = timed_queue
+    pool.get = timed_queue.get
+    auto_sizer = PoolAutoSizer(bus, pool, timed_queue, settings.autosize_target_wait, settings.autosize_interval)
+    if bus is not None:
+        auto_sizer.subscribe()
+    return auto_sizer
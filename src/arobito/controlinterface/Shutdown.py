@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module shuts the control interface down in stages.
+
+A shutdown is requested by an administrator on ``/app/shutdown`` or with ``SIGTERM`` or ``SIGINT``. It runs in the
+background:
+
+#. The clients are told about the shutdown on the push channel.
+#. The server stops accepting connections. Idle keep-alive connections are closed.
+#. The requests in flight get ``drain-timeout`` seconds to finish. Those still running then are aborted by closing their
+   connection. An immediate shutdown aborts them at once.
+#. The sessions are written, see :py:meth:`SessionManager.flush
+   <arobito.controlinterface.BackendManager.SessionManager.flush>`.
+#. The engine stops its plugins and exits.
+
+The numbers of drained and aborted requests are logged through the :py:mod:`LogWriter
+<arobito.controlinterface.LogWriter>`.
+"""
+
+import signal
+import threading
+import time
+import traceback
+from cherrypy.process import plugins
+from arobito import Helper
+from arobito.controlinterface import LogWriter
+from arobito.controlinterface.BackendManager import SessionManager
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Shutdown(plugins.SimplePlugin):
+    """
+    Engine plugin running the staged shutdown
+    """
+
+    #: Seconds to wait before the server stops accepting, so the response to the shutdown request gets out
+    answer_delay = 0.25
+
+    def __init__(self, bus, drain_timeout: float):
+        """
+        Prepare the plugin
+
+        :param bus: The CherryPy engine
+        :param drain_timeout: Seconds the requests in flight get to finish on a drained shutdown
+        """
+        plugins.SimplePlugin.__init__(self, bus)
+        self.drain_timeout = drain_timeout
+        #: The number of requests finished during the shutdown
+        self.drained = 0
+        #: The number of requests aborted during the shutdown
+        self.aborted = 0
+        self.__lock = threading.Lock()
+        self.__running = False
+
+    def subscribe(self) -> None:
+        """
+        Register with the engine and for ``SIGTERM`` and ``SIGINT``
+        """
+        plugins.SimplePlugin.subscribe(self)
+        self.bus.subscribe(Helper.shutdown_channel, self.shutdown)
+        if threading.current_thread() is threading.main_thread():
+            for signal_number in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signal_number, lambda number, frame: self.shutdown())
+
+    def unsubscribe(self) -> None:
+        """
+        Unregister from the engine
+        """
+        plugins.SimplePlugin.unsubscribe(self)
+        self.bus.unsubscribe(Helper.shutdown_channel, self.shutdown)
+
+    def shutdown(self, drain: bool=True) -> bool:
+        """
+        Start the shutdown in the background
+
+        :param drain: True to let the requests in flight finish within the drain timeout, False to abort them
+        :return: True when the shutdown was started, False when the engine does not run or it is shutting down already
+        """
+        with self.__lock:
+            if self.__running or self.bus.state != self.bus.states.STARTED:
+                return False
+            self.__running = True
+        threading.Thread(target=self.__shutdown, args=(drain,), name='Shutdown').start()
+        return True
+
+    def __shutdown(self, drain: bool) -> None:
+        """
+        Run the stages of the shutdown
+
+        :param drain: True to let the requests in flight finish, False to abort them
+        """
+        timeout = self.drain_timeout if drain else 0.0
+        try:
+            time.sleep(self.answer_delay)
+            Helper.publish_status('shutdown', mode='drain' if drain else 'immediate', delay=timeout)
+            deadline = time.monotonic() + timeout
+            for drained, aborted in self.bus.publish(Helper.drain_channel, deadline):
+                self.drained += drained
+                self.aborted += aborted
+            SessionManager().flush()
+        except Exception as e:
+            LogWriter.report('error', 'shutdown_failed', 'Shutdown: {:s}'.format(e.__str__()),
+                             stack=traceback.format_exc())
+        LogWriter.report('info', 'shutdown', 'Shutdown: {:d} requests drained, {:d} aborted'
+                         .format(self.drained, self.aborted), drained=self.drained, aborted=self.aborted)
+        self.bus.exit()
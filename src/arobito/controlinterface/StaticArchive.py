@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module allows to deliver the static content out of a single zip archive instead of a folder.
+
+The central directory of the archive is read once and indexed in memory. The archive itself is memory mapped, so
+stored entries are delivered as slices of the map. Deflated entries can be handed to clients that accept gzip without
+decompressing them: A deflate stream within a zip archive is the same as within a gzip member, only the header and the
+trailer need to be added.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zipfile
+import zlib
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The structure of the fixed part of a local file header in a zip archive
+local_header_struct = struct.Struct('<4sHHHHHIIIHH')
+
+#: The header of a gzip member: magic, deflate, no flags, no mtime, no extra flags, unknown OS
+gzip_header = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+#: File endings of content that is already compressed and is stored as it is when creating an archive
+compressed_types = ('png', 'gif', 'jpg', 'jpeg', 'zip', 'gz', 'woff')
+
+
+def is_archive(location: str) -> bool:
+    """
+    Tell if a location is a zip archive instead of a folder
+
+    :param location: The file system location
+    :return: True for a zip archive
+    """
+    return os.path.isfile(location) and zipfile.is_zipfile(location)
+
+
+def create_archive(static_folder: str, archive_file: str) -> int:
+    """
+    Pack a static folder into a zip archive
+
+    Content that is already compressed, like images, is stored. Everything else is deflated.
+
+    :param static_folder: The folder to pack
+    :param archive_file: The archive to create
+    :return: The number of files packed
+    """
+    count = 0
+    with zipfile.ZipFile(archive_file, 'w') as archive:
+        for folder, dirs, files in os.walk(static_folder):
+            dirs.sort()
+            for name in sorted(files):
+                file = os.path.join(folder, name)
+                arc_name = os.path.relpath(file, static_folder).replace(os.sep, '/')
+                extension = name[name.rfind('.') + 1:].lower()
+                compression = zipfile.ZIP_STORED if extension in compressed_types else zipfile.ZIP_DEFLATED
+                archive.write(file, arc_name, compress_type=compression)
+                count += 1
+    return count
+
+
+class ArchiveEntry(object):
+    """
+    The index information of a single file in the archive
+    """
+
+    def __init__(self, offset: int, compressed_size: int, size: int, deflated: bool, crc: int):
+        """
+        Create the entry
+
+        :param offset: The position of the (compressed) data in the archive
+        :param compressed_size: The size of the data in the archive
+        :param size: The size of the file
+        :param deflated: True when the data is deflated, False when it is stored
+        :param crc: The CRC-32 of the file
+        """
+        self.offset = offset
+        self.compressed_size = compressed_size
+        self.size = size
+        self.deflated = deflated
+        self.crc = crc
+
+
+class StaticArchive(object):
+    """
+    A zip archive with static content, indexed and memory mapped
+    """
+
+    def __init__(self, archive_file: str):
+        """
+        Open the archive and index its central directory
+
+        When all entries are within a single top level folder (e.g. the archive was created by zipping the
+        ``web-static`` folder itself), that folder is stripped from the names.
+
+        :param archive_file: The zip archive
+        :raise IOError: When the archive cannot be read or contains unsupported entries
+        """
+        self.archive_file = archive_file
+        self.entries = dict()
+        with open(archive_file, 'rb') as fh:
+            self.__map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with zipfile.ZipFile(archive_file) as archive:
+                infos = [info for info in archive.infolist() if not info.is_dir()]
+        except zipfile.BadZipFile as e:
+            raise IOError('Invalid archive "{:s}": {:s}'.format(archive_file, e.__str__()))
+        prefix = ''
+        top_levels = set(info.filename.split('/', 1)[0] for info in infos)
+        if len(top_levels) == 1 and all('/' in info.filename for info in infos):
+            prefix = top_levels.pop() + '/'
+        for info in infos:
+            if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                raise IOError('Unsupported compression for "{:s}" in "{:s}"'.format(info.filename, archive_file))
+            if info.flag_bits & 0x1:
+                raise IOError('Encrypted entry "{:s}" in "{:s}"'.format(info.filename, archive_file))
+            header = local_header_struct.unpack_from(self.__map, info.header_offset)
+            if header[0] != b'PK\x03\x04':
+                raise IOError('Invalid local header for "{:s}" in "{:s}"'.format(info.filename, archive_file))
+            offset = info.header_offset + local_header_struct.size + header[9] + header[10]
+            self.entries[info.filename[len(prefix):]] = ArchiveEntry(offset, info.compress_size, info.file_size,
+                                                                     info.compress_type == zipfile.ZIP_DEFLATED,
+                                                                     info.CRC)
+
+    def get_entry(self, name: str) -> ArchiveEntry:
+        """
+        Look up a file
+
+        :param name: The name of the file, with ``/`` as separator
+        :return: The entry or None when there is no such file
+        """
+        return self.entries.get(name, None)
+
+    def raw(self, entry: ArchiveEntry) -> memoryview:
+        """
+        Get the data of an entry like it is stored in the archive, without copying it
+
+        :param entry: The entry
+        :return: A view on the memory map
+        """
+        return memoryview(self.__map)[entry.offset:entry.offset + entry.compressed_size]
+
+    def read(self, entry: ArchiveEntry):
+        """
+        Get the content of a file
+
+        Stored files are returned as a view on the memory map, deflated files are decompressed.
+
+        :param entry: The entry
+        :return: The content as bytes or memoryview
+        """
+        if not entry.deflated:
+            return self.raw(entry)
+        return zlib.decompress(self.raw(entry), -zlib.MAX_WBITS)
+
+    def gzip_parts(self, entry: ArchiveEntry) -> list:
+        """
+        Wrap the deflate stream of an entry into a gzip member, without decompressing it
+
+        :param entry: A deflated entry
+        :return: A list of the gzip header, the deflate stream and the gzip trailer
+        """
+        trailer = struct.pack('<II', entry.crc, entry.size & 0xffffffff)
+        return [gzip_header, self.raw(entry), trailer]
+
+    def load_json(self, name: str):
+        """
+        Load a JSON document out of the archive
+
+        :param name: The name of the file
+        :return: The document or None when there is no such file
+        """
+        entry = self.get_entry(name)
+        if entry is None:
+            return None
+        return json.loads(bytes(self.read(entry)).decode('utf-8'))
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module contains the building blocks for delivering static files: Parsing of HTTP ``Range`` headers and response
+bodies that stream (parts of) a file without loading it into memory as a whole.
+
+It does not depend on CherryPy, so the same bodies can be used by every server implementation.
+"""
+
+import mmap
+import re
+from arobito.Base import create_simple_key
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The size of the chunks a streamed file is delivered in
+chunk_size = 65536
+
+#: Requests with more ranges than this are answered with the whole file
+max_ranges = 16
+
+range_spec_regex = re.compile('^(?P<start>[0-9]*)-(?P<end>[0-9]*)$')
+
+
+def parse_range(header: str, size: int) -> list:
+    """
+    Parse the value of a HTTP ``Range`` header
+
+    Only byte ranges are supported. The ranges are returned as a list of ``(start, stop)`` tuples, where ``stop`` is
+    exclusive, like in Python slices.
+
+    :param header: The value of the ``Range`` header
+    :param size: The size of the file in bytes
+    :return: None when the header is missing or cannot be used (deliver the whole file then), an empty list when no
+             range is satisfiable (answer with 416), the list of ranges otherwise.
+    """
+    if header is None:
+        return None
+    header = header.strip()
+    if not header.startswith('bytes='):
+        return None
+    specs = header[6:].split(',')
+    if len(specs) > max_ranges:
+        return None
+    ranges = list()
+    for spec in specs:
+        match = range_spec_regex.match(spec.strip())
+        if not match:
+            return None
+        start = match.group('start')
+        end = match.group('end')
+        if len(start) <= 0 and len(end) <= 0:
+            return None
+        if len(start) <= 0:
+            # Suffix range: the last n bytes
+            suffix = int(end)
+            if suffix <= 0 or size <= 0:
+                continue
+            ranges.append((max(0, size - suffix), size))
+            continue
+        start = int(start)
+        if len(end) > 0 and int(end) < start:
+            return None
+        if start >= size:
+            continue
+        stop = size if len(end) <= 0 else min(int(end) + 1, size)
+        ranges.append((start, stop))
+    return ranges
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Check if a client accepts gzip encoded responses
+
+    :param accept_encoding: The value of the ``Accept-Encoding`` header
+    :return: True if gzip is accepted
+    """
+    if accept_encoding is None:
+        return False
+    for coding in accept_encoding.split(','):
+        parts = [p.strip() for p in coding.split(';')]
+        if parts[0].lower() not in ('gzip', 'x-gzip', '*'):
+            continue
+        for p in parts[1:]:
+            if p.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+                return False
+        return True
+    return False
+
+
+class FileBody(object):
+    """
+    A response body that streams ranges of a file out of a memory map, chunk by chunk.
+
+    With a single range, the body is the plain content of the range. With more ranges, the body is a
+    ``multipart/byteranges`` document. Servers with direct access to the client socket can use :py:attr:`file_name`
+    and :py:attr:`ranges` to hand single range bodies to ``os.sendfile`` instead of iterating.
+    """
+
+    def __init__(self, file_name: str, size: int, mime: str, ranges: list=None):
+        """
+        Prepare the body
+
+        :param file_name: The file to deliver
+        :param size: The size of the file
+        :param mime: The mime type of the file, used for the multipart headers
+        :param ranges: A list of ``(start, stop)`` tuples. None delivers the whole file.
+        """
+        self.file_name = file_name
+        self.size = size
+        self.mime = mime
+        self.ranges = ranges if ranges else [(0, size)]
+        self.boundary = create_simple_key(32)
+
+    def is_multipart(self) -> bool:
+        """
+        Tell if this body is a ``multipart/byteranges`` document
+
+        :return: True for more than one range
+        """
+        return len(self.ranges) > 1
+
+    def content_type(self) -> str:
+        """
+        Get the value of the ``Content-Type`` header for this body
+
+        :return: The content type
+        """
+        if self.is_multipart():
+            return 'multipart/byteranges; boundary={:s}'.format(self.boundary)
+        return self.mime
+
+    def content_range(self) -> str:
+        """
+        Get the value of the ``Content-Range`` header for a single range body
+
+        :return: The header value
+        """
+        start, stop = self.ranges[0]
+        return 'bytes {:d}-{:d}/{:d}'.format(start, stop - 1, self.size)
+
+    def __part_header(self, start: int, stop: int) -> bytes:
+        """
+        Create the header of a part in a multipart body
+
+        :param start: The start of the range
+        :param stop: The end of the range (exclusive)
+        :return: The header as bytes
+        """
+        return '--{:s}\r\nContent-Type: {:s}\r\nContent-Range: bytes {:d}-{:d}/{:d}\r\n\r\n'\
+            .format(self.boundary, self.mime, start, stop - 1, self.size).encode('ascii')
+
+    def __closing(self) -> bytes:
+        """
+        The closing delimiter of a multipart body
+
+        :return: The delimiter as bytes
+        """
+        return '--{:s}--\r\n'.format(self.boundary).encode('ascii')
+
+    def content_length(self) -> int:
+        """
+        Calculate the number of bytes this body produces
+
+        :return: The length in bytes
+        """
+        length = 0
+        for start, stop in self.ranges:
+            length += stop - start
+            if self.is_multipart():
+                length += len(self.__part_header(start, stop)) + 2
+        if self.is_multipart():
+            length += len(self.__closing())
+        return length
+
+    def _stream(self, data):
+        """
+        Deliver the ranges out of a buffer
+
+        :param data: A buffer with the complete content, e.g. a memory map
+        """
+        for start, stop in self.ranges:
+            if self.is_multipart():
+                yield self.__part_header(start, stop)
+            for offset in range(start, stop, chunk_size):
+                yield bytes(data[offset:min(offset + chunk_size, stop)])
+            if self.is_multipart():
+                yield b'\r\n'
+        if self.is_multipart():
+            yield self.__closing()
+
+    def __iter__(self):
+        """
+        Stream the body
+
+        The file is mapped into memory and delivered in slices of :py:data:`chunk_size` bytes, so the memory
+        consumption does not depend on the file size.
+        """
+        with open(self.file_name, 'rb') as fh:
+            if self.size <= 0:
+                mapped = b''
+            else:
+                mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for chunk in self._stream(mapped):
+                    yield chunk
+            finally:
+                if isinstance(mapped, mmap.mmap):
+                    mapped.close()
+
+
+class BufferBody(FileBody):
+    """
+    A response body like :py:class:`FileBody <.FileBody>`, that streams ranges out of a buffer already in memory,
+    e.g. a slice of a memory mapped archive.
+    """
+
+    def __init__(self, data, mime: str, ranges: list=None):
+        """
+        Prepare the body
+
+        :param data: The buffer, e.g. bytes or a memoryview
+        :param mime: The mime type of the content
+        :param ranges: A list of ``(start, stop)`` tuples. None delivers the whole buffer.
+        """
+        super(BufferBody, self).__init__(None, len(data), mime, ranges)
+        self.data = data
+
+    def __iter__(self):
+        """
+        Stream the body in slices of :py:data:`chunk_size` bytes
+        """
+        return self._stream(self.data)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module runs the control interface in several worker processes (POSIX only).
+
+The supervisor forks the workers before any thread is started. Every worker binds its own listening socket to the same
+address with ``SO_REUSEPORT``, so the kernel spreads the connections over the workers. The supervisor itself only keeps
+a bound socket without listening on it, which reserves the port while workers are restarted.
+
+Workers that crash (a non-zero exit status or a signal) are started again, with a growing delay when they keep
+crashing. A worker exiting with status 0 was asked to shut down, e.g. by ``/app/shutdown``, so the supervisor stops
+the other workers and exits as well. ``SIGTERM`` and ``SIGINT`` are forwarded to the workers. A restart with a socket
+handoff (see :py:mod:`Handoff <arobito.controlinterface.Handoff>`) is not available in this mode.
+
+As the supervisor starts no threads, it runs no :py:mod:`LogWriter <arobito.controlinterface.LogWriter>`; its own
+messages go to the error output, those of the workers to their log.
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from arobito.controlinterface import LogWriter
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: True when worker processes are possible on this platform
+supported = hasattr(os, 'fork') and hasattr(socket, 'SO_REUSEPORT')
+
+
+def reserve_port(bind_ip: str, listen_port: int) -> socket.socket:
+    """
+    Bind a socket with ``SO_REUSEPORT`` without listening on it
+
+    :param bind_ip: The IP to bind to
+    :param listen_port: The port to bind to
+    :return: The socket
+    :raise IOError: When the address cannot be bound, e.g. because another program listens on it
+    """
+    family = socket.AF_INET6 if ':' in bind_ip else socket.AF_INET
+    reserved = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        reserved.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        reserved.bind((bind_ip, listen_port))
+    except OSError as e:
+        reserved.close()
+        raise IOError('Cannot bind {:s}:{:d}: {:s}'.format(bind_ip, listen_port, e.__str__()))
+    return reserved
+
+
+class Supervisor(object):
+    """
+    Start, watch and restart the worker processes
+    """
+
+    #: Seconds to wait before restarting a crashed worker, doubled on every crash in a row
+    restart_delay = 0.5
+    #: The longest delay before a restart
+    max_restart_delay = 30.0
+    #: A worker running that many seconds is considered healthy again and restarts without delay
+    healthy_after = 10.0
+    #: Seconds the workers get to exit after ``SIGTERM`` before they are killed
+    stop_timeout = 10.0
+    #: Seconds between two checks of the workers
+    poll_interval = 0.1
+
+    def __init__(self, workers: int, bind_ip: str, listen_port: int, target):
+        """
+        Prepare the supervisor
+
+        :param workers: The number of worker processes
+        :param bind_ip: The IP the workers bind to
+        :param listen_port: The port the workers listen to
+        :param target: A callable run in every worker, returning the exit status of the worker
+        """
+        self.workers = workers
+        self.bind_ip = bind_ip
+        self.listen_port = listen_port
+        self.target = target
+        #: The running workers: pid to slot number
+        self.pids = dict()
+        #: Per slot: the start time of the current worker and the number of crashes in a row
+        self.slots = [(0.0, 0) for i in range(0, workers)]
+        #: Slots waiting for a restart: slot number to the time of the restart
+        self.pending = dict()
+        self.restarts = 0
+        self.__reserved = None
+        self.__stopping = False
+        self.__stop_deadline = None
+
+    def run(self) -> int:
+        """
+        Run the workers until the service is stopped
+
+        :return: The exit status code
+        :raise IOError: When the port cannot be reserved
+        """
+        self.__reserved = reserve_port(self.bind_ip, self.listen_port)
+        previous = dict((signal_number, signal.signal(signal_number, self.__on_signal))
+                        for signal_number in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP))
+        try:
+            for slot in range(0, self.workers):
+                self.__start(slot)
+            while self.pids or (self.pending and not self.__stopping):
+                self.__reap()
+                self.__restart_pending()
+                if self.__stopping and self.__stop_deadline is not None and time.monotonic() > self.__stop_deadline:
+                    self.__signal_workers(signal.SIGKILL)
+                    self.__stop_deadline = None
+                time.sleep(self.poll_interval)
+        finally:
+            for signal_number, handler in previous.items():
+                signal.signal(signal_number, handler)
+            self.__reserved.close()
+        return 0
+
+    def stop(self) -> None:
+        """
+        Stop all workers; :py:meth:`run` returns once they are gone
+        """
+        if self.__stopping:
+            return
+        self.__stopping = True
+        self.__stop_deadline = time.monotonic() + self.stop_timeout
+        self.pending.clear()
+        self.__signal_workers(signal.SIGTERM)
+
+    def __on_signal(self, signal_number, frame) -> None:
+        """
+        Stop the workers on ``SIGTERM`` or ``SIGINT``; ``SIGHUP`` is ignored, as the workers cannot hand over the port
+        """
+        if signal_number == signal.SIGHUP:
+            LogWriter.report('warning', 'handoff_unsupported',
+                             'Restarting with a socket handoff is not possible with worker processes')
+            return
+        self.stop()
+
+    def __signal_workers(self, signal_number: int) -> None:
+        """
+        Send a signal to all running workers
+
+        :param signal_number: The signal
+        """
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal_number)
+            except ProcessLookupError:
+                pass
+
+    def __start(self, slot: int) -> None:
+        """
+        Fork a worker
+
+        :param slot: The slot of the worker
+        """
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            self.__run_worker()
+        self.pids[pid] = slot
+        self.slots[slot] = (time.monotonic(), self.slots[slot][1])
+
+    def __run_worker(self) -> None:
+        """
+        The life of a worker process: Run the target and exit with its status, never returning to the caller
+        """
+        status = 1
+        try:
+            self.__reserved.close()
+            for signal_number in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                signal.signal(signal_number, signal.SIG_DFL)
+            status = self.target()
+        except BaseException as e:
+            if isinstance(e, SystemExit):
+                status = e.code if isinstance(e.code, int) else 1
+            else:
+                LogWriter.report('error', 'worker_failed', 'Worker {:d} failed: {:s}'.format(os.getpid(), e.__str__()),
+                                 stack=traceback.format_exc())
+        finally:
+            LogWriter.LogWriter().stop()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(status & 0xff if isinstance(status, int) else 1)
+
+    def __reap(self) -> None:
+        """
+        Collect the exited workers and decide what to do about them
+        """
+        while self.pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.pids.clear()
+                return
+            if pid == 0:
+                return
+            slot = self.pids.pop(pid, None)
+            if slot is None or self.__stopping:
+                continue
+            if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+                LogWriter.report('info', 'worker_stopped', 'Worker {:d} shut down, stopping the service'.format(pid))
+                self.stop()
+                continue
+            started, crashes = self.slots[slot]
+            if time.monotonic() - started >= self.healthy_after:
+                crashes = 0
+            delay = 0.0 if crashes == 0 else min(self.restart_delay * 2 ** (crashes - 1), self.max_restart_delay)
+            self.slots[slot] = (started, crashes + 1)
+            self.pending[slot] = time.monotonic() + delay
+            reason = 'exited with {:d}'.format(os.WEXITSTATUS(status)) if os.WIFEXITED(status) \
+                else 'was killed by signal {:d}'.format(os.WTERMSIG(status))
+            LogWriter.report('warning', 'worker_restart',
+                             'Worker {:d} {:s}, restarting in {:.1f} seconds'.format(pid, reason, delay))
+
+    def __restart_pending(self) -> None:
+        """
+        Start the workers whose restart is due
+        """
+        now = time.monotonic()
+        for slot, due in list(self.pending.items()):
+            if due <= now and not self.__stopping:
+                del self.pending[slot]
+                self.restarts += 1
+                self.__start(slot)
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module measures where the time of an ``/app`` request goes and reports it in a ``Server-Timing`` header.
+
+The phases are:
+
+* ``tools``: The request line and header handling, and the tools before the body is read
+* ``parse``: Reading and decoding the request body; only decoding in the :py:mod:`AsyncServer
+  <arobito.controlinterface.AsyncServer>`, which reads the body together with the headers
+* ``admission``: Waiting for a slot of the :py:mod:`Admission <arobito.controlinterface.Admission>` control
+* ``backend``: The method of :py:class:`ControllerBackend.App <arobito.controlinterface.ControllerBackend.App>`,
+  including the two following phases
+* ``session``: Looking up the session, including the cleanup of expired sessions
+* ``hash``: Hashing the password on ``auth``
+* ``encode``: Encoding the response
+* ``write``: Sending the response; only in the log, as the header is sent before
+
+The timing is enabled with ``server-timing = yes`` in the ``[Server]`` section of ``controller.ini``. The share of the
+requests given by ``server-timing-sample`` (0 to 1) is also logged, with the request ID, through the :py:mod:`LogWriter
+<arobito.controlinterface.LogWriter>`. The request ID is taken from an ``X-Request-ID`` header or created, and sent
+back in the same header.
+
+Disabled, the timing costs nothing: The functions of the inner phases are only wrapped by :py:func:`install`, and the
+CherryPy ``timing`` tool is only switched on for ``/app`` when enabled.
+"""
+
+import contextvars
+import functools
+import os
+import random
+import re
+import time
+import cherrypy
+from arobito.controlinterface import BackendManager, Codec, LogWriter
+from arobito.controlinterface.ControllerBackend import App as Backend
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The phases in the order they are reported
+phases = ('tools', 'parse', 'admission', 'backend', 'session', 'hash', 'encode', 'write')
+
+#: The functions timed once installed, as module or class, name of the function and phase
+timed_functions = (
+    (BackendManager.SessionManager, 'get_user', 'session'),
+    (BackendManager, 'hash_password', 'hash'),
+    (Codec, 'encode', 'encode')
+)
+
+#: The valid request IDs sent by clients
+request_id_regex = re.compile('^[A-Za-z0-9._:-]{1,64}$')
+
+#: The timer of the current request, None outside a timed request
+current = contextvars.ContextVar('arobito_timer', default=None)
+
+#: Whether :py:func:`install` was called
+installed = False
+
+#: The share of the timed requests logged
+sample_rate = 0.0
+
+
+class RequestTimer(object):
+    """
+    The phases of one request
+    """
+
+    __slots__ = ('request_id', 'durations', 'started', 'last', 'open')
+
+    def __init__(self, request_id: str=None):
+        """
+        Start timing
+
+        :param request_id: The ID sent by the client; a new one is created if it is None or invalid
+        """
+        if request_id is None or not request_id_regex.match(request_id):
+            request_id = os.urandom(8).hex()
+        self.request_id = request_id
+        #: The seconds spent by phase
+        self.durations = dict()
+        self.started = self.last = time.perf_counter()
+        #: The phases of the wrapped functions running
+        self.open = set()
+
+    def mark(self, phase: str) -> None:
+        """
+        End a phase: The time since the previous mark is added to it
+
+        :param phase: The phase, or None to skip the time
+        """
+        now = time.perf_counter()
+        if phase is not None:
+            self.durations[phase] = self.durations.get(phase, 0.0) + now - self.last
+        self.last = now
+
+    def add(self, phase: str, seconds: float) -> None:
+        """
+        Add the time of a function to a phase, without moving the mark
+
+        :param phase: The phase
+        :param seconds: The time
+        """
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def header(self) -> str:
+        """
+        Get the ``Server-Timing`` header
+
+        :return: The phases measured so far and the total in milliseconds
+        """
+        entries = ['{:s};dur={:.3f}'.format(phase, self.durations[phase] * 1000)
+                   for phase in phases if phase in self.durations]
+        entries.append('total;dur={:.3f}'.format((time.perf_counter() - self.started) * 1000))
+        return ', '.join(entries)
+
+    def log(self, method: str, path: str, status: int) -> None:
+        """
+        Log the phases, for the sampled share of the requests
+
+        :param method: The request method
+        :param path: The request path
+        :param status: The status code of the response
+        """
+        if sample_rate <= 0 or random.random() >= sample_rate:
+            return
+        LogWriter.log('debug', 'server_timing', 'Timing: request {:s} {:s} {:s} {:d} {:s} total={:.3f}ms'.format(
+            self.request_id, method, path, status,
+            ' '.join('{:s}={:.3f}ms'.format(phase, self.durations[phase] * 1000)
+                     for phase in phases if phase in self.durations),
+            (time.perf_counter() - self.started) * 1000), request_id=self.request_id)
+
+
+def timed(function, phase: str):
+    """
+    Wrap a function to add its time to a phase of the current request
+
+    Calls within a call of the same phase, e.g. a backend method called by ``batch``, are not counted twice.
+
+    :param function: The function
+    :param phase: The phase
+    :return: The wrapper
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        timer = current.get()
+        if timer is None or phase in timer.open:
+            return function(*args, **kwargs)
+        timer.open.add(phase)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timer.add(phase, time.perf_counter() - started)
+            timer.open.discard(phase)
+
+    wrapper.timed_original = function
+    return wrapper
+
+
+def install(backend_methods, rate: float=0.0) -> None:
+    """
+    Wrap the functions of the inner phases and the backend methods, once
+
+    :param backend_methods: The names of the methods of :py:class:`ControllerBackend.App
+                            <arobito.controlinterface.ControllerBackend.App>` called by the API
+    :param rate: The share of the timed requests to log
+    """
+    global installed, sample_rate
+    sample_rate = rate
+    if installed:
+        return
+    installed = True
+    targets = timed_functions + tuple((Backend, name, 'backend') for name in backend_methods)
+    for owner, name, phase in targets:
+        setattr(owner, name, timed(getattr(owner, name), phase))
+
+
+def uninstall() -> None:
+    """
+    Remove the wrappers again
+    """
+    global installed
+    if not installed:
+        return
+    for owner in (BackendManager.SessionManager, BackendManager, Codec, Backend):
+        for name, member in list(vars(owner).items()):
+            original = getattr(member, 'timed_original', None)
+            if original is not None:
+                setattr(owner, name, original)
+    installed = False
+
+
+class TimingTool(cherrypy.Tool):
+    """
+    The CherryPy tool timing the phases of the ``/app`` requests
+    """
+
+    def __init__(self):
+        """
+        Start the timer when the resource is found
+        """
+        cherrypy.Tool.__init__(self, 'on_start_resource', self.start, priority=1)
+
+    def _setup(self) -> None:
+        """
+        Hook the marks between the phases into the request
+        """
+        cherrypy.Tool._setup(self)
+        hooks = cherrypy.request.hooks
+        hooks.attach('before_request_body', self.mark, priority=100, phase='tools')
+        hooks.attach('before_handler', self.mark, priority=10, phase='parse')
+        hooks.attach('before_handler', self.mark, priority=30, phase='admission')
+        hooks.attach('before_finalize', self.send_header, priority=100)
+        hooks.attach('on_end_request', self.finish, priority=90)
+
+    @staticmethod
+    def start() -> None:
+        """
+        Start the timer
+        """
+        request = cherrypy.request
+        request.timer = RequestTimer(request.headers.get('X-Request-ID'))
+        request.timer_token = current.set(request.timer)
+
+    @staticmethod
+    def mark(phase: str) -> None:
+        """
+        End a phase
+
+        :param phase: The phase
+        """
+        cherrypy.request.timer.mark(phase)
+
+    @staticmethod
+    def send_header() -> None:
+        """
+        Add the ``Server-Timing`` and ``X-Request-ID`` headers
+        """
+        timer = cherrypy.request.timer
+        timer.mark(None)
+        cherrypy.response.headers['Server-Timing'] = timer.header()
+        cherrypy.response.headers['X-Request-ID'] = timer.request_id
+
+    @staticmethod
+    def finish() -> None:
+        """
+        Log the request and stop timing
+        """
+        request = cherrypy.request
+        timer = getattr(request, 'timer', None)
+        if timer is None:
+            return
+        timer.mark('write')
+        try:
+            status = int(str(cherrypy.response.status)[:3])
+        except ValueError:
+            status = 500
+        timer.log(request.method, request.script_name + request.path_info, status)
+        current.reset(request.timer_token)
+
+
+cherrypy.tools.timing = TimingTool()
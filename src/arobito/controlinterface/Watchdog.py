@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module watches the requests in flight and reports those that take too long.
+
+A stuck worker, e.g. one blocked on a slow disk while rewriting ``controller.ini``, is otherwise only noticed when the
+thread pool runs out of threads. The :py:class:`RequestTracker` knows the start and the thread of every request in
+flight; the CherryPy ``watchdog`` tool and the :py:mod:`AsyncServer <arobito.controlinterface.AsyncServer>` feed it.
+The :py:class:`Watchdog` engine plugin looks at it every ``watchdog-interval`` seconds. A request running longer than
+``watchdog-threshold`` seconds is counted once in the ``slow_requests_total`` counter of the :py:mod:`Metrics
+<arobito.controlinterface.Metrics>`, and the stack of its thread is logged with the request through the
+:py:mod:`LogWriter <arobito.controlinterface.LogWriter>`. At most one stack is logged every ``watchdog-dump-interval``
+seconds; the slow requests left out meanwhile are counted in the next report. ``watchdog-threshold = 0`` disables the
+watchdog.
+
+In the asyncio server, all requests run on the thread of the event loop, so the stack shows what blocks the loop, if
+anything. Calls run in the executor are reported with the stack of their executor thread.
+"""
+
+import itertools
+import sys
+import threading
+import time
+import traceback
+import cherrypy
+from cherrypy.process.plugins import Monitor
+from arobito.Base import SingletonMeta
+from arobito.controlinterface import LogWriter, Metrics
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Flight(object):
+    """
+    A request in flight
+    """
+
+    __slots__ = ('started', 'thread', 'method', 'path', 'remote', 'request_id', 'reported')
+
+    def __init__(self, method: str, path: str, remote: str=None, request_id: str=None):
+        """
+        Start the request on the current thread
+
+        :param method: The request method
+        :param path: The request path
+        :param remote: The address of the client, if known
+        :param request_id: The ID of the request, if the client sent one
+        """
+        self.started = time.monotonic()
+        self.thread = threading.get_ident()
+        self.method = method
+        self.path = path
+        self.remote = remote
+        self.request_id = request_id
+        self.reported = False
+
+    def describe(self, now: float) -> str:
+        """
+        Describe the request for the log
+
+        :param now: The current time, as :py:func:`time.monotonic`
+        :return: The description
+        """
+        return '{:s} {:s}{:s}{:s}, running for {:.1f} s'.format(
+            self.method, self.path, '' if self.remote is None else ' from ' + self.remote,
+            '' if self.request_id is None else ' (request ' + self.request_id + ')', now - self.started)
+
+
+class RequestTracker(object, metaclass=SingletonMeta):
+    """
+    This class, a singleton, keeps the requests in flight
+
+    Adding and removing a request are single dict operations, so no lock is needed.
+    """
+
+    def __init__(self):
+        """
+        Start without requests
+        """
+        self.__flights = dict()
+        self.__tokens = itertools.count()
+
+    def begin(self, method: str, path: str, remote: str=None, request_id: str=None) -> int:
+        """
+        Record the start of a request on the current thread
+
+        :param method: The request method
+        :param path: The request path
+        :param remote: The address of the client, if known
+        :param request_id: The ID of the request, if the client sent one
+        :return: The token to end the request with
+        """
+        token = next(self.__tokens)
+        self.__flights[token] = Flight(method, path, remote, request_id)
+        return token
+
+    def end(self, token: int) -> None:
+        """
+        Record the end of a request
+
+        :param token: The token returned by :py:meth:`begin`
+        """
+        self.__flights.pop(token, None)
+
+    def run(self, token: int, function, *args):
+        """
+        Call a function for a request on the current thread, e.g. in an executor, and move the request there meanwhile
+
+        :param token: The token of the request, or None
+        :param function: The function
+        :return: Its result
+        """
+        flight = self.__flights.get(token)
+        if flight is None:
+            return function(*args)
+        thread = flight.thread
+        flight.thread = threading.get_ident()
+        try:
+            return function(*args)
+        finally:
+            flight.thread = thread
+
+    def flights(self) -> list:
+        """
+        Get the requests in flight
+
+        :return: A list of :py:class:`Flight` objects
+        """
+        return list(self.__flights.copy().values())
+
+
+class Watchdog(Monitor):
+    """
+    Engine plugin reporting the requests in flight that run longer than a threshold
+    """
+
+    def __init__(self, bus, threshold: float, interval: float=1.0, dump_interval: float=60.0):
+        """
+        Create the plugin
+
+        :param bus: The CherryPy engine
+        :param threshold: Seconds after which a request is slow
+        :param interval: Seconds between two checks
+        :param dump_interval: Minimum seconds between two printed stacks
+        """
+        super(Watchdog, self).__init__(bus, self.check, frequency=interval, name='Watchdog')
+        self.threshold = threshold
+        self.dump_interval = dump_interval
+        #: The number of slow requests seen
+        self.slow = 0
+        self.__last_dump = None
+        self.__skipped = 0
+
+    def check(self) -> None:
+        """
+        Count and report the requests that became slow since the last check
+        """
+        now = time.monotonic()
+        for flight in RequestTracker().flights():
+            if flight.reported or now - flight.started < self.threshold:
+                continue
+            flight.reported = True
+            self.slow += 1
+            Metrics.Registry().count('slow_requests')
+            if self.__last_dump is not None and now - self.__last_dump < self.dump_interval:
+                self.__skipped += 1
+                continue
+            self.__last_dump = now
+            self.dump(flight, now)
+
+    def dump(self, flight: Flight, now: float) -> None:
+        """
+        Log a slow request with the stack of its thread
+
+        :param flight: The request
+        :param now: The current time, as :py:func:`time.monotonic`
+        """
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        frame = sys._current_frames().get(flight.thread)
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else '  (thread gone)\n'
+        skipped = ''
+        if self.__skipped > 0:
+            skipped = ' ({:d} further slow requests not shown)'.format(self.__skipped)
+            self.__skipped = 0
+        LogWriter.log('warning', 'slow_request', 'Watchdog: Slow request {:s} on thread {:s}{:s}'.format(
+            flight.describe(now), names.get(flight.thread, str(flight.thread)), skipped), stack=stack)
+
+
+class WatchdogTool(cherrypy.Tool):
+    """
+    The CherryPy tool recording the requests in the :py:class:`RequestTracker`
+    """
+
+    def __init__(self):
+        """
+        Record the request when the resource is found
+        """
+        cherrypy.Tool.__init__(self, 'on_start_resource', self.begin, priority=0)
+
+    def _setup(self) -> None:
+        """
+        Hook the end of the request in
+        """
+        cherrypy.Tool._setup(self)
+        cherrypy.request.hooks.attach('on_end_request', self.end, priority=100)
+
+    @staticmethod
+    def begin() -> None:
+        """
+        Record the start of the request
+        """
+        request = cherrypy.request
+        request.watchdog_token = RequestTracker().begin(request.method, request.script_name + request.path_info,
+                                                        request.remote.ip, request.headers.get('X-Request-ID'))
+
+    @staticmethod
+    def end() -> None:
+        """
+        Record the end of the request
+        """
+        token = getattr(cherrypy.request, 'watchdog_token', None)
+        if token is not None:
+            RequestTracker().end(token)
+
+
+cherrypy.tools.watchdog = WatchdogTool()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Build the asset bundles for the static folder ahead of time.
+
+This is the build step for deployments with a read-only static folder. Without it, the bundles are built when the
+control interface starts up. Optionally, the static folder including the bundles is packed into a single zip archive
+that can be used as ``static-folder``.
+"""
+
+import sys
+import argparse
+from os import path
+from arobito.Base import find_root_path
+from arobito.controlinterface import AssetBundler, StaticArchive
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def bundle_assets(static_folder: str, inline_limit: int=8192, archive: str=None) -> int:
+    """
+    Build the bundles and print their names
+
+    :param static_folder: The static folder
+    :param inline_limit: Images up to this size are inlined into the style sheets
+    :param archive: If given, pack the static folder into this zip archive afterwards
+    :return: A return code. 0 means 'everything is ok'
+    """
+    try:
+        manifest = AssetBundler.build_bundles(static_folder, inline_limit)
+    except IOError as e:
+        print('Cannot build asset bundles: {:s}'.format(e.__str__()), file=sys.stderr)
+        return 1
+    for kind in ('css', 'js', 'index'):
+        print(path.join(static_folder, AssetBundler.bundle_folder, manifest[kind]))
+    if archive is not None:
+        try:
+            count = StaticArchive.create_archive(static_folder, archive)
+        except IOError as e:
+            print('Cannot create archive: {:s}'.format(e.__str__()), file=sys.stderr)
+            return 1
+        print('{:s} ({:d} files)'.format(archive, count))
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--staticfolder',
+                        help='Specify the static folder (Default: web-static next to this script)',
+                        type=str, default=path.join(find_root_path(), 'web-static'))
+    parser.add_argument('-l', '--inlinelimit',
+                        help='Inline images up to this size in bytes into the style sheets (Default: 8192)',
+                        type=int, default=8192)
+    parser.add_argument('-a', '--archive',
+                        help='Pack the static folder into this zip archive after bundling (Default: no archive)',
+                        type=str, default=None)
+    args = parser.parse_args()
+    sys.exit(bundle_assets(args.staticfolder, inline_limit=args.inlinelimit, archive=args.archive))
@@ -27,6 +27,7 @@ control interface on a CherryPy foundation.
 import sys
 import argparse
 from arobito.controlinterface.ControlInterface import ArobitoControlInterface
+from arobito.controlinterface.ServerTuning import server_modes
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -35,15 +36,18 @@ __credits__ = ['Jürgen Edelbluth']
 __maintainer__ = 'Jürgen Edelbluth'
 
 
-def control_interface(bind_ip: str='0.0.0.0', listen_port: int=9812) -> int:
+def control_interface(bind_ip: str='0.0.0.0', listen_port: int=9812, server_options: dict=None,
+                      pid_file: str=None) -> int:
     """
     Launch the Arobito Control Interface - a web based remote control solution
 
     :param bind_ip: IP address to bind the control interface to. Use '0.0.0.0' for all available IP addresses.
     :param listen_port: The port number for the control interface to listen. Default is 9812.
+    :param server_options: Server tuning options overriding the ones in ``controller.ini``. None values are ignored.
+    :param pid_file: A file to write the process ID of the serving process to, also after a restart on ``SIGHUP``
     :return: A return code. 0 means 'everything is ok'
     """
-    rci = ArobitoControlInterface(bind_ip, listen_port)
+    rci = ArobitoControlInterface(bind_ip, listen_port, server_options, pid_file)
     return rci.startup()
 
 
@@ -55,5 +59,57 @@ if __name__ == '__main__':
     parser.add_argument('-p', '--listenport',
                         help='Specify the port to listen to (Default: 9812)',
                         type=int, default=9812)
+    parser.add_argument('-P', '--pidfile',
+                        help='Write the process ID of the serving process to this file, also after a restart',
+                        type=str, default=None)
+    parser.add_argument('-m', '--mode',
+                        help='The server implementation (Default: server-mode in controller.ini, or cherrypy)',
+                        type=str, choices=server_modes, default=None)
+    parser.add_argument('-w', '--workers',
+                        help='Number of worker processes sharing the port (Default: workers in controller.ini, or 1)',
+                        type=int, default=None)
+    parser.add_argument('-t', '--threads',
+                        help='Number of worker threads, in asyncio mode for blocking work only (Default: thread-pool '
+                             'in controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-T', '--maxthreads',
+                        help='Maximum number of worker threads, -1 for no limit (Default: thread-pool-max in '
+                             'controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-a', '--autosize',
+                        help='Grow and shrink the thread pool by the observed queue wait (Default: '
+                             'thread-pool-autosize in controller.ini)',
+                        action='store_true', default=None)
+    parser.add_argument('-q', '--socketqueue',
+                        help='Size of the socket backlog (Default: socket-queue-size in controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-o', '--sockettimeout',
+                        help='Socket timeout in seconds, also for idle keep-alive connections (Default: socket-timeout '
+                             'in controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-b', '--maxbody',
+                        help='Maximum request body size in bytes (Default: max-request-body-size in controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-k', '--keepalivelimit',
+                        help='Maximum number of idle keep-alive connections, 0 disables keep-alive (Default: '
+                             'keep-alive-limit in controller.ini)',
+                        type=int, default=None)
+    parser.add_argument('-d', '--draintimeout',
+                        help='Seconds requests in flight get to finish on a shutdown (Default: drain-timeout in '
+                             'controller.ini)',
+                        type=float, default=None)
     args = parser.parse_args()
-    sys.exit(control_interface(bind_ip=args.bindip, listen_port=args.listenport))
+    options = {
+        'server-mode': args.mode,
+        'workers': args.workers,
+        'thread-pool': args.threads,
+        'thread-pool-max': args.maxthreads,
+        'thread-pool-autosize': args.autosize,
+        'socket-queue-size': args.socketqueue,
+        'socket-timeout': args.sockettimeout,
+        'max-request-body-size': args.maxbody,
+        'keep-alive-limit': args.keepalivelimit,
+        'drain-timeout': args.draintimeout
+    }
+    sys.exit(control_interface(bind_ip=args.bindip, listen_port=args.listenport, server_options=options,
+                               pid_file=args.pidfile))
@@ -31,6 +31,6 @@ setup(
     author='The Arobito Project',
     author_email='',
     description='',
-    requires=['cherrypy', 'ws4py']
+    requires=['cherrypy (>=18.6.0, <19.0)', 'cheroot (>=10.0.0)', 'ws4py']
 )
 
@@ -19,6 +19,8 @@
 
     var local = {};
     local.clientKey = null;
+    local.pushSocket = null;
+    robi.sessionCount = null;
 
     robi.error = function(title, message) {
         $.growl.error({ message: message, title: title });
@@ -64,6 +66,7 @@
         }
         if (true === data.auth.success) {
             local.clientKey = data.auth.key;
+            local.openPushChannel();
             $('#loginForm').css('display', 'none');
             $('#navigationBlock').css('display', 'block');
             robi.notice('Login successful', 'Thank you, have fun!');
@@ -75,6 +78,7 @@
     
     local.logout = function(data) {
         local.clientKey = null;
+        local.closePushChannel();
         $('#navigationBlock').css('display', 'none');
         $('#loginForm').css('display', 'block');
         robi.notice('Logout successful', 'Good bye!');
@@ -93,6 +97,68 @@
     local.getSessionCount = function (data) {
         // TODO
     };
+
+    local.pushed = function (message) {
+        if (message.topic === 'status') {
+            if (message.data.state === 'shutdown') {
+                if (message.data.delay > 0) {
+                    robi.warn('Shutdown', 'Robi is shutting down within ' + message.data.delay + ' seconds.');
+                }
+                else {
+                    robi.warn('Shutdown', 'Robi is shutting down.');
+                }
+            }
+            else if (message.data.state === 'stopped') {
+                robi.warn('Shutdown', 'Robi has stopped.');
+            }
+            return;
+        }
+        if (message.topic === 'sessions') {
+            robi.sessionCount = message.data.count;
+            $(document).trigger('robi:sessions', [message.data.count]);
+            return;
+        }
+        if (message.topic === 'notifications') {
+            var levels = { error: robi.error, warning: robi.warn, notice: robi.notice },
+                show = levels[message.data.level] || robi.message;
+            show(message.data.title, message.data.message);
+        }
+    };
+
+    local.openPushChannel = function () {
+        if (!window.WebSocket) {
+            return;
+        }
+        var scheme = (window.location.protocol === 'https:') ? 'wss://' : 'ws://',
+            socket = new WebSocket(scheme + window.location.host + '/push/');
+        socket.onopen = function () {
+            socket.send(JSON.stringify({ action: 'auth', key: local.clientKey }));
+        };
+        socket.onmessage = function (evtObj) {
+            var message = JSON.parse(evtObj.data);
+            if (message.topic) {
+                local.pushed(message);
+                return;
+            }
+            if (message.action === 'auth' && true === message.success) {
+                // The sessions topic is refused for non-administrators, the others are subscribed anyway
+                socket.send(JSON.stringify({ action: 'subscribe', topics: ['status', 'sessions', 'notifications'] }));
+            }
+        };
+        socket.onclose = function () {
+            if (local.pushSocket === socket) {
+                local.pushSocket = null;
+            }
+        };
+        local.pushSocket = socket;
+    };
+
+    local.closePushChannel = function () {
+        if (null !== local.pushSocket) {
+            local.pushSocket.close();
+            local.pushSocket = null;
+        }
+    };
     
     robi.login = function(f) {
         var username = $(f).find('input[name="username"]').val(),
@@ -146,6 +212,26 @@
         });
     };
     
+    robi.batch = function (calls, callback) {
+        $.ajax('/app/batch', {
+            data: JSON.stringify({ key: local.clientKey, calls: calls }),
+            success: function (data, status, xhr) {
+                if (!(data.batch)) {
+                    robi.error('Batch Error', 'Unknown answer received from server!');
+                    return;
+                }
+                if (true !== data.batch.success) {
+                    robi.error('Batch Error', data.batch.reason);
+                    return;
+                }
+                callback(data.batch.results);
+            },
+            error: function (xhr, status, errorThrown) {
+                robi.error('Batch Error', 'An error occurred while running a batch: ' + errorThrown);
+            }
+        });
+    };
+
     local.initLoginForm = function() {
 	$('#loginForm').find('form input').each(function(obj) {
 	    $(obj).addClass('ui-corner-all');
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Microbenchmarks for the :py:mod:`Base <arobito.Base>` module, run by ``benchrunner.py``.
+"""
+
+from arobito import Base
+from testlibs import Benchmarking
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class HashPassword(Benchmarking.Benchmark):
+    """
+    Hash a password with salt and secret and the default rounds, as on every login
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the salt and the secret
+        """
+        self.salt = Base.create_salt()
+        self.secret = Base.create_salt()
+
+    def run(self) -> None:
+        """
+        Hash the password
+        """
+        Base.hash_password('arobito', self.salt, secret=self.secret)
+
+
+class CreateSalt(Benchmarking.Benchmark):
+    """
+    Create a salt of the default length
+    """
+
+    def run(self) -> None:
+        """
+        Create the salt
+        """
+        Base.create_salt()
+
+
+class CreateSimpleKey(Benchmarking.Benchmark):
+    """
+    Create a session key of the default length, as on every login
+    """
+
+    def run(self) -> None:
+        """
+        Create the key
+        """
+        Base.create_simple_key()
+
+
+class SingletonBenchmarkSubject(object, metaclass=Base.SingletonMeta):
+    """
+    A singleton without state, the subject of :py:class:`SingletonCall`
+    """
+    pass
+
+
+class SingletonCall(Benchmarking.Benchmark):
+    """
+    Get the instance of a singleton created before, as every request does for the managers
+    """
+
+    def setUp(self) -> None:
+        """
+        Create the instance
+        """
+        SingletonBenchmarkSubject()
+
+    def run(self) -> None:
+        """
+        Get the instance
+        """
+        SingletonBenchmarkSubject()
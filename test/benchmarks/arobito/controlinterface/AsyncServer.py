@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Side by side benchmark of the CherryPy and the asyncio server mode (see :py:mod:`AsyncServer
+<arobito.controlinterface.AsyncServer>`).
+
+For each mode, a server is started and loaded with 10, 100 and 1000 concurrent keep-alive connections. Every connection
+sends ``/app/get_session_count`` requests one after the other. The throughput, the latency percentiles, the errors and
+the resident memory and thread count of the server are reported. The load is generated by a single asyncio client in
+this process, so on small machines the client may limit the throughput. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.AsyncServer --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The numbers of concurrent connections to measure
+concurrency_levels = (10, 100, 1000)
+
+
+async def connection_loop(host: str, port: int, request: bytes, deadline: float, latencies: list,
+                          errors: list) -> None:
+    """
+    Send requests over one keep-alive connection until the deadline
+
+    :param host: The host of the server
+    :param port: The port of the server
+    :param request: The complete HTTP request
+    :param deadline: The end of the measurement (``time.monotonic``)
+    :param latencies: The list to add the latency of each request in seconds to
+    :param errors: The list to add errors to
+    """
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError as e:
+        errors.append(e.__str__())
+        return
+    try:
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            writer.write(request)
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            if not head.startswith(b'HTTP/1.1 200'):
+                errors.append(head.split(b'\r\n', 1)[0].decode('iso-8859-1'))
+                break
+            latencies.append(time.monotonic() - started)
+            if b'connection: close' in head.lower():
+                break
+    except (OSError, asyncio.IncompleteReadError) as e:
+        errors.append(e.__class__.__name__)
+    finally:
+        writer.close()
+
+
+async def load(host: str, port: int, key: str, connections: int, duration: float) -> dict:
+    """
+    Load a server with concurrent connections
+
+    :param host: The host of the server
+    :param port: The port of the server
+    :param key: A session key
+    :param connections: The number of concurrent connections
+    :param duration: The duration in seconds
+    :return: A dict with the requests per second, the 50th and 99th latency percentile in milliseconds and the errors
+    """
+    body = json.dumps(dict(key=key)).encode('utf-8')
+    request = 'POST /app/get_session_count HTTP/1.1\r\nHost: {:s}\r\nContent-Type: application/json\r\n' \
+              'Content-Length: {:d}\r\n\r\n'.format(host, len(body)).encode('ascii') + body
+    latencies = list()
+    errors = list()
+    started = time.monotonic()
+    await asyncio.gather(*[connection_loop(host, port, request, started + duration, latencies, errors)
+                           for i in range(0, connections)])
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    percentile = (lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0)
+    return dict(rate=len(latencies) / elapsed, p50=percentile(0.5), p99=percentile(0.99), errors=len(errors))
+
+
+def threads_of(server: LocalServer) -> int:
+    """
+    Get the number of threads of the server process (Linux only)
+
+    :param server: The server
+    :return: The number of threads, or -1 when it cannot be determined
+    """
+    try:
+        with open('/proc/{:d}/status'.format(server.process.pid), 'r') as fh:
+            for line in fh:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except (IOError, ValueError):
+        pass
+    return -1
+
+
+def run(duration: float=10.0, levels: tuple=concurrency_levels) -> dict:
+    """
+    Measure both server modes
+
+    :param duration: Seconds per concurrency level
+    :param levels: The numbers of concurrent connections
+    :return: A dict of the modes and a dict of the levels and the results of :py:func:`load`, extended by the
+             resident memory and the thread count of the server
+    """
+    results = dict()
+    for mode in ('cherrypy', 'asyncio'):
+        server = LocalServer(['--mode', mode, '--socketqueue', '1024', '--keepalivelimit', '2000'])
+        server.start()
+        try:
+            key = server.login()
+            results[mode] = dict()
+            for connections in levels:
+                result = asyncio.run(load(server.host, server.port, key, connections, duration))
+                result['rss'] = server.rss()
+                result['threads'] = threads_of(server)
+                results[mode][connections] = result
+        finally:
+            server.stop()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--duration',
+                        help='Seconds per mode and concurrency level (Default: 10)',
+                        type=float, default=10.0)
+    args = parser.parse_args()
+    print('{:<9s} {:>6s} {:>10s} {:>9s} {:>9s} {:>7s} {:>9s} {:>8s}'
+          .format('mode', 'conns', 'req/s', 'p50 ms', 'p99 ms', 'errors', 'RSS MiB', 'threads'))
+    for mode_name, levels_results in run(args.duration).items():
+        for level, r in levels_results.items():
+            print('{:<9s} {:>6d} {:>10.0f} {:>9.1f} {:>9.1f} {:>7d} {:>9.1f} {:>8d}'
+                  .format(mode_name, level, r['rate'], r['p50'], r['p99'], r['errors'], r['rss'] / 1048576.0,
+                          r['threads']))
+    sys.exit(0)
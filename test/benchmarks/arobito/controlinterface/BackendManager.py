@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Microbenchmarks for the :py:mod:`BackendManager <arobito.controlinterface.BackendManager>` module, run by
+``benchrunner.py``.
+
+They work only with the standard settings of the ``users.ini`` file.
+"""
+
+import time
+from arobito.Base import create_simple_key
+from arobito.controlinterface.BackendManager import UserManager, SessionManager
+from testlibs import Benchmarking
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The number of other sessions while a session is looked up
+session_count = 1000
+
+
+class UserManagerCorrectPassword(Benchmarking.Benchmark):
+    """
+    Check the credentials of a login that succeeds
+    """
+
+    def run(self) -> None:
+        """
+        Check the credentials
+        """
+        UserManager().get_user_by_username_and_password('arobito', 'arobito')
+
+
+class UserManagerUnknownUser(Benchmarking.Benchmark):
+    """
+    Check the credentials of an unknown user, which fails without hashing
+    """
+
+    def run(self) -> None:
+        """
+        Check the credentials
+        """
+        UserManager().get_user_by_username_and_password('unknown', 'arobito')
+
+
+class SessionManagerGetUser(Benchmarking.Benchmark):
+    """
+    Look up a session among :py:data:`session_count` others, as every call with a key does
+    """
+
+    def setUp(self) -> None:
+        """
+        Log in and add the other sessions
+        """
+        self.manager = SessionManager()
+        self.manager.clear()
+        self.key = self.manager.login('arobito', 'arobito')
+        now = time.time()
+        self.manager.import_sessions(dict((create_simple_key(), dict(username='arobito', level='Administrator',
+                                                                     timestamp=now, last_access=now))
+                                          for i in range(0, session_count)))
+
+    def tearDown(self) -> None:
+        """
+        Remove the sessions
+        """
+        self.manager.clear()
+
+    def run(self) -> None:
+        """
+        Look the session up
+        """
+        self.manager.get_user(self.key)
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the :py:mod:`Codec <arobito.controlinterface.Codec>` module.
+
+For every JSON codec installed, typical ``/app`` requests are sent to the application through WSGI, without a server,
+so the numbers show the cost of the application and not of the network. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.Codec --requests 5000
+"""
+
+import argparse
+import sys
+import time
+import cherrypy
+from arobito.controlinterface import Codec, ControllerFrontend
+from testlibs import WsgiClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def requests_per_second(app, path: str, body: bytes, count: int) -> float:
+    """
+    Send the same request repeatedly
+
+    :param app: The WSGI application
+    :param path: The path below ``/app``
+    :param body: The request body
+    :param count: The number of requests
+    :return: The requests per second
+    """
+    headers = {'Content-Type': 'application/json'}
+    started = time.perf_counter()
+    for i in range(0, count):
+        status = WsgiClient.request(app, '/app', path, 'POST', headers, body)[0]
+        if status != 200:
+            raise IOError('Request to {:s} failed with {:d}'.format(path, status))
+    return count / (time.perf_counter() - started)
+
+
+def codec_operations_per_second(codec: Codec.BodyCodec, count: int) -> float:
+    """
+    Encode and decode a typical response repeatedly, without CherryPy
+
+    :param codec: The codec
+    :param count: The number of round trips
+    :return: The round trips per second
+    """
+    document = dict(batch=dict(success=True, results=[dict(result=dict(session_count=i)) for i in range(0, 8)]))
+    started = time.perf_counter()
+    for i in range(0, count):
+        codec.decode(codec.encode(document))
+    return count / (time.perf_counter() - started)
+
+
+def run(count: int=5000) -> dict:
+    """
+    Measure every codec
+
+    :param count: The number of requests per codec and request type
+    :return: A dict of the codec names and a dict of the request types and requests (or round trips) per second
+    """
+    cherrypy.log.access_file = None
+    cherrypy.log.screen = None
+    app = cherrypy.Application(ControllerFrontend.App(), '/app', {'/': {}})
+    previous = Codec.current.name
+    results = dict()
+    try:
+        # Warm up, so the first codec is not measured with cold caches
+        requests_per_second(app, '/auth', b'{"username":"x","password":"y"}', min(count, 500))
+        for name in sorted(Codec.codecs):
+            Codec.select(name)
+            key = Codec.decode(WsgiClient.request(app, '/app', '/auth', 'POST', {'Content-Type': 'application/json'},
+                                                  b'{"username":"arobito","password":"arobito"}')[2])['auth']['key']
+            key_request = Codec.encode(dict(key=key))
+            batch_request = Codec.encode(dict(key=key, calls=[dict(method='get_session_count')] * 8))
+            results[name] = {
+                'auth (failing, constant)': requests_per_second(app, '/auth', b'{"username":"x","password":"y"}',
+                                                                count),
+                'get_session_count': requests_per_second(app, '/get_session_count', key_request, count),
+                'batch of 8 calls': requests_per_second(app, '/batch', batch_request, count),
+                'encode + decode only': codec_operations_per_second(Codec.codecs[name], count * 10)
+            }
+            WsgiClient.request(app, '/app', '/logout', 'POST', {'Content-Type': 'application/json'}, key_request)
+    finally:
+        Codec.select(previous)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests',
+                        help='Number of requests per codec and request type (Default: 5000)',
+                        type=int, default=5000)
+    args = parser.parse_args()
+    for codec_name, rates in run(args.requests).items():
+        for request_type, rate in rates.items():
+            print('{:<8s} {:<26s} {:>8.0f} per second'.format(codec_name, request_type, rate))
+    sys.exit(0)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the :py:mod:`Health <arobito.controlinterface.Health>` module.
+
+The probes are sent through WSGI, without a server, and compared to ``/app/get_session_count`` through the CherryPy
+application with its tools, so the numbers show the cost of the application and not of the network. The readiness
+check alone is measured as well. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.Health --requests 20000
+"""
+
+import argparse
+import json
+import sys
+import time
+import cherrypy
+from arobito.controlinterface import ControllerFrontend, Health
+from testlibs import WsgiClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def microseconds_per_call(call, count: int) -> float:
+    """
+    Run a call repeatedly
+
+    :param call: The callable
+    :param count: The number of calls
+    :return: The average time of a call in microseconds
+    """
+    started = time.perf_counter()
+    for i in range(0, count):
+        call()
+    return (time.perf_counter() - started) * 1000000 / count
+
+
+def run(count: int=20000) -> dict:
+    """
+    Measure the probes and a regular call
+
+    :param count: The number of requests per request type
+    :return: A dict of the request types and the microseconds per request
+    """
+    cherrypy.log.access_file = None
+    cherrypy.log.screen = None
+    frontend = ControllerFrontend.App()
+    app = cherrypy.Application(frontend, '/app', {'/': {}})
+    health = Health.Health(frontend.backend, cherrypy.engine, lambda: False)
+    key = json.loads(WsgiClient.request(app, '/app', '/auth', 'POST', {'Content-Type': 'application/json'},
+                                        b'{"username":"arobito","password":"arobito"}')[2].decode('utf-8'))
+    key_request = json.dumps(dict(key=key['auth']['key'])).encode('utf-8')
+
+    def probe(path: str) -> None:
+        if WsgiClient.request(health, '/health', path)[0] not in (200, 503):
+            raise IOError('Probe {:s} failed'.format(path))
+
+    def app_call() -> None:
+        if WsgiClient.request(app, '/app', '/get_session_count', 'POST', {'Content-Type': 'application/json'},
+                              key_request)[0] != 200:
+            raise IOError('Request failed')
+
+    try:
+        return {
+            'readiness check only': microseconds_per_call(health.ready, count * 10),
+            '/health/live': microseconds_per_call(lambda: probe('/live'), count),
+            '/health/ready': microseconds_per_call(lambda: probe('/ready'), count),
+            '/app/get_session_count': microseconds_per_call(app_call, count)
+        }
+    finally:
+        WsgiClient.request(app, '/app', '/logout', 'POST', {'Content-Type': 'application/json'}, key_request)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--requests',
+                        help='Number of requests per request type (Default: 20000)',
+                        type=int, default=20000)
+    args = parser.parse_args()
+    for request_type, cost in run(args.requests).items():
+        print('{:<24s} {:>10.2f} microseconds'.format(request_type, cost))
+    sys.exit(0)
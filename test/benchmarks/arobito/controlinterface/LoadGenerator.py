@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load generator for the control interface, driven by scenario files.
+
+A scenario describes a traffic shape: a number of virtual users, each with its own keep-alive connection and session,
+sending a weighted mix of requests with a think time between them. Every user logs in through ``/app/auth`` first and
+again after each ``/app/logout`` of the mix. The scenario files are JSON; the ones shipped are in the ``scenarios``
+folder of the benchmarks and may be named without path and extension:
+
+.. code-block:: javascript
+
+   {
+     "name": "dashboard",
+     "users": 20,                   // concurrent virtual users
+     "duration": 30,                // seconds, after the ramp-up
+     "ramp_up": 2,                  // seconds over which the users start
+     "think_time": 0.5,             // mean seconds between two requests of a user, exponentially distributed
+     "seed": 1,                     // seed of the random choices, for reproducible runs
+     "processes": 1,                // client processes the users are spread over
+     "server": { "arguments": ["--mode", "asyncio"], "config": "[Server]\\n..." },
+     "mix": [
+       { "name": "session_count", "weight": 80, "method": "POST", "path": "/app/get_session_count",
+         "body": { "key": "$key" } },
+       { "name": "index", "weight": 20, "method": "GET", "path": "/static/index.html" }
+     ]
+   }
+
+In request bodies, the string ``$key`` is replaced by the session key of the user. Without a ``--target``, a local
+``controlinterface.py`` is started with the ``server`` settings of the scenario. The report is printed as JSON: The
+throughput, the latency percentiles in milliseconds and the error rate, overall and per request of the mix, and the
+status codes seen. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.LoadGenerator dashboard --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The folder of the scenario files shipped
+scenario_folder = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'scenarios'))
+
+#: The settings of a scenario file that may be left out
+scenario_defaults = {
+    'users': 10,
+    'duration': 10.0,
+    'ramp_up': 0.0,
+    'think_time': 0.0,
+    'seed': 1,
+    'processes': 1,
+    'username': 'arobito',
+    'password': 'arobito',
+    'server': {}
+}
+
+#: The percentiles reported
+percentiles = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+#: Seconds a single request may take before it counts as failed
+request_timeout = 30.0
+
+
+def load_scenario(name: str) -> dict:
+    """
+    Read a scenario file
+
+    :param name: The path of the file, or the name of a scenario shipped
+    :return: The scenario with the defaults filled in
+    :raise ValueError: When the scenario is invalid
+    """
+    file_name = name
+    if not os.path.isfile(file_name):
+        file_name = os.path.join(scenario_folder, name + '.json')
+    with open(file_name, 'r') as fh:
+        scenario = json.load(fh)
+    for option, value in scenario_defaults.items():
+        scenario.setdefault(option, value)
+    scenario.setdefault('name', os.path.splitext(os.path.basename(file_name))[0])
+    mix = scenario.get('mix')
+    if not isinstance(mix, list) or len(mix) == 0:
+        raise ValueError('The scenario needs a mix of requests')
+    for entry in mix:
+        if not isinstance(entry, dict) or not str(entry.get('path', '')).startswith('/'):
+            raise ValueError('Every request of the mix needs a path')
+        entry.setdefault('method', 'GET' if entry.get('body') is None else 'POST')
+        entry.setdefault('name', entry['path'])
+        entry.setdefault('weight', 1)
+        if entry['weight'] <= 0:
+            raise ValueError('The weight of "{:s}" must be larger than zero'.format(entry['name']))
+    if scenario['users'] < 1 or scenario['processes'] < 1 or scenario['duration'] <= 0:
+        raise ValueError('users, processes and duration must be larger than zero')
+    return scenario
+
+
+def substitute(value, key: str):
+    """
+    Replace ``$key`` in a request body by the session key
+
+    :param value: The body or a part of it
+    :param key: The session key
+    :return: The body with the key
+    """
+    if value == '$key':
+        return key
+    if isinstance(value, dict):
+        return dict((k, substitute(v, key)) for k, v in value.items())
+    if isinstance(value, list):
+        return [substitute(v, key) for v in value]
+    return value
+
+
+class Connection(object):
+    """
+    A keep-alive HTTP/1.1 connection, opened again when the server closes it
+    """
+
+    def __init__(self, host: str, port: int):
+        """
+        Prepare the connection
+
+        :param host: The host of the server
+        :param port: The port of the server
+        """
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    def close(self) -> None:
+        """
+        Close the connection
+        """
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: bytes=None) -> tuple:
+        """
+        Send a request and read the response
+
+        :param method: The request method
+        :param path: The path
+        :param body: The JSON body, or None
+        :return: A tuple of the status code and the response body
+        """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = '{:s} {:s} HTTP/1.1\r\nHost: {:s}\r\n'.format(method, path, self.host)
+        if body is not None:
+            head += 'Content-Type: application/json\r\nContent-Length: {:d}\r\n'.format(len(body))
+        self.writer.write(head.encode('ascii') + b'\r\n' + (body or b''))
+        response = await self.reader.readuntil(b'\r\n\r\n')
+        lines = response.decode('iso-8859-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        headers = dict()
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+                if size == 0:
+                    await self.reader.readuntil(b'\r\n')
+                    break
+                data += (await self.reader.readexactly(size + 2))[:-2]
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, data
+
+
+class Recorder(object):
+    """
+    The latencies, status codes and errors of a run
+    """
+
+    def __init__(self):
+        """
+        Start empty
+        """
+        #: The latencies in seconds per request name
+        self.latencies = dict()
+        #: The number of failed requests per request name
+        self.errors = dict()
+        #: The number of responses per status code
+        self.status = dict()
+        #: The seconds the measurement took
+        self.elapsed = 0.0
+
+    def record(self, name: str, latency: float, status: int) -> None:
+        """
+        Record a request
+
+        :param name: The name of the request
+        :param latency: The seconds it took
+        :param status: The status code, 0 when no response was received
+        """
+        self.latencies.setdefault(name, list()).append(latency)
+        self.status[status] = self.status.get(status, 0) + 1
+        if status == 0 or status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def merge(self, other: dict) -> None:
+        """
+        Add the data of another recorder, e.g. of another client process
+
+        :param other: The data, as returned by :py:meth:`data`
+        """
+        for name, values in other['latencies'].items():
+            self.latencies.setdefault(name, list()).extend(values)
+        for name, count in other['errors'].items():
+            self.errors[name] = self.errors.get(name, 0) + count
+        for status, count in other['status'].items():
+            self.status[status] = self.status.get(status, 0) + count
+        self.elapsed = max(self.elapsed, other['elapsed'])
+
+    def data(self) -> dict:
+        """
+        Get the raw data
+
+        :return: A dict of the latencies, errors, status codes and the elapsed time
+        """
+        return dict(latencies=self.latencies, errors=self.errors, status=self.status, elapsed=self.elapsed)
+
+    @staticmethod
+    def summary(latencies: list, errors: int, elapsed: float) -> dict:
+        """
+        Summarize a list of latencies
+
+        :param latencies: The latencies in seconds
+        :param errors: The number of failed requests among them
+        :param elapsed: The seconds the measurement took
+        :return: A dict with the number of requests, the throughput, the error rate and the latencies in milliseconds
+        """
+        values = sorted(latencies)
+        result = dict(requests=len(values), throughput=round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+                      errors=errors, error_rate=round(errors / len(values), 4) if values else 0.0)
+        latency = dict()
+        for name, p in percentiles:
+            latency[name] = round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3) if values else 0.0
+        latency['mean'] = round(sum(values) / len(values) * 1000, 3) if values else 0.0
+        latency['max'] = round(values[-1] * 1000, 3) if values else 0.0
+        result['latency_ms'] = latency
+        return result
+
+    def report(self) -> dict:
+        """
+        Summarize the run
+
+        :return: The overall summary with the summaries per request name and the status codes
+        """
+        result = Recorder.summary([value for values in self.latencies.values() for value in values],
+                                  sum(self.errors.values()), self.elapsed)
+        result['per_request'] = dict((name, Recorder.summary(values, self.errors.get(name, 0), self.elapsed))
+                                     for name, values in sorted(self.latencies.items()))
+        result['status'] = dict((str(status), count) for status, count in sorted(self.status.items()))
+        return result
+
+
+class VirtualUser(object):
+    """
+    A user sending the requests of the mix over its own connection
+    """
+
+    def __init__(self, scenario: dict, host: str, port: int, recorder: Recorder, seed: int):
+        """
+        Create the user
+
+        :param scenario: The scenario
+        :param host: The host of the server
+        :param port: The port of the server
+        :param recorder: The recorder of the run
+        :param seed: The seed of the random choices of this user
+        """
+        self.scenario = scenario
+        self.connection = Connection(host, port)
+        self.recorder = recorder
+        self.random = random.Random(seed)
+        self.key = None
+        self.__weights = [entry['weight'] for entry in scenario['mix']]
+
+    async def send(self, name: str, method: str, path: str, body) -> tuple:
+        """
+        Send a request and record it
+
+        :param name: The name of the request
+        :param method: The request method
+        :param path: The path
+        :param body: The JSON body as object, or None
+        :return: A tuple of the status code (0 on a failure) and the response body
+        """
+        data = None if body is None else json.dumps(substitute(body, self.key)).encode('utf-8')
+        started = time.monotonic()
+        try:
+            status, response = await asyncio.wait_for(self.connection.request(method, path, data), request_timeout)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError):
+            self.connection.close()
+            status, response = 0, b''
+        self.recorder.record(name, time.monotonic() - started, status)
+        return status, response
+
+    async def login(self) -> bool:
+        """
+        Log in through ``/app/auth``
+
+        :return: True on success
+        """
+        status, response = await self.send('auth', 'POST', '/app/auth', dict(username=self.scenario['username'],
+                                                                             password=self.scenario['password']))
+        try:
+            self.key = json.loads(response.decode('utf-8'))['auth']['key'] if status == 200 else None
+        except (ValueError, KeyError, TypeError):
+            self.key = None
+        return self.key is not None
+
+    async def run(self, start: float, deadline: float) -> None:
+        """
+        Send requests from the start until the deadline
+
+        :param start: When to start (``time.monotonic``)
+        :param deadline: When to stop (``time.monotonic``)
+        """
+        await asyncio.sleep(max(0.0, start - time.monotonic()))
+        think_time = self.scenario['think_time']
+        try:
+            while time.monotonic() < deadline:
+                if self.key is None and not await self.login():
+                    await asyncio.sleep(min(1.0, max(0.0, deadline - time.monotonic())))
+                    continue
+                entry = self.random.choices(self.scenario['mix'], self.__weights)[0]
+                await self.send(entry['name'], entry['method'], entry['path'], entry.get('body'))
+                if entry['path'] == '/app/logout':
+                    self.key = None
+                if think_time > 0:
+                    await asyncio.sleep(min(self.random.expovariate(1.0 / think_time),
+                                            max(0.0, deadline - time.monotonic())))
+        finally:
+            self.connection.close()
+
+
+async def generate(scenario: dict, host: str, port: int, users: range) -> dict:
+    """
+    Run some of the users of a scenario in this process
+
+    :param scenario: The scenario
+    :param host: The host of the server
+    :param port: The port of the server
+    :param users: The numbers of the users to run
+    :return: The raw data of the :py:class:`Recorder`
+    """
+    recorder = Recorder()
+    started = time.monotonic()
+    ramp_up = scenario['ramp_up']
+    deadline = started + ramp_up + scenario['duration']
+    await asyncio.gather(*[VirtualUser(scenario, host, port, recorder, scenario['seed'] * 100003 + number)
+                          .run(started + ramp_up * number / scenario['users'], deadline) for number in users])
+    recorder.elapsed = time.monotonic() - started
+    return recorder.data()
+
+
+def client(arguments: tuple) -> dict:
+    """
+    Run the users of one client process
+
+    :param arguments: The scenario, host, port and user numbers, as for :py:func:`generate`
+    :return: The raw data of the :py:class:`Recorder`
+    """
+    return asyncio.run(generate(*arguments))
+
+
+def run_against(scenario: dict, host: str, port: int) -> dict:
+    """
+    Run a scenario against a running server
+
+    :param scenario: The scenario
+    :param host: The host of the server
+    :param port: The port of the server
+    :return: The report
+    """
+    processes = min(scenario['processes'], scenario['users'])
+    groups = [range(number, scenario['users'], processes) for number in range(0, processes)]
+    if processes == 1:
+        results = [client((scenario, host, port, groups[0]))]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(client, [(scenario, host, port, group) for group in groups])
+    recorder = Recorder()
+    for result in results:
+        recorder.merge(result)
+    report = dict(scenario=scenario['name'], users=scenario['users'], duration=scenario['duration'],
+                  ramp_up=scenario['ramp_up'], think_time=scenario['think_time'])
+    report.update(recorder.report())
+    return report
+
+
+def run(scenario: dict, target: str=None) -> dict:
+    """
+    Run a scenario, against a local server started for it unless a target is given
+
+    :param scenario: The scenario
+    :param target: ``host:port`` of a running server, or None
+    :return: The report
+    """
+    if target is not None:
+        host, _, port = target.rpartition(':')
+        return run_against(scenario, host or '127.0.0.1', int(port))
+    settings = scenario['server']
+    server = LocalServer(settings.get('arguments', list()), settings.get('config'))
+    server.start()
+    try:
+        report = run_against(scenario, server.host, server.port)
+        report['server'] = dict(arguments=settings.get('arguments', list()), rss=server.rss())
+        return report
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('scenario',
+                        help='The scenario file, or the name of a scenario shipped ({:s})'.format(
+                            ', '.join(sorted(os.path.splitext(name)[0] for name in os.listdir(scenario_folder)))))
+    parser.add_argument('-t', '--target',
+                        help='host:port of a running server (Default: start a local server)',
+                        type=str, default=None)
+    parser.add_argument('-d', '--duration',
+                        help='Seconds to run, overriding the scenario',
+                        type=float, default=None)
+    parser.add_argument('-u', '--users',
+                        help='Virtual users, overriding the scenario',
+                        type=int, default=None)
+    parser.add_argument('-o', '--output',
+                        help='Write the report to this file instead of the standard output',
+                        type=str, default=None)
+    args = parser.parse_args()
+    loaded = load_scenario(args.scenario)
+    if args.duration is not None:
+        loaded['duration'] = args.duration
+    if args.users is not None:
+        loaded['users'] = args.users
+    text = json.dumps(run(loaded, args.target), indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+    sys.exit(0)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark for the :py:mod:`MessagePack <arobito.controlinterface.MessagePack>` module.
+
+Typical ``/app`` payloads are encoded with the binary encoding and with every JSON codec installed. The size of the
+encoded payload and the time to decode it are compared. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.MessagePack --decodes 20000
+"""
+
+import argparse
+import sys
+import time
+from arobito.controlinterface import Codec
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: Typical payloads of the ``/app`` API, by name
+payloads = {
+    'auth request': dict(username='arobito', password='arobito'),
+    'auth response': dict(auth=dict(success=True, status='Login successful', key='f' * 128)),
+    'session count': dict(session_count=42),
+    'batch request': dict(key='f' * 128, calls=[dict(method='get_session_count', params=dict())] * 8),
+    'batch response': dict(batch=dict(success=True, results=[dict(result=dict(session_count=i)) for i in range(0, 8)])),
+    'status push': dict(topic='status', data=dict(state='shutdown', delay=5, ratio=0.75, ready=False))
+}
+
+
+def decode_microseconds(codec: Codec.BodyCodec, data: bytes, count: int) -> float:
+    """
+    Decode the same payload repeatedly
+
+    :param codec: The codec
+    :param data: The encoded payload
+    :param count: The number of decodes
+    :return: The average time of a decode in microseconds
+    """
+    started = time.perf_counter()
+    for i in range(0, count):
+        codec.decode(data)
+    return (time.perf_counter() - started) / count * 1000000
+
+
+def run(count: int=20000) -> dict:
+    """
+    Measure every payload with every codec
+
+    :param count: The number of decodes per payload and codec
+    :return: A dict of the payload names and a dict of the codec names and tuples of the size in bytes and the decode
+             time in microseconds
+    """
+    codecs = [Codec.binary] + [Codec.codecs[name] for name in sorted(Codec.codecs)]
+    results = dict()
+    for name, payload in payloads.items():
+        results[name] = dict()
+        for codec in codecs:
+            data = codec.encode(payload)
+            if codec.decode(data) != payload:
+                raise ValueError('Codec {:s} changed the {:s} payload'.format(codec.name, name))
+            decode_microseconds(codec, data, min(count, 1000))
+            results[name][codec.name] = (len(data), decode_microseconds(codec, data, count))
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--decodes',
+                        help='Number of decodes per payload and codec (Default: 20000)',
+                        type=int, default=20000)
+    args = parser.parse_args()
+    for payload_name, measures in run(args.decodes).items():
+        for codec_name, (size, micros) in measures.items():
+            print('{:<16s} {:<8s} {:>6d} bytes {:>8.2f} µs per decode'.format(payload_name, codec_name, size, micros))
+    sys.exit(0)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load test for the :py:mod:`PushChannel <arobito.controlinterface.PushChannel>` module.
+
+It starts a server, opens many authenticated and subscribed push sockets that stay idle and reports the memory the
+server needs per socket. Finally, it changes the session count and measures how long it takes until every socket got
+the pushed update. Run it from the ``test`` folder (Linux only, the memory is read from ``/proc``):
+
+.. code-block:: bash
+
+   python3 -m benchmarks.arobito.controlinterface.PushChannel --sockets 500
+"""
+
+import argparse
+import sys
+import time
+from testlibs.LocalServer import LocalServer
+from testlibs.PushClient import PushClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def idle_sockets(count: int=500) -> dict:
+    """
+    Hold ``count`` idle push sockets open and measure the server
+
+    :param count: The number of sockets
+    :return: A dict with the results
+    """
+    server = LocalServer()
+    server.start()
+    clients = list()
+    try:
+        key = server.login()
+        url = 'ws://{:s}:{:d}/push/'.format(server.host, server.port)
+        topics = ['status', 'sessions', 'notifications']
+
+        # One socket first, so the memory of loading the code paths is not counted per socket
+        warm_up = PushClient(url)
+        warm_up.connect()
+        warm_up.authenticate(key, topics)
+        warm_up.close()
+        time.sleep(1.0)
+        rss_before = server.rss()
+
+        started = time.monotonic()
+        for i in range(0, count):
+            client = PushClient(url)
+            client.connect()
+            if not client.authenticate(key, topics):
+                raise IOError('Socket {:d} failed to authenticate'.format(i))
+            clients.append(client)
+        connect_time = time.monotonic() - started
+        time.sleep(1.0)
+        rss_after = server.rss()
+
+        for client in clients:
+            client.messages.clear()
+        started = time.monotonic()
+        server.login()
+        latest = 0.0
+        for client in clients:
+            if client.wait_for(lambda m: m.get('topic', None) == 'sessions', 10.0) is None:
+                raise IOError('A socket did not receive the session count')
+            latest = time.monotonic() - started
+        return dict(sockets=count, connect_time=connect_time, rss_before=rss_before, rss_after=rss_after,
+                    bytes_per_socket=(rss_after - rss_before) / count if rss_before > 0 else -1,
+                    fan_out_time=latest)
+    finally:
+        for client in clients:
+            client.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--sockets',
+                        help='Number of idle sockets to hold open (Default: 500)',
+                        type=int, default=500)
+    args = parser.parse_args()
+    result = idle_sockets(args.sockets)
+    print('Idle push sockets:        {:d}'.format(result['sockets']))
+    print('Connect and subscribe:    {:.2f} s'.format(result['connect_time']))
+    print('Server memory before:     {:.1f} MiB'.format(result['rss_before'] / 1048576))
+    print('Server memory after:      {:.1f} MiB'.format(result['rss_after'] / 1048576))
+    print('Memory per socket:        {:.1f} KiB'.format(result['bytes_per_socket'] / 1024))
+    print('Fan-out to all sockets:   {:.1f} ms'.format(result['fan_out_time'] * 1000))
+    sys.exit(0)
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Replay of a capture of the control interface (see :py:mod:`Capture <arobito.controlinterface.Capture>`), to compare an
+instance with the run captured.
+
+The requests of the capture file are sent again, at the pace they were captured (``--speed 1``), N times as fast
+(``--speed N``) or one after the other as fast as possible (``--speed 0``, the same order on every run). Redacted
+passwords are replaced by ``--password``; a captured login gives its session key to the later requests of the same
+session, and sessions without a captured login are logged in before their first request. Only ``GET`` and ``POST``
+requests are replayed, the others are counted as skipped.
+
+Without a ``--target``, a local ``controlinterface.py`` is started for the replay. The report is printed as JSON: The
+latency percentiles in milliseconds of the capture and of the replay, overall and per path, and the requests whose
+status code, response shape or, for ``/static``, size differ from the capture, with some examples. The capture
+measures the latencies in the server, the replay in the client, so the replay includes the network. It exits with 1
+when requests differ. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.Replay /etc/arobito/capture.jsonl --speed 4
+"""
+
+import argparse
+import asyncio
+import calendar
+import json
+import sys
+import time
+from arobito.controlinterface import Capture
+from benchmarks.arobito.controlinterface.LoadGenerator import Connection, Recorder, request_timeout
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The request methods replayed
+methods = ('GET', 'POST')
+
+#: The number of differing requests shown in the report
+max_examples = 20
+
+
+def seconds_of(stamp: str) -> float:
+    """
+    Convert a time stamp of the capture
+
+    :param stamp: The time stamp, ISO 8601 in UTC with milliseconds
+    :return: The seconds since the epoch
+    """
+    whole, _, fraction = stamp.rstrip('Z').partition('.')
+    return calendar.timegm(time.strptime(whole, '%Y-%m-%dT%H:%M:%S')) + float('0.' + (fraction or '0'))
+
+
+def load_capture(file_name: str) -> list:
+    """
+    Read a capture file
+
+    :param file_name: The file
+    :return: The captured requests, in the order they started, each with its ``offset`` in seconds from the first
+    """
+    records = list()
+    with open(file_name, 'r') as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            # Other records, e.g. the reports of dropped records, are no requests
+            if 'm' not in record or 'p' not in record:
+                continue
+            record['offset'] = seconds_of(record['ts']) - record.get('ms', 0.0) / 1000
+            records.append(record)
+    records.sort(key=lambda item: item['offset'])
+    if records:
+        first = records[0]['offset']
+        for record in records:
+            record['offset'] -= first
+    return records
+
+
+def sessions_of(value) -> set:
+    """
+    Find the numbers of the sessions a request body refers to
+
+    :param value: The request body of the capture
+    :return: The session numbers
+    """
+    prefix = '$' + Capture.key_field
+    if isinstance(value, dict):
+        found = set()
+        for name, item in value.items():
+            if name == Capture.key_field and isinstance(item, str) and item.startswith(prefix):
+                found.add(int(item[len(prefix):]))
+            else:
+                found |= sessions_of(item)
+        return found
+    if isinstance(value, list):
+        return set(number for item in value for number in sessions_of(item))
+    return set()
+
+
+class Replayer(object):
+    """
+    Sends the captured requests and compares the responses
+    """
+
+    def __init__(self, host: str, port: int, records: list, username: str=None, password: str='arobito'):
+        """
+        Prepare the replay
+
+        :param host: The host of the server
+        :param port: The port of the server
+        :param records: The captured requests, see :py:func:`load_capture`
+        :param username: The user name for all logins, None to keep the ones captured
+        :param password: The password for all logins
+        """
+        self.host = host
+        self.port = port
+        self.records = records
+        self.username = username
+        self.password = password
+        self.__idle = list()
+        self.__keys = dict()
+        self.__captured_logins = set(record['k'] for record in records if 'k' in record)
+        #: The latencies of the capture
+        self.captured = Recorder()
+        #: The latencies of the replay
+        self.replayed = Recorder()
+        #: The requests that differ from the capture
+        self.differences = list()
+        #: The number of requests not replayed
+        self.skipped = 0
+
+    async def send(self, method: str, path: str, body: bytes=None) -> tuple:
+        """
+        Send a request over an idle connection, or a new one
+
+        :param method: The request method
+        :param path: The path
+        :param body: The JSON body or None
+        :return: A tuple of the status code (0 when the request failed), the response body and the seconds it took
+        """
+        connection = self.__idle.pop() if self.__idle else Connection(self.host, self.port)
+        started = time.perf_counter()
+        try:
+            status, data = await asyncio.wait_for(connection.request(method, path, body), request_timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            connection.close()
+            return 0, b'', time.perf_counter() - started
+        elapsed = time.perf_counter() - started
+        self.__idle.append(connection)
+        return status, data, elapsed
+
+    def __future(self, number: int) -> asyncio.Future:
+        """
+        Get the future of the session key of a session
+
+        :param number: The number of the session in the capture
+        :return: The future
+        """
+        if number not in self.__keys:
+            self.__keys[number] = asyncio.get_running_loop().create_future()
+        return self.__keys[number]
+
+    async def key(self, number: int) -> str:
+        """
+        Get the session key of a session, logging in when the capture has no login for it
+
+        :param number: The number of the session in the capture
+        :return: The session key, None when the login failed
+        """
+        future = self.__future(number)
+        if not future.done() and number not in self.__captured_logins:
+            self.__captured_logins.add(number)
+            status, data, elapsed = await self.send('POST', '/app/auth', json.dumps(
+                dict(username=self.username or 'arobito', password=self.password)).encode('utf-8'))
+            future.set_result(Capture.find_key(json.loads(data.decode('utf-8'))) if status == 200 else None)
+        return await future
+
+    def substitute(self, value, keys: dict):
+        """
+        Fill the secrets into a captured request body
+
+        :param value: The request body of the capture
+        :param keys: The session keys by session number
+        :return: The request body to send
+        """
+        if isinstance(value, dict):
+            result = dict()
+            for name, item in value.items():
+                if name in Capture.secret_fields and item == '*':
+                    result[name] = self.password
+                elif name == 'username' and self.username is not None:
+                    result[name] = self.username
+                elif name == Capture.key_field and isinstance(item, str) and item.startswith('$' + name):
+                    result[name] = keys.get(int(item[len(name) + 1:]))
+                else:
+                    result[name] = self.substitute(item, keys)
+            return result
+        if isinstance(value, list):
+            return [self.substitute(item, keys) for item in value]
+        return value
+
+    async def replay(self, record: dict) -> None:
+        """
+        Send a captured request and compare the response
+
+        :param record: The captured request
+        """
+        if record['m'] not in methods:
+            self.skipped += 1
+            return
+        body = None
+        if 'b' in record:
+            keys = dict()
+            for number in sessions_of(record['b']):
+                keys[number] = await self.key(number)
+            body = json.dumps(self.substitute(record['b'], keys)).encode('utf-8')
+        elif record['m'] == 'POST':
+            body = b''
+        status, data, elapsed = await self.send(record['m'], record['p'], body)
+        document = None
+        if status == 200 and record['p'].startswith('/app/'):
+            try:
+                document = json.loads(data.decode('utf-8'))
+            except ValueError:
+                pass
+        if 'k' in record:
+            future = self.__future(record['k'])
+            if not future.done():
+                future.set_result(Capture.find_key(document))
+        self.captured.record(record['p'], record.get('ms', 0.0) / 1000, record['s'])
+        self.replayed.record(record['p'], elapsed, status)
+        difference = list()
+        if status != record['s']:
+            difference.append('status')
+        if 'r' in record and (document is None or Capture.shape(document) != record['r']):
+            difference.append('shape')
+        if record['p'].startswith('/static/') and status == record['s'] and len(data) != record.get('n', len(data)):
+            difference.append('size')
+        if difference:
+            self.differences.append(dict(method=record['m'], path=record['p'], offset=round(record['offset'], 3),
+                                         differs=difference, captured=dict(status=record['s'], shape=record.get('r'),
+                                                                           size=record.get('n')),
+                                         replayed=dict(status=status, size=len(data),
+                                                       shape=None if document is None else Capture.shape(document))))
+
+    async def run(self, speed: float=1.0) -> None:
+        """
+        Replay all requests
+
+        :param speed: The factor of the pace of the capture, 0 to send the requests one after the other
+        """
+        started = time.perf_counter()
+        if speed <= 0:
+            for record in self.records:
+                await self.replay(record)
+        else:
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+
+            async def at(record: dict) -> None:
+                await asyncio.sleep(max(0.0, start + record['offset'] / speed - loop.time()))
+                await self.replay(record)
+
+            await asyncio.gather(*[at(record) for record in self.records])
+        self.replayed.elapsed = time.perf_counter() - started
+        self.captured.elapsed = self.records[-1]['offset'] if self.records else 0.0
+        for connection in self.__idle:
+            connection.close()
+
+    def report(self) -> dict:
+        """
+        Summarize the comparison
+
+        :return: The requests replayed and skipped, the summaries of the capture and the replay with their latency
+                 ratios per path, the number of differences by kind and the first differences
+        """
+        captured, replayed = self.captured.report(), self.replayed.report()
+        per_path = dict()
+        for path, summary in replayed['per_request'].items():
+            before = captured['per_request'][path]['latency_ms']
+            after = summary['latency_ms']
+            per_path[path] = dict(requests=summary['requests'], captured_ms=before, replayed_ms=after,
+                                  p50_ratio=round(after['p50'] / before['p50'], 3) if before['p50'] > 0 else None)
+        kinds = dict()
+        for difference in self.differences:
+            for kind in difference['differs']:
+                kinds[kind] = kinds.get(kind, 0) + 1
+        return dict(requests=replayed['requests'], skipped=self.skipped, captured=dict(
+            latency_ms=captured['latency_ms'], duration=round(self.captured.elapsed, 3)), replayed=dict(
+            latency_ms=replayed['latency_ms'], duration=round(self.replayed.elapsed, 3), status=replayed['status']),
+            per_path=per_path, differences=kinds, examples=self.differences[:max_examples])
+
+
+def run(records: list, speed: float=1.0, target: str=None, mode: str='cherrypy', username: str=None,
+        password: str='arobito') -> dict:
+    """
+    Replay a capture, against a local server started for it unless a target is given
+
+    :param records: The captured requests, see :py:func:`load_capture`
+    :param speed: The factor of the pace of the capture, 0 to send the requests one after the other
+    :param target: ``host:port`` of a running server, or None
+    :param mode: The server mode of the local server
+    :param username: The user name for all logins, None to keep the ones captured
+    :param password: The password for all logins
+    :return: The report
+    """
+    server = None
+    if target is not None:
+        host, _, port = target.rpartition(':')
+        host, port = host or '127.0.0.1', int(port)
+    else:
+        server = LocalServer(['--mode', mode])
+        server.start()
+        host, port = server.host, server.port
+    try:
+        replayer = Replayer(host, port, records, username, password)
+        asyncio.run(replayer.run(speed))
+        report = replayer.report()
+        report['speed'] = speed
+        return report
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('capture',
+                        help='The capture file')
+    parser.add_argument('-s', '--speed',
+                        help='Factor of the pace of the capture, 0 for as fast as possible (Default: 1)',
+                        type=float, default=1.0)
+    parser.add_argument('-t', '--target',
+                        help='host:port of a running server (Default: start a local server)',
+                        type=str, default=None)
+    parser.add_argument('-m', '--mode',
+                        help='Server mode of the local server (Default: cherrypy)',
+                        choices=('cherrypy', 'asyncio'), default='cherrypy')
+    parser.add_argument('-u', '--username',
+                        help='User name for all logins (Default: the ones captured)',
+                        type=str, default=None)
+    parser.add_argument('-p', '--password',
+                        help='Password for all logins (Default: arobito)',
+                        type=str, default='arobito')
+    parser.add_argument('-o', '--output',
+                        help='Write the report to this file instead of the standard output',
+                        type=str, default=None)
+    args = parser.parse_args()
+    result = run(load_capture(args.capture), args.speed, args.target, args.mode, args.username, args.password)
+    text = json.dumps(result, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as out:
+            out.write(text + '\n')
+    else:
+        print(text)
+    sys.exit(1 if result['differences'] else 0)
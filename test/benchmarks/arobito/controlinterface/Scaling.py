@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Scaling benchmark for the :py:class:`SessionManager <arobito.controlinterface.BackendManager.SessionManager>` and the
+:py:class:`UserManager <arobito.controlinterface.BackendManager.UserManager>`.
+
+For every population size from 10 to ``10 ** max-exponent``, a fresh process gets that many synthetic users in its
+``users.ini`` and that many sessions, and measures the median latency of every operation and the memory per user and
+per session. A power law ``latency = c * size ** k`` is fitted to the latencies of every operation by least squares on
+the logarithms; the exponent ``k`` is the empirical complexity, about 0 for constant time and 1 for linear time. The run
+fails when an operation that should take constant time has an exponent above :py:data:`constant_exponent`. Run it from
+the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.Scaling --max-exponent 5
+
+The operations are:
+
+* ``login``: :py:meth:`login <arobito.controlinterface.BackendManager.SessionManager.login>` of a random user, hashing
+  the password
+* ``find_user``: :py:meth:`get_user_by_username_and_password
+  <arobito.controlinterface.BackendManager.UserManager.get_user_by_username_and_password>` of an unknown user, without
+  hashing
+* ``get_user``, ``logout``: Of a random session
+* ``cleanup``: Without sessions to expire
+* ``count``: :py:meth:`get_current_sessions
+  <arobito.controlinterface.BackendManager.SessionManager.get_current_sessions>`
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from arobito.Base import create_salt, hash_password
+from arobito.controlinterface import Memory
+from arobito.controlinterface.BackendManager import SessionManager, UserManager
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The operations measured
+operations = ('login', 'find_user', 'get_user', 'logout', 'cleanup', 'count')
+
+#: The operations that should take constant time, per session store; SQLite counts the sessions by walking an index
+constant_operations = dict(memory=operations, sqlite=('login', 'find_user', 'get_user', 'logout', 'cleanup'))
+
+#: The highest exponent of an operation that counts as constant time
+constant_exponent = 0.1
+
+#: The number of calls measured per operation; ``login`` hashes and is called less often
+calls = dict(login=20, find_user=2000, get_user=2000, logout=1000, cleanup=2000, count=2000)
+
+#: The password of all synthetic users
+password = 'scaling'
+
+
+def session_key(number: int) -> str:
+    """
+    Get the key of a synthetic session
+
+    :param number: The number of the session
+    :return: The key, as long as a real one
+    """
+    return 'scaling{:057d}'.format(number)
+
+
+def write_config(folder: str, size: int, store: str) -> None:
+    """
+    Write the ``users.ini`` with the synthetic users and the ``controller.ini``
+
+    All users share the same salt and password, so the file is written without hashing for every user.
+
+    :param folder: The config folder
+    :param size: The number of users
+    :param store: The session store
+    """
+    secret = create_salt()
+    salt = create_salt()
+    hashed = hash_password(password, salt=salt, secret=secret)
+    with open(os.path.join(folder, 'users.ini'), 'w') as fh:
+        fh.write('[_Config_]\nsecret = {:s}\n\n'.format(secret.replace('%', '%%')))
+        for number in range(0, size):
+            fh.write('[User:user{:d}]\nlevel = Administrator\nsalt = {:s}\npassword = {:s}\nenabled = yes\n\n'
+                     .format(number, salt.replace('%', '%%'), hashed))
+    with open(os.path.join(folder, 'controller.ini'), 'w') as fh:
+        fh.write('[SessionManagement]\nmax_age_seconds = 86400\nmax_inactivity = 3600\nstore = {:s}\n'.format(store))
+
+
+def rss() -> int:
+    """
+    Get the resident set size of the process
+
+    :return: The bytes, 0 when unknown
+    """
+    return Memory.process_memory().get('rss', 0)
+
+
+def latency(function, arguments: list) -> float:
+    """
+    Call a function once per argument and take the median time
+
+    :param function: The function
+    :param arguments: The arguments, one per call
+    :return: The median seconds per call
+    """
+    times = list()
+    for argument in arguments:
+        started = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def measure_size(size: int, store: str) -> dict:
+    """
+    Fill the managers and measure the operations, in a process of its own
+
+    :param size: The number of users and of sessions
+    :param store: The session store
+    :return: The ``size``, the median seconds per operation in ``latency`` and the ``bytes_per_user`` and
+             ``bytes_per_session``
+    """
+    folder = tempfile.mkdtemp(prefix='arobito-scaling-')
+    try:
+        write_config(folder, size, store)
+        os.chdir(folder)
+        generator = random.Random(size)
+        start = rss()
+        users = UserManager()
+        after_users = rss()
+        sessions = SessionManager()
+        now = time.time()
+        for first in range(0, size, 10000):
+            sessions.import_sessions(dict((session_key(number), dict(username='user{:d}'.format(number),
+                                                                     level='Administrator', timestamp=now,
+                                                                     last_access=now))
+                                          for number in range(first, min(size, first + 10000))))
+        after_sessions = rss()
+        keys = [session_key(generator.randrange(0, size)) for i in range(0, calls['get_user'])]
+        results = dict()
+        results['find_user'] = latency(lambda name: users.get_user_by_username_and_password(name, password),
+                                       ['unknown{:d}'.format(i) for i in range(0, calls['find_user'])])
+        results['get_user'] = latency(sessions.get_user, keys)
+        results['count'] = latency(lambda unused: sessions.get_current_sessions(), range(0, calls['count']))
+        results['cleanup'] = latency(lambda unused: sessions.cleanup(), range(0, calls['cleanup']))
+        logout = generator.sample(range(0, size), min(size, calls['logout']))
+        results['logout'] = latency(sessions.logout, [session_key(number) for number in logout])
+        results['login'] = latency(lambda name: sessions.login(name, password),
+                                   ['user{:d}'.format(generator.randrange(0, size)) for i in range(0, calls['login'])])
+        return dict(size=size, latency=results, bytes_per_user=(after_users - start) / size,
+                    bytes_per_session=(after_sessions - after_users) / size)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def exponent(points: list) -> float:
+    """
+    Fit a power law to measurements
+
+    :param points: Tuples of the size and the latency
+    :return: The exponent of the size, by least squares on the logarithms
+    """
+    xs = [math.log(size) for size, value in points]
+    ys = [math.log(max(value, 1e-9)) for size, value in points]
+    mean_x = statistics.mean(xs)
+    mean_y = statistics.mean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread > 0 else 0.0
+
+
+def complexity(value: float) -> str:
+    """
+    Name the complexity of a fitted exponent
+
+    :param value: The exponent
+    :return: The name
+    """
+    if value <= constant_exponent:
+        return 'O(1)'
+    if value < 0.8:
+        return 'sublinear'
+    if value < 1.2:
+        return 'O(n)'
+    if value < 1.6:
+        return 'O(n log n)'
+    return 'O(n^{:.1f})'.format(value)
+
+
+def run(max_exponent: int=6, store: str='memory') -> dict:
+    """
+    Measure all sizes and fit the complexities
+
+    :param max_exponent: The largest size is ``10 ** max_exponent``
+    :param store: The session store, ``memory`` or ``sqlite``
+    :return: The ``store``, the ``sizes`` with their measurements, the ``complexity`` per operation and the
+             ``failures``, the operations that should take constant time but grow
+    """
+    sizes = list()
+    for power in range(1, max_exponent + 1):
+        # A fresh process for every size, so the memory and the singletons start empty
+        with multiprocessing.Pool(1) as pool:
+            sizes.append(pool.apply(measure_size, (10 ** power, store)))
+    fitted = dict()
+    failures = list()
+    for operation in operations:
+        value = exponent([(entry['size'], entry['latency'][operation]) for entry in sizes])
+        fitted[operation] = dict(exponent=round(value, 3), complexity=complexity(value))
+        if operation in constant_operations[store] and value > constant_exponent:
+            failures.append(operation)
+    return dict(store=store, sizes=sizes, complexity=fitted, failures=failures)
+
+
+def print_report(report: dict) -> None:
+    """
+    Print a table of the measurements and the complexities
+
+    :param report: The result of :py:func:`run`
+    """
+    print('{:>9s} {:>10s} {:>10s} '.format('size', 'B/user', 'B/session') +
+          ' '.join('{:>10s}'.format(operation) for operation in operations))
+    for entry in report['sizes']:
+        print('{:>9d} {:>10.0f} {:>10.0f} '.format(entry['size'], entry['bytes_per_user'], entry['bytes_per_session']) +
+              ' '.join('{:>8.2f}µs'.format(entry['latency'][operation] * 1e6) for operation in operations))
+    print('{:>31s} '.format('exponent') +
+          ' '.join('{:>10.3f}'.format(report['complexity'][operation]['exponent']) for operation in operations))
+    print('{:>31s} '.format('complexity') +
+          ' '.join('{:>10s}'.format(report['complexity'][operation]['complexity']) for operation in operations))
+    if report['failures']:
+        print('Growing with the size, but should take constant time: {:s}'.format(', '.join(report['failures'])))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-e', '--max-exponent',
+                        help='The largest population is 10 to the power of this (Default: 6)',
+                        type=int, default=6)
+    parser.add_argument('-s', '--store',
+                        help='The session store (Default: memory)',
+                        choices=sorted(constant_operations), default='memory')
+    parser.add_argument('-o', '--output',
+                        help='Write the report as JSON to this file',
+                        type=str, default=None)
+    args = parser.parse_args()
+    result = run(args.max_exponent, args.store)
+    print_report(result)
+    if args.output is not None:
+        with open(args.output, 'w') as out:
+            out.write(json.dumps(result, indent=2) + '\n')
+    sys.exit(1 if result['failures'] else 0)
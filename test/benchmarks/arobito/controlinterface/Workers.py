@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Throughput scaling of the worker processes (see :py:mod:`Supervisor <arobito.controlinterface.Supervisor>`).
+
+A server is started with 1, 2, ... up to the number of CPU cores worker processes and loaded with concurrent keep-alive
+connections sending ``/app/get_session_count``. The session is stored in SQLite in every run, also with a single
+worker, so the runs compare. The load is generated by as many client processes as the machine has cores (using
+:py:func:`load <benchmarks.arobito.controlinterface.AsyncServer.load>`), so the client shares the cores with the server
+and the numbers show the scaling rather than the limit of a single core. Run it from the ``test`` folder:
+
+.. code-block:: bash
+
+   PYTHONPATH=../src python3 -m benchmarks.arobito.controlinterface.Workers --duration 10 --mode cherrypy
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+from testlibs.LocalServer import LocalServer
+from benchmarks.arobito.controlinterface.AsyncServer import load
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def client(arguments: tuple) -> dict:
+    """
+    Run the load of one client process
+
+    :param arguments: Host, port, session key, connections and duration, as for :py:func:`load
+                      <benchmarks.arobito.controlinterface.AsyncServer.load>`
+    :return: The result of the load
+    """
+    return asyncio.run(load(*arguments))
+
+
+def run(duration: float=10.0, mode: str='cherrypy', max_workers: int=None, connections: int=64) -> dict:
+    """
+    Measure the throughput for growing numbers of worker processes
+
+    :param duration: Seconds per number of workers
+    :param mode: The server mode of the workers
+    :param max_workers: The largest number of workers, by default the number of CPU cores
+    :param connections: The number of concurrent connections, spread over the client processes
+    :return: A dict of the number of workers and a dict with the requests per second, the 50th and 99th latency
+             percentile of the slowest client in milliseconds and the errors
+    """
+    cores = os.cpu_count() or 1
+    if max_workers is None:
+        max_workers = cores
+    clients = max(1, min(cores, connections))
+    results = dict()
+    for workers in range(1, max_workers + 1):
+        arguments = ['--mode', mode, '--workers', str(workers), '--socketqueue', '1024', '--keepalivelimit', '2000']
+        server = LocalServer(arguments, '[SessionManagement]\nstore = sqlite\n')
+        server.start()
+        try:
+            key = server.login()
+            with multiprocessing.Pool(clients) as pool:
+                loads = pool.map(client, [(server.host, server.port, key, connections // clients, duration)
+                                          for i in range(0, clients)])
+            results[workers] = dict(rate=sum(r['rate'] for r in loads), p50=max(r['p50'] for r in loads),
+                                    p99=max(r['p99'] for r in loads), errors=sum(r['errors'] for r in loads))
+        finally:
+            server.stop()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--duration',
+                        help='Seconds per number of workers (Default: 10)',
+                        type=float, default=10.0)
+    parser.add_argument('-m', '--mode',
+                        help='The server mode of the workers (Default: cherrypy)',
+                        type=str, choices=('cherrypy', 'asyncio'), default='cherrypy')
+    parser.add_argument('-w', '--workers',
+                        help='The largest number of workers (Default: the number of CPU cores)',
+                        type=int, default=None)
+    parser.add_argument('-c', '--connections',
+                        help='Concurrent connections (Default: 64)',
+                        type=int, default=64)
+    args = parser.parse_args()
+    print('{:>7s} {:>10s} {:>8s} {:>9s} {:>9s} {:>7s}'.format('workers', 'req/s', 'scaling', 'p50 ms', 'p99 ms',
+                                                              'errors'))
+    results = run(args.duration, args.mode, args.workers, args.connections)
+    for workers, r in results.items():
+        print('{:>7d} {:>10.0f} {:>7.2f}x {:>9.1f} {:>9.1f} {:>7d}'
+              .format(workers, r['rate'], r['rate'] / results[1]['rate'] if results[1]['rate'] else 0.0, r['p50'],
+                      r['p99'], r['errors']))
+    sys.exit(0)
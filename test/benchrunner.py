@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+This module is our microbenchmark runner.
+
+Like the test runner, it iterates through all modules under the package ``benchmarks`` and runs every subclass of
+:py:class:`Benchmark <testlibs.Benchmarking.Benchmark>` it finds. Every run is appended to a JSON history file; with
+``--baseline``, the results are compared with a stored run, and the runner fails when a benchmark became slower.
+
+.. code-block:: bash
+
+   python3 benchrunner.py --save-baseline baseline.json
+   # ... change something ...
+   python3 benchrunner.py --baseline baseline.json --filter Base.
+"""
+
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import time
+from testlibs import Benchmarking, Lister
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def bench_suite_setup() -> None:
+    """
+    Setup the benchmark runner: Make the Arobito source code accessible.
+    """
+    sys.path.insert(0, os.path.abspath('../src/'))
+
+
+def enlist_benchmarks(filters: list=None) -> list:
+    """
+    Find the benchmarks
+
+    :param filters: Substrings of which the name of a benchmark must contain one, None for all benchmarks
+    :return: The benchmark classes, sorted by name
+    """
+    benchmarks = dict()
+    for bench_class in Lister.enlist_all_classes('benchmarks'):
+        if not issubclass(bench_class, Benchmarking.Benchmark) or bench_class is Benchmarking.Benchmark:
+            continue
+        if filters and not any(part in bench_class.name() for part in filters):
+            continue
+        benchmarks[bench_class.name()] = bench_class
+    return [benchmarks[name] for name in sorted(benchmarks)]
+
+
+def current_commit() -> str:
+    """
+    Get the commit the sources are at
+
+    :return: The short commit hash, None when unknown
+    """
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('ascii').strip()
+
+
+def run_benchmarks(args: argparse.Namespace) -> int:
+    """
+    Run the benchmarks, store the results and compare them with the baseline
+
+    :param args: The parsed command line
+    :return: 0 on success, 1 on regressions or when no benchmark was found
+    """
+    print('========================', file=sys.stderr)
+    print('Arobito Benchmark Runner', file=sys.stderr)
+    print('========================', file=sys.stderr)
+    print(file=sys.stderr)
+
+    baseline = Benchmarking.load_baseline(args.baseline) if args.baseline else None
+    benchmarks = enlist_benchmarks(args.filter)
+    if not benchmarks:
+        print('No benchmarks found.', file=sys.stderr)
+        return 1
+
+    width = max(len(bench_class.name()) for bench_class in benchmarks)
+    results = dict()
+    for bench_class in benchmarks:
+        result = Benchmarking.measure(bench_class(), args.samples, args.sample_time)
+        results[bench_class.name()] = result
+        print('{:<{:d}s} {:>11s} ±{:>5.1f}%  {:>12,.0f}/s  ({:d} x {:d})'
+              .format(bench_class.name(), width, Benchmarking.format_time(result['median']), result['rsd'] * 100,
+                      result['ops'], result['samples'], result['loops']), file=sys.stderr)
+
+    run = dict(timestamp=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), commit=current_commit(),
+               python=platform.python_version(), machine=platform.machine(), results=results)
+    if args.history:
+        Benchmarking.append_history(args.history, run)
+    if args.save_baseline:
+        Benchmarking.save(args.save_baseline, run)
+
+    if baseline is None:
+        return 0
+
+    print(file=sys.stderr)
+    print('-----------------------------', file=sys.stderr)
+    print('Comparison with the baseline', file=sys.stderr)
+    print('-----------------------------', file=sys.stderr)
+    regressions = 0
+    for name, change, verdict in Benchmarking.compare(results, baseline, args.threshold):
+        if verdict == 'regression':
+            regressions += 1
+        print('{:<{:d}s} {:>8s}  {:s}'.format(name, width, '' if change is None else '{:+.1%}'.format(change),
+                                               verdict.upper() if verdict == 'regression' else verdict),
+              file=sys.stderr)
+
+    print(file=sys.stderr)
+    if regressions > 0:
+        print('{:d} REGRESSION(S) FOUND.'.format(regressions), file=sys.stderr)
+        return 1
+    print('NO REGRESSIONS.', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-k', '--filter', help='Run only the benchmarks whose name contains this (repeatable)',
+                        action='append')
+    parser.add_argument('--samples', help='Number of samples per benchmark (Default: the benchmark\'s own)', type=int)
+    parser.add_argument('--sample-time', help='Minimum seconds per sample (Default: the benchmark\'s own)',
+                        type=float)
+    parser.add_argument('--history', help='JSON file the runs are appended to, empty for none '
+                                          '(Default: benchmark-history.json)',
+                        default='benchmark-history.json')
+    parser.add_argument('--baseline', help='Compare with the run in this file, or the latest run of a history file')
+    parser.add_argument('--save-baseline', help='Store this run as baseline in this file')
+    parser.add_argument('--threshold', help='Relative slowdown reported as regression (Default: 0.1)',
+                        type=float, default=0.1)
+    bench_suite_setup()
+    # Important: Return with the return code from the run!
+    sys.exit(run_benchmarks(parser.parse_args()))
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+The base of the microbenchmarks run by ``benchrunner.py``.
+
+A microbenchmark is a subclass of :py:class:`Benchmark` in a module under the ``benchmarks`` package, found the same
+way ``testrunner.py`` finds the test cases. :py:func:`measure` runs it: After a warmup, the number of calls per sample
+is calibrated so a sample takes at least :py:attr:`Benchmark.sample_time`, and the cost of the empty loop is taken off.
+The samples are summarised by :py:func:`summarise`; :py:func:`compare` checks a run against a baseline.
+
+All times are nanoseconds per call.
+"""
+
+import gc
+import json
+import math
+import os
+import statistics
+import time
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The most calls in one sample
+max_loops = 10000000
+
+
+class Benchmark(object):
+    """
+    The base class of the microbenchmarks; a subclass implements :py:meth:`run`
+    """
+
+    #: The seconds the benchmark is run before it is measured
+    warmup = 0.2
+
+    #: The seconds one sample takes at least
+    sample_time = 0.05
+
+    #: The number of samples
+    samples = 20
+
+    @classmethod
+    def name(cls) -> str:
+        """
+        Get the name of the benchmark
+
+        :return: The module below ``benchmarks`` and the class name, e.g. ``arobito.Base.HashPassword``
+        """
+        module = cls.__module__
+        if module.startswith('benchmarks.'):
+            module = module[len('benchmarks.'):]
+        return '{:s}.{:s}'.format(module, cls.__name__)
+
+    def setUp(self) -> None:
+        """
+        Prepare the benchmark, not measured
+        """
+        pass
+
+    def tearDown(self) -> None:
+        """
+        Clean up after the benchmark, not measured
+        """
+        pass
+
+    def run(self) -> None:
+        """
+        The code measured
+
+        :raise NotImplementedError: Always, the subclass implements it
+        """
+        raise NotImplementedError('{:s} does not implement run()'.format(self.name()))
+
+    def idle(self) -> None:
+        """
+        Do nothing; measured to take the cost of the loop and the call off the results
+        """
+        pass
+
+
+def time_loop(function, loops: int) -> float:
+    """
+    Call a function repeatedly
+
+    :param function: The function
+    :param loops: The number of calls
+    :return: The seconds taken
+    """
+    calls = range(0, loops)
+    started = time.perf_counter()
+    for i in calls:
+        function()
+    return time.perf_counter() - started
+
+
+def calibrate(function, sample_time: float) -> int:
+    """
+    Find the number of calls taking at least the given time
+
+    :param function: The function
+    :param sample_time: The seconds
+    :return: The number of calls
+    """
+    loops = 1
+    while loops < max_loops:
+        elapsed = time_loop(function, loops)
+        if elapsed >= sample_time:
+            break
+        if elapsed <= 0.0:
+            loops *= 10
+        else:
+            loops = max(loops * 2, int(loops * sample_time * 1.2 / elapsed))
+    return min(loops, max_loops)
+
+
+def summarise(times: list) -> dict:
+    """
+    Summarise the samples of a benchmark
+
+    :param times: The nanoseconds per call of every sample
+    :return: The ``median``, ``mean``, ``stdev``, ``min`` and ``max`` in nanoseconds per call, ``ci95``, the half
+             width of the 95% confidence interval of the mean, ``rsd``, the relative standard deviation, ``ops`` per
+             second, the number of ``samples`` and of ``outliers`` (beyond 1.5 times the interquartile range)
+    """
+    count = len(times)
+    median = statistics.median(times)
+    mean = statistics.mean(times)
+    stdev = statistics.stdev(times) if count > 1 else 0.0
+    outliers = 0
+    if count >= 4:
+        quartiles = statistics.quantiles(times, n=4)
+        first, third = quartiles[0], quartiles[2]
+        spread = (third - first) * 1.5
+        outliers = len([value for value in times if value < first - spread or value > third + spread])
+    return dict(median=median, mean=mean, stdev=stdev, min=min(times), max=max(times),
+                ci95=1.96 * stdev / math.sqrt(count), rsd=stdev / mean if mean > 0 else 0.0,
+                ops=1e9 / median if median > 0 else 0.0, samples=count, outliers=outliers)
+
+
+def measure(benchmark: Benchmark, samples: int=None, sample_time: float=None) -> dict:
+    """
+    Run and measure a benchmark
+
+    The garbage collector is off while a sample is taken, as with :py:mod:`timeit`.
+
+    :param benchmark: The benchmark
+    :param samples: The number of samples, None for the benchmark's own
+    :param sample_time: The seconds a sample takes at least, None for the benchmark's own
+    :return: The summary of :py:func:`summarise`, with the ``loops`` per sample and the ``overhead`` in nanoseconds
+             per call taken off
+    """
+    samples = samples if samples is not None else benchmark.samples
+    sample_time = sample_time if sample_time is not None else benchmark.sample_time
+    benchmark.setUp()
+    try:
+        deadline = time.perf_counter() + benchmark.warmup
+        while time.perf_counter() < deadline:
+            benchmark.run()
+        loops = calibrate(benchmark.run, sample_time)
+        overhead = min(time_loop(benchmark.idle, loops) for i in range(0, 3)) * 1e9 / loops
+        times = list()
+        enabled = gc.isenabled()
+        for i in range(0, samples):
+            gc.collect()
+            gc.disable()
+            try:
+                elapsed = time_loop(benchmark.run, loops)
+            finally:
+                if enabled:
+                    gc.enable()
+            times.append(max(0.0, elapsed * 1e9 / loops - overhead))
+    finally:
+        benchmark.tearDown()
+    result = summarise(times)
+    result['loops'] = loops
+    result['overhead'] = overhead
+    return result
+
+
+def compare(results: dict, baseline: dict, threshold: float=0.1) -> list:
+    """
+    Compare the results of a run with a baseline
+
+    A benchmark counts as a regression when its median is slower than the baseline's by more than the threshold and by
+    more than the confidence intervals of both, so noise alone is not reported.
+
+    :param results: The benchmark names and their results
+    :param baseline: The benchmark names and their results of the baseline
+    :param threshold: The relative change that is ignored, e.g. 0.1 for 10%
+    :return: A list of tuples of the name, the ``change`` relative to the baseline (None for new benchmarks) and the
+             verdict: ``regression``, ``improvement``, ``unchanged`` or ``new``
+    """
+    verdicts = list()
+    for name in sorted(results):
+        if name not in baseline or baseline[name]['median'] <= 0:
+            verdicts.append((name, None, 'new'))
+            continue
+        before = baseline[name]
+        after = results[name]
+        change = after['median'] / before['median'] - 1.0
+        noise = (before.get('ci95', 0.0) + after.get('ci95', 0.0)) / before['median']
+        if change > threshold and change > noise:
+            verdict = 'regression'
+        elif change < -threshold and -change > noise:
+            verdict = 'improvement'
+        else:
+            verdict = 'unchanged'
+        verdicts.append((name, change, verdict))
+    return verdicts
+
+
+def load_history(file_name: str) -> list:
+    """
+    Read the stored runs
+
+    :param file_name: The history file
+    :return: The runs, oldest first; empty when the file does not exist
+    """
+    if not os.path.isfile(file_name):
+        return list()
+    with open(file_name, 'r') as fh:
+        history = json.load(fh)
+    return history if isinstance(history, list) else [history]
+
+
+def append_history(file_name: str, run: dict) -> None:
+    """
+    Add a run to the history file
+
+    :param file_name: The history file
+    :param run: The run
+    """
+    history = load_history(file_name)
+    history.append(run)
+    save(file_name, history)
+
+
+def save(file_name: str, data) -> None:
+    """
+    Write a run or a history, replacing the file at once
+
+    :param file_name: The file
+    :param data: The run or the list of runs
+    """
+    temp_name = file_name + '.tmp'
+    with open(temp_name, 'w') as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+    os.replace(temp_name, file_name)
+
+
+def load_baseline(file_name: str) -> dict:
+    """
+    Read the results of a baseline
+
+    :param file_name: A file with a single run, or a history file whose latest run is the baseline
+    :return: The benchmark names and their results
+    :raise ValueError: When the file holds no run
+    """
+    history = load_history(file_name)
+    if not history or 'results' not in history[-1]:
+        raise ValueError('No benchmark run in "{:s}"'.format(file_name))
+    return history[-1]['results']
+
+
+def format_time(nanoseconds: float) -> str:
+    """
+    Format a time per call for reading
+
+    :param nanoseconds: The nanoseconds
+    :return: The time with a suitable unit
+    """
+    for unit, factor in (('s', 1e9), ('ms', 1e6), ('µs', 1e3)):
+        if nanoseconds >= factor:
+            return '{:.2f} {:s}'.format(nanoseconds / factor, unit)
+    return '{:.1f} ns'.format(nanoseconds)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Run the control interface in a separate process, for tests and benchmarks that need a real server.
+
+The server runs in a temporary working folder, so it creates its own ``controller.ini`` and ``users.ini`` with the
+default user ``arobito``.
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+#: The start script of the control interface
+start_script = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'controlinterface.py'))
+
+
+def find_free_port() -> int:
+    """
+    Ask the operating system for a free TCP port
+
+    :return: The port number
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class LocalServer(object):
+    """
+    A control interface process listening on a free port of ``127.0.0.1``
+    """
+
+    def __init__(self, arguments: list=None, config: str=None):
+        """
+        Prepare the server
+
+        :param arguments: Additional command line arguments for ``controlinterface.py``
+        :param config: Content for the ``controller.ini`` of the server
+        """
+        self.host = '127.0.0.1'
+        self.port = find_free_port()
+        self.arguments = arguments if arguments is not None else list()
+        self.work_dir = tempfile.mkdtemp(prefix='arobito-')
+        if config is not None:
+            with open(os.path.join(self.work_dir, 'controller.ini'), 'w') as fh:
+                fh.write(config)
+        self.log_file = os.path.join(self.work_dir, 'server.log')
+        self.process = None
+
+    def start(self, timeout: float=30.0) -> None:
+        """
+        Start the server and wait until it accepts connections
+
+        :param timeout: Seconds to wait
+        :raise IOError: When the server does not come up
+        """
+        command = [sys.executable, start_script, '-I', self.host, '-p', str(self.port)] + self.arguments
+        with open(self.log_file, 'w') as log:
+            self.process = subprocess.Popen(command, cwd=self.work_dir, stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise IOError('Server exited with {:d}:\n{:s}'.format(self.process.returncode, self.log()))
+            try:
+                with socket.create_connection((self.host, self.port), timeout=1.0):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise IOError('Server did not start within {:.0f} seconds:\n{:s}'.format(timeout, self.log()))
+
+    def stop(self) -> None:
+        """
+        Stop the server and remove its working folder
+        """
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def log(self) -> str:
+        """
+        Get the output of the server
+
+        :return: The output
+        """
+        if not os.path.isfile(self.log_file):
+            return ''
+        with open(self.log_file, 'r', errors='replace') as fh:
+            return fh.read()
+
+    def url(self, path: str) -> str:
+        """
+        Build an URL on the server
+
+        :param path: The path, starting with ``/``
+        :return: The URL
+        """
+        return 'http://{:s}:{:d}{:s}'.format(self.host, self.port, path)
+
+    def post_json(self, path: str, data: dict) -> dict:
+        """
+        Post a JSON request to the server
+
+        :param path: The path, e.g. ``/app/auth``
+        :param data: The request
+        :return: The response
+        """
+        request = urllib.request.Request(self.url(path), data=json.dumps(data).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def login(self, username: str='arobito', password: str='arobito') -> str:
+        """
+        Log in to the server
+
+        :param username: The user name
+        :param password: The password
+        :return: The session key
+        """
+        return self.post_json('/app/auth', dict(username=username, password=password))['auth']['key']
+
+    def rss(self) -> int:
+        """
+        Get the resident memory of the server process (Linux only)
+
+        :return: The resident set size in bytes, or -1 when it cannot be determined
+        """
+        try:
+            with open('/proc/{:d}/status'.format(self.process.pid), 'r') as fh:
+                for line in fh:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except (IOError, ValueError):
+            pass
+        return -1
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A blocking client for the push channel (see :py:mod:`PushChannel <arobito.controlinterface.PushChannel>`).
+
+It does not start any threads, so many of them can be held open by a single test.
+"""
+
+import json
+import time
+from ws4py.client import WebSocketBaseClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class PushClient(WebSocketBaseClient):
+    """
+    A push channel client collecting the received messages
+    """
+
+    def __init__(self, url: str):
+        """
+        Prepare the client, without connecting
+
+        :param url: The WebSocket URL, e.g. ``ws://127.0.0.1:9812/push/``
+        """
+        WebSocketBaseClient.__init__(self, url)
+        self.messages = list()
+
+    def received_message(self, message) -> None:
+        """
+        Collect a message
+
+        :param message: The message
+        """
+        self.messages.append(json.loads(message.data.decode('utf-8')))
+
+    def request(self, data: dict) -> None:
+        """
+        Send a request
+
+        :param data: The request
+        """
+        self.send(json.dumps(data))
+
+    def wait_for(self, condition, timeout: float=5.0) -> dict:
+        """
+        Read from the socket until a message fulfilling a condition arrives
+
+        :param condition: A callable taking a message and returning True for the message waited for
+        :param timeout: Seconds to wait
+        :return: The message, which is removed from :py:attr:`messages`, or None on timeout
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            for message in self.messages:
+                if condition(message):
+                    self.messages.remove(message)
+                    return message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.terminated:
+                return None
+            self.sock.settimeout(remaining)
+            self.once()
+
+    def authenticate(self, key: str, topics: list, timeout: float=5.0) -> bool:
+        """
+        Authenticate and subscribe to topics
+
+        :param key: The session key
+        :param topics: The topics to subscribe to
+        :param timeout: Seconds to wait for each answer
+        :return: True when all steps succeeded
+        """
+        self.request(dict(action='auth', key=key))
+        answer = self.wait_for(lambda m: m.get('action', None) == 'auth', timeout)
+        if answer is None or not answer['success']:
+            return False
+        self.request(dict(action='subscribe', topics=topics))
+        answer = self.wait_for(lambda m: m.get('action', None) == 'subscribe', timeout)
+        return answer is not None and answer['success']
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A minimal WSGI client to send requests to CherryPy applications without starting a server.
+"""
+
+import io
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def request(app, script_name: str, path: str, method: str='GET', headers: dict=None, body: bytes=b'') -> tuple:
+    """
+    Send a request to a WSGI application
+
+    :param app: The WSGI application, e.g. a ``cherrypy.Application``
+    :param script_name: The mount point of the application, e.g. ``/static``
+    :param path: The path below the mount point
+    :param method: The HTTP method
+    :param headers: A dict of request headers
+    :param body: The request body
+    :return: A tuple of the status code as int, a dict of the response headers and the response body as bytes
+    """
+    response = dict()
+
+    def start_response(status: str, response_headers: list, exc_info=None) -> None:
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = dict(response_headers)
+
+    query = ''
+    if '?' in path:
+        path, query = path.split('?', 1)
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': script_name,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'HTTP_HOST': 'localhost',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.version': (1, 0)
+    }
+    if headers is not None:
+        for name, value in headers.items():
+            if name.lower() == 'content-type':
+                environ['CONTENT_TYPE'] = value
+                continue
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    result = app(environ, start_response)
+    try:
+        response_body = b''.join(result)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], response_body
@@ -16,6 +16,7 @@
 
 import unittest
 import arobito.Base
+import os
 import os.path
 
 __license__ = 'Apache License V2.0'
@@ -107,6 +108,37 @@ class Singleton(unittest.TestCase):
                          'The values in Singleton 1 and Singleton 2 are not equal')
 
 
+class SingletonAfterFork(unittest.TestCase):
+    """
+    Find out if a child process creates its own singleton instances after a fork
+    """
+
+    def runTest(self) -> None:
+        """
+        Set a value in the parent, fork and report the value the child sees through a pipe
+        """
+        if not hasattr(os, 'fork'):
+            self.skipTest('No fork on this platform')
+        parent_instance = SingletonMock1()
+        parent_instance.set_value('Parent value')
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_fd)
+                value = SingletonMock1().get_value()
+                os.write(write_fd, b'reset' if value == 'After Init' else b'kept')
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as fh:
+            result = fh.read()
+        os.waitpid(pid, 0)
+        self.assertEqual(result, b'reset', 'The child process kept the instance of the parent')
+        self.assertIs(SingletonMock1(), parent_instance, 'The parent lost its instance')
+        self.assertEqual(parent_instance.get_value(), 'Parent value', 'The value of the parent changed')
+
+
 class DifferentSingletons(unittest.TestCase):
     """
     Find out if two different singletons are really independent
@@ -76,3 +76,24 @@ class GetConfigFile(unittest.TestCase):
         """
         self.__check_default()
         self.__check_with_name()
+
+
+class GetConfigSection(unittest.TestCase):
+    """
+    Test the :py:func:`get_config_section <arobito.FsTools.get_config_section>` function
+    """
+
+    def runTest(self) -> None:
+        """
+        Check that defaults are filled in, but existing values are kept, and clean up afterwards
+        """
+        section = arobito.FsTools.get_config_section('testing.ini', 'Testing', {'first': '1', 'second': 'two'})
+        self.assertEqual(section.get('first'), '1', 'Default value for first option not set')
+        self.assertEqual(section.get('second'), 'two', 'Default value for second option not set')
+        conf_file = arobito.FsTools.get_config_file('testing.ini')
+        with open(conf_file, 'w') as fh:
+            fh.write('[Testing]\nfirst = 42\nsecond =\n')
+        section = arobito.FsTools.get_config_section('testing.ini', 'Testing', {'first': '1', 'second': 'two'})
+        self.assertEqual(section.getint('first'), 42, 'Existing value was overwritten')
+        self.assertEqual(section.get('second'), 'two', 'Empty value was not replaced by the default')
+        os.remove(conf_file)
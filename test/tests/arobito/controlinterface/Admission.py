@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Admission <arobito.controlinterface.Admission>` module.
+"""
+
+import unittest
+import asyncio
+import threading
+import time
+from arobito.controlinterface.Admission import AdmissionController, Overloaded, lane_of
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Lanes(unittest.TestCase):
+    """
+    Test the admission and the order of the lanes of the :py:class:`AdmissionController
+    <arobito.controlinterface.Admission.AdmissionController>`
+    """
+
+    def __check_order(self, controller: AdmissionController) -> None:
+        """
+        Waiting requests get the free slots by lane, not by arrival
+
+        :param controller: The controller
+        """
+        controller.configure(1, 3, 10.0)
+        first = controller.enter('interactive')
+        self.assertEqual(first.state, 'admitted', 'Request not admitted below the limit')
+        waiting = [controller.enter(lane) for lane in ('expensive', 'interactive', 'priority')]
+        self.assertEqual([ticket.state for ticket in waiting], ['waiting'] * 3, 'Requests not queued')
+        order = list()
+        ticket = first
+        for i in range(0, 3):
+            controller.leave(ticket)
+            ticket = [ticket for ticket in waiting if ticket.state == 'admitted']
+            self.assertEqual(len(ticket), 1, 'Not exactly one request admitted')
+            ticket = ticket[0]
+            order.append(ticket)
+        controller.leave(ticket)
+        self.assertEqual(order, list(reversed(waiting)), 'Lanes not served in order')
+
+    def __check_shedding(self, controller: AdmissionController) -> None:
+        """
+        A full queue rejects requests or sheds waiting ones of worse lanes
+
+        :param controller: The controller
+        """
+        controller.configure(1, 1, 10.0)
+        woken = list()
+        first = controller.enter('priority')
+        queued = controller.enter('expensive', lambda: woken.append('expensive'))
+        with self.assertRaises(Overloaded, msg='Request admitted with a full queue') as context:
+            controller.enter('expensive')
+        self.assertGreaterEqual(context.exception.retry_after, 1, 'Retry-After below one second')
+        better = controller.enter('interactive', lambda: woken.append('interactive'))
+        self.assertEqual(queued.state, 'shed', 'Worse request not shed')
+        self.assertEqual(woken, ['expensive'], 'Shed request not woken')
+        controller.leave(first)
+        self.assertEqual(better.state, 'admitted', 'Better request not admitted')
+        self.assertEqual(woken, ['expensive', 'interactive'], 'Admitted request not woken')
+        controller.leave(better)
+
+    def __check_slo(self, controller: AdmissionController) -> None:
+        """
+        Requests expected to wait longer than the SLO are rejected at once
+
+        :param controller: The controller
+        """
+        controller.configure(1, 3, 1.0)
+        first = controller.enter('interactive')
+        controller.service_time = 2.0
+        before = controller.metrics()['lanes']['interactive']['rejected']
+        with self.assertRaises(Overloaded, msg='Request admitted beyond the SLO') as context:
+            controller.enter('interactive')
+        self.assertEqual(context.exception.retry_after, 2, 'Wrong Retry-After')
+        self.assertEqual(controller.metrics()['lanes']['interactive']['rejected'], before + 1, 'Rejection not counted')
+        controller.service_time = 0.0
+        controller.leave(first)
+
+    def runTest(self) -> None:
+        """
+        Run the checks and disable the controller again
+        """
+        controller = AdmissionController()
+        try:
+            self.assertIsNone(controller.enter('interactive'), 'Disabled controller returned a ticket')
+            self.__check_order(controller)
+            self.__check_shedding(controller)
+            self.__check_slo(controller)
+            metrics = controller.metrics()
+            self.assertEqual(metrics['in_flight'], 0, 'Slots not freed')
+            self.assertEqual([lane['waiting'] for lane in metrics['lanes'].values()], [0, 0, 0], 'Requests waiting')
+            self.assertEqual(lane_of('auth'), 'expensive', 'Wrong lane for auth')
+            self.assertEqual(lane_of('batch'), 'interactive', 'Wrong default lane')
+        finally:
+            controller.configure(0, 0, 1.0)
+
+
+class Waiting(unittest.TestCase):
+    """
+    Test waiting for a slot, in threads and in :py:mod:`asyncio`
+    """
+
+    def __check_threads(self, controller: AdmissionController) -> None:
+        """
+        A waiting thread gets the slot when it is freed, or gives up after the SLO
+
+        :param controller: The controller
+        """
+        first = controller.admit('interactive')
+        started = time.monotonic()
+        self.assertRaises(Overloaded, controller.admit, 'interactive')
+        self.assertGreaterEqual(time.monotonic() - started, controller.slo * 0.9, 'Gave up before the SLO')
+        result = list()
+        thread = threading.Thread(target=lambda: result.append(controller.admit('interactive')))
+        thread.start()
+        time.sleep(0.05)
+        controller.leave(first)
+        thread.join()
+        self.assertEqual(result[0].state, 'admitted', 'Waiting thread not admitted')
+        controller.leave(result[0])
+
+    async def __wait_async(self, controller: AdmissionController) -> None:
+        """
+        The same with coroutines
+
+        :param controller: The controller
+        """
+        first = await controller.admit_async('interactive')
+        with self.assertRaises(Overloaded, msg='Waiting coroutine did not give up'):
+            await controller.admit_async('interactive')
+        waiting = asyncio.ensure_future(controller.admit_async('priority'))
+        await asyncio.sleep(0.05)
+        controller.leave(first)
+        ticket = await waiting
+        self.assertEqual(ticket.state, 'admitted', 'Waiting coroutine not admitted')
+        controller.leave(ticket)
+
+    def __check_disable(self, controller: AdmissionController) -> None:
+        """
+        Disabling the limiter admits the waiting requests at once
+
+        :param controller: The controller
+        """
+        controller.configure(1, 2, 5.0)
+        first = controller.admit('interactive')
+        result = list()
+        thread = threading.Thread(target=lambda: result.append(controller.admit('interactive')))
+        thread.start()
+        time.sleep(0.05)
+        started = time.monotonic()
+        controller.configure(0, 0, 5.0)
+        thread.join()
+        self.assertLess(time.monotonic() - started, 1.0, 'Waiting thread not admitted at once')
+        self.assertEqual(result[0].state, 'admitted', 'Waiting thread not admitted')
+        controller.leave(result[0])
+        controller.leave(first)
+
+    def runTest(self) -> None:
+        """
+        Wait with a limit of one request
+        """
+        controller = AdmissionController()
+        controller.configure(1, 2, 0.3)
+        try:
+            self.__check_threads(controller)
+            asyncio.run(self.__wait_async(controller))
+            self.__check_disable(controller)
+            self.assertEqual(controller.metrics()['in_flight'], 0, 'Slots not freed')
+        finally:
+            controller.configure(0, 0, 1.0)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`AssetBundler <arobito.controlinterface.AssetBundler>` module.
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+from arobito.controlinterface import AssetBundler
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+index_html = '''<html>
+<head>
+    <link rel="stylesheet" type="text/css" href="/static/css/a.css" />
+    <link rel="stylesheet" type="text/css" href="/static/css/b.css" />
+    <script type="text/javascript" src="/static/js/a.js"></script>
+    <script type="text/javascript" src="/static/js/b.js"></script>
+</head>
+<body></body>
+</html>'''
+
+
+def write_file(root_dir: str, name: str, content: bytes) -> None:
+    """
+    Write a file into the static folder
+
+    :param root_dir: The static folder
+    :param name: The name of the file, relative to the static folder
+    :param content: The content
+    """
+    file = os.path.join(root_dir, name)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file, 'wb') as fh:
+        fh.write(content)
+
+
+class BuildBundles(unittest.TestCase):
+    """
+    Test the :py:func:`build_bundles <arobito.controlinterface.AssetBundler.build_bundles>` and
+    :py:func:`ensure_bundles <arobito.controlinterface.AssetBundler.ensure_bundles>` functions
+    """
+
+    def runTest(self) -> None:
+        """
+        Bundle a small static folder and check the bundles, the index page and the detection of outdated bundles
+        """
+        root_dir = tempfile.mkdtemp()
+        try:
+            write_file(root_dir, 'index.html', index_html.encode('utf-8'))
+            write_file(root_dir, 'css/a.css', b'.a { background: url("img/small.png"); }')
+            write_file(root_dir, 'css/b.css', b'.b { background: url(../big.png); }')
+            write_file(root_dir, 'css/img/small.png', b'\x89PNG small')
+            write_file(root_dir, 'big.png', b'\x89PNG' + b'\x00' * 100)
+            write_file(root_dir, 'js/a.js', b'var a = 1')
+            write_file(root_dir, 'js/b.js', b'var b = 2;')
+
+            manifest = AssetBundler.build_bundles(root_dir, inline_limit=50)
+            self.assertRegex(manifest['css'], '^app\.[0-9a-f]{16}\.css$', 'CSS bundle name wrong')
+            self.assertRegex(manifest['js'], '^app\.[0-9a-f]{16}\.js$', 'JS bundle name wrong')
+            bundle_dir = os.path.join(root_dir, AssetBundler.bundle_folder)
+
+            with open(os.path.join(bundle_dir, manifest['css']), 'r') as fh:
+                css = fh.read()
+            self.assertIn('url("data:image/png;base64,iVBORyBzbWFsbA==")', css, 'Small image not inlined')
+            self.assertIn('url("/static/big.png")', css, 'Big image URL not made absolute')
+            with open(os.path.join(bundle_dir, manifest['js']), 'r') as fh:
+                self.assertEqual(fh.read(), 'var a = 1\n;\nvar b = 2;', 'JS bundle content wrong')
+            with open(os.path.join(bundle_dir, manifest['index']), 'r') as fh:
+                index = fh.read()
+            self.assertNotIn('/static/css/', index, 'Single style sheet still referenced')
+            self.assertNotIn('/static/js/', index, 'Single script still referenced')
+            self.assertIn('href="/static/bundles/{:s}"'.format(manifest['css']), index, 'CSS bundle not referenced')
+            self.assertIn('src="/static/bundles/{:s}"'.format(manifest['js']), index, 'JS bundle not referenced')
+
+            self.assertEqual(AssetBundler.ensure_bundles(root_dir, inline_limit=50), manifest,
+                             'Up to date bundles were rebuilt')
+
+            write_file(root_dir, 'js/b.js', b'var b = 3;')
+            os.utime(os.path.join(root_dir, 'js', 'b.js'), (1, 1))
+            self.assertIsNone(AssetBundler.load_manifest(root_dir), 'Outdated bundles not detected')
+            rebuilt = AssetBundler.ensure_bundles(root_dir, inline_limit=50)
+            self.assertNotEqual(rebuilt['js'], manifest['js'], 'JS bundle name did not change with its content')
+            self.assertEqual(rebuilt['css'], manifest['css'], 'CSS bundle name changed without a change')
+            self.assertFalse(os.path.exists(os.path.join(bundle_dir, manifest['js'])), 'Old bundle not removed')
+        finally:
+            shutil.rmtree(root_dir)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`AsyncServer <arobito.controlinterface.AsyncServer>` module.
+"""
+
+import unittest
+import http.client
+import json
+import os
+from arobito.controlinterface import AsyncServer, MessagePack
+from arobito.controlinterface.ControlInterface import ArobitoControlInterface
+from testlibs.LocalServer import LocalServer
+from testlibs.PushClient import PushClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Requests(unittest.TestCase):
+    """
+    Test the :py:class:`HttpRequest <arobito.controlinterface.AsyncServer.HttpRequest>` class and the WebSocket framing
+    """
+
+    def runTest(self) -> None:
+        """
+        Evaluate typical headers and mask a payload
+        """
+        request = AsyncServer.HttpRequest('POST', '/app/auth%20x?a=b', 'HTTP/1.1', {
+            'connection': 'Keep-Alive, Upgrade', 'content-type': 'application/JSON; charset=utf-8'})
+        self.assertEqual(request.path, '/app/auth x', 'Path not decoded')
+        self.assertEqual(request.tokens('Connection'), {'keep-alive', 'upgrade'}, 'Tokens wrong')
+        self.assertEqual(request.media_type(), 'application/json', 'Media type wrong')
+        self.assertEqual(request.header('Content-Type'), 'application/JSON; charset=utf-8', 'Header not found')
+        self.assertTrue(request.keep_alive(), 'HTTP/1.1 is not kept alive')
+        self.assertFalse(AsyncServer.HttpRequest('GET', '/', 'HTTP/1.1', {'connection': 'close'}).keep_alive(),
+                         'Connection: close ignored')
+        self.assertFalse(AsyncServer.HttpRequest('GET', '/', 'HTTP/1.0', {}).keep_alive(), 'HTTP/1.0 kept alive')
+
+        payload = os.urandom(1001)
+        mask = b'\x01\x02\x03\x04'
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.assertEqual(AsyncServer.unmask(masked, mask), payload, 'Unmasking failed')
+        self.assertEqual(AsyncServer.AsyncPushSocket.frame(0x1, b'hi'), b'\x81\x02hi', 'Short frame wrong')
+        self.assertEqual(AsyncServer.AsyncPushSocket.frame(0x1, payload)[:4], b'\x81\x7e\x03\xe9', 'Frame wrong')
+        self.assertIn('batch', AsyncServer.api_methods, 'API methods not found')
+
+
+class Server(unittest.TestCase):
+    """
+    Test the asyncio server mode on a running server
+    """
+
+    def __check_http(self, server: LocalServer) -> None:
+        """
+        Send requests over a single keep-alive connection
+
+        :param server: The server
+        """
+        connection = http.client.HTTPConnection(server.host, server.port, timeout=10)
+        try:
+            connection.request('GET', '/')
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 303, 'No redirect')
+            self.assertEqual(response.getheader('Location'), '/static/index.html', 'Redirect wrong')
+            sock = connection.sock
+
+            connection.request('GET', '/static/index.html')
+            response = connection.getresponse()
+            index = response.read()
+            self.assertEqual(response.status, 200, 'Index page not delivered')
+            self.assertIn(b'<html', index, 'Index page wrong')
+            self.assertEqual(response.getheader('Content-Security-Policy'),
+                             ArobitoControlInterface.content_security_policy, 'CSP missing')
+            self.assertEqual(response.getheader('X-Frame-Options'), 'DENY', 'Security header missing')
+            self.assertIs(connection.sock, sock, 'Connection not kept alive')
+
+            connection.request('GET', '/static/index.html', headers={'Range': 'bytes=0-9'})
+            response = connection.getresponse()
+            self.assertEqual(response.status, 206, 'Range not served')
+            self.assertEqual(response.read(), index[:10], 'Range content wrong')
+
+            connection.request('GET', '/static/index.html', headers={'Range': 'bytes=999999-'})
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 416, 'Unsatisfiable range served')
+
+            connection.request('GET', '/static/../controller.ini')
+            response = connection.getresponse()
+            response.read()
+            self.assertEqual(response.status, 404, 'Invalid path served')
+
+            body = json.dumps(dict(username='arobito', password='arobito')).encode('utf-8')
+            connection.request('POST', '/app/auth', body, {'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            self.assertEqual(response.status, 200, 'Login failed')
+            key = json.loads(response.read().decode('utf-8'))['auth']['key']
+
+            connection.request('POST', '/app/get_session_count', MessagePack.pack(dict(key=key)),
+                               {'Content-Type': 'application/msgpack'})
+            response = connection.getresponse()
+            self.assertEqual(response.getheader('Content-Type'), 'application/msgpack', 'Binary not negotiated')
+            self.assertEqual(MessagePack.unpack(response.read()), dict(session_count=1), 'Session count wrong')
+
+            connection.putrequest('POST', '/app/logout')
+            connection.putheader('Content-Type', 'application/json')
+            connection.putheader('Transfer-Encoding', 'chunked')
+            connection.endheaders()
+            body = json.dumps(dict(key=key)).encode('utf-8')
+            connection.send('{:x}\r\n'.format(len(body)).encode('ascii') + body + b'\r\n0\r\n\r\n')
+            response = connection.getresponse()
+            self.assertEqual(json.loads(response.read().decode('utf-8')), dict(logout=True), 'Chunked body failed')
+
+            for path, headers, body, status in (('/app/unknown', {'Content-Type': 'application/json'}, b'{}', 404),
+                                                ('/app/logout', {'Content-Type': 'text/plain'}, b'{}', 415),
+                                                ('/app/logout', {'Content-Type': 'application/json'}, b'{"', 400),
+                                                ('/nothing', {}, b'', 404)):
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                response.read()
+                self.assertEqual(response.status, status, 'Wrong status for {:s}'.format(path))
+            self.assertIs(connection.sock, sock, 'Connection not kept alive after errors')
+        finally:
+            connection.close()
+
+    def __check_push(self, server: LocalServer) -> None:
+        """
+        Use the push channel
+
+        :param server: The server
+        """
+        client = PushClient('ws://{:s}:{:d}/push/'.format(server.host, server.port))
+        client.connect()
+        try:
+            self.assertTrue(client.authenticate(server.login(), ['status', 'sessions']), 'Authentication failed')
+            status = client.wait_for(lambda m: m.get('topic', None) == 'status')
+            self.assertEqual(status['data']['state'], 'running', 'Initial status wrong')
+            client.wait_for(lambda m: m.get('topic', None) == 'sessions')
+            server.login()
+            count = client.wait_for(lambda m: m.get('topic', None) == 'sessions')
+            self.assertIsNotNone(count, 'Session count change not pushed')
+            self.assertEqual(count['data']['count'], 2, 'Pushed session count wrong')
+        finally:
+            client.close()
+
+    def runTest(self) -> None:
+        """
+        Start a server in asyncio mode, use it and stop it
+        """
+        server = LocalServer(['--mode', 'asyncio'])
+        server.start()
+        try:
+            self.__check_http(server)
+            self.__check_push(server)
+        finally:
+            server.stop()
+        self.assertEqual(server.process.returncode, 0, 'Server did not stop cleanly:\n' + server.log())
@@ -18,8 +18,12 @@
 Tests for the :py:mod:`BackendManager <arobito.controlinterface.BackendManager>` module.
 """
 
+import os
+import shutil
+import tempfile
+import time
 import unittest
-from arobito.controlinterface.BackendManager import UserManager, SessionManager
+from arobito.controlinterface.BackendManager import UserManager, SessionManager, MemorySessionStore, SqliteSessionStore
 
 __license__ = 'Apache License V2.0'
 __copyright__ = 'Copyright 2014 The Arobito Project'
@@ -241,3 +245,91 @@ class SessionManagerIsSingleton(unittest.TestCase):
         self.assertIsNotNone(session_manager1, 'Session Manager 1 is None')
         self.assertIsNotNone(session_manager2, 'Session Manager 2 is None')
         self.assertEqual(session_manager1, session_manager2, 'Session Manager objects are not equal')
+
+
+class SessionStores(unittest.TestCase):
+    """
+    Test the session stores (:py:class:`MemorySessionStore <arobito.controlinterface.BackendManager.MemorySessionStore>`
+    and :py:class:`SqliteSessionStore <arobito.controlinterface.BackendManager.SqliteSessionStore>`)
+    """
+
+    def runTest(self) -> None:
+        """
+        Run the same operations against both stores. The SQLite store is opened twice to see that the sessions are
+        shared.
+        """
+        self.__check_store(MemorySessionStore(), None)
+        folder = tempfile.mkdtemp(prefix='arobito-')
+        try:
+            file_name = os.path.join(folder, 'sessions.sqlite')
+            self.__check_store(SqliteSessionStore(file_name), SqliteSessionStore(file_name))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    def __check_store(self, store, second) -> None:
+        """
+        Add, read, expire and remove sessions
+
+        :param store: The store to test
+        :param second: Another store on the same data or None
+        """
+        name = type(store).__name__
+        now = time.time()
+        store.add('old', dict(username='arobito', level='Administrator', timestamp=now - 100, last_access=now - 100))
+        store.add('idle', dict(username='arobito', level='Administrator', timestamp=now - 10, last_access=now - 50))
+        store.add('new', dict(username='arobito', level='Administrator', timestamp=now, last_access=now))
+        self.assertEqual(store.count(), 3, '{:s}: Wrong session count'.format(name))
+        user = store.get('new', now + 1)
+        self.assertEqual(user['level'], 'Administrator', '{:s}: User level not stored'.format(name))
+        self.assertEqual(store.get('new')['last_access'], now + 1, '{:s}: Access time not updated'.format(name))
+        self.assertIsNone(store.get('unknown'), '{:s}: Unknown session found'.format(name))
+        if second is not None:
+            self.assertEqual(second.get('new')['username'], 'arobito', '{:s}: Session not shared'.format(name))
+        self.assertEqual(store.expire(now - 60, now - 20), 2, '{:s}: Wrong number of sessions expired'.format(name))
+        self.assertIsNone(store.get('old'), '{:s}: Old session not expired'.format(name))
+        self.assertIsNone(store.get('idle'), '{:s}: Idle session not expired'.format(name))
+        self.assertEqual(list(store.items()), ['new'], '{:s}: Wrong sessions listed'.format(name))
+        self.assertEqual(store.items()['new']['timestamp'], now, '{:s}: Session listed wrong'.format(name))
+        store.flush()
+        self.assertEqual(store.get('new')['username'], 'arobito', '{:s}: Session lost by flushing'.format(name))
+        self.assertTrue(store.remove('new'), '{:s}: Session not removed'.format(name))
+        self.assertFalse(store.remove('new'), '{:s}: Session removed twice'.format(name))
+        store.add('new', dict(username='arobito', level='Administrator', timestamp=now, last_access=now))
+        store.clear()
+        self.assertEqual(store.count(), 0, '{:s}: Sessions left'.format(name))
+
+
+class MemorySessionStoreOrder(unittest.TestCase):
+    """
+    Test the expiry of the :py:class:`MemorySessionStore <arobito.controlinterface.BackendManager.MemorySessionStore>`
+    with sessions accessed and added out of order
+    """
+
+    def runTest(self) -> None:
+        """
+        Accessed sessions are kept, idle and old ones expire, also when they were added out of order
+        """
+        store = MemorySessionStore()
+        now = time.time()
+        for i in range(0, 10):
+            store.add('s{:d}'.format(i), dict(username='arobito', level='Administrator', timestamp=now - 100 + i,
+                                              last_access=now - 100 + i))
+        store.get('s0', now)
+        self.assertEqual(store.expire(now - 1000, now - 95), 4, 'Idle sessions not expired')
+        self.assertIsNotNone(store.get('s0'), 'Accessed session expired')
+        self.assertIsNone(store.get('s1'), 'Idle session kept')
+        self.assertEqual(store.expire(now - 98, now - 1000), 1, 'Old session not expired')
+        self.assertIsNone(store.get('s0'), 'Old session kept')
+
+        store.add('late', dict(username='arobito', level='Administrator', timestamp=now - 500, last_access=now - 500))
+        store.add('early', dict(username='arobito', level='Administrator', timestamp=now - 200, last_access=now - 10))
+        self.assertEqual(store.expire(now - 300, now - 93), 3, 'Sessions added out of order not expired')
+        self.assertIsNone(store.get('late'), 'Session added out of order kept')
+        self.assertEqual(sorted(store.items()), ['early', 's7', 's8', 's9'], 'Wrong sessions kept')
+        self.assertEqual(store.expire(now - 150, now - 1000), 1, 'Old session added out of order not expired')
+        self.assertEqual(store.count(), 3, 'Wrong session count')
+
+        store.get('s8', now + 2)
+        self.assertEqual(store.get('s9', now + 1)['last_access'], now + 2, 'Access moved back behind the newest one')
+        self.assertEqual(store.expire(now - 1000, now + 1.5), 1, 'Session accessed before not expired')
+        self.assertEqual(sorted(store.items()), ['s8', 's9'], 'Wrong sessions kept after racing accesses')
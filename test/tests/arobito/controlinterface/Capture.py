@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+Tests for the :py:mod:`Capture <arobito.controlinterface.Capture>` module.
+"""
+
+import unittest
+import json
+import os
+import time
+import urllib.request
+from arobito.controlinterface import Capture
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Redaction(unittest.TestCase):
+    """
+    Test the redaction and the shapes of the :py:class:`CaptureWriter <arobito.controlinterface.Capture.CaptureWriter>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Passwords are hidden, session keys numbered, and documents reduced to their shape
+        """
+        writer = Capture.CaptureWriter()
+        redacted = writer.redact(dict(username='arobito', password='arobito'))
+        self.assertEqual(redacted, dict(username='arobito', password='*'), 'Password not redacted')
+        first = writer.redact(dict(key='capture-test-first', calls=[dict(method='get_session_count')]))
+        self.assertRegex(first['key'], r'^\$key[0-9]+$', 'Session key not replaced')
+        self.assertEqual(first['calls'], [dict(method='get_session_count')], 'Calls changed')
+        second = writer.redact(dict(key='capture-test-second'))
+        self.assertNotEqual(first['key'], second['key'], 'Sessions not told apart')
+        self.assertEqual(writer.redact(dict(key='capture-test-first')), dict(key=first['key']),
+                         'Session numbered twice')
+        self.assertEqual(Capture.shape(dict(auth=dict(success=True, key='k', count=3, items=[1.5, 2], none=None))),
+                         dict(auth=dict(success='bool', key='str', count='number', items=['number'], none='null')),
+                         'Wrong shape')
+        self.assertEqual(Capture.find_key(dict(auth=dict(success=True, key='capture-test-first'))),
+                         'capture-test-first', 'Key not found in the response')
+        self.assertIsNone(Capture.decode(b'not json', 'application/json'), 'Invalid body decoded')
+
+
+class Server(unittest.TestCase):
+    """
+    Check the capture file of running servers
+    """
+
+    def runTest(self) -> None:
+        """
+        Both server modes capture the requests, without the secrets
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode], '[Server]\ncapture-file = capture.jsonl\n')
+            server.start()
+            try:
+                key = server.login()
+                server.post_json('/app/get_session_count', dict(key=key))
+                urllib.request.urlopen(server.url('/static/index.html'), timeout=10).read()
+                server.post_json('/app/logout', dict(key=key))
+                file_name = os.path.join(server.work_dir, 'capture.jsonl')
+                records = list()
+                deadline = time.monotonic() + 10.0
+                while time.monotonic() < deadline:
+                    if os.path.isfile(file_name):
+                        with open(file_name, 'r') as fh:
+                            records = [json.loads(line) for line in fh if line.strip()]
+                    if len(records) >= 4:
+                        break
+                    time.sleep(0.1)
+                # CherryPy records a request after sending the response, so the next one may be recorded first
+                self.assertEqual(sorted((record['m'], record['p'], record['s']) for record in records),
+                                 [('GET', '/static/index.html', 200), ('POST', '/app/auth', 200),
+                                  ('POST', '/app/get_session_count', 200), ('POST', '/app/logout', 200)],
+                                 'Requests not captured in {:s} mode:\n{:s}'.format(mode, server.log()))
+                self.assertNotIn(key, json.dumps(records), 'Session key captured in {:s} mode'.format(mode))
+                by_path = dict((record['p'], record) for record in records)
+                auth = by_path['/app/auth']
+                self.assertEqual(auth['b']['password'], '*', 'Password captured in {:s} mode'.format(mode))
+                count = by_path['/app/get_session_count']
+                self.assertEqual(count['b'], dict(key='$key{:d}'.format(auth['k'])),
+                                 'Session not numbered in {:s} mode'.format(mode))
+                self.assertEqual(count['r'], dict(session_count='number'), 'Wrong shape in {:s} mode'.format(mode))
+                self.assertGreater(by_path['/static/index.html']['n'], 0, 'Size missing in {:s} mode'.format(mode))
+                self.assertNotIn('r', by_path['/static/index.html'], 'Static file shaped in {:s} mode'.format(mode))
+            finally:
+                server.stop()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Codec <arobito.controlinterface.Codec>` module.
+"""
+
+import unittest
+import json
+import cherrypy
+from arobito.controlinterface import Codec, ControllerFrontend, MessagePack
+from arobito.controlinterface.ControllerBackend import App as Backend
+from testlibs import WsgiClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class JsonCodecs(unittest.TestCase):
+    """
+    Test all :py:data:`codecs <arobito.controlinterface.Codec.codecs>` available
+    """
+
+    def runTest(self) -> None:
+        """
+        Encode and decode a typical response with every codec
+        """
+        document = dict(auth=dict(success=True, status='Login successful', key='abc'), count=-1, ratio=0.5,
+                        items=[1, 'zwei', None, False], text='Grüße')
+        self.assertIn('stdlib', Codec.codecs, 'The fallback codec is missing')
+        self.assertEqual(Codec.codecs['stdlib'].encode(dict(b=1, a=[1, 2])), b'{"b":1,"a":[1,2]}',
+                         'Fallback codec is not compact or sorts the keys')
+        for name, codec in Codec.codecs.items():
+            encoded = codec.encode(document)
+            self.assertIsInstance(encoded, bytes, 'Codec {:s} does not produce bytes'.format(name))
+            self.assertEqual(json.loads(encoded.decode('utf-8')), document, 'Codec {:s} encodes wrong'.format(name))
+            self.assertEqual(codec.decode(encoded), document, 'Codec {:s} decodes wrong'.format(name))
+            with self.assertRaises(ValueError, msg='Codec {:s} accepts invalid JSON'.format(name)):
+                codec.decode(b'{"invalid":')
+
+        with self.assertRaises(ValueError, msg='Unknown codec selected'):
+            Codec.select('unknown')
+        previous = Codec.current.name
+        try:
+            self.assertEqual(Codec.select('stdlib').name, 'stdlib', 'Codec not selected')
+            self.assertIs(Codec.current, Codec.codecs['stdlib'], 'Codec not in use')
+            self.assertIn(Codec.select('auto').name, Codec.codecs, 'No codec selected automatically')
+        finally:
+            Codec.select(previous)
+
+
+class ConstantResponse(unittest.TestCase):
+    """
+    Test the :py:class:`ConstantResponse <arobito.controlinterface.Codec.ConstantResponse>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        Encode a constant twice and try to modify it
+        """
+        constant = Codec.ConstantResponse(logout=True)
+        self.assertEqual(constant, dict(logout=True), 'Constant differs from a dict')
+        encoded = Codec.encode(constant)
+        self.assertEqual(json.loads(encoded.decode('utf-8')), dict(logout=True), 'Constant encoded wrong')
+        self.assertIs(Codec.encode(constant), encoded, 'Constant encoded again')
+        with self.assertRaises(TypeError, msg='Constant modified'):
+            constant['logout'] = False
+        with self.assertRaises(TypeError, msg='Constant modified'):
+            constant.update(logout=False)
+        self.assertIsInstance(Backend.logout_response, Codec.ConstantResponse, 'Logout response is not constant')
+
+
+class Negotiation(unittest.TestCase):
+    """
+    Test the :py:func:`negotiate <arobito.controlinterface.Codec.negotiate>` function
+    """
+
+    def runTest(self) -> None:
+        """
+        Negotiate with typical headers
+        """
+        cases = [
+            (None, None, 'application/json'),
+            (None, 'application/json', 'application/json'),
+            (None, 'application/msgpack', 'application/msgpack'),
+            ('application/msgpack', 'application/json', 'application/msgpack'),
+            ('application/x-msgpack', None, 'application/x-msgpack'),
+            ('application/json, application/msgpack;q=0.5', 'application/msgpack', 'application/json'),
+            ('application/json;q=0.5, application/x-msgpack', 'application/json', 'application/x-msgpack'),
+            ('*/*', 'application/x-msgpack', 'application/x-msgpack'),
+            ('application/json, text/javascript, */*; q=0.01', 'application/msgpack', 'application/json'),
+            ('text/html', 'application/msgpack', 'application/msgpack'),
+            ('text/html', None, 'application/json')
+        ]
+        for accept, request_type, expected in cases:
+            codec, media_type = Codec.negotiate(accept, request_type)
+            self.assertEqual(media_type, expected, 'Wrong media type for {!r}, {!r}'.format(accept, request_type))
+            self.assertIs(codec, Codec.binary if 'msgpack' in expected else Codec.current, 'Wrong codec')
+        self.assertIs(Codec.codec_for('application/x-msgpack'), Codec.binary, 'Binary codec not found')
+        self.assertIs(Codec.codec_for('application/json'), Codec.current, 'JSON codec not found')
+
+
+class Frontend(unittest.TestCase):
+    """
+    Test the codec layer within the :py:class:`App <arobito.controlinterface.ControllerFrontend.App>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Post valid, invalid and unsupported requests
+        """
+        app = cherrypy.Application(ControllerFrontend.App(), '/app', {'/': {}})
+        headers = {'Content-Type': 'application/json'}
+
+        status, response_headers, body = WsgiClient.request(app, '/app', '/auth', 'POST', headers,
+                                                            b'{"username":"nobody","password":"wrong"}')
+        self.assertEqual(status, 200, 'Status is not 200')
+        self.assertEqual(response_headers['Content-Type'], 'application/json', 'Content type wrong')
+        self.assertEqual(body, Codec.encode(Backend.auth_default_response), 'Constant response not used')
+
+        status, response_headers, body = WsgiClient.request(app, '/app', '/logout', 'POST', headers, b'{"key":')
+        self.assertEqual(status, 400, 'Invalid JSON not rejected')
+
+        status, response_headers, body = WsgiClient.request(app, '/app', '/logout', 'POST',
+                                                            {'Content-Type': 'text/plain'}, b'{}')
+        self.assertEqual(status, 415, 'Unsupported content type not rejected')
+
+        headers = {'Content-Type': 'application/msgpack'}
+        status, response_headers, body = WsgiClient.request(app, '/app', '/auth', 'POST', headers,
+                                                            MessagePack.pack(dict(username='nobody', password='x')))
+        self.assertEqual(status, 200, 'Binary request failed')
+        self.assertEqual(response_headers['Content-Type'], 'application/msgpack', 'Binary response not chosen')
+        self.assertEqual(body, Codec.encode(Backend.auth_default_response, Codec.binary), 'Constant not used')
+        self.assertEqual(MessagePack.unpack(body), Backend.auth_default_response, 'Binary response wrong')
+
+        headers = {'Content-Type': 'application/json', 'Accept': 'application/x-msgpack'}
+        status, response_headers, body = WsgiClient.request(app, '/app', '/get_session_count', 'POST', headers,
+                                                            b'{"key":"invalid"}')
+        self.assertEqual(response_headers['Content-Type'], 'application/x-msgpack', 'Accept header ignored')
+        self.assertEqual(MessagePack.unpack(body), Backend.session_count_denied_response, 'Binary response wrong')
+
+        headers = {'Content-Type': 'application/msgpack', 'Accept': 'application/json'}
+        status, response_headers, body = WsgiClient.request(app, '/app', '/logout', 'POST', headers,
+                                                            MessagePack.pack(dict(key='invalid')))
+        self.assertEqual(response_headers['Content-Type'], 'application/json', 'Accept header ignored')
+        self.assertEqual(json.loads(body.decode('utf-8')), Backend.logout_response, 'JSON response wrong')
+
+        status, response_headers, body = WsgiClient.request(app, '/app', '/logout', 'POST', headers, b'\xc1')
+        self.assertEqual(status, 400, 'Invalid binary request not rejected')
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`ControlInterface <arobito.controlinterface.ControlInterface>` module.
+"""
+
+import unittest
+import gzip
+import os
+import tempfile
+from urllib.parse import unquote
+import cherrypy
+from arobito.controlinterface.ControlInterface import ArobitoControlInterfaceStatics
+from arobito.controlinterface import AssetBundler, StaticArchive
+from testlibs import WsgiClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def create_statics(test: unittest.TestCase) -> ArobitoControlInterfaceStatics:
+    """
+    Create an :py:class:`ArobitoControlInterfaceStatics
+    <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>` instance serving the static folder of
+    the source tree, without asset bundles.
+
+    :param test: The currently running unit test case
+    :return: The instance
+    """
+    statics = ArobitoControlInterfaceStatics()
+    test.assertIsNotNone(statics)
+    statics.root_dir = os.path.abspath('../src/web-static')
+    statics.bundles = None
+    statics.archive = None
+    return statics
+
+
+class StandInProxy(object):
+    """
+    A tiny stand-in for a reverse proxy like nginx: It forwards requests to the application and, like an internal
+    location, delivers the file named in the offload header itself.
+    """
+
+    def __init__(self, test: unittest.TestCase, app, root_dir: str, prefix: str=None):
+        """
+        Set up the proxy
+
+        :param test: The currently running unit test case
+        :param app: The WSGI application behind the proxy
+        :param root_dir: The folder the internal location points to
+        :param prefix: The prefix of the internal location (``X-Accel-Redirect``); None for ``X-Sendfile``
+        """
+        self.test = test
+        self.app = app
+        self.root_dir = root_dir
+        self.prefix = prefix
+
+    def get(self, path: str) -> tuple:
+        """
+        Fetch a file through the proxy
+
+        :param path: The path below ``/static``
+        :return: Status, headers and body, like the proxy would send them to the client
+        """
+        status, headers, body = WsgiClient.request(self.app, '/static', path)
+        if status != 200:
+            return status, headers, body
+        self.test.assertEqual(body, b'', 'Application sent a body in offload mode')
+        if self.prefix is not None:
+            self.test.assertNotIn('X-Sendfile', headers, 'X-Sendfile sent in X-Accel-Redirect mode')
+            location = headers.pop('X-Accel-Redirect')
+            self.test.assertTrue(location.startswith(self.prefix + '/'), 'Location is not below the prefix')
+            file = os.path.join(self.root_dir, unquote(location[len(self.prefix) + 1:]))
+        else:
+            self.test.assertNotIn('X-Accel-Redirect', headers, 'X-Accel-Redirect sent in X-Sendfile mode')
+            file = headers.pop('X-Sendfile')
+            self.test.assertTrue(os.path.isabs(file), 'X-Sendfile path is not absolute')
+        with open(file, 'rb') as fh:
+            body = fh.read()
+        headers['Content-Length'] = str(len(body))
+        return status, headers, body
+
+
+class StaticsOffload(unittest.TestCase):
+    """
+    Test the reverse proxy offload modes of :py:class:`ArobitoControlInterfaceStatics
+    <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>`
+    """
+
+    def __check_proxy(self, proxy: StandInProxy) -> None:
+        """
+        Fetch files through the proxy and compare them with the originals
+
+        :param proxy: The proxy to use
+        """
+        for path, mime in [('/index.html', 'application/xhtml+xml'), ('/robi-assets/robi-app.js', 'text/javascript'),
+                           ('/robi-assets/arobito-eyes_150x84.png', 'image/png')]:
+            status, headers, body = proxy.get(path)
+            self.assertEqual(status, 200, 'Status for {:s} is not 200'.format(path))
+            self.assertTrue(headers['Content-Type'].startswith(mime), 'Mime type for {:s} wrong'.format(path))
+            with open(os.path.join('../src/web-static', path[1:]), 'rb') as fh:
+                self.assertEqual(body, fh.read(), 'Content of {:s} differs'.format(path))
+        status, headers, body = proxy.get('/does-not-exist.html')
+        self.assertEqual(status, 404, 'Missing file is not answered with 404')
+        self.assertNotIn('X-Accel-Redirect', headers, 'Missing file has an offload header')
+        self.assertNotIn('X-Sendfile', headers, 'Missing file has an offload header')
+
+    def runTest(self) -> None:
+        """
+        Run the offload modes behind the stand-in proxy
+        """
+        statics = create_statics(self)
+        app = cherrypy.Application(statics, '/static', {'/': {}})
+
+        statics.offload_header = 'X-Accel-Redirect'
+        statics.offload_prefix = '/internal-static'
+        self.__check_proxy(StandInProxy(self, app, statics.root_dir, '/internal-static'))
+
+        statics.offload_header = 'X-Sendfile'
+        self.__check_proxy(StandInProxy(self, app, statics.root_dir))
+
+
+class StaticsRange(unittest.TestCase):
+    """
+    Test streaming and ``Range`` requests of :py:class:`ArobitoControlInterfaceStatics
+    <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Fetch a file completely and in ranges, with streaming forced by a low threshold
+        """
+        statics = create_statics(self)
+        statics.offload_header = None
+        statics.stream_threshold = 1024
+        app = cherrypy.Application(statics, '/static', {'/': {}})
+        with open('../src/web-static/robi-assets/robi-app.js', 'rb') as fh:
+            content = fh.read()
+
+        status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js')
+        self.assertEqual(status, 200, 'Status is not 200')
+        self.assertEqual(body, content, 'Streamed content differs')
+        self.assertEqual(headers['Content-Length'], str(len(content)), 'Content length wrong')
+        self.assertEqual(headers['Accept-Ranges'], 'bytes', 'Ranges are not announced')
+
+        status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js',
+                                                   headers={'Range': 'bytes=10-19'})
+        self.assertEqual(status, 206, 'Status is not 206')
+        self.assertEqual(body, content[10:20], 'Range content differs')
+        self.assertEqual(headers['Content-Range'], 'bytes 10-19/{:d}'.format(len(content)), 'Content range wrong')
+
+        status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js',
+                                                   headers={'Range': 'bytes=0-4,-5'})
+        self.assertEqual(status, 206, 'Status is not 206')
+        self.assertTrue(headers['Content-Type'].startswith('multipart/byteranges'), 'Not a multipart response')
+        self.assertIn(content[:5], body, 'First range missing')
+        self.assertIn(content[-5:], body, 'Second range missing')
+
+        status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js',
+                                                   headers={'Range': 'bytes={:d}-'.format(len(content))})
+        self.assertEqual(status, 416, 'Status is not 416')
+        self.assertEqual(headers['Content-Range'], 'bytes */{:d}'.format(len(content)), 'Content range wrong')
+
+
+class StaticsBundles(unittest.TestCase):
+    """
+    Test the delivery of asset bundles by :py:class:`ArobitoControlInterfaceStatics
+    <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Fetch the index page and the bundles it references
+        """
+        statics = create_statics(self)
+        statics.offload_header = None
+        statics.bundles = AssetBundler.ensure_bundles(statics.root_dir)
+        app = cherrypy.Application(statics, '/static', {'/': {}})
+
+        status, headers, body = WsgiClient.request(app, '/static', '/index.html')
+        self.assertEqual(status, 200, 'Status is not 200')
+        self.assertNotIn('Cache-Control', headers, 'Index page must not be cached forever')
+        for kind in ('css', 'js'):
+            url = '/static/{:s}/{:s}'.format(AssetBundler.bundle_folder, statics.bundles[kind])
+            self.assertIn(url.encode('utf-8'), body, 'Index page does not reference the {:s} bundle'.format(kind))
+            status, headers, body_bundle = WsgiClient.request(app, '/static', url[len('/static'):])
+            self.assertEqual(status, 200, 'Status for the {:s} bundle is not 200'.format(kind))
+            self.assertIn('immutable', headers['Cache-Control'], 'Bundle is not immutable')
+            self.assertIn('max-age=31536000', headers['Cache-Control'], 'Bundle max age wrong')
+
+
+class StaticsArchive(unittest.TestCase):
+    """
+    Test the delivery out of a zip archive by :py:class:`ArobitoControlInterfaceStatics
+    <arobito.controlinterface.ControlInterface.ArobitoControlInterfaceStatics>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Pack the static folder and fetch files out of the archive, with and without gzip
+        """
+        statics = create_statics(self)
+        statics.offload_header = None
+        statics.stream_threshold = 1024
+        fd, archive_file = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        try:
+            StaticArchive.create_archive(statics.root_dir, archive_file)
+            statics.archive = StaticArchive.StaticArchive(archive_file)
+            app = cherrypy.Application(statics, '/static', {'/': {}})
+            with open('../src/web-static/robi-assets/robi-app.js', 'rb') as fh:
+                script = fh.read()
+            with open('../src/web-static/robi-assets/arobito-eyes_150x84.png', 'rb') as fh:
+                image = fh.read()
+
+            status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js')
+            self.assertEqual(status, 200, 'Status is not 200')
+            self.assertEqual(body, script, 'Decompressed content differs')
+            self.assertNotIn('Content-Encoding', headers, 'Content encoded without being accepted')
+
+            status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js',
+                                                       headers={'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(status, 200, 'Status is not 200')
+            self.assertEqual(headers['Content-Encoding'], 'gzip', 'Content is not gzip encoded')
+            self.assertEqual(headers['Content-Length'], str(len(body)), 'Content length wrong')
+            self.assertEqual(gzip.decompress(body), script, 'Gzip encoded content differs')
+
+            status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/robi-app.js',
+                                                       headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=5-9'})
+            self.assertEqual(status, 206, 'Status is not 206')
+            self.assertEqual(body, script[5:10], 'Range out of a deflated entry wrong')
+
+            status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/arobito-eyes_150x84.png',
+                                                       headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(status, 200, 'Status is not 200')
+            self.assertNotIn('Content-Encoding', headers, 'Stored content is encoded')
+            self.assertEqual(body, image, 'Stored content differs')
+
+            status, headers, body = WsgiClient.request(app, '/static', '/robi-assets/missing.js')
+            self.assertEqual(status, 404, 'Missing file is not answered with 404')
+        finally:
+            os.remove(archive_file)
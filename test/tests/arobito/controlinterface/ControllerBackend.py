@@ -220,7 +220,8 @@ class AppShutdown(unittest.TestCase):
 
     def runTest(self) -> None:
         """
-        Testing the shutdown method would cancel the program, so we can only check the behaviour with bad input.
+        Check the behaviour with bad input. Without a running server, there is nothing to shut down, so even an
+        administrator is denied.
         """
 
         app = create_app(self)
@@ -240,6 +241,43 @@ class AppShutdown(unittest.TestCase):
         self.assertIsInstance(response['shutdown'], bool, 'Shutdown element is not boolean')
         self.assertFalse(response['shutdown'], 'Shutdown element is not false')
 
+        # Request with an unknown mode
+        self.assertRaises(ValueError, app.shutdown, dict(key='invalid_key', mode='later'))
+
+        # Valid request without a running server
+        key = get_valid_key(self, app)
+        for mode in ('drain', 'immediate'):
+            response = app.shutdown(dict(key=key, mode=mode))
+            self.assertEqual(response, dict(shutdown=False), 'Shutdown without a server is not denied')
+        app.logout(dict(key=key))
+
+
+class AppRestart(unittest.TestCase):
+    """
+    Test the :py:meth:`App.restart <arobito.controlinterface.ControllerBackend.App.restart>` method.
+    """
+
+    def runTest(self) -> None:
+        """
+        Without a running server, nobody takes the restart request, so even an administrator is denied.
+        """
+
+        app = create_app(self)
+
+        # Request with None
+        self.assertRaises(ValueError, app.restart, None)
+
+        # Request with bad object
+        self.assertRaises(ValueError, app.restart, list())
+
+        # Request with invalid key
+        self.assertEqual(app.restart(dict(key='invalid_key')), dict(restart=False), 'Invalid key accepted')
+
+        # Request without anybody to restart
+        key = get_valid_key(self, app)
+        self.assertEqual(app.restart(dict(key=key)), dict(restart=False), 'Restart reported without a server')
+        app.logout(dict(key=key))
+
 
 class AppGetSessionCount(unittest.TestCase):
     """
@@ -317,3 +355,215 @@ class AppGetSessionCount(unittest.TestCase):
 
         response = app.get_session_count(dict(key=master_key))
         self.__check_invalid_response(response)
+
+
+class AppGetAdmissionStats(unittest.TestCase):
+    """
+    Test the :py:meth:`App.get_admission_stats <arobito.controlinterface.ControllerBackend.App.get_admission_stats>`
+    method.
+    """
+
+    def runTest(self) -> None:
+        """
+        Only administrators get the statistics
+        """
+
+        app = create_app(self)
+
+        self.assertRaises(ValueError, app.get_admission_stats, None)
+        self.assertRaises(ValueError, app.get_admission_stats, list())
+        self.assertEqual(app.get_admission_stats(dict()), dict(admission=None), 'Request without key not denied')
+        self.assertEqual(app.get_admission_stats(dict(key='invalid_key')), dict(admission=None),
+                         'Invalid key not denied')
+
+        key = get_valid_key(self, app)
+        response = app.get_admission_stats(dict(key=key))
+        app.logout(dict(key=key))
+        self.assertIsInstance(response['admission'], dict, 'No statistics for an administrator')
+        self.assertIn('in_flight', response['admission'], 'In-flight count missing')
+        self.assertEqual(set(response['admission']['lanes']), {'priority', 'interactive', 'expensive'},
+                         'Lanes missing')
+
+
+class AppProfile(unittest.TestCase):
+    """
+    Test the :py:meth:`App.profile <arobito.controlinterface.ControllerBackend.App.profile>` method.
+    """
+
+    def runTest(self) -> None:
+        """
+        Only administrators may profile, with valid parameters
+        """
+
+        app = create_app(self)
+
+        self.assertRaises(ValueError, app.profile, None)
+        self.assertRaises(ValueError, app.profile, list())
+        self.assertEqual(app.profile(dict()), dict(profile=None), 'Request without key not denied')
+        self.assertEqual(app.profile(dict(key='invalid_key', duration=0.01)), dict(profile=None),
+                         'Invalid key not denied')
+
+        key = get_valid_key(self, app)
+        try:
+            self.assertRaises(ValueError, app.profile, dict(key=key, mode='unknown'))
+            for name, value in (('duration', 0), ('duration', '1'), ('interval', -1), ('every', True)):
+                with self.assertRaises(ValueError, msg='Invalid {:s} accepted'.format(name)):
+                    app.profile({'key': key, name: value})
+            response = app.profile(dict(key=key, duration=0.05))
+            self.assertEqual(response['profile']['mode'], 'sample', 'Wrong mode')
+            self.assertIn('stacks', response['profile'], 'Stacks missing')
+            response = app.profile(dict(key=key, mode='cprofile', duration=0.01, every=3))
+            self.assertEqual(response['profile']['mode'], 'cprofile', 'Wrong mode')
+            self.assertEqual(response['profile']['requests'], 0, 'Requests profiled without requests')
+        finally:
+            app.logout(dict(key=key))
+
+
+class AppMemory(unittest.TestCase):
+    """
+    Test the :py:meth:`App.memory <arobito.controlinterface.ControllerBackend.App.memory>` method.
+    """
+
+    def runTest(self) -> None:
+        """
+        Only administrators may look into the memory, with valid parameters
+        """
+
+        app = create_app(self)
+
+        self.assertRaises(ValueError, app.memory, None)
+        self.assertRaises(ValueError, app.memory, list())
+        self.assertEqual(app.memory(dict()), dict(memory=None), 'Request without key not denied')
+        self.assertEqual(app.memory(dict(key='invalid_key', action='start')), dict(memory=None),
+                         'Invalid key not denied')
+
+        key = get_valid_key(self, app)
+        try:
+            self.assertRaises(ValueError, app.memory, dict(key=key, action='unknown'))
+            for name, value in (('frames', 0), ('limit', '5'), ('limit', True)):
+                with self.assertRaises(ValueError, msg='Invalid {:s} accepted'.format(name)):
+                    app.memory({'key': key, name: value})
+            response = app.memory(dict(key=key))['memory']
+            self.assertGreaterEqual(response['tables']['sessions'], 1, 'Session table size wrong')
+            self.assertIn('response_cache', response['tables'], 'Response cache size missing')
+            self.assertIsNone(app.memory(dict(key=key, action='snapshot'))['memory']['top'],
+                              'Snapshot without tracing')
+            response = app.memory(dict(key=key, action='start', frames=2))['memory']
+            self.assertTrue(response['tracing'], 'Tracing not started')
+            self.assertEqual(response['frames'], 2, 'Frames not set')
+            response = app.memory(dict(key=key, action='snapshot', limit=5, traceback=True))['memory']
+            self.assertLessEqual(len(response['top']), 5, 'Limit ignored')
+            self.assertIsNone(response['diff'], 'Diff on the first snapshot')
+            response = app.memory(dict(key=key, action='snapshot'))['memory']
+            self.assertIsInstance(response['diff'], list, 'Diff missing on the second snapshot')
+            self.assertFalse(app.memory(dict(key=key, action='stop'))['memory']['tracing'], 'Tracing not stopped')
+        finally:
+            app.memory(dict(key=key, action='stop'))
+            app.logout(dict(key=key))
+
+
+class AppGetMetrics(unittest.TestCase):
+    """
+    Test the :py:meth:`App.get_metrics <arobito.controlinterface.ControllerBackend.App.get_metrics>` method.
+    """
+
+    def runTest(self) -> None:
+        """
+        Only administrators get the metrics
+        """
+
+        app = create_app(self)
+
+        self.assertRaises(ValueError, app.get_metrics, None)
+        self.assertRaises(ValueError, app.get_metrics, list())
+        self.assertIsNone(app.get_metrics(dict()), 'Request without key not denied')
+        self.assertIsNone(app.get_metrics(dict(key=None)), 'Request without key not denied')
+        self.assertIsNone(app.get_metrics(dict(key='invalid_key')), 'Invalid key not denied')
+
+        key = get_valid_key(self, app)
+        text = app.get_metrics(dict(key=key))
+        app.logout(dict(key=key))
+        self.assertIsInstance(text, str, 'No metrics for an administrator')
+        self.assertIn('# TYPE arobito_requests_total counter', text, 'Request counter missing')
+
+
+class CountingSessionManager(object):
+    """
+    Wraps the session manager and counts the session lookups
+    """
+
+    def __init__(self, session_manager):
+        self.session_manager = session_manager
+        self.lookups = 0
+
+    def get_user(self, session: str) -> dict:
+        self.lookups += 1
+        return self.session_manager.get_user(session)
+
+    def __getattr__(self, name: str):
+        return getattr(self.session_manager, name)
+
+
+class AppBatch(unittest.TestCase):
+    """
+    Test the :py:meth:`App.batch <arobito.controlinterface.ControllerBackend.App.batch>` method.
+    """
+
+    def __check_failed_response(self, response: dict, reason: str) -> None:
+        """
+        Check a response of a batch that was not run
+
+        :param response: The response from the batch method
+        :param reason: The reason expected
+        """
+
+        self.assertIsInstance(response, dict, 'Response is not a dict')
+        self.assertIn('batch', response, 'Response does not contain a batch element')
+        self.assertFalse(response['batch']['success'], 'Success is not false')
+        self.assertEqual(response['batch']['reason'], reason, 'Reason is wrong')
+
+    def runTest(self) -> None:
+        """
+        Run batches with bad and valid input
+        """
+
+        app = create_app(self)
+
+        # Request with None
+        self.assertRaises(ValueError, app.batch, None)
+
+        # Request with bad object
+        self.assertRaises(ValueError, app.batch, list())
+
+        key = get_valid_key(self, app)
+        self.__check_failed_response(app.batch(dict(key=key)), 'Calls must be a list')
+        self.__check_failed_response(app.batch(dict(key='invalid_key', calls=[])), 'Invalid session')
+        self.__check_failed_response(app.batch(dict(key=key, calls=[dict(method='get_session_count')] * 33)),
+                                     'Too many calls')
+
+        counting = CountingSessionManager(app.session_manager)
+        app.session_manager = counting
+        try:
+            response = app.batch(dict(key=key, calls=[
+                dict(method='get_session_count'),
+                dict(method='get_session_count', params=dict(key='ignored')),
+                dict(method='auth', params=dict(username='arobito', password='arobito')),
+                dict(method='get_session_count', params='invalid'),
+                'invalid',
+                dict(method='logout'),
+                dict(method='get_session_count')
+            ]))
+        finally:
+            app.session_manager = counting.session_manager
+        self.assertEqual(counting.lookups, 1, 'Session looked up more than once')
+        self.assertTrue(response['batch']['success'], 'Batch failed')
+        results = response['batch']['results']
+        self.assertEqual(len(results), 7, 'Number of results wrong')
+        self.assertEqual(results[0], dict(result=dict(session_count=1)), 'First call failed')
+        self.assertEqual(results[1], dict(result=dict(session_count=1)), 'Session key of the batch not used')
+        self.assertEqual(results[2], dict(error='Unknown method'), 'Method not in the list was called')
+        self.assertEqual(results[3], dict(error='Params must be an object'), 'Invalid params accepted')
+        self.assertEqual(results[4], dict(error='Unknown method'), 'Invalid call accepted')
+        self.assertEqual(results[5], dict(result=dict(logout=True)), 'Logout failed')
+        self.assertEqual(results[6], dict(error='Invalid session'), 'Call after logout succeeded')
+        self.assertEqual(app.get_session_count(dict(key=key)), dict(session_count=-1), 'Session still valid')
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Handoff <arobito.controlinterface.Handoff>` module.
+"""
+
+import unittest
+import http.client
+import json
+import os
+import signal
+import threading
+import time
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class LoadThread(threading.Thread):
+    """
+    Send requests on new connections until stopped, counting successes and failures
+    """
+
+    #: Seconds between two requests, keeping the number of closed connections in ``TIME_WAIT`` low for later tests
+    pause = 0.01
+
+    def __init__(self, server: LocalServer, key: str):
+        """
+        Prepare the load
+
+        :param server: The server
+        :param key: A session key
+        """
+        threading.Thread.__init__(self, name='Load')
+        self.server = server
+        self.body = json.dumps(dict(key=key)).encode('utf-8')
+        self.succeeded = 0
+        self.failures = list()
+        self.running = True
+
+    def run(self) -> None:
+        """
+        Send ``/app/get_session_count`` requests
+        """
+        while self.running:
+            connection = http.client.HTTPConnection(self.server.host, self.server.port, timeout=30)
+            try:
+                connection.request('POST', '/app/get_session_count', self.body,
+                                   {'Content-Type': 'application/json', 'Connection': 'close'})
+                response = connection.getresponse()
+                result = json.loads(response.read().decode('utf-8'))
+                if response.status == 200 and result == dict(session_count=1):
+                    self.succeeded += 1
+                else:
+                    self.failures.append('{:d} {:s}'.format(response.status, str(result)))
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.failures.append('{:s}: {:s}'.format(e.__class__.__name__, e.__str__()))
+            finally:
+                connection.close()
+            time.sleep(self.pause)
+
+
+class Restart(unittest.TestCase):
+    """
+    Restart a running server under load, by ``SIGHUP`` and by ``/app/restart``
+    """
+
+    def __restart(self, server: LocalServer, pid_file: str, trigger: str) -> int:
+        """
+        Restart the server while loading it and check that no request failed
+
+        :param server: The server
+        :param pid_file: The PID file of the server
+        :param trigger: ``signal`` or ``api``
+        :return: The process ID of the new server process
+        """
+        key = server.login()
+        threads = [LoadThread(server, key) for i in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        try:
+            time.sleep(0.5)
+            if trigger == 'signal':
+                server.process.send_signal(signal.SIGHUP)
+            else:
+                self.assertEqual(server.post_json('/app/restart', dict(key=key)), dict(restart=True),
+                                 'Restart not accepted')
+            server.process.wait(60)
+            time.sleep(1.0)
+        finally:
+            for thread in threads:
+                thread.running = False
+            for thread in threads:
+                thread.join()
+        self.assertEqual(server.process.returncode, 0, 'Old process did not exit cleanly:\n' + server.log())
+        failures = [failure for thread in threads for failure in thread.failures]
+        self.assertEqual(failures, [], 'Requests failed during the restart:\n' + server.log())
+        self.assertGreater(sum(thread.succeeded for thread in threads), 0, 'No requests sent')
+        with open(pid_file, 'r') as fh:
+            pid = int(fh.read())
+        self.assertNotEqual(pid, server.process.pid, 'PID file not updated')
+        return pid
+
+    def runTest(self) -> None:
+        """
+        Restart in both server modes
+        """
+        if not hasattr(os, 'posix_spawn') or not hasattr(signal, 'SIGHUP'):
+            self.skipTest('Restarts are not supported on this platform')
+        for mode, trigger in (('cherrypy', 'signal'), ('asyncio', 'api')):
+            server = LocalServer(['--mode', mode])
+            pid_file = os.path.join(server.work_dir, 'server.pid')
+            server.arguments += ['--pidfile', pid_file]
+            server.start()
+            pid = None
+            try:
+                pid = self.__restart(server, pid_file, trigger)
+                self.assertEqual(server.post_json('/app/get_session_count', dict(key=server.login())),
+                                 dict(session_count=2), 'Sessions not handed over in {:s} mode'.format(mode))
+            finally:
+                if pid is not None:
+                    os.kill(pid, signal.SIGTERM)
+                    deadline = time.monotonic() + 10.0
+                    while time.monotonic() < deadline and os.path.exists('/proc/{:d}'.format(pid)):
+                        time.sleep(0.1)
+                server.stop()
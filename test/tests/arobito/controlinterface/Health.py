@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Health <arobito.controlinterface.Health>` module.
+"""
+
+import unittest
+import json
+import time
+import urllib.error
+import urllib.request
+from arobito.controlinterface.ControllerBackend import App as Backend
+from arobito.controlinterface.Health import Health
+from testlibs import WsgiClient
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Probes(unittest.TestCase):
+    """
+    Test the probes as a WSGI application
+    """
+
+    def __check(self, app: Health, path: str, status: int, document: dict, method: str='GET') -> None:
+        """
+        Send a probe and check the response
+
+        :param app: The health application
+        :param path: The path below ``/health``
+        :param status: The expected status code
+        :param document: The expected response document
+        :param method: The request method
+        """
+        response_status, headers, body = WsgiClient.request(app, '/health', path, method)
+        self.assertEqual(response_status, status, 'Wrong status for {:s}'.format(path))
+        self.assertEqual(headers['Cache-Control'], 'no-store', 'Probe may be cached')
+        if document is not None:
+            self.assertEqual(json.loads(body.decode('utf-8')), document, 'Wrong response for {:s}'.format(path))
+
+    def runTest(self) -> None:
+        """
+        Check the answers in every state
+        """
+        backend = Backend()
+        saturated = list()
+        app = Health(backend, saturated=lambda: len(saturated) > 0)
+        self.__check(app, '/live', 200, dict(live=True))
+        self.__check(app, '/ready', 200, dict(ready=True))
+        self.assertEqual(WsgiClient.request(app, '/health', '/ready', 'HEAD')[2], b'', 'Body sent on HEAD')
+        self.assertEqual(WsgiClient.request(app, '/health', '/ready', 'POST')[0], 405, 'POST accepted')
+        self.assertEqual(WsgiClient.request(app, '/health', '/unknown')[0], 404, 'Unknown probe found')
+
+        saturated.append(True)
+        self.__check(app, '/ready', 503, dict(ready=False, reason='saturated'))
+        self.__check(app, '/live', 200, dict(live=True))
+        saturated.clear()
+
+        locked = backend.locked
+        backend.locked = True
+        try:
+            self.__check(app, '/ready', 503, dict(ready=False, reason='locked'))
+        finally:
+            backend.locked = locked
+
+
+class Server(unittest.TestCase):
+    """
+    Probe running servers
+    """
+
+    def runTest(self) -> None:
+        """
+        Both server modes answer the probes
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode])
+            server.start()
+            try:
+                with urllib.request.urlopen(server.url('/health/live'), timeout=10) as response:
+                    self.assertEqual(json.loads(response.read().decode('utf-8')), dict(live=True),
+                                     'Not live in {:s} mode'.format(mode))
+                deadline = time.monotonic() + 10.0
+                status = None
+                while time.monotonic() < deadline:
+                    try:
+                        with urllib.request.urlopen(server.url('/health/ready'), timeout=10) as response:
+                            status = response.status
+                            break
+                    except urllib.error.HTTPError as e:
+                        status = e.code
+                        time.sleep(0.1)
+                self.assertEqual(status, 200, 'Not ready in {:s} mode:\n{:s}'.format(mode, server.log()))
+            finally:
+                server.stop()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`LogWriter <arobito.controlinterface.LogWriter>` module.
+"""
+
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from arobito.controlinterface import LogWriter
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def read_records(file_name: str) -> list:
+    """
+    Read the records of a log file
+
+    :param file_name: The file
+    :return: The records
+    """
+    if not os.path.isfile(file_name):
+        return list()
+    with open(file_name, 'r') as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def read_paths(file_name: str) -> list:
+    """
+    Read the paths of the access records of the log tests
+
+    :param file_name: The file
+    :return: The paths starting with ``/static/log-``
+    """
+    return [record['path'] for record in read_records(file_name) if record.get('path', '').startswith('/static/log-')]
+
+
+class Writer(unittest.TestCase):
+    """
+    Test the :py:class:`LogWriter <arobito.controlinterface.LogWriter.LogWriter>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        Records are deduplicated, dropped on overflow, written in the background and rotated
+        """
+        folder = tempfile.mkdtemp(prefix='arobito-log-')
+        file_name = os.path.join(folder, 'test.log')
+        writer = LogWriter.LogWriter()
+        writer.stop()
+        try:
+            writer.configure(file_name, 2048, 1, 10000, 60.0, True)
+            self.assertTrue(writer.log('warning', 'log_test_repeated', 'Same message'), 'First message suppressed')
+            for i in range(0, 4):
+                self.assertFalse(writer.log('warning', 'log_test_repeated', 'Same message'), 'Repeat not suppressed')
+            for i in range(0, LogWriter.event_burst + 5):
+                writer.log('warning', 'log_test_burst', 'Message {:d}'.format(i))
+            writer.access('GET', '/static/log-test', 404, 9, 0.0015, '127.0.0.1')
+
+            dropped = writer.dropped
+            writer.queue_size = 0
+            self.assertFalse(writer.log('error', 'log_test_overflow', 'Dropped'), 'Record not dropped')
+            self.assertEqual(writer.dropped, dropped + 1, 'Drop not counted')
+            writer.queue_size = 10000
+
+            writer.start()
+            for i in range(0, 60):
+                writer.access('GET', '/static/log-test-{:d}'.format(i), 200, 100, 0.001)
+                time.sleep(0.001)
+            writer.stop()
+            records = read_records(file_name + '.1') + read_records(file_name)
+            self.assertTrue(os.path.isfile(file_name + '.1'), 'Log not rotated')
+            self.assertFalse(os.path.isfile(file_name + '.2'), 'Too many backups kept')
+            self.assertTrue(all(record['ts'].endswith('Z') for record in records), 'Time stamps wrong')
+            mine = [record for record in records if record.get('event', '').startswith('log_test')]
+            self.assertEqual(len([record for record in mine if record['event'] == 'log_test_repeated']), 1,
+                             'Repeated message not deduplicated')
+            self.assertEqual(len([record for record in mine if record['event'] == 'log_test_burst']),
+                             LogWriter.event_burst, 'Burst not limited')
+            suppressed = [record for record in records if record.get('event') == 'suppressed']
+            self.assertEqual(suppressed[-1]['suppressed'].get('log_test_repeated'), 4, 'Repeats not reported')
+            self.assertEqual(suppressed[-1]['suppressed'].get('log_test_burst'), 5, 'Burst not reported')
+            self.assertTrue(any(record.get('event') == 'log_dropped' for record in records), 'Drop not reported')
+            access = [record for record in records if record.get('path') == '/static/log-test']
+            self.assertEqual(access, [dict(ts=access[0]['ts'], level='access', method='GET', path='/static/log-test',
+                                           status=404, bytes=9, ms=1.5, remote='127.0.0.1')], 'Access record wrong')
+            self.assertEqual(len([record for record in records if record.get('path', '').startswith(
+                '/static/log-test-')]), 60, 'Access records lost on rotation')
+        finally:
+            writer.stop()
+            writer.configure()
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class SharedFile(unittest.TestCase):
+    """
+    Test the :py:class:`LogWriter <arobito.controlinterface.LogWriter.LogWriter>` with a file rotated by another process
+    """
+
+    def runTest(self) -> None:
+        """
+        The file is reopened when it was rotated elsewhere
+        """
+        folder = tempfile.mkdtemp(prefix='arobito-log-')
+        file_name = os.path.join(folder, 'test.log')
+        writer = LogWriter.LogWriter()
+        writer.stop()
+        try:
+            writer.configure(file_name, 0, 1, 10000, 60.0, True)
+            writer.start()
+            for i in range(0, 5):
+                writer.access('GET', '/static/log-before-{:d}'.format(i), 200, 100, 0.001)
+            deadline = time.monotonic() + 5.0
+            while len(read_paths(file_name)) < 5 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(len(read_paths(file_name)), 5, 'Records not written')
+
+            os.replace(file_name, file_name + '.1')
+            for i in range(0, 5):
+                writer.access('GET', '/static/log-after-{:d}'.format(i), 200, 100, 0.001)
+            writer.stop()
+            self.assertEqual(read_paths(file_name + '.1'),
+                             ['/static/log-before-{:d}'.format(i) for i in range(0, 5)], 'Rotated file written')
+            self.assertEqual(read_paths(file_name),
+                             ['/static/log-after-{:d}'.format(i) for i in range(0, 5)], 'File not reopened')
+
+        finally:
+            writer.stop()
+            writer.configure()
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class Report(unittest.TestCase):
+    """
+    Test :py:func:`report <arobito.controlinterface.LogWriter.report>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Messages go to the file while the writer runs, and to the error output before it starts and after it stops
+        """
+        folder = tempfile.mkdtemp(prefix='arobito-log-')
+        file_name = os.path.join(folder, 'test.log')
+        writer = LogWriter.LogWriter()
+        writer.stop()
+        try:
+            writer.configure(file_name, 0, 1, 10000, 60.0, False)
+            self.assertFalse(writer.running, 'Writer running before the start')
+            LogWriter.report('info', 'log_test_report', 'Report before the start')
+            writer.start()
+            self.assertTrue(writer.running, 'Writer not running')
+            self.assertTrue(LogWriter.report('warning', 'log_test_report', 'Report while running', stack='  here\n'),
+                            'Report suppressed')
+            writer.stop()
+            self.assertFalse(writer.running, 'Writer still running')
+            LogWriter.report('info', 'log_test_report', 'Report after the stop')
+            records = [record for record in read_records(file_name) if record.get('event') == 'log_test_report']
+            self.assertEqual([(record['message'], record.get('stack')) for record in records],
+                             [('Report while running', '  here\n')], 'Wrong reports written')
+        finally:
+            writer.stop()
+            writer.configure()
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class Workers(unittest.TestCase):
+    """
+    Test the :py:class:`LogWriter <arobito.controlinterface.LogWriter.LogWriter>` of several processes writing the same
+    file
+    """
+
+    def runTest(self) -> None:
+        """
+        Every full file is rotated once, no record is lost
+        """
+        if not hasattr(os, 'fork'):
+            self.skipTest('Processes cannot be forked on this platform')
+        folder = tempfile.mkdtemp(prefix='arobito-log-')
+        file_name = os.path.join(folder, 'test.log')
+        try:
+            pids = list()
+            for worker in range(0, 2):
+                pid = os.fork()
+                if pid == 0:
+                    code = 1
+                    try:
+                        writer = LogWriter.LogWriter()
+                        writer.configure(file_name, 30000, 100, 10000, 60.0, True)
+                        writer.start()
+                        for i in range(0, 600):
+                            writer.access('GET', '/static/log-{:d}-{:d}'.format(worker, i), 200, 100, 0.001)
+                            time.sleep(0.002)
+                        writer.stop()
+                        code = 0
+                    finally:
+                        os._exit(code)
+                pids.append(pid)
+            for pid in pids:
+                self.assertEqual(os.waitpid(pid, 0)[1], 0, 'Worker failed')
+
+            numbers = sorted(int(name[len('test.log.'):]) for name in os.listdir(folder)
+                             if name.startswith('test.log.') and name[len('test.log.'):].isdigit())
+            self.assertGreater(len(numbers), 1, 'Log not rotated')
+            self.assertEqual(numbers, list(range(1, len(numbers) + 1)), 'Backups lost')
+            backups = ['test.log.{:d}'.format(number) for number in numbers]
+            self.assertTrue(all(os.path.getsize(os.path.join(folder, name)) >= 30000 for name in backups),
+                            'File rotated before it was full')
+            paths = [record['path'] for name in backups + ['test.log']
+                     for record in read_records(os.path.join(folder, name)) if record.get('level') == 'access']
+            self.assertEqual(len(paths), 1200, 'Records lost on rotation')
+            self.assertEqual(len(set(paths)), 1200, 'Records written twice')
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class Server(unittest.TestCase):
+    """
+    Check the log file of running servers
+    """
+
+    def runTest(self) -> None:
+        """
+        Both server modes write access records and deduplicate the messages of missing files
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode], '[Server]\naccess-log = yes\nlog-file = access.log\n')
+            server.start()
+            try:
+                for i in range(0, 3):
+                    with self.assertRaises(urllib.error.HTTPError, msg='Missing file found'):
+                        urllib.request.urlopen(server.url('/static/no-such-file.js'), timeout=10)
+                key = server.login()
+                server.post_json('/app/logout', dict(key=key))
+                file_name = os.path.join(server.work_dir, 'access.log')
+                records = list()
+                deadline = time.monotonic() + 10.0
+                while time.monotonic() < deadline:
+                    records = read_records(file_name)
+                    if len([record for record in records if record['level'] == 'access']) >= 5:
+                        break
+                    time.sleep(0.1)
+                access = [(record['method'], record['path'], record['status']) for record in records
+                          if record['level'] == 'access']
+                self.assertEqual(access.count(('GET', '/static/no-such-file.js', 404)), 3,
+                                 'Missing file not logged in {:s} mode:\n{:s}'.format(mode, server.log()))
+                self.assertIn(('POST', '/app/auth', 200), access, 'Login not logged in {:s} mode'.format(mode))
+                self.assertEqual(len([record for record in records if record.get('event') == 'static_not_found']), 1,
+                                 'Messages not deduplicated in {:s} mode'.format(mode))
+            finally:
+                server.stop()
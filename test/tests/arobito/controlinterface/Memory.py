@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Memory <arobito.controlinterface.Memory>` module.
+"""
+
+import unittest
+import os
+from arobito.controlinterface import Memory
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def allocate_in_memory_test(count: int) -> list:
+    """
+    Allocate some memory
+
+    :param count: The number of objects
+    :return: The objects
+    """
+    return [bytearray(1024) for i in range(0, count)]
+
+
+class Snapshots(unittest.TestCase):
+    """
+    Test the :py:class:`MemoryInspector <arobito.controlinterface.Memory.MemoryInspector>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        A growing allocation site shows up in the top sites and in the diff
+        """
+        if os.path.exists(Memory.status_file):
+            self.assertGreater(Memory.process_memory().get('rss', 0), 0, 'Resident set size missing')
+        inspector = Memory.MemoryInspector()
+        self.assertTrue(inspector.start()['tracing'], 'Tracing not started')
+        try:
+            kept = allocate_in_memory_test(100)
+            first = inspector.snapshot(10)
+            self.assertTrue(any('controlinterface/Memory.py' in site['site'] for site in first['top']),
+                            'Allocation site missing')
+            kept += allocate_in_memory_test(400)
+            second = inspector.snapshot(10)
+            growth = [site for site in second['diff'] if 'controlinterface/Memory.py' in site['site'] and
+                      site['size_diff'] >= 400 * 1024 and site['count_diff'] >= 400]
+            self.assertEqual(len(growth), 1, 'Growth not in the diff')
+            self.assertEqual(len(kept), 500, 'Objects lost')
+        finally:
+            self.assertFalse(inspector.stop()['tracing'], 'Tracing not stopped')
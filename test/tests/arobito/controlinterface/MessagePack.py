@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`MessagePack <arobito.controlinterface.MessagePack>` module.
+"""
+
+import unittest
+from arobito.controlinterface import MessagePack
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class KnownEncodings(unittest.TestCase):
+    """
+    Compare the output of :py:func:`pack <arobito.controlinterface.MessagePack.pack>` with the MessagePack specification
+    """
+
+    def runTest(self) -> None:
+        """
+        Pack values at the borders of the formats
+        """
+        expected = [
+            (None, 'c0'), (False, 'c2'), (True, 'c3'),
+            (0, '00'), (127, '7f'), (128, 'cc80'), (255, 'ccff'), (256, 'cd0100'), (65536, 'ce00010000'),
+            (2 ** 32, 'cf0000000100000000'), (-1, 'ff'), (-32, 'e0'), (-33, 'd0df'), (-129, 'd1ff7f'),
+            (-2 ** 31 - 1, 'd3ffffffff7fffffff'), (1.5, 'cb3ff8000000000000'),
+            ('', 'a0'), ('a' * 31, 'bf' + '61' * 31), ('a' * 32, 'd920' + '61' * 32), ('ü', 'a2c3bc'),
+            (b'\x01', 'c40101'), ([], '90'), ([1, 2], '920102'),
+            (list(range(0, 16)), 'dc0010' + bytes(range(0, 16)).hex()),
+            (dict(compact=True, schema=0), '82a7636f6d70616374c3a6736368656d6100')
+        ]
+        for value, encoded in expected:
+            self.assertEqual(MessagePack.pack(value).hex(), encoded, 'Wrong encoding of {!r}'.format(value))
+            self.assertEqual(MessagePack.unpack(bytes.fromhex(encoded)), value, 'Wrong decoding of {!r}'.format(value))
+        self.assertEqual(MessagePack.pack((1, 2)), MessagePack.pack([1, 2]), 'Tuples not packed as arrays')
+        self.assertEqual(MessagePack.unpack(bytes.fromhex('ca3fc00000')), 1.5, 'float32 not understood')
+
+
+class RoundTrip(unittest.TestCase):
+    """
+    Pack and unpack larger and nested documents
+    """
+
+    def runTest(self) -> None:
+        """
+        Pack documents using the 16 and 32 bit formats
+        """
+        documents = [
+            dict(auth=dict(success=True, status='Login successful', key='k' * 128), count=-1, ratio=0.25),
+            dict(('key{:d}'.format(i), [i, -i, str(i)]) for i in range(0, 70000)),
+            ['Grüße' * 20000, b'\x00' * 300, b'\x00' * 70000, 2 ** 64 - 1, -2 ** 63],
+            [[[[None]]]]
+        ]
+        for document in documents:
+            self.assertEqual(MessagePack.unpack(MessagePack.pack(document)), document, 'Document changed')
+
+
+class InvalidData(unittest.TestCase):
+    """
+    Make sure invalid input is rejected with the right exceptions
+    """
+
+    def runTest(self) -> None:
+        """
+        Pack unsupported values and unpack broken data
+        """
+        for value in (2 ** 64, -2 ** 63 - 1):
+            with self.assertRaises(ValueError, msg='Integer out of range packed'):
+                MessagePack.pack(value)
+        with self.assertRaises(TypeError, msg='Unsupported type packed'):
+            MessagePack.pack(dict(value=object()))
+        broken = ['', 'c1', 'd4', 'a3616263c0', 'a36162', 'dc0002c0', 'cd01', '81900c', 'a2c328',
+                  '91' * (MessagePack.max_depth + 2)]
+        for data in broken:
+            with self.assertRaises(ValueError, msg='Invalid data unpacked: {:s}'.format(data)):
+                MessagePack.unpack(bytes.fromhex(data))
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Metrics <arobito.controlinterface.Metrics>` module.
+"""
+
+import unittest
+import re
+import threading
+import urllib.error
+import urllib.request
+from arobito.controlinterface import Metrics
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def samples(text: str) -> dict:
+    """
+    Parse the samples of a rendering
+
+    :param text: The metrics in the Prometheus text format
+    :return: A dict of the sample names with labels and their values
+    """
+    result = dict()
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            result[name] = float(value)
+    return result
+
+
+class Registry(unittest.TestCase):
+    """
+    Test the recording and the rendering
+    """
+
+    def runTest(self) -> None:
+        """
+        The shards of several threads are summed up into cumulative histograms
+        """
+        registry = Metrics.Registry()
+        registry.declare_endpoints(['/test/registry'])
+        self.assertEqual(registry.endpoint_of('/test/registry'), '/test/registry', 'Declared endpoint not found')
+        self.assertEqual(registry.endpoint_of('/test/registry/'), '/test/registry', 'Trailing slash not ignored')
+        self.assertEqual(registry.endpoint_of('/app/unknown'), '/other', 'Unknown endpoint recorded')
+        self.assertEqual(registry.endpoint_of('/static/js/app.js'), '/static', 'Static file not grouped')
+
+        def record() -> None:
+            for i in range(0, 100):
+                registry.started('/test/registry')
+                registry.finished('/test/registry', 200, 0.003, 10, 20)
+            registry.started('/test/registry')
+            registry.finished('/test/registry', 503, 20.0, 0, 5)
+            registry.count('test_events', 2)
+
+        threads = [threading.Thread(target=record) for i in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        registry.started('/test/pending')
+        registry.add_gauge('test_gauge', 'Test', lambda: 3)
+        registry.add_gauge('test_broken', 'Fails', lambda: 1 / 0)
+        registry.add_gauge('test_labelled', 'Labelled', lambda: {(('state', 'a"b'),): 1.5})
+
+        text = registry.render()
+        values = samples(text)
+        self.assertEqual(values['arobito_requests_total{endpoint="/test/registry",status="200"}'], 400,
+                         'Wrong request count')
+        self.assertEqual(values['arobito_requests_total{endpoint="/test/registry",status="503"}'], 4,
+                         'Wrong error count')
+        self.assertEqual(values['arobito_request_duration_seconds_bucket{endpoint="/test/registry",le="0.0025"}'], 0,
+                         'Request in a too small bucket')
+        self.assertEqual(values['arobito_request_duration_seconds_bucket{endpoint="/test/registry",le="0.005"}'], 400,
+                         'Request in a wrong bucket')
+        self.assertEqual(values['arobito_request_duration_seconds_bucket{endpoint="/test/registry",le="10.0"}'], 400,
+                         'Buckets not cumulative')
+        self.assertEqual(values['arobito_request_duration_seconds_bucket{endpoint="/test/registry",le="+Inf"}'], 404,
+                         'Slow requests missing')
+        self.assertEqual(values['arobito_request_duration_seconds_count{endpoint="/test/registry"}'], 404,
+                         'Wrong histogram count')
+        self.assertAlmostEqual(values['arobito_request_duration_seconds_sum{endpoint="/test/registry"}'], 81.2,
+                               msg='Wrong histogram sum')
+        self.assertEqual(values['arobito_request_bytes_total{endpoint="/test/registry"}'], 4000, 'Wrong bytes in')
+        self.assertEqual(values['arobito_response_bytes_total{endpoint="/test/registry"}'], 8020, 'Wrong bytes out')
+        self.assertEqual(values['arobito_requests_in_flight{endpoint="/test/registry"}'], 0, 'Requests left in flight')
+        self.assertEqual(values['arobito_requests_in_flight{endpoint="/test/pending"}'], 1, 'Request not in flight')
+        self.assertEqual(values['arobito_test_events_total'], 8, 'Wrong counter')
+        self.assertEqual(values['arobito_test_gauge'], 3, 'Gauge missing')
+        self.assertEqual(values['arobito_test_labelled{state="a\\"b"}'], 1.5, 'Label not escaped')
+        self.assertNotIn('arobito_test_broken', text, 'Failing gauge rendered')
+        self.assertIn('# TYPE arobito_request_duration_seconds histogram', text, 'Histogram type missing')
+
+        self.assertEqual(Metrics.bearer_key('Bearer abc'), 'abc', 'Bearer token not found')
+        self.assertEqual(Metrics.bearer_key('bearer  abc '), 'abc', 'Bearer scheme not case insensitive')
+        self.assertIsNone(Metrics.bearer_key('Basic abc'), 'Other scheme accepted')
+        self.assertIsNone(Metrics.bearer_key('Bearer'), 'Empty token accepted')
+        self.assertIsNone(Metrics.bearer_key(None), 'Missing header accepted')
+
+
+class Server(unittest.TestCase):
+    """
+    Scrape running servers
+    """
+
+    def __scrape(self, server: LocalServer, key: str) -> str:
+        """
+        Get the metrics
+
+        :param server: The server
+        :param key: The session key, or None
+        :return: The metrics
+        """
+        headers = dict() if key is None else {'Authorization': 'Bearer ' + key}
+        request = urllib.request.Request(server.url('/metrics'), headers=headers)
+        with urllib.request.urlopen(request, timeout=10) as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'),
+                            'Wrong content type')
+            return response.read().decode('utf-8')
+
+    def runTest(self) -> None:
+        """
+        Both server modes record the requests and deny the metrics to anonymous scrapers
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode])
+            server.start()
+            try:
+                with self.assertRaises(urllib.error.HTTPError) as context:
+                    self.__scrape(server, None)
+                self.assertEqual(context.exception.code, 401, 'Anonymous scrape not denied in {:s} mode'.format(mode))
+                self.assertEqual(context.exception.headers['WWW-Authenticate'], 'Bearer', 'Challenge missing')
+                key = server.login()
+                server.post_json('/app/get_session_count', dict(key=key))
+                server.post_json('/app/get_session_count', dict(key='invalid'))
+                with urllib.request.urlopen(server.url('/static/index.html'), timeout=10) as response:
+                    response.read()
+                text = self.__scrape(server, key)
+                server.post_json('/app/logout', dict(key=key))
+                values = samples(text)
+                for endpoint in ('/app/auth', '/app/get_session_count'):
+                    self.assertGreaterEqual(values['arobito_requests_total{{endpoint="{:s}",status="200"}}'
+                                                   .format(endpoint)],
+                                            1, 'Request to {:s} not counted in {:s} mode'.format(endpoint, mode))
+                self.assertGreater(values['arobito_response_bytes_total{endpoint="/static"}'], 0,
+                                   'Static bytes not counted in {:s} mode'.format(mode))
+                self.assertGreater(values['arobito_request_bytes_total{endpoint="/app/auth"}'], 0,
+                                   'Request bytes not counted in {:s} mode'.format(mode))
+                self.assertEqual(values['arobito_sessions'], 1, 'Session gauge wrong in {:s} mode'.format(mode))
+                self.assertIn('arobito_thread_pool_workers{state="busy"}', values,
+                              'Thread pool gauge missing in {:s} mode'.format(mode))
+                self.assertTrue(re.search('^arobito_response_cache_(hits|misses)_total ', text, re.MULTILINE),
+                                'Cache counters missing in {:s} mode'.format(mode))
+            finally:
+                server.stop()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Profiler <arobito.controlinterface.Profiler>` module.
+"""
+
+import unittest
+import queue
+import threading
+import time
+from arobito.controlinterface.Profiler import Profiler
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def spin_in_profiler_test(seconds: float) -> int:
+    """
+    Keep the CPU busy
+
+    :param seconds: How long
+    :return: The number of loops
+    """
+    loops = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        loops += 1
+    return loops
+
+
+class Sampling(unittest.TestCase):
+    """
+    Test the ``sample`` mode
+    """
+
+    def runTest(self) -> None:
+        """
+        Busy workers are sampled, idle workers and other threads only on request
+        """
+        profiler = Profiler()
+        idle_queue = queue.Queue()
+        busy = threading.Thread(target=spin_in_profiler_test, args=(1.0,), name='CP Server Thread-test-busy')
+        idle = threading.Thread(target=idle_queue.get, name='CP Server Thread-test-idle')
+        other = threading.Thread(target=spin_in_profiler_test, args=(1.0,), name='Other Thread-test')
+        for thread in (busy, idle, other):
+            thread.start()
+        try:
+            result = profiler.sample(0.3, 0.005)
+            self.assertGreaterEqual(result['samples'], 10, 'Too few samples')
+            self.assertEqual(result['threads'], 1, 'Wrong threads sampled')
+            lines = result['stacks'].splitlines()
+            self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines), 'Stacks not collapsed')
+            self.assertTrue(any(line.startswith('threading.py:_bootstrap;') and
+                                'Profiler.py:spin_in_profiler_test' in line for line in lines),
+                            'Busy worker not sampled from the root')
+
+            result = profiler.sample(0.05, 0.005, all_threads=True, idle=True)
+            self.assertIn('queue.py:get', result['stacks'], 'Idle worker not sampled')
+            self.assertGreaterEqual(result['threads'], 3, 'Not all threads sampled')
+            self.assertFalse(profiler.busy, 'Profiler still busy')
+        finally:
+            idle_queue.put(None)
+            for thread in (busy, idle, other):
+                thread.join()
+
+
+class Deterministic(unittest.TestCase):
+    """
+    Test the ``cprofile`` mode
+    """
+
+    def runTest(self) -> None:
+        """
+        Every n-th call is profiled during the run only
+        """
+        profiler = Profiler()
+        self.assertGreaterEqual(profiler.call(spin_in_profiler_test, 0.0), 0, 'Call without a run failed')
+        results = list()
+        runner = threading.Thread(target=lambda: results.append(profiler.deterministic(0.5, 2)))
+        runner.start()
+        deadline = time.monotonic() + 5.0
+        while profiler.every <= 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNone(profiler.sample(0.1), 'Second run started')
+        for i in range(0, 4):
+            profiler.call(spin_in_profiler_test, 0.01)
+        runner.join()
+        self.assertEqual(profiler.every, 0, 'Profiling not stopped')
+        self.assertEqual(results[0]['requests'], 2, 'Wrong number of requests profiled')
+        self.assertIn('spin_in_profiler_test', results[0]['stats'], 'Function missing in the statistics')
+
+
+class Concurrent(unittest.TestCase):
+    """
+    Test overlapping calls in the ``cprofile`` mode
+    """
+
+    def runTest(self) -> None:
+        """
+        A call overlapping a profiled one runs unprofiled
+        """
+        profiler = Profiler()
+        entered = threading.Event()
+        release = threading.Event()
+
+        def wait_in_profiler_test() -> bool:
+            entered.set()
+            return release.wait(5.0)
+
+        results = list()
+        calls = list()
+        runner = threading.Thread(target=lambda: results.append(profiler.deterministic(1.0, 1)))
+        runner.start()
+        deadline = time.monotonic() + 5.0
+        while profiler.every <= 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        first = threading.Thread(target=lambda: calls.append(profiler.call(wait_in_profiler_test)))
+        first.start()
+        try:
+            self.assertTrue(entered.wait(5.0), 'First call not started')
+            self.assertGreaterEqual(profiler.call(spin_in_profiler_test, 0.01), 0, 'Overlapping call failed')
+        finally:
+            release.set()
+            first.join()
+            runner.join()
+        self.assertEqual(calls, [True], 'First call failed')
+        self.assertEqual(results[0]['requests'], 1, 'Wrong number of requests profiled')
+        self.assertIn('wait_in_profiler_test', results[0]['stats'], 'Function missing in the statistics')
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`PushChannel <arobito.controlinterface.PushChannel>` module.
+"""
+
+import unittest
+import json
+from arobito.controlinterface import PushChannel
+from arobito.controlinterface.BackendManager import SessionManager
+from testlibs.LocalServer import LocalServer
+from testlibs.PushClient import PushClient
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class StandInSocket(object):
+    """
+    Collects the messages the broker pushes instead of sending them
+    """
+
+    def __init__(self):
+        self.payloads = list()
+
+    def push(self, payload: str) -> None:
+        self.payloads.append(json.loads(payload))
+
+
+class Broker(unittest.TestCase):
+    """
+    Test the :py:class:`PushBroker <arobito.controlinterface.PushChannel.PushBroker>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        Authenticate sockets, subscribe them and deliver messages
+        """
+        broker = PushChannel.PushBroker()
+        broker.deliver(timeout=0)
+        session_manager = SessionManager()
+        key = session_manager.login('arobito', 'arobito')
+        self.assertIsNotNone(key, 'Login failed')
+
+        subscriber = StandInSocket()
+        idle = StandInSocket()
+        broker.add(subscriber)
+        broker.add(idle)
+        try:
+            self.assertFalse(broker.subscribe(subscriber, 'status'), 'Subscription without authentication')
+            self.assertFalse(broker.authenticate(subscriber, 'invalid'), 'Invalid key accepted')
+            self.assertFalse(broker.authenticate(subscriber, None), 'Missing key accepted')
+            self.assertTrue(broker.authenticate(subscriber, key), 'Valid key rejected')
+            self.assertTrue(broker.subscribe(subscriber, 'status'), 'Subscription failed')
+            self.assertTrue(broker.subscribe(subscriber, 'sessions'), 'Administrator cannot subscribe to sessions')
+            self.assertFalse(broker.subscribe(subscriber, 'unknown'), 'Unknown topic accepted')
+            self.assertEqual(broker.count('status'), 1, 'Subscriber count wrong')
+
+            broker.publish('notifications', dict(title='Hello', message='World', level='info'))
+            broker.publish('status', dict(state='testing'))
+            self.assertEqual(broker.deliver(timeout=1.0), 2, 'Number of messages delivered wrong')
+            self.assertEqual(subscriber.payloads, [dict(topic='status', data=dict(state='testing'))],
+                             'Wrong messages delivered')
+            self.assertEqual(idle.payloads, [], 'Messages delivered without subscription')
+            self.assertEqual(broker.current('status'), dict(state='testing'), 'Current status not kept')
+
+            broker.unsubscribe(subscriber, 'status')
+            self.assertEqual(broker.count('status'), 0, 'Unsubscribe failed')
+            self.assertNotIn(subscriber, broker.sweep(), 'Valid socket swept')
+            session_manager.logout(key)
+            self.assertIn(subscriber, broker.sweep(), 'Socket of an ended session not swept')
+        finally:
+            broker.remove(subscriber)
+            broker.remove(idle)
+            broker.publish('status', dict(state='running'))
+            broker.deliver(timeout=0)
+        self.assertEqual(broker.count(), 0, 'Sockets not removed')
+
+
+class Server(unittest.TestCase):
+    """
+    Test the push channel on a running server
+    """
+
+    def runTest(self) -> None:
+        """
+        Connect, authenticate and receive session count changes
+        """
+        server = LocalServer()
+        server.start()
+        try:
+            client = PushClient('ws://{:s}:{:d}/push/'.format(server.host, server.port))
+            client.connect()
+            try:
+                client.request(dict(action='subscribe', topics=['status']))
+                answer = client.wait_for(lambda m: m.get('action', None) == 'subscribe')
+                self.assertIsNotNone(answer, 'No answer received')
+                self.assertFalse(answer['success'], 'Subscription without authentication')
+
+                self.assertTrue(client.authenticate(server.login(), ['status', 'sessions']), 'Authentication failed')
+                status = client.wait_for(lambda m: m.get('topic', None) == 'status')
+                self.assertEqual(status['data']['state'], 'running', 'Initial status wrong')
+                count = client.wait_for(lambda m: m.get('topic', None) == 'sessions')
+                self.assertEqual(count['data']['count'], 1, 'Initial session count wrong')
+
+                server.login()
+                count = client.wait_for(lambda m: m.get('topic', None) == 'sessions')
+                self.assertIsNotNone(count, 'Session count change not pushed')
+                self.assertEqual(count['data']['count'], 2, 'Pushed session count wrong')
+            finally:
+                client.close()
+        finally:
+            server.stop()
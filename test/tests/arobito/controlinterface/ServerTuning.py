@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`ServerTuning <arobito.controlinterface.ServerTuning>` module.
+"""
+
+import unittest
+import time
+import cherrypy
+from cherrypy._cpserver import Server
+from arobito.controlinterface import ServerTuning, Supervisor
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class ServerSettings(unittest.TestCase):
+    """
+    Test the :py:class:`ServerSettings <arobito.controlinterface.ServerTuning.ServerSettings>` class
+    """
+
+    def __check_overrides(self) -> None:
+        """
+        Override some options, as the command line does
+        """
+        settings = ServerTuning.ServerSettings({'thread-pool': 4, 'thread-pool-max': 16, 'thread-pool-autosize': True,
+                                                'keep-alive-limit': None, 'socket-timeout': 3, 'drain-timeout': '2.5',
+                                                'admission-limit': 2, 'admission-slo': '0.5', 'server-timing': 'yes',
+                                                'server-timing-sample': '0.5', 'watchdog-threshold': '0',
+                                                'access-log': 'no', 'log-file': '/tmp/arobito-test.log',
+                                                'capture-file': '/tmp/arobito-capture.jsonl'})
+        self.assertEqual(settings.thread_pool, 4, 'Thread pool not overridden')
+        self.assertEqual(settings.thread_pool_max, 16, 'Thread pool maximum not overridden')
+        self.assertTrue(settings.autosize, 'Auto sizing not overridden')
+        self.assertEqual(settings.socket_timeout, 3, 'Socket timeout not overridden')
+        self.assertIsInstance(settings.keep_alive_limit, int, 'None override is not ignored')
+        self.assertEqual(settings.drain_timeout, 2.5, 'Drain timeout not overridden')
+        self.assertEqual(settings.admission_limit, 2, 'Admission limit not overridden')
+        self.assertEqual(settings.admission_slo, 0.5, 'Admission SLO not overridden')
+        self.assertTrue(settings.server_timing, 'Server timing not overridden')
+        self.assertEqual(settings.server_timing_sample, 0.5, 'Server timing sample not overridden')
+        self.assertEqual(settings.watchdog_threshold, 0, 'Watchdog threshold not overridden')
+        self.assertFalse(settings.access_log, 'Access log not overridden')
+        self.assertEqual(settings.log_file, '/tmp/arobito-test.log', 'Log file not overridden')
+        self.assertEqual(settings.capture_file, '/tmp/arobito-capture.jsonl', 'Capture file not overridden')
+
+        config = settings.cherrypy_config()
+        self.assertEqual(config['server.thread_pool'], 4, 'CherryPy config is wrong')
+        self.assertEqual(config['server.thread_pool_max'], 16, 'CherryPy config is wrong')
+        self.assertEqual(config['server.socket_timeout'], 3, 'CherryPy config is wrong')
+
+    def __check_invalid(self) -> None:
+        """
+        Invalid options must be rejected
+        """
+        for options in ({'thread-pool': 0}, {'thread-pool': 8, 'thread-pool-max': 4}, {'thread-pool-max': 0},
+                        {'thread-pool-autosize': 'yes', 'thread-pool-max': -1}, {'socket-queue-size': 'many'},
+                        {'keep-alive': 'maybe'}, {'socket-timeout': 0}, {'drain-timeout': -1},
+                        {'admission-limit': -1}, {'admission-queue': -1}, {'admission-slo': 0},
+                        {'server-timing-sample': 2}, {'watchdog-threshold': -1}, {'watchdog-interval': 0},
+                        {'log-max-bytes': -1}, {'log-queue': 0}, {'log-interval': 0}, {'no-such-option': 1}):
+            with self.assertRaises(ValueError, msg='Invalid options {:s} accepted'.format(options.__str__())):
+                ServerTuning.ServerSettings(options)
+
+        supported = ServerTuning.reuse_port_supported
+        ServerTuning.reuse_port_supported = False
+        try:
+            with self.assertRaises(ValueError, msg='Workers accepted without reuse_port'):
+                ServerTuning.ServerSettings({'workers': 2, 'server-mode': 'cherrypy'})
+            if Supervisor.supported:
+                settings = ServerTuning.ServerSettings({'workers': 2, 'server-mode': 'asyncio'})
+                self.assertEqual(settings.workers, 2, 'Workers of the asyncio server rejected')
+        finally:
+            ServerTuning.reuse_port_supported = supported
+
+    def runTest(self) -> None:
+        """
+        Load the settings with and without overrides
+        """
+        settings = ServerTuning.ServerSettings()
+        self.assertGreaterEqual(settings.thread_pool, 1, 'Thread pool too small')
+        self.assertIsNone(settings.capture_file, 'Capture enabled by default')
+        self.assertGreater(settings.socket_queue_size, 0, 'Socket queue too small')
+        self.__check_overrides()
+        self.__check_invalid()
+
+
+class TimedQueue(unittest.TestCase):
+    """
+    Test the :py:class:`TimedQueue <arobito.controlinterface.ServerTuning.TimedQueue>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        Put some items, wait and take them again
+        """
+        q = ServerTuning.TimedQueue()
+        self.assertEqual(q.take_stats(), (0, 0.0, 0.0), 'Empty statistics wrong')
+        q.put('a')
+        q.put('b')
+        time.sleep(0.05)
+        self.assertEqual(q.qsize(), 2, 'Queue size wrong')
+        self.assertEqual(q.get(), 'a', 'Queue order wrong')
+        self.assertEqual(q.get(), 'b', 'Queue order wrong')
+        waits, average_wait, longest_wait = q.take_stats()
+        self.assertEqual(waits, 2, 'Number of waits wrong')
+        self.assertGreaterEqual(average_wait, 0.04, 'Average wait too short')
+        self.assertGreaterEqual(longest_wait, average_wait, 'Longest wait shorter than average')
+        self.assertEqual(q.take_stats()[0], 0, 'Statistics not reset')
+
+
+class PoolAutoSizer(unittest.TestCase):
+    """
+    Test the :py:class:`PoolAutoSizer <arobito.controlinterface.ServerTuning.PoolAutoSizer>` class and the
+    :py:func:`prepare_server <arobito.controlinterface.ServerTuning.prepare_server>` function
+    """
+
+    def __check_decide(self) -> None:
+        """
+        Check the decisions, without a pool
+        """
+        sizer = ServerTuning.PoolAutoSizer(None, None, ServerTuning.TimedQueue(), 0.05, 1.0)
+        self.assertEqual(sizer.decide(10, 0, 0.1), 2, 'Pool does not grow on long waits')
+        self.assertEqual(sizer.decide(2, 0, 0.1), 1, 'Pool does not grow by at least one thread')
+        self.assertEqual(sizer.decide(10, 2, 0.03), 0, 'Pool changes without reason')
+        for i in range(0, ServerTuning.PoolAutoSizer.shrink_after - 1):
+            self.assertEqual(sizer.decide(12, 8, 0.0), 0, 'Pool shrinks too early')
+        self.assertEqual(sizer.decide(12, 8, 0.0), -3, 'Pool does not shrink when idle')
+        self.assertEqual(sizer.decide(12, 8, 0.0), 0, 'Calm intervals not reset after shrinking')
+
+    def __check_prepare(self) -> None:
+        """
+        Prepare a HTTP server, without starting it
+        """
+        server = Server()
+        server.socket_host = '127.0.0.1'
+        server.socket_port = 0
+        settings = ServerTuning.ServerSettings({'thread-pool': 2, 'thread-pool-max': 6, 'thread-pool-autosize': True,
+                                                'keep-alive': 'no'})
+        for key, value in settings.cherrypy_config().items():
+            setattr(server, key[len('server.'):], value)
+        sizer = ServerTuning.prepare_server(server, settings)
+        self.assertIsNotNone(sizer, 'No auto sizer created')
+        self.assertEqual(server.httpserver.keep_alive_conn_limit, 0, 'Keep-alive not disabled')
+        pool = server.httpserver.requests
+        self.assertEqual(pool.min, 2, 'Pool minimum wrong')
+        self.assertEqual(pool.max, 6, 'Pool maximum wrong')
+        self.assertIsInstance(pool._queue, ServerTuning.TimedQueue, 'Pool queue not replaced')
+
+        pool._queue.put('connection')
+        time.sleep(0.1)
+        pool._queue.get()
+        sizer.target_wait = 0.05
+        try:
+            sizer.adjust()
+            self.assertEqual(len(pool._threads), 1, 'Pool did not grow')
+        finally:
+            pool.stop(1)
+
+    def runTest(self) -> None:
+        """
+        Check the decisions and the integration into the HTTP server
+        """
+        self.__check_decide()
+        self.__check_prepare()
+        self.assertIsNotNone(cherrypy.engine, 'CherryPy engine missing')
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Shutdown <arobito.controlinterface.Shutdown>` module.
+"""
+
+import unittest
+import json
+import re
+import signal
+import socket
+import time
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def start_request(server: LocalServer, key: str) -> tuple:
+    """
+    Start a request and send only the first half of its body, so it stays in flight
+
+    :param server: The server
+    :param key: A session key
+    :return: The connection and the rest of the body
+    """
+    body = json.dumps(dict(key=key)).encode('utf-8')
+    connection = socket.create_connection((server.host, server.port), timeout=30)
+    connection.sendall('POST /app/get_session_count HTTP/1.1\r\nHost: {:s}\r\nContent-Type: application/json\r\n'
+                       'Content-Length: {:d}\r\nConnection: close\r\n\r\n'.format(server.host, len(body))
+                       .encode('ascii') + body[:5])
+    return connection, body[5:]
+
+
+def read_response(connection: socket.socket) -> bytes:
+    """
+    Read until the server closes the connection
+
+    :param connection: The connection
+    :return: The data read, empty when the connection was aborted
+    """
+    data = b''
+    try:
+        while True:
+            chunk = connection.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+    except ConnectionError:
+        pass
+    finally:
+        connection.close()
+    return data
+
+
+def shutdown_counts(server: LocalServer) -> tuple:
+    """
+    Get the numbers of drained and aborted requests the server logged
+
+    :param server: The server
+    :return: The numbers, or None when nothing was logged
+    """
+    match = re.search(r'Shutdown: (\d+) requests drained, (\d+) aborted', server.log())
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class Drain(unittest.TestCase):
+    """
+    Shut a server down while a request is in flight, by ``/app/shutdown`` and by ``SIGTERM``
+    """
+
+    def runTest(self) -> None:
+        """
+        The request finishes and the server exits cleanly in both server modes
+        """
+        for mode, trigger in (('cherrypy', 'api'), ('asyncio', 'signal'), ('cherrypy', 'signal')):
+            server = LocalServer(['--mode', mode, '--draintimeout', '10'])
+            server.start()
+            try:
+                key = server.login()
+                connection, rest = start_request(server, key)
+                time.sleep(0.2)
+                if trigger == 'signal':
+                    server.process.send_signal(signal.SIGTERM)
+                else:
+                    self.assertEqual(server.post_json('/app/shutdown', dict(key=key, mode='drain')),
+                                     dict(shutdown=True), 'Shutdown not accepted')
+                time.sleep(1.0)
+                self.assertIsNone(server.process.poll(), 'Server exited with a request in flight')
+                with self.assertRaises(OSError, msg='New connections are still accepted'):
+                    socket.create_connection((server.host, server.port), timeout=5).close()
+                connection.sendall(rest)
+                response = read_response(connection)
+                self.assertTrue(response.startswith(b'HTTP/1.1 200'), 'Request not drained:\n' + server.log())
+                self.assertEqual(json.loads(response.split(b'\r\n\r\n', 1)[1].decode('utf-8')), dict(session_count=1),
+                                 'Wrong response after draining')
+                server.process.wait(30)
+                self.assertEqual(server.process.returncode, 0, 'Server did not exit cleanly:\n' + server.log())
+                counts = shutdown_counts(server)
+                self.assertIsNotNone(counts, 'Shutdown not logged in {:s} mode:\n{:s}'.format(mode, server.log()))
+                self.assertGreaterEqual(counts[0], 1, 'Request not counted as drained')
+                self.assertEqual(counts[1], 0, 'Requests aborted on a drained shutdown')
+            finally:
+                server.stop()
+
+
+class Immediate(unittest.TestCase):
+    """
+    Shut a server down at once while a request is in flight
+    """
+
+    def runTest(self) -> None:
+        """
+        The request is aborted and counted in both server modes
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode, '--draintimeout', '30'])
+            server.start()
+            try:
+                key = server.login()
+                connection, rest = start_request(server, key)
+                time.sleep(0.2)
+                self.assertEqual(server.post_json('/app/shutdown', dict(key=key, mode='immediate')),
+                                 dict(shutdown=True), 'Shutdown not accepted')
+                self.assertEqual(read_response(connection), b'', 'Request not aborted')
+                server.process.wait(20)
+                self.assertEqual(server.process.returncode, 0, 'Server did not exit cleanly:\n' + server.log())
+                counts = shutdown_counts(server)
+                self.assertIsNotNone(counts, 'Shutdown not logged in {:s} mode:\n{:s}'.format(mode, server.log()))
+                self.assertEqual(counts[1], 1, 'Request not counted as aborted')
+            finally:
+                server.stop()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`StaticArchive <arobito.controlinterface.StaticArchive>` module.
+"""
+
+import unittest
+import gzip
+import os
+import tempfile
+import zipfile
+from arobito.controlinterface import StaticArchive
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class IndexedArchive(unittest.TestCase):
+    """
+    Test the :py:class:`StaticArchive <arobito.controlinterface.StaticArchive.StaticArchive>` class
+    """
+
+    def __check_archive(self, archive_file: str) -> None:
+        """
+        Open the archive and read the stored and the deflated file
+
+        :param archive_file: The archive
+        """
+        archive = StaticArchive.StaticArchive(archive_file)
+        self.assertIsNone(archive.get_entry('missing.js'), 'Missing file found')
+
+        entry = archive.get_entry('img/a.png')
+        self.assertIsNotNone(entry, 'Stored file not found')
+        self.assertFalse(entry.deflated, 'Image is deflated')
+        self.assertEqual(bytes(archive.read(entry)), b'\x89PNG' * 100, 'Stored content wrong')
+
+        entry = archive.get_entry('js/a.js')
+        self.assertIsNotNone(entry, 'Deflated file not found')
+        self.assertTrue(entry.deflated, 'Script is not deflated')
+        self.assertEqual(archive.read(entry), b'var a = 1;\n' * 500, 'Deflated content wrong')
+        gzipped = b''.join(bytes(p) for p in archive.gzip_parts(entry))
+        self.assertEqual(gzip.decompress(gzipped), b'var a = 1;\n' * 500, 'Gzip member content wrong')
+
+    def runTest(self) -> None:
+        """
+        Create archives with and without top level folder and index them
+        """
+        folder = tempfile.mkdtemp()
+        fd, archive_file = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        try:
+            os.makedirs(os.path.join(folder, 'img'))
+            os.makedirs(os.path.join(folder, 'js'))
+            with open(os.path.join(folder, 'img', 'a.png'), 'wb') as fh:
+                fh.write(b'\x89PNG' * 100)
+            with open(os.path.join(folder, 'js', 'a.js'), 'wb') as fh:
+                fh.write(b'var a = 1;\n' * 500)
+
+            self.assertFalse(StaticArchive.is_archive(folder), 'Folder is detected as archive')
+            self.assertEqual(StaticArchive.create_archive(folder, archive_file), 2, 'Number of files packed wrong')
+            self.assertTrue(StaticArchive.is_archive(archive_file), 'Archive is not detected as archive')
+            self.__check_archive(archive_file)
+
+            with zipfile.ZipFile(archive_file, 'w') as archive:
+                archive.write(os.path.join(folder, 'img', 'a.png'), 'web-static/img/a.png')
+                archive.write(os.path.join(folder, 'js', 'a.js'), 'web-static/js/a.js', zipfile.ZIP_DEFLATED)
+            self.__check_archive(archive_file)
+        finally:
+            os.remove(archive_file)
+            for name in ('img/a.png', 'js/a.js', 'img', 'js', ''):
+                file = os.path.join(folder, name)
+                if os.path.isdir(file):
+                    os.rmdir(file)
+                else:
+                    os.remove(file)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`StaticContent <arobito.controlinterface.StaticContent>` module.
+"""
+
+import unittest
+import os
+import tempfile
+from arobito.controlinterface import StaticContent
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class ParseRange(unittest.TestCase):
+    """
+    Test the :py:func:`parse_range <arobito.controlinterface.StaticContent.parse_range>` function
+    """
+
+    def runTest(self) -> None:
+        """
+        Parse valid, unsatisfiable and unusable range headers
+        """
+        self.assertIsNone(StaticContent.parse_range(None, 100), 'Missing header not ignored')
+        self.assertIsNone(StaticContent.parse_range('items=0-1', 100), 'Unknown unit not ignored')
+        self.assertIsNone(StaticContent.parse_range('bytes=5-1', 100), 'Invalid range not ignored')
+        self.assertIsNone(StaticContent.parse_range('bytes=-', 100), 'Empty range not ignored')
+        self.assertIsNone(StaticContent.parse_range('bytes=' + ','.join(['0-1'] * 17), 100),
+                          'Too many ranges not ignored')
+        self.assertEqual(StaticContent.parse_range('bytes=0-9', 100), [(0, 10)], 'Simple range wrong')
+        self.assertEqual(StaticContent.parse_range('bytes=90-', 100), [(90, 100)], 'Open range wrong')
+        self.assertEqual(StaticContent.parse_range('bytes=-10', 100), [(90, 100)], 'Suffix range wrong')
+        self.assertEqual(StaticContent.parse_range('bytes=-500', 100), [(0, 100)], 'Long suffix range wrong')
+        self.assertEqual(StaticContent.parse_range('bytes=95-200', 100), [(95, 100)], 'Range is not cut at the end')
+        self.assertEqual(StaticContent.parse_range('bytes=0-0, 50-59', 100), [(0, 1), (50, 60)],
+                         'Multiple ranges wrong')
+        self.assertEqual(StaticContent.parse_range('bytes=100-', 100), [], 'Unsatisfiable range not detected')
+
+
+class FileBody(unittest.TestCase):
+    """
+    Test the :py:class:`FileBody <arobito.controlinterface.StaticContent.FileBody>` class
+    """
+
+    def runTest(self) -> None:
+        """
+        Stream a file completely, as a single range and as multiple ranges
+        """
+        content = bytes(range(256)) * 1024
+        fd, file_name = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        try:
+            body = StaticContent.FileBody(file_name, len(content), 'application/octet-stream')
+            data = b''.join(body)
+            self.assertEqual(data, content, 'Complete body differs from the file')
+            self.assertEqual(body.content_length(), len(content), 'Content length of complete body wrong')
+            self.assertFalse(body.is_multipart(), 'Complete body is a multipart body')
+
+            body = StaticContent.FileBody(file_name, len(content), 'application/octet-stream', [(100, 70000)])
+            data = b''.join(body)
+            self.assertEqual(data, content[100:70000], 'Single range body differs from the file')
+            self.assertEqual(body.content_length(), len(data), 'Content length of single range body wrong')
+            self.assertEqual(body.content_range(), 'bytes 100-69999/262144', 'Content range wrong')
+
+            body = StaticContent.FileBody(file_name, len(content), 'text/plain', [(0, 10), (500, 510)])
+            data = b''.join(body)
+            self.assertTrue(body.is_multipart(), 'Body with two ranges is not a multipart body')
+            self.assertTrue(body.content_type().startswith('multipart/byteranges; boundary='),
+                            'Multipart content type wrong')
+            self.assertEqual(body.content_length(), len(data), 'Content length of multipart body wrong')
+            self.assertIn(b'Content-Range: bytes 500-509/262144\r\n\r\n' + content[500:510], data,
+                          'Second part missing in multipart body')
+            self.assertTrue(data.endswith('--{:s}--\r\n'.format(body.boundary).encode('ascii')),
+                            'Multipart body is not closed')
+
+            empty = StaticContent.FileBody(file_name, 0, 'text/plain')
+            self.assertEqual(b''.join(empty), b'', 'Empty body is not empty')
+        finally:
+            os.remove(file_name)
+
+
+class AcceptsGzip(unittest.TestCase):
+    """
+    Test the :py:func:`accepts_gzip <arobito.controlinterface.StaticContent.accepts_gzip>` function
+    """
+
+    def runTest(self) -> None:
+        """
+        Check some typical ``Accept-Encoding`` headers
+        """
+        self.assertFalse(StaticContent.accepts_gzip(None), 'Missing header accepts gzip')
+        self.assertFalse(StaticContent.accepts_gzip('identity'), 'Identity accepts gzip')
+        self.assertFalse(StaticContent.accepts_gzip('gzip;q=0, deflate'), 'Gzip with q=0 accepted')
+        self.assertTrue(StaticContent.accepts_gzip('gzip, deflate, br'), 'Gzip not accepted')
+        self.assertTrue(StaticContent.accepts_gzip('deflate, GZIP;q=0.5'), 'Gzip with quality not accepted')
+        self.assertTrue(StaticContent.accepts_gzip('*'), 'Wildcard does not accept gzip')
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Supervisor <arobito.controlinterface.Supervisor>` module.
+"""
+
+import unittest
+import os
+import signal
+import socket
+import time
+from arobito.controlinterface import Supervisor
+from testlibs.LocalServer import LocalServer, find_free_port
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def child_pids(pid: int) -> list:
+    """
+    Get the child processes of a process (Linux only)
+
+    :param pid: The process
+    :return: The process IDs of the children
+    """
+    with open('/proc/{:d}/task/{:d}/children'.format(pid, pid), 'r') as fh:
+        return [int(child) for child in fh.read().split()]
+
+
+class ReservePort(unittest.TestCase):
+    """
+    Test :py:func:`reserve_port <arobito.controlinterface.Supervisor.reserve_port>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Reserve a free port, share it with another socket and fail on a port somebody else listens on
+        """
+        if not Supervisor.supported:
+            self.skipTest('Worker processes are not supported on this platform')
+        port = find_free_port()
+        reserved = Supervisor.reserve_port('127.0.0.1', port)
+        try:
+            shared = Supervisor.reserve_port('127.0.0.1', port)
+            shared.listen(1)
+            shared.close()
+        finally:
+            reserved.close()
+
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as other:
+            other.bind(('127.0.0.1', 0))
+            other.listen(1)
+            self.assertRaises(IOError, Supervisor.reserve_port, '127.0.0.1', other.getsockname()[1])
+
+
+class Workers(unittest.TestCase):
+    """
+    Run the server with several worker processes
+    """
+
+    def __check_sessions(self, server: LocalServer, key: str) -> None:
+        """
+        Use a session on many connections, which are spread over the workers
+
+        :param server: The server
+        :param key: The session key
+        """
+        for i in range(0, 20):
+            response = server.post_json('/app/get_session_count', dict(key=key))
+            self.assertEqual(response, dict(session_count=1), 'Session not known to every worker')
+
+    def __check_restart(self, server: LocalServer, key: str) -> None:
+        """
+        Kill a worker and wait for the supervisor to replace it
+
+        :param server: The server
+        :param key: The session key
+        """
+        workers = child_pids(server.process.pid)
+        self.assertEqual(len(workers), 2, 'Wrong number of workers')
+        os.kill(workers[0], signal.SIGKILL)
+        deadline = time.monotonic() + 20.0
+        replaced = list()
+        while time.monotonic() < deadline:
+            replaced = child_pids(server.process.pid)
+            if len(replaced) == 2 and workers[0] not in replaced:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(replaced), 2, 'Crashed worker not restarted')
+        self.assertNotIn(workers[0], replaced, 'Crashed worker still there')
+        time.sleep(1.0)
+        self.__check_sessions(server, key)
+
+    def runTest(self) -> None:
+        """
+        Start a server with two workers in both server modes, use it, crash a worker and stop it
+        """
+        if not Supervisor.supported or not os.path.isdir('/proc'):
+            self.skipTest('Worker processes are not supported on this platform')
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--workers', '2', '--mode', mode])
+            server.start()
+            try:
+                key = server.login()
+                self.__check_sessions(server, key)
+                self.__check_restart(server, key)
+            finally:
+                server.stop()
+            self.assertEqual(server.process.returncode, 0,
+                             'Server in {:s} mode did not stop cleanly:\n{:s}'.format(mode, server.log()))
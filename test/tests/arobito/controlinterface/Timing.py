@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Timing <arobito.controlinterface.Timing>` module.
+"""
+
+import unittest
+import json
+import re
+import time
+import urllib.request
+from arobito.controlinterface import BackendManager, Codec, Timing
+from arobito.controlinterface.ControllerBackend import App as Backend
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+def header_phases(header: str) -> dict:
+    """
+    Parse a ``Server-Timing`` header
+
+    :param header: The header value
+    :return: A dict of the phases and their milliseconds
+    """
+    return dict((name, float(duration)) for name, duration in re.findall('([a-z]+);dur=([0-9.]+)', header))
+
+
+class Phases(unittest.TestCase):
+    """
+    Test the timer and the wrappers of the inner phases
+    """
+
+    def runTest(self) -> None:
+        """
+        The wrappers time the phases of the current request only and are removed again
+        """
+        self.assertEqual(Timing.RequestTimer('abc-1').request_id, 'abc-1', 'Request ID not taken')
+        self.assertEqual(len(Timing.RequestTimer('bad id\r\n').request_id), 16, 'Invalid request ID taken')
+        self.assertNotEqual(Timing.RequestTimer().request_id, Timing.RequestTimer().request_id, 'Request ID reused')
+
+        original = BackendManager.SessionManager.get_user
+        Timing.install(['auth', 'get_session_count', 'logout'])
+        try:
+            backend = Backend()
+            key = backend.auth(dict(username='arobito', password='arobito'))['auth']['key']
+            timer = Timing.RequestTimer()
+            token = Timing.current.set(timer)
+            try:
+                backend.get_session_count(dict(key=key))
+                Codec.encode(dict(session_count=1))
+            finally:
+                Timing.current.reset(token)
+            backend.logout(dict(key=key))
+            self.assertEqual(set(timer.durations), {'backend', 'session', 'encode'}, 'Wrong phases timed')
+            self.assertLessEqual(timer.durations['session'], timer.durations['backend'],
+                                 'Session lookup not within the backend method')
+            phases = header_phases(timer.header())
+            self.assertEqual(list(phases), ['backend', 'session', 'encode', 'total'], 'Wrong header order')
+        finally:
+            Timing.uninstall()
+        self.assertIs(BackendManager.SessionManager.get_user, original, 'Wrapper not removed')
+        self.assertFalse(hasattr(Backend.auth, 'timed_original'), 'Backend wrapper not removed')
+
+
+class Server(unittest.TestCase):
+    """
+    Check the header and the log of running servers
+    """
+
+    def runTest(self) -> None:
+        """
+        Both server modes report the phases of ``auth``
+        """
+        for mode in ('cherrypy', 'asyncio'):
+            server = LocalServer(['--mode', mode], '[Server]\nserver-timing = yes\nserver-timing-sample = 1\n')
+            server.start()
+            try:
+                request = urllib.request.Request(server.url('/app/auth'),
+                                                 data=json.dumps(dict(username='arobito', password='arobito'))
+                                                 .encode('utf-8'),
+                                                 headers={'Content-Type': 'application/json',
+                                                          'X-Request-ID': 'timing-test-' + mode})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    key = json.loads(response.read().decode('utf-8'))['auth']['key']
+                    self.assertEqual(response.headers['X-Request-ID'], 'timing-test-' + mode, 'Request ID not sent')
+                    phases = header_phases(response.headers['Server-Timing'])
+                server.post_json('/app/logout', dict(key=key))
+                for phase in ('tools', 'parse', 'admission', 'backend', 'hash', 'encode', 'total'):
+                    self.assertIn(phase, phases, 'Phase {:s} missing in {:s} mode'.format(phase, mode))
+                self.assertNotIn('write', phases, 'Write phase in the header')
+                self.assertGreaterEqual(phases['backend'], phases['hash'], 'Hashing not within the backend method')
+                logged = 'Timing: request timing-test-{:s} POST /app/auth 200 .*write='.format(mode)
+                deadline = time.monotonic() + 5.0
+                while not re.search(logged, server.log()) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                self.assertRegex(server.log(), logged, 'Request not logged in {:s} mode'.format(mode))
+            finally:
+                server.stop()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2014 The Arobito Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tests for the :py:mod:`Watchdog <arobito.controlinterface.Watchdog>` module.
+"""
+
+import unittest
+import re
+import threading
+import time
+from arobito.controlinterface import Watchdog
+from testlibs.LocalServer import LocalServer
+
+__license__ = 'Apache License V2.0'
+__copyright__ = 'Copyright 2014 The Arobito Project'
+__author__ = 'Jürgen Edelbluth'
+__credits__ = ['Jürgen Edelbluth']
+__maintainer__ = 'Jürgen Edelbluth'
+
+
+class Tracking(unittest.TestCase):
+    """
+    Test the :py:class:`RequestTracker <arobito.controlinterface.Watchdog.RequestTracker>` and the checks of the
+    :py:class:`Watchdog <arobito.controlinterface.Watchdog.Watchdog>`
+    """
+
+    def runTest(self) -> None:
+        """
+        Slow requests are counted once, fast and finished ones not at all
+        """
+        tracker = Watchdog.RequestTracker()
+        release = threading.Event()
+        tokens = list()
+
+        def stuck() -> None:
+            token = tracker.begin('POST', '/app/watchdog-test', '127.0.0.1', 'watchdog-test')
+            tokens.append(token)
+            release.wait()
+            tracker.end(token)
+
+        threads = [threading.Thread(target=stuck, name='Watchdog Test-{:d}'.format(i)) for i in range(0, 2)]
+        for thread in threads:
+            thread.start()
+        while len(tokens) < len(threads):
+            time.sleep(0.01)
+        watchdog = Watchdog.Watchdog(None, 0.1, 1.0, 60.0)
+        try:
+            moved = tracker.run(tokens[0], lambda: [flight.thread for flight in tracker.flights()
+                                                    if flight.path == '/app/watchdog-test'])
+            self.assertIn(threading.get_ident(), moved, 'Request not moved to the calling thread')
+            watchdog.check()
+            self.assertEqual(watchdog.slow, 0, 'Fast requests counted')
+            time.sleep(0.15)
+            finished = tracker.begin('GET', '/static/watchdog-test')
+            tracker.end(finished)
+            watchdog.check()
+            self.assertEqual(watchdog.slow, 2, 'Slow requests not counted')
+            watchdog.check()
+            self.assertEqual(watchdog.slow, 2, 'Slow requests counted twice')
+            flights = [flight for flight in tracker.flights() if flight.path == '/app/watchdog-test']
+            self.assertEqual(set(flight.thread for flight in flights), set(thread.ident for thread in threads),
+                             'Request not moved back to its thread')
+            self.assertRegex(flights[0].describe(time.monotonic()),
+                             '^POST /app/watchdog-test from 127.0.0.1 \\(request watchdog-test\\), running for ',
+                             'Description wrong')
+        finally:
+            release.set()
+            for thread in threads:
+                thread.join()
+        self.assertFalse(any(flight.path.endswith('watchdog-test') for flight in tracker.flights()),
+                         'Finished requests still tracked')
+
+
+class Server(unittest.TestCase):
+    """
+    Check the log of running servers
+    """
+
+    def runTest(self) -> None:
+        """
+        Both server modes report a request running longer than the threshold, on the thread running it
+        """
+        config = '[Server]\nwatchdog-threshold = 0.2\nwatchdog-interval = 0.05\n'
+        for mode, thread in (('cherrypy', 'CP Server Thread'), ('asyncio', 'AsyncExecutor')):
+            server = LocalServer(['--mode', mode], config)
+            server.start()
+            try:
+                key = server.login()
+                result = server.post_json('/app/profile', dict(key=key, mode='sample', duration=0.5))
+                server.post_json('/app/logout', dict(key=key))
+                self.assertGreater(result['profile']['samples'], 0, 'Profile failed in {:s} mode'.format(mode))
+                reported = 'Watchdog: Slow request POST /app/profile from .* on thread {:s}'.format(thread)
+                deadline = time.monotonic() + 5.0
+                while not re.search(reported, server.log()) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                log = server.log()
+                self.assertRegex(log, reported, 'Slow request not reported in {:s} mode'.format(mode))
+                self.assertIn('in sample', log, 'Stack not printed in {:s} mode'.format(mode))
+            finally:
+                server.stop()